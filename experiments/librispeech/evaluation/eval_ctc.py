@@ -44,13 +44,13 @@ def do_eval(model, params, epoch, batch_size, beam_width):
     test_clean_data = Dataset(
         data_type='dev_clean', train_data_size=params['train_data_size'],
         label_type=params['label_type'],
-        batch_size=batch_size, splice=params['splice'],
+        batch_size=batch_size, splice=model.splice,
         num_stack=params['num_stack'], num_skip=params['num_skip'],
         shuffle=False)
     test_other_data = Dataset(
         data_type='dev_other', train_data_size=params['train_data_size'],
         label_type=params['label_type'],
-        batch_size=batch_size, splice=params['splice'],
+        batch_size=batch_size, splice=model.splice,
         num_stack=params['num_stack'], num_skip=params['num_skip'],
         shuffle=False)
 
@@ -172,7 +172,9 @@ def main():
         clip_grad=params['clip_grad'],
         clip_activation=params['clip_activation'],
         num_proj=params['num_proj'],
-        weight_decay=params['weight_decay'])
+        weight_decay=params['weight_decay'],
+        batch_norm=params.get('batch_norm', False),
+        time_conv=params.get('time_conv', False))
 
     model.save_path = args.model_path
     do_eval(model=model, params=params,
@@ -0,0 +1,288 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Evaluate the trained BLSTM-CTC model by latency-controlled inference with
+   various chunk sizes and right contexts (Librispeech corpus)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import re
+import numpy as np
+import tensorflow as tf
+import yaml
+import argparse
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+plt.style.use('ggplot')
+
+sys.path.append(os.path.abspath('../../../'))
+from experiments.librispeech.data.load_dataset_ctc import Dataset
+from models.ctc.vanilla_ctc import CTC
+from models.ctc.streaming_ctc import LatencyControlledCTC
+from utils.io.labels.character import Idx2char
+from utils.io.labels.word import Idx2word
+from utils.evaluation.edit_distance import compute_cer, compute_wer
+from utils.directory import mkdir_join
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--epoch', type=int, default=-1,
+                    help='the epoch to restore')
+parser.add_argument('--model_path', type=str,
+                    help='path to the model to evaluate')
+parser.add_argument('--data_type', type=str, default='dev_clean',
+                    help='dev_clean or dev_other or test_clean or test_other')
+parser.add_argument('--chunk_sizes', type=str, default='10,20,40',
+                    help='comma-separated chunk sizes (after frame stacking)')
+parser.add_argument('--right_contexts', type=str, default='0,10,20',
+                    help='comma-separated right contexts (after frame stacking)')
+parser.add_argument('--eval_batch_size', type=int, default=16,
+                    help='the size of mini-batch when evaluation')
+
+
+def do_eval(params, epoch, dataset, chunk_size=None, right_context=0):
+    """Evaluate the model with a configuration of latency control.
+    Args:
+        params (dict): A dictionary of parameters
+        epoch (int): the epoch to restore
+        dataset: An instance of a `Dataset` class
+        chunk_size (int, optional): the number of frames in each chunk.
+            None means inference over whole utterances.
+        right_context (int, optional): the number of frames in the right
+            context
+    Returns:
+        cer_mean (float): An average of CER (None for word models)
+        wer_mean (float): An average of WER
+        latency_per_chunk (float): An average time [sec] to compute a chunk
+    """
+    if params['label_type'] == 'character':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character.txt')
+    elif params['label_type'] == 'character_capital_divide':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character_capital_divide.txt',
+            capital_divide=True,
+            space_mark='_')
+    else:
+        idx2word = Idx2word(
+            map_file_path='../metrics/mapping_files/ctc/word_' + params['train_data_size'] + '.txt')
+
+    def idx2str(labels):
+        if 'char' in params['label_type']:
+            return idx2char(labels)
+        return '_'.join(idx2word(labels))
+
+    tf.reset_default_graph()
+    with tf.Graph().as_default():
+        model = build_model(params)
+        if chunk_size is None:
+            # NOTE: the whole utterance is regarded as a single chunk
+            model.create_placeholders()
+            _, logits = model.compute_loss(model.inputs_pl_list[0],
+                                           model.labels_pl_list[0],
+                                           model.inputs_seq_len_pl_list[0],
+                                           model.keep_prob_input_pl_list[0],
+                                           model.keep_prob_hidden_pl_list[0],
+                                           model.keep_prob_output_pl_list[0])
+            posteriors_op = tf.nn.softmax(tf.transpose(logits, (1, 0, 2)))
+        else:
+            decoder = LatencyControlledCTC(model,
+                                           chunk_size=chunk_size,
+                                           right_context=right_context)
+
+        # Create a saver for writing training checkpoints
+        saver = tf.train.Saver()
+
+        with tf.Session() as sess:
+            ckpt = tf.train.get_checkpoint_state(model.save_path)
+
+            # If check point exists
+            if ckpt:
+                # Use last saved model
+                model_path = ckpt.model_checkpoint_path
+                if epoch != -1:
+                    model_path = model_path.split('/')[:-1]
+                    model_path = '/'.join(model_path) + \
+                        '/model.ckpt-' + str(epoch)
+                saver.restore(sess, model_path)
+            else:
+                raise ValueError('There are not any checkpoints.')
+
+            # Reset data counter
+            dataset.reset()
+
+            cer_mean, wer_mean, utt_num = 0, 0, 0
+            latencies = []
+            for data, is_new_epoch in dataset:
+
+                inputs, labels_true, inputs_seq_len, _ = data
+                inputs, labels_true, inputs_seq_len = \
+                    inputs[0], labels_true[0], inputs_seq_len[0]
+
+                if chunk_size is None:
+                    feed_dict = {
+                        model.inputs_pl_list[0]: inputs,
+                        model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                        model.keep_prob_input_pl_list[0]: 1.0,
+                        model.keep_prob_hidden_pl_list[0]: 1.0,
+                        model.keep_prob_output_pl_list[0]: 1.0
+                    }
+                    posteriors = sess.run(posteriors_op, feed_dict=feed_dict)
+                else:
+                    posteriors = decoder(sess, inputs, inputs_seq_len)
+                    latencies.extend(decoder.latencies)
+
+                for i_batch in range(len(inputs)):
+                    labels_pred = _best_path(
+                        posteriors[i_batch, :inputs_seq_len[i_batch]],
+                        blank_index=model.num_classes - 1)
+
+                    if dataset.is_test:
+                        str_true = labels_true[i_batch][0]
+                        str_true = str_true.replace(' ', '_')
+                    else:
+                        str_true = idx2str(labels_true[i_batch])
+                    str_pred = idx2str(labels_pred)
+
+                    # Remove consecutive spaces & garbage labels
+                    str_pred = re.sub(r'[_]+', '_', str_pred)
+                    str_true = re.sub(r'[\']+', '', str_true)
+                    str_pred = re.sub(r'[\']+', '', str_pred)
+
+                    wer_mean += compute_wer(ref=str_true.split('_'),
+                                            hyp=str_pred.split('_'),
+                                            normalize=True)
+                    if 'char' in params['label_type']:
+                        cer_mean += compute_cer(
+                            str_pred=re.sub(r'[_]+', '', str_pred),
+                            str_true=re.sub(r'[_]+', '', str_true),
+                            normalize=True)
+                    utt_num += 1
+
+                if is_new_epoch:
+                    break
+
+    cer_mean = cer_mean / utt_num if 'char' in params['label_type'] else None
+    wer_mean /= utt_num
+    latency_per_chunk = np.mean(latencies) if len(latencies) > 0 else 0
+    return cer_mean, wer_mean, latency_per_chunk
+
+
+def _best_path(posteriors, blank_index):
+    """Greedy decoding.
+    Args:
+        posteriors (np.ndarray): A tensor of size `[T, num_classes]`
+        blank_index (int): the index of the blank class
+    Returns:
+        labels (np.ndarray): A tensor of size `[L]`
+    """
+    best = np.argmax(posteriors, axis=1)
+    if len(best) == 0:
+        return best
+    keep = np.insert(best[1:] != best[:-1], 0, True)
+    labels = best[keep]
+    return labels[labels != blank_index]
+
+
+def build_model(params):
+    model = CTC(
+        encoder_type=params['encoder_type'],
+        input_size=params['input_size'] * params['num_stack'],
+        splice=params['splice'],
+        num_units=params['num_units'],
+        num_layers=params['num_layers'],
+        num_classes=params['num_classes'],
+        lstm_impl=params['lstm_impl'],
+        use_peephole=params['use_peephole'],
+        parameter_init=params['weight_init'],
+        clip_grad=params['clip_grad'],
+        clip_activation=params['clip_activation'],
+        num_proj=params['num_proj'],
+        weight_decay=params['weight_decay'])
+    model.save_path = params['model_path']
+    return model
+
+
+def main():
+
+    args = parser.parse_args()
+
+    # Load config file
+    with open(os.path.join(args.model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        params = config['param']
+    params['model_path'] = args.model_path
+
+    # Except for a blank class
+    if params['label_type'] == 'character':
+        params['num_classes'] = 28
+    elif params['label_type'] == 'character_capital_divide':
+        params['num_classes'] = 77
+    elif params['label_type'] == 'word':
+        if params['train_data_size'] == 'train_clean100':
+            params['num_classes'] = 7213
+        elif params['train_data_size'] == 'train_clean360':
+            params['num_classes'] = 16287
+        elif params['train_data_size'] == 'train_other500':
+            params['num_classes'] = 18669
+        elif params['train_data_size'] == 'train_all':
+            params['num_classes'] = 26642
+
+    dataset = Dataset(
+        data_type=args.data_type, train_data_size=params['train_data_size'],
+        label_type=params['label_type'],
+        batch_size=args.eval_batch_size, splice=params['splice'],
+        num_stack=params['num_stack'], num_skip=params['num_skip'],
+        shuffle=False)
+
+    # NOTE: each stacked frame shifts 10ms * num_skip
+    frame_shift_ms = params['num_skip'] * 10
+
+    # Full-context baseline
+    cer, wer, _ = do_eval(params, args.epoch, dataset)
+    results = [(-1, -1, -1, -1 if cer is None else cer, wer, 0)]
+    print('Full context: WER %f %%' % (wer * 100))
+
+    for chunk_size in [int(c) for c in args.chunk_sizes.split(',')]:
+        for right_context in [int(r) for r in args.right_contexts.split(',')]:
+            cer, wer, latency_per_chunk = do_eval(
+                params, args.epoch, dataset,
+                chunk_size=chunk_size, right_context=right_context)
+            latency_ms = (chunk_size + right_context) * frame_shift_ms
+            results.append((chunk_size, right_context, latency_ms,
+                            -1 if cer is None else cer, wer,
+                            latency_per_chunk * 1000))
+            print('Chunk %d + right context %d (%d ms): WER %f %% / %.2f ms per chunk' %
+                  (chunk_size, right_context, latency_ms, wer * 100,
+                   latency_per_chunk * 1000))
+            if cer is not None:
+                print('  CER %f %%' % (cer * 100))
+
+    # Save as csv file
+    save_path = mkdir_join(args.model_path, 'latency_controlled')
+    np.savetxt(os.path.join(save_path, args.data_type + '.csv'),
+               np.array(results), delimiter=",",
+               header='chunk_size,right_context,latency_ms,cer,wer,compute_ms_per_chunk')
+
+    # Plot accuracy vs. latency & save as png file
+    name = 'CER' if 'char' in params['label_type'] else 'WER'
+    plt.clf()
+    for right_context in sorted(set(r[1] for r in results[1:])):
+        points = sorted([(r[2], r[3] if name == 'CER' else r[4])
+                         for r in results[1:] if r[1] == right_context])
+        plt.plot([p[0] for p in points], [p[1] * 100 for p in points],
+                 marker='o', label='right context: %d' % right_context)
+    plt.axhline(y=(results[0][3] if name == 'CER' else results[0][4]) * 100,
+                linestyle=':', color='grey', label='full context')
+    plt.xlabel('Latency [ms]', fontsize=12)
+    plt.ylabel(name + ' [%]', fontsize=12)
+    plt.legend(loc="upper right", fontsize=12)
+    plt.savefig(os.path.join(save_path, args.data_type + '.png'), dpi=500)
+
+
+if __name__ == '__main__':
+    main()
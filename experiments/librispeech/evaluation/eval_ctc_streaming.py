@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Evaluate the trained unidirectional CTC model by chunk-wise streaming
+   inference (Librispeech corpus)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import re
+import numpy as np
+import tensorflow as tf
+import yaml
+import argparse
+
+sys.path.append(os.path.abspath('../../../'))
+from experiments.librispeech.data.load_dataset_ctc import Dataset
+from models.ctc.vanilla_ctc import CTC
+from models.ctc.streaming_ctc import StreamingCTC
+from utils.io.labels.character import Idx2char
+from utils.io.labels.word import Idx2word
+from utils.evaluation.edit_distance import compute_cer
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--epoch', type=int, default=-1,
+                    help='the epoch to restore')
+parser.add_argument('--model_path', type=str,
+                    help='path to the model to evaluate')
+parser.add_argument('--data_type', type=str, default='dev_clean',
+                    help='dev_clean or dev_other or test_clean or test_other')
+parser.add_argument('--chunk_size', type=int, default=10,
+                    help='the number of frames in each chunk ' +
+                    '(after frame stacking)')
+parser.add_argument('--show_partial', action='store_true',
+                    help='if set, print partial hypotheses of each chunk')
+
+
+def do_eval(model, params, epoch, data_type, chunk_size, show_partial=False):
+    """Evaluate the model by streaming inference.
+    Args:
+        model: the model to restore
+        params (dict): A dictionary of parameters
+        epoch (int): the epoch to restore
+        data_type (string): dev_clean or dev_other or test_clean or test_other
+        chunk_size (int): the number of frames in each chunk
+        show_partial (bool, optional): if True, print partial hypotheses
+    """
+    # Load dataset
+    dataset = Dataset(
+        data_type=data_type, train_data_size=params['train_data_size'],
+        label_type=params['label_type'],
+        batch_size=1, splice=params['splice'],
+        num_stack=params['num_stack'], num_skip=params['num_skip'],
+        shuffle=False)
+
+    if params['label_type'] == 'character':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character.txt')
+    elif params['label_type'] == 'character_capital_divide':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character_capital_divide.txt',
+            capital_divide=True,
+            space_mark='_')
+    else:
+        idx2word = Idx2word(
+            map_file_path='../metrics/mapping_files/ctc/word_' + params['train_data_size'] + '.txt')
+
+    def idx2str(labels):
+        if 'char' in params['label_type']:
+            return idx2char(labels)
+        return '_'.join(idx2word(labels))
+
+    # Define the streaming graph
+    streamer = StreamingCTC(model, chunk_size=chunk_size)
+
+    # Create a saver for writing training checkpoints
+    saver = tf.train.Saver()
+
+    # NOTE: each stacked frame shifts 10ms * num_skip
+    chunk_duration = chunk_size * params['num_skip'] * 0.01
+
+    with tf.Session() as sess:
+        ckpt = tf.train.get_checkpoint_state(model.save_path)
+
+        # If check point exists
+        if ckpt:
+            # Use last saved model
+            model_path = ckpt.model_checkpoint_path
+            if epoch != -1:
+                model_path = model_path.split('/')[:-1]
+                model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            saver.restore(sess, model_path)
+            print("Model restored: " + model_path)
+        else:
+            raise ValueError('There are not any checkpoints.')
+
+        latencies = []
+        audio_duration, compute_duration = 0, 0
+        cer_mean, utt_num = 0, 0
+        while True:
+
+            data, is_new_epoch = dataset.next(batch_size=1)
+            inputs, labels_true, inputs_seq_len, input_names = data
+            # NOTE: Batch size is expected to be 1
+            inputs = inputs[0][0][:inputs_seq_len[0][0]]
+
+            print('----- wav: %s -----' % input_names[0][0])
+            for _, new_labels, latency in streamer(sess, inputs):
+                if show_partial and len(new_labels) > 0:
+                    print('  [%.1f ms] %s' %
+                          (latency * 1000, idx2str(streamer.hypothesis)))
+
+            latencies.extend(streamer.latencies)
+            audio_duration += len(inputs) * params['num_skip'] * 0.01
+            compute_duration += sum(streamer.latencies)
+
+            if dataset.is_test:
+                str_true = labels_true[0][0][0]
+            else:
+                str_true = idx2str(labels_true[0][0])
+            str_pred = idx2str(streamer.hypothesis)
+            print('Ref: %s' % str_true.replace('_', ' '))
+            print('Hyp: %s' % str_pred.replace('_', ' '))
+
+            if 'char' in params['label_type']:
+                str_true = re.sub(r'[_\']+', '', str_true)
+                str_pred = re.sub(r'[_\']+', '', str_pred)
+                cer_mean += compute_cer(str_pred=str_pred,
+                                        str_true=str_true,
+                                        normalize=True)
+            utt_num += 1
+
+            if is_new_epoch:
+                break
+
+    latencies = np.array(latencies) * 1000
+    print('Chunk: %d frames (%.0f ms)' % (chunk_size, chunk_duration * 1000))
+    print('Latency per chunk [ms]: mean %.2f / 50%% %.2f / 95%% %.2f / 99%% %.2f / max %.2f' %
+          (np.mean(latencies), np.percentile(latencies, 50),
+           np.percentile(latencies, 95), np.percentile(latencies, 99),
+           np.max(latencies)))
+    print('Real time factor: %.3f' % (compute_duration / audio_duration))
+    if 'char' in params['label_type']:
+        print('CER: %f %%' % (cer_mean / utt_num * 100))
+
+
+def main():
+
+    args = parser.parse_args()
+
+    # Load config file
+    with open(os.path.join(args.model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        params = config['param']
+
+    # Except for a blank class
+    if params['label_type'] == 'character':
+        params['num_classes'] = 28
+    elif params['label_type'] == 'character_capital_divide':
+        params['num_classes'] = 77
+    elif params['label_type'] == 'word':
+        if params['train_data_size'] == 'train_clean100':
+            params['num_classes'] = 7213
+        elif params['train_data_size'] == 'train_clean360':
+            params['num_classes'] = 16287
+        elif params['train_data_size'] == 'train_other500':
+            params['num_classes'] = 18669
+        elif params['train_data_size'] == 'train_all':
+            params['num_classes'] = 26642
+
+    # Model setting
+    model = CTC(
+        encoder_type=params['encoder_type'],
+        input_size=params['input_size'] * params['num_stack'],
+        splice=params['splice'],
+        num_units=params['num_units'],
+        num_layers=params['num_layers'],
+        num_classes=params['num_classes'],
+        lstm_impl=params['lstm_impl'],
+        use_peephole=params['use_peephole'],
+        parameter_init=params['weight_init'],
+        clip_grad=params['clip_grad'],
+        clip_activation=params['clip_activation'],
+        num_proj=params['num_proj'],
+        weight_decay=params['weight_decay'])
+
+    model.save_path = args.model_path
+    do_eval(model=model, params=params, epoch=args.epoch,
+            data_type=args.data_type, chunk_size=args.chunk_size,
+            show_partial=args.show_partial)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Evaluate the frozen inference graph of the CTC model
+   (Librispeech corpus)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import re
+import time
+import yaml
+import argparse
+
+sys.path.append(os.path.abspath('../../../'))
+from experiments.librispeech.data.load_dataset_ctc import Dataset
+from models.ctc.export import FrozenCTC
+from utils.io.labels.character import Idx2char
+from utils.io.labels.word import Idx2word
+from utils.evaluation.edit_distance import compute_cer, compute_wer
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model_path', type=str,
+                    help='path to the model including frozen_graph.pb')
+parser.add_argument('--data_type', type=str, default='dev_clean',
+                    help='dev_clean or dev_other or test_clean or test_other')
+parser.add_argument('--eval_batch_size', type=int, default=16,
+                    help='the size of mini-batch when evaluation')
+
+
+def main():
+
+    args = parser.parse_args()
+
+    # Load config file
+    with open(os.path.join(args.model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        params = config['param']
+
+    # Load the frozen graph
+    decoder = FrozenCTC(os.path.join(args.model_path, 'frozen_graph.pb'))
+    print('Startup time: %.3f sec' % decoder.startup_time)
+
+    dataset = Dataset(
+        data_type=args.data_type, train_data_size=params['train_data_size'],
+        label_type=params['label_type'],
+        batch_size=args.eval_batch_size, splice=params['splice'],
+        num_stack=params['num_stack'], num_skip=params['num_skip'],
+        shuffle=False)
+
+    if params['label_type'] == 'character':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character.txt')
+    elif params['label_type'] == 'character_capital_divide':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character_capital_divide.txt',
+            capital_divide=True,
+            space_mark='_')
+    else:
+        idx2word = Idx2word(
+            map_file_path='../metrics/mapping_files/ctc/word_' + params['train_data_size'] + '.txt')
+
+    def idx2str(labels):
+        if 'char' in params['label_type']:
+            return idx2char(labels)
+        return '_'.join(idx2word(labels))
+
+    cer_mean, wer_mean, utt_num = 0, 0, 0
+    first_batch_time, decode_time = None, 0
+    for data, is_new_epoch in dataset:
+
+        inputs, labels_true, inputs_seq_len, _ = data
+
+        start_time = time.time()
+        labels_pred = decoder.decode(inputs[0], inputs_seq_len[0])
+        if first_batch_time is None:
+            first_batch_time = time.time() - start_time
+        decode_time += time.time() - start_time
+
+        for i_batch in range(len(inputs[0])):
+            if dataset.is_test:
+                str_true = labels_true[0][i_batch][0].replace(' ', '_')
+            else:
+                str_true = idx2str(labels_true[0][i_batch])
+            str_pred = idx2str(labels_pred[i_batch])
+
+            # Remove consecutive spaces & garbage labels
+            str_pred = re.sub(r'[_]+', '_', str_pred)
+            str_true = re.sub(r'[\']+', '', str_true)
+            str_pred = re.sub(r'[\']+', '', str_pred)
+
+            wer_mean += compute_wer(ref=str_true.split('_'),
+                                    hyp=str_pred.split('_'),
+                                    normalize=True)
+            if 'char' in params['label_type']:
+                cer_mean += compute_cer(
+                    str_pred=re.sub(r'[_]+', '', str_pred),
+                    str_true=re.sub(r'[_]+', '', str_true),
+                    normalize=True)
+            utt_num += 1
+
+        if is_new_epoch:
+            break
+
+    decoder.close()
+
+    print('Time to the first result: %.3f sec' %
+          (decoder.startup_time + first_batch_time))
+    print('Decoding time: %.3f sec (%d utterances)' % (decode_time, utt_num))
+    print('  WER: %f %%' % (wer_mean / utt_num * 100))
+    if 'char' in params['label_type']:
+        print('  CER: %f %%' % (cer_mean / utt_num * 100))
+
+
+if __name__ == '__main__':
+    main()
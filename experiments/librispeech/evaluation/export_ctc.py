@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export the trained CTC model as a frozen inference graph
+   (Librispeech corpus)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import tensorflow as tf
+import yaml
+import argparse
+
+sys.path.append(os.path.abspath('../../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.ctc.export import export_inference_graph
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--epoch', type=int, default=-1,
+                    help='the epoch to restore')
+parser.add_argument('--model_path', type=str,
+                    help='path to the model to export')
+parser.add_argument('--beam_width', type=int, default=1,
+                    help='beam_width (int, optional): beam width for beam search.' +
+                    ' 1 disables beam search, which mean greedy decoding.')
+
+
+def main():
+
+    args = parser.parse_args()
+
+    # Load config file
+    with open(os.path.join(args.model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        params = config['param']
+
+    # Except for a blank class
+    if params['label_type'] == 'character':
+        params['num_classes'] = 28
+    elif params['label_type'] == 'character_capital_divide':
+        params['num_classes'] = 77
+    elif params['label_type'] == 'word':
+        if params['train_data_size'] == 'train_clean100':
+            params['num_classes'] = 7213
+        elif params['train_data_size'] == 'train_clean360':
+            params['num_classes'] = 16287
+        elif params['train_data_size'] == 'train_other500':
+            params['num_classes'] = 18669
+        elif params['train_data_size'] == 'train_all':
+            params['num_classes'] = 26642
+
+    # Model setting
+    model = CTC(
+        encoder_type=params['encoder_type'],
+        input_size=params['input_size'] * params['num_stack'],
+        splice=params['splice'],
+        num_units=params['num_units'],
+        num_layers=params['num_layers'],
+        num_classes=params['num_classes'],
+        lstm_impl=params['lstm_impl'],
+        use_peephole=params['use_peephole'],
+        parameter_init=params['weight_init'],
+        clip_grad=params['clip_grad'],
+        clip_activation=params['clip_activation'],
+        num_proj=params['num_proj'],
+        weight_decay=params['weight_decay'],
+        batch_norm=False)
+    # NOTE: batch normalization is folded into the convolutional layers in
+    # the exported graph
+
+    ckpt = tf.train.get_checkpoint_state(args.model_path)
+    if not ckpt:
+        raise ValueError('There are not any checkpoints.')
+    model_path = ckpt.model_checkpoint_path
+    if args.epoch != -1:
+        model_path = model_path.split('/')[:-1]
+        model_path = '/'.join(model_path) + '/model.ckpt-' + str(args.epoch)
+
+    save_path = os.path.join(args.model_path, 'frozen_graph.pb')
+    graph_def = export_inference_graph(model=model,
+                                       checkpoint_path=model_path,
+                                       save_path=save_path,
+                                       beam_width=args.beam_width,
+                                       fold_bn=params.get('batch_norm', False))
+    print('Exported: %s (%d nodes)' % (save_path, len(graph_def.node)))
+
+
+if __name__ == '__main__':
+    main()
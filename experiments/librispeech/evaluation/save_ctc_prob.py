@@ -9,7 +9,6 @@ from __future__ import print_function
 
 import os
 import sys
-import numpy as np
 import tensorflow as tf
 import yaml
 import argparse
@@ -17,24 +16,33 @@ import argparse
 sys.path.append(os.path.abspath('../../../'))
 from experiments.librispeech.data.load_dataset_ctc import Dataset
 from models.ctc.vanilla_ctc import CTC
-from utils.directory import mkdir_join
+from utils.io.outputs.posteriors import PosteriorWriter
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--epoch', type=int, default=-1,
                     help='the epoch to restore')
 parser.add_argument('--model_path', type=str,
                     help='path to the model to evaluate')
-parser.add_argument('--eval_batch_size', type=str, default=1,
+parser.add_argument('--eval_batch_size', type=int, default=1,
                     help='the size of mini-batch in evaluation')
+parser.add_argument('--top_k', type=int, default=-1,
+                    help='the number of posteriors to save per frame. ' +
+                    '-1 means saving all posteriors in float16.')
+parser.add_argument('--chunk_frames', type=int, default=100000,
+                    help='the number of frames in each chunk of the archive')
 
 
-def do_save(model, params, epoch, eval_batch_size):
-    """Save the CTC outputs.
+def do_save(model, params, epoch, eval_batch_size, top_k=None,
+            chunk_frames=100000):
+    """Save the CTC outputs to the posterior archive.
     Args:
         model: the model to restore
         params (dict): A dictionary of parameters
         epoch (int): the epoch to restore
         eval_batch_size (int): the size of mini-batch in evaluation
+        top_k (int, optional): the number of posteriors to save per frame.
+            None means saving all posteriors.
+        chunk_frames (int, optional): the number of frames in each chunk
     """
     # Load dataset
     train_data = Dataset(
@@ -56,9 +64,10 @@ def do_save(model, params, epoch, eval_batch_size):
             model.inputs_seq_len_pl_list[0],
             model.keep_prob_input_pl_list[0],
             model.keep_prob_hidden_pl_list[0],
-            model.keep_prob_output_pl_list[0],
-            softmax_temperature=params['softmax_temperature'])
-        posteriors_op = model.posteriors(logits, blank_prior=1)
+            model.keep_prob_output_pl_list[0])
+        posteriors_op = model.posteriors(
+            logits, blank_prior=1,
+            softmax_tempareture=params.get('softmax_temperature', 1))
 
     # Create a saver for writing training checkpoints
     saver = tf.train.Saver()
@@ -78,6 +87,12 @@ def do_save(model, params, epoch, eval_batch_size):
         else:
             raise ValueError('There are not any checkpoints.')
 
+        writer = PosteriorWriter(
+            os.path.join(model.save_path, 'probs'),
+            num_classes=model.num_classes,
+            top_k=top_k,
+            chunk_frames=chunk_frames)
+
         for data, is_new_epoch in train_data:
 
             # Create feed dictionary for next mini batch
@@ -98,13 +113,14 @@ def do_save(model, params, epoch, eval_batch_size):
             for i_batch in range(batch_size):
                 prob = posteriors[i_batch][:int(inputs_seq_len[0][i_batch]), :]
 
-                # Save as a npy file
-                np.save(mkdir_join(model.save_path, 'probs',
-                                   input_names[0][i_batch]), prob)
+                # Append to the archive
+                writer.write(input_names[0][i_batch], prob)
 
             if is_new_epoch:
                 break
 
+        writer.close()
+
 
 def main():
 
@@ -134,6 +150,7 @@ def main():
     model = CTC(
         encoder_type=params['encoder_type'],
         input_size=params['input_size'] * params['num_stack'],
+        splice=params['splice'],
         num_units=params['num_units'],
         num_layers=params['num_layers'],
         num_classes=params['num_classes'],
@@ -146,7 +163,10 @@ def main():
         weight_decay=params['weight_decay'])
 
     model.save_path = args.model_path
-    do_save(model=model, params=params, epoch=args.epoch)
+    do_save(model=model, params=params, epoch=args.epoch,
+            eval_batch_size=args.eval_batch_size,
+            top_k=args.top_k if args.top_k > 0 else None,
+            chunk_frames=args.chunk_frames)
 
 
 if __name__ == '__main__':
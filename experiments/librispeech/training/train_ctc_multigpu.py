@@ -21,7 +21,8 @@ from experiments.librispeech.metrics.ctc import do_eval_cer, do_eval_wer
 from utils.io.labels.sparsetensor import list2sparsetensor
 from utils.training.learning_rate_controller import Controller
 from utils.training.plot import plot_loss, plot_ler
-from utils.training.multi_gpu import average_gradients
+from utils.training.throughput import ThroughputMonitor
+from utils.training.multi_gpu import build_towers, get_devices
 from utils.directory import mkdir_join, mkdir
 from utils.parameter import count_total_parameters
 from models.ctc.vanilla_ctc import CTC
@@ -67,74 +68,43 @@ def do_train(model, params, gpu_indices):
         optimizer = model._set_optimizer(
             params['optimizer'], learning_rate_pl)
 
-        # Calculate the gradients for each model tower
-        total_grads_and_vars, total_losses = [], []
-        decode_ops, ler_ops = [], []
-        all_devices = ['/gpu:%d' % i_gpu for i_gpu in range(len(gpu_indices))]
+        def tower_fn(i_gpu, scope):
+            # Define placeholders in each tower
+            model.create_placeholders()
+
+            # Calculate the total loss for the current tower of the model
+            tower_loss, tower_logits = model.compute_loss(
+                model.inputs_pl_list[i_gpu],
+                model.labels_pl_list[i_gpu],
+                model.inputs_seq_len_pl_list[i_gpu],
+                model.keep_prob_input_pl_list[i_gpu],
+                model.keep_prob_hidden_pl_list[i_gpu],
+                model.keep_prob_output_pl_list[i_gpu],
+                scope)
+
+            # Add to the graph each operation per tower
+            decode_op_tower = model.decoder(
+                tower_logits,
+                model.inputs_seq_len_pl_list[i_gpu],
+                beam_width=params['beam_width'])
+            ler_op_tower = model.compute_ler(
+                decode_op_tower, model.labels_pl_list[i_gpu])
+            return tower_loss, (decode_op_tower, ler_op_tower)
+
+        # Build the model towers, and average the gradients over them. In
+        # mixed precision training, the update is skipped when gradients
+        # overflow in any tower.
         # NOTE: /cpu:0 is prepared for evaluation
-        with tf.variable_scope(tf.get_variable_scope()):
-            for i_gpu in range(len(all_devices)):
-                with tf.device(all_devices[i_gpu]):
-                    with tf.name_scope('tower_gpu%d' % i_gpu) as scope:
-
-                        # Define placeholders in each tower
-                        model.create_placeholders()
-
-                        # Calculate the total loss for the current tower of the
-                        # model. This function constructs the entire model but
-                        # shares the variables across all towers.
-                        tower_loss, tower_logits = model.compute_loss(
-                            model.inputs_pl_list[i_gpu],
-                            model.labels_pl_list[i_gpu],
-                            model.inputs_seq_len_pl_list[i_gpu],
-                            model.keep_prob_input_pl_list[i_gpu],
-                            model.keep_prob_hidden_pl_list[i_gpu],
-                            model.keep_prob_output_pl_list[i_gpu],
-                            scope)
-                        tower_loss = tf.expand_dims(tower_loss, axis=0)
-                        total_losses.append(tower_loss)
-
-                        # Reuse variables for the next tower
-                        tf.get_variable_scope().reuse_variables()
-
-                        # Calculate the gradients for the batch of data on this
-                        # tower
-                        tower_grads_and_vars = optimizer.compute_gradients(
-                            tower_loss)
-
-                        # Gradient clipping
-                        tower_grads_and_vars = model._clip_gradients(
-                            tower_grads_and_vars, _clip_norm=False)
-
-                        # TODO: Optionally add gradient noise
-
-                        # Keep track of the gradients across all towers
-                        total_grads_and_vars.append(tower_grads_and_vars)
-
-                        # Add to the graph each operation per tower
-                        decode_op_tower = model.decoder(
-                            tower_logits,
-                            model.inputs_seq_len_pl_list[i_gpu],
-                            beam_width=params['beam_width'])
-                        decode_ops.append(decode_op_tower)
-                        ler_op_tower = model.compute_ler(
-                            decode_op_tower, model.labels_pl_list[i_gpu])
-                        ler_op_tower = tf.expand_dims(ler_op_tower, axis=0)
-                        ler_ops.append(ler_op_tower)
-
-        # Aggregate losses, then calculate average loss
-        total_losses = tf.concat(axis=0, values=total_losses)
-        loss_op = tf.reduce_mean(total_losses, axis=0)
-        ler_ops = tf.concat(axis=0, values=ler_ops)
-        ler_op = tf.reduce_mean(ler_ops, axis=0)
-
-        # We must calculate the mean of each gradient. Note that this is the
-        # synchronization point across all towers
-        average_grads_and_vars = average_gradients(total_grads_and_vars)
-
-        # Apply the gradients to adjust the shared variables.
-        train_op = optimizer.apply_gradients(average_grads_and_vars,
-                                             global_step=global_step)
+        train_op, loss_op, tower_outputs = build_towers(
+            model, optimizer, tower_fn,
+            devices=get_devices(len(gpu_indices)),
+            global_step=global_step,
+            clip_global_norm=params.get('clip_global_norm', False),
+            accum_steps=params.get('accum_steps', 1),
+            aggregation_device=params.get('aggregation_device', None))
+        decode_ops = [decode_op for decode_op, _ in tower_outputs]
+        ler_op = tf.add_n([ler_op_tower for _, ler_op_tower in tower_outputs]
+                          ) / len(gpu_indices)
 
         # Define learning rate controller
         lr_controller = Controller(
@@ -186,10 +156,13 @@ def do_train(model, params, gpu_indices):
             start_time_step = time.time()
             ler_dev_best = 1
             learning_rate = float(params['learning_rate'])
+            monitor = ThroughputMonitor()
             for step, (data, is_new_epoch) in enumerate(train_data):
+                monitor.lap('data')
 
                 # Create feed dictionary for next mini batch (train)
                 inputs, labels, inputs_seq_len, _ = data
+                monitor.add_batch(inputs, inputs_seq_len)
                 feed_dict_train = {}
                 for i_gpu in range(len(gpu_indices)):
                     feed_dict_train[model.inputs_pl_list[i_gpu]
@@ -205,11 +178,26 @@ def do_train(model, params, gpu_indices):
                     feed_dict_train[model.keep_prob_output_pl_list[i_gpu]
                                     ] = params['dropout_output']
                 feed_dict_train[learning_rate_pl] = learning_rate
+                # NOTE: batch normalization is in the training mode only
+                # when updating parameters
+                feed_dict_train[model.is_training_pl] = True
+                monitor.lap('feed')
 
                 # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % int(params['print_step'] / len(gpu_indices)) == 0:
+                # NOTE: the loss, accuracy and summaries of the mini-batch
+                # are fetched with the update to avoid extra forward passes.
+                # They are computed with dropout.
+                is_print_step = (step + 1) % int(params['print_step'] / len(gpu_indices)) == 0
+                if is_print_step:
+                    start_time_log = time.time()
+                    _, loss_train, ler_train, summary_str_train = sess.run(
+                        [train_op, loss_op, ler_op, summary_train],
+                        feed_dict=feed_dict_train)
+                else:
+                    sess.run(train_op, feed_dict=feed_dict_train)
+                monitor.lap('run')
+
+                if is_print_step:
 
                     # Create feed dictionary for next mini batch (dev)
                     (inputs, labels, inputs_seq_len,  _), _ = dev_data_other.next()
@@ -225,24 +213,13 @@ def do_train(model, params, gpu_indices):
                         feed_dict_dev[model.keep_prob_hidden_pl_list[i_gpu]] = 1.0
                         feed_dict_dev[model.keep_prob_output_pl_list[i_gpu]] = 1.0
 
-                    # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
+                    # Compute loss & accuracy, and update event files in a
+                    # single run
+                    loss_dev, ler_dev, summary_str_dev = sess.run(
+                        [loss_op, ler_op, summary_dev], feed_dict=feed_dict_dev)
                     csv_steps.append(step)
                     csv_loss_train.append(loss_train)
                     csv_loss_dev.append(loss_dev)
-
-                    # Change to evaluation mode
-                    for i_gpu in range(len(gpu_indices)):
-                        feed_dict_train[model.keep_prob_input_pl_list[i_gpu]] = 1.0
-                        feed_dict_train[model.keep_prob_hidden_pl_list[i_gpu]] = 1.0
-                        feed_dict_train[model.keep_prob_output_pl_list[i_gpu]] = 1.0
-
-                    # Compute accuracy & update event files
-                    ler_train, summary_str_train = sess.run(
-                        [ler_op, summary_train], feed_dict=feed_dict_train)
-                    ler_dev, summary_str_dev = sess.run(
-                        [ler_op, summary_dev], feed_dict=feed_dict_dev)
                     csv_ler_train.append(ler_train)
                     csv_ler_dev.append(ler_dev)
                     summary_writer.add_summary(summary_str_train, step + 1)
@@ -250,9 +227,16 @@ def do_train(model, params, gpu_indices):
                     summary_writer.flush()
 
                     duration_step = time.time() - start_time_step
+                    duration_log = time.time() - start_time_log
+                    # The overhead of logging over the mean step time
+                    duration_log -= (duration_step - duration_log) / \
+                        max(int(params['print_step'] / len(gpu_indices)) - 1, 1)
                     print("Step %d (epoch: %.3f): loss = %.3f (%.3f) / ler = %.3f (%.3f) / lr = %.5f (%.3f min)" %
                           (step + 1, train_data.epoch_detail, loss_train, loss_dev, ler_train, ler_dev,
                            learning_rate, duration_step / 60))
+                    print('  logging overhead: %.3f sec' % duration_log)
+                    monitor.lap('eval')
+                    monitor.report(step + 1, summary_writer)
                     sys.stdout.flush()
                     start_time_step = time.time()
 
@@ -265,6 +249,7 @@ def do_train(model, params, gpu_indices):
                     # Save fugure of loss & ler
                     plot_loss(csv_loss_train, csv_loss_dev, csv_steps,
                               save_path=model.save_path)
+                    monitor.save(model.save_path)
                     plot_ler(csv_ler_train, csv_ler_dev, csv_steps,
                              label_type=params['label_type'],
                              save_path=model.save_path)
@@ -349,6 +334,7 @@ def do_train(model, params, gpu_indices):
                             value=ler_dev_other_epoch)
 
                     start_time_epoch = time.time()
+                    monitor.lap('eval')
 
             duration_train = time.time() - start_time_train
             print('Total time: %.3f hour' % (duration_train / 3600))
@@ -393,7 +379,9 @@ def main(config_path, model_save_path, gpu_indices):
                 clip_grad=params['clip_grad'],
                 clip_activation=params['clip_activation'],
                 num_proj=params['num_proj'],
-                weight_decay=params['weight_decay'])
+                weight_decay=params['weight_decay'],
+                batch_norm=params.get('batch_norm', False),
+                mixed_precision=params.get('mixed_precision', False))
 
     # Set process name
     setproctitle(
@@ -413,8 +401,14 @@ def main(config_path, model_save_path, gpu_indices):
         model.name += '_wd' + str(params['weight_decay'])
     if params['bottleneck_dim'] != 0:
         model.name += '_bottle' + str(params['bottleneck_dim'])
+    if params.get('batch_norm', False):
+        model.name += '_bn'
+    if params.get('mixed_precision', False):
+        model.name += '_fp16'
     if len(gpu_indices) >= 2:
         model.name += '_gpu' + str(len(gpu_indices))
+    if params.get('accum_steps', 1) > 1:
+        model.name += '_accum' + str(params['accum_steps'])
 
     # Set save path
     model.save_path = mkdir_join(
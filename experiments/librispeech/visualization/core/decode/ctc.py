@@ -88,6 +88,68 @@ def decode_test(session, decode_op, model, dataset, label_type,
             break
 
 
+def decode_test_archive(reader, dataset, label_type, train_data_size,
+                        save_path=None):
+    """Visualize label outputs of CTC model by greedy decoding from the
+       posterior archive (without running the model).
+    Args:
+        reader: An instance of `PosteriorReader` class
+        dataset: An instance of a `Dataset` class
+        label_type (string):  character or character_capital_divide or word
+        train_data_size (string, optional): train_clean100 or train_clean360 or
+            train_other500 or train_all
+        save_path (string, optional): path to save decoding results
+    """
+    if label_type == 'character':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character.txt')
+    elif label_type == 'character_capital_divide':
+        idx2char = Idx2char(
+            map_file_path='../metrics/mapping_files/ctc/character_capital_divide.txt',
+            capital_divide=True)
+    elif label_type == 'word':
+        idx2word = Idx2word(
+            map_file_path='../metrics/mapping_files/ctc/word_' + train_data_size + '.txt')
+
+    if save_path is not None:
+        sys.stdout = open(join(save_path, 'decode.txt'), 'w')
+
+    while True:
+
+        data, is_new_epoch = dataset.next(batch_size=1)
+        _, labels_true, _, input_names = data
+        # NOTE: Batch size is expected to be 1
+
+        utt_name = input_names[0][0]
+        if utt_name not in reader:
+            print('----- wav: %s (not in the archive) -----' % utt_name)
+            if is_new_epoch:
+                break
+            continue
+
+        labels_pred = reader.best_path(utt_name)
+
+        print('----- wav: %s -----' % utt_name)
+        if label_type == 'character':
+            str_true = idx2char(labels_true[0][0]).replace('_', ' ')
+            str_pred = idx2char(labels_pred).replace('_', ' ')
+        elif label_type == 'character_capital_divide':
+            str_true = idx2char(labels_true[0][0])
+            str_pred = idx2char(labels_pred)
+        else:
+            if dataset.is_test:
+                str_true = labels_true[0][0][0]
+            else:
+                str_true = ' '.join(idx2word(labels_true[0][0]))
+            str_pred = ' '.join(idx2word(labels_pred))
+
+        print('Ref: %s' % str_true)
+        print('Hyp: %s' % str_pred)
+
+        if is_new_epoch:
+            break
+
+
 def decode_test_multitask(session, decode_op_main, decode_op_sub, model,
                           dataset, train_data_size, label_type_main,
                           label_type_sub, is_test=False, save_path=None):
@@ -15,8 +15,9 @@ import argparse
 
 sys.path.append(os.path.abspath('../../../'))
 from experiments.librispeech.data.load_dataset_ctc import Dataset
-from experiments.librispeech.visualization.core.decode.ctc import decode_test
+from experiments.librispeech.visualization.core.decode.ctc import decode_test, decode_test_archive
 from models.ctc.vanilla_ctc import CTC
+from utils.io.outputs.posteriors import PosteriorReader
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--epoch', type=int, default=-1,
@@ -26,6 +27,32 @@ parser.add_argument('--model_path', type=str,
 parser.add_argument('--beam_width', type=int, default=20,
                     help='beam_width (int, optional): beam width for beam search.' +
                     ' 1 disables beam search, which mean greedy decoding.')
+parser.add_argument('--archive_path', type=str, default=None,
+                    help='path to the posterior archive saved by ' +
+                    'save_ctc_prob.py. If set, greedy decoding is performed ' +
+                    'from saved posteriors without restoring the model.')
+
+
+def do_decode_archive(params, archive_path):
+    """Decode the CTC outputs from the posterior archive.
+    Args:
+        params (dict): A dictionary of parameters
+        archive_path (string): path to the posterior archive
+    """
+    reader = PosteriorReader(archive_path)
+    for data_type in ['test_clean', 'test_other']:
+        dataset = Dataset(
+            data_type=data_type,
+            train_data_size=params['train_data_size'],
+            label_type=params['label_type'],
+            batch_size=1, splice=params['splice'],
+            num_stack=params['num_stack'], num_skip=params['num_skip'],
+            shuffle=False)
+        decode_test_archive(reader=reader,
+                            dataset=dataset,
+                            label_type=params['label_type'],
+                            train_data_size=params['train_data_size'],
+                            save_path=None)
 
 
 def do_decode(model, params, epoch, beam_width):
@@ -130,10 +157,15 @@ def main():
         elif params['train_data_size'] == 'train_all':
             params['num_classes'] = 26642
 
+    if args.archive_path is not None:
+        do_decode_archive(params=params, archive_path=args.archive_path)
+        return
+
     # Model setting
     model = CTC(
         encoder_type=params['encoder_type'],
         input_size=params['input_size'] * params['num_stack'],
+        splice=params['splice'],
         num_units=params['num_units'],
         num_layers=params['num_layers'],
         num_classes=params['num_classes'],
@@ -26,17 +26,20 @@ green = '#006400'
 
 sys.path.append(os.path.abspath('../../../'))
 from experiments.librispeech.data.load_dataset_ctc import Dataset
-# from models.ctc.vanilla_ctc import CTC
-from models.ctc.distillation_ctc import CTC
+from models.ctc.vanilla_ctc import CTC
 from utils.directory import mkdir_join
+from utils.io.outputs.posteriors import PosteriorReader
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--epoch', type=int, default=-1,
                     help='the epoch to restore')
 parser.add_argument('--model_path', type=str,
                     help='path to the model to evaluate')
-parser.add_argument('--eval_batch_size', type=str, default=1,
+parser.add_argument('--eval_batch_size', type=int, default=1,
                     help='the size of mini-batch in evaluation')
+parser.add_argument('--archive_path', type=str, default=None,
+                    help='path to the posterior archive saved by ' +
+                    'save_ctc_prob.py. If set, the model is not restored.')
 
 
 def do_plot(model, params, epoch, eval_batch_size):
@@ -74,9 +77,10 @@ def do_plot(model, params, epoch, eval_batch_size):
             model.inputs_seq_len_pl_list[0],
             model.keep_prob_input_pl_list[0],
             model.keep_prob_hidden_pl_list[0],
-            model.keep_prob_output_pl_list[0],
-            softmax_temperature=params['softmax_temperature'])
-        posteriors_op = model.posteriors(logits, blank_prior=1)
+            model.keep_prob_output_pl_list[0])
+        posteriors_op = model.posteriors(
+            logits, blank_prior=1,
+            softmax_tempareture=params.get('softmax_temperature', 1))
 
     # Create a saver for writing training checkpoints
     saver = tf.train.Saver()
@@ -150,36 +154,65 @@ def posterior_test(session, posteriors_op, model, dataset, label_type,
         # Visualize
         for i_batch in range(batch_size):
             prob = posteriors[i_batch][:int(inputs_seq_len[0][i_batch]), :]
-
-            plt.clf()
-            plt.figure(figsize=(10, 4))
-            frame_num = int(inputs_seq_len[0][i_batch])
-            times_probs = np.arange(frame_num) * num_stack / 100
-
-            # NOTE: Blank class is set to the last class in TensorFlow
-            for i in range(0, prob.shape[-1] - 1, 1):
-                plt.plot(times_probs, prob[:, i])
-            plt.plot(times_probs, prob[:, -1],
-                     ':', label='blank', color='grey')
-            plt.xlabel('Time [sec]', fontsize=12)
-            plt.ylabel('Posteriors', fontsize=12)
-            plt.xlim([0, frame_num * num_stack / 100])
-            plt.ylim([0.05, 1.05])
-            plt.xticks(list(range(0, int(frame_num * num_stack / 100) + 1, 1)))
-            plt.yticks(list(range(0, 2, 1)))
-            plt.legend(loc="upper right", fontsize=12)
-
-            plt.show()
-
-            # Save as a png file
-            if save_path is not None:
-                plt.savefig(os.path.join(
-                    save_path, input_names[0][i_batch] + '.png'), dvi=500)
+            plot_posteriors(prob, utt_name=input_names[0][i_batch],
+                            num_stack=num_stack, save_path=save_path,
+                            show=show)
 
         if is_new_epoch:
             break
 
 
+def posterior_test_archive(archive_path, num_stack=1, save_path=None,
+                           show=False):
+    """Visualize label posteriors saved in the posterior archive.
+    Args:
+        archive_path (string): path to the posterior archive
+        num_stack (int): the number of frames to stack
+        save_path (string, string): path to save ctc outputs
+        show (bool, optional): if True, show each figure
+    """
+    reader = PosteriorReader(archive_path)
+    for utt_name in reader.keys():
+        plot_posteriors(reader[utt_name], utt_name=utt_name,
+                        num_stack=num_stack, save_path=save_path, show=show)
+
+
+def plot_posteriors(prob, utt_name, num_stack=1, save_path=None, show=False):
+    """Plot label posteriors of an utterance.
+    Args:
+        prob (np.ndarray): A tensor of size `[T, num_classes]`
+        utt_name (string): the name of the utterance
+        num_stack (int): the number of frames to stack
+        save_path (string, string): path to save ctc outputs
+        show (bool, optional): if True, show each figure
+    """
+    plt.clf()
+    plt.figure(figsize=(10, 4))
+    frame_num = prob.shape[0]
+    times_probs = np.arange(frame_num) * num_stack / 100
+
+    # NOTE: Blank class is set to the last class in TensorFlow
+    for i in range(0, prob.shape[-1] - 1, 1):
+        plt.plot(times_probs, prob[:, i])
+    plt.plot(times_probs, prob[:, -1],
+             ':', label='blank', color='grey')
+    plt.xlabel('Time [sec]', fontsize=12)
+    plt.ylabel('Posteriors', fontsize=12)
+    plt.xlim([0, frame_num * num_stack / 100])
+    plt.ylim([0.05, 1.05])
+    plt.xticks(list(range(0, int(frame_num * num_stack / 100) + 1, 1)))
+    plt.yticks(list(range(0, 2, 1)))
+    plt.legend(loc="upper right", fontsize=12)
+
+    if show:
+        plt.show()
+
+    # Save as a png file
+    if save_path is not None:
+        plt.savefig(os.path.join(save_path, utt_name + '.png'), dpi=500)
+    plt.close()
+
+
 def main():
 
     args = parser.parse_args()
@@ -204,10 +237,19 @@ def main():
         elif params['train_data_size'] == 'train_all':
             params['num_classes'] = 26642
 
+    if args.archive_path is not None:
+        # Plot without restoring the model
+        posterior_test_archive(
+            args.archive_path,
+            num_stack=params['num_stack'],
+            save_path=mkdir_join(args.model_path, 'ctc_output', 'archive'))
+        return
+
     # Model setting
     model = CTC(
         encoder_type=params['encoder_type'],
         input_size=params['input_size'] * params['num_stack'],
+        splice=params['splice'],
         num_units=params['num_units'],
         num_layers=params['num_layers'],
         num_classes=params['num_classes'],
@@ -3,7 +3,7 @@
 
 """Load dataset for the Joint CTC-Attention model (TIMIT corpus).
    In addition, frame stacking and skipping are used.
-   You can use only the single GPU version.
+   The mini-batch can be split for the multi-GPU version.
 """
 
 from __future__ import absolute_import
@@ -25,7 +25,7 @@ class Dataset(DatasetBase):
                  max_epoch=None, splice=1,
                  num_stack=1, num_skip=1,
                  shuffle=False, sort_utt=False, sort_stop_epoch=None,
-                 progressbar=False):
+                 progressbar=False, num_gpu=1):
         """A class for loading dataset.
         Args:
             data_type (string): train or dev or test
@@ -45,6 +45,7 @@ class Dataset(DatasetBase):
             sort_stop_epoch (int, optional): After sort_stop_epoch, training
                 will revert back to a random order
             progressbar (bool, optional): if True, visualize progressbar
+            num_gpu (int, optional): if more than 1, divide batch_size by num_gpu
         """
         if data_type not in ['train', 'dev', 'test']:
             raise TypeError('data_type must be "train" or "dev" or "test".')
@@ -68,6 +69,7 @@ class Dataset(DatasetBase):
         self.sort_utt = sort_utt
         self.sort_stop_epoch = sort_stop_epoch
         self.progressbar = progressbar
+        self.num_gpu = num_gpu
         self.ctc_padded_value = -1
         self.att_padded_value = eos_index
 
@@ -44,13 +44,13 @@ def do_eval(model, params, epoch, batch_size, beam_width):
     if 'phone' in params['label_type']:
         test_data = Dataset(
             data_type='test', label_type='phone39',
-            batch_size=batch_size, splice=params['splice'],
+            batch_size=batch_size, splice=model.splice,
             num_stack=params['num_stack'], num_skip=params['num_skip'],
             shuffle=False, progressbar=True)
     else:
         test_data = Dataset(
             data_type='test', label_type=params['label_type'],
-            batch_size=batch_size, splice=params['splice'],
+            batch_size=batch_size, splice=model.splice,
             num_stack=params['num_stack'], num_skip=params['num_skip'],
             shuffle=False, progressbar=True)
 
@@ -149,7 +149,9 @@ def main():
         clip_grad=params['clip_grad'],
         clip_activation=params['clip_activation'],
         num_proj=params['num_proj'],
-        weight_decay=params['weight_decay'])
+        weight_decay=params['weight_decay'],
+        batch_norm=params.get('batch_norm', False),
+        time_conv=params.get('time_conv', False))
 
     model.save_path = args.model_path
     do_eval(model=model, params=params,
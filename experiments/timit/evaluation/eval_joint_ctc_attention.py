@@ -0,0 +1,221 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Evaluate the trained Joint CTC-Attention model by one-pass joint decoding
+   with various CTC weights and beam widths, and report the speed and accuracy
+   (TIMIT corpus)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+import yaml
+import argparse
+
+sys.path.append(os.path.abspath('../../../'))
+from experiments.timit.data.load_dataset_joint_ctc_attention import Dataset
+from experiments.timit.metrics.attention import do_eval_per, do_eval_cer
+from models.attention.joint_ctc_attention import JointCTCAttention
+from utils.directory import mkdir_join
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--epoch', type=int, default=-1,
+                    help='the epoch to restore')
+parser.add_argument('--model_path', type=str,
+                    help='path to the model to evaluate')
+parser.add_argument('--ctc_weights', type=str, default='0,0.1,0.3,0.5',
+                    help='comma-separated weights for CTC prefix scores')
+parser.add_argument('--beam_widths', type=str, default='1,4,10',
+                    help='comma-separated beam widths')
+parser.add_argument('--ctc_beam_width', type=int, default=None,
+                    help='the number of candidate labels scored by CTC ' +
+                    'per hypothesis. Default is 1.5 * beam width. ' +
+                    '-1 means all labels (exact but expensive).')
+parser.add_argument('--eval_batch_size', type=int, default=16,
+                    help='the size of mini-batch when evaluation')
+
+
+def do_eval(params, epoch, dataset, beam_width, ctc_weight,
+            ctc_beam_width=None, eval_batch_size=None):
+    """Evaluate the model with a configuration of decoding.
+    Args:
+        params (dict): A dictionary of parameters
+        epoch (int): the epoch to restore
+        dataset: An instance of a `Dataset` class
+        beam_width (int): the number of beams
+        ctc_weight (float): weight for CTC prefix scores. 0 means decoding by
+            the attention decoder only.
+        ctc_beam_width (int, optional): the number of candidate labels scored
+            by CTC per hypothesis. None means 1.5 * beam_width, and -1 means
+            all labels.
+        eval_batch_size (int, optional): the batch size when evaluating the
+            model
+    Returns:
+        ler (float): PER or CER
+        decode_time (float): An average time [sec] to decode an utterance
+    """
+    tf.reset_default_graph()
+    with tf.Graph().as_default():
+        model = build_model(params, beam_width=beam_width,
+                            ctc_weight=ctc_weight,
+                            ctc_beam_width=ctc_beam_width)
+
+        # Define placeholders
+        model.create_placeholders()
+
+        # Add to the graph each operation (including model definition)
+        _, _, _, decoder_outputs_train, decoder_outputs_infer = model.compute_loss(
+            model.inputs_pl_list[0],
+            model.att_labels_pl_list[0],
+            model.inputs_seq_len_pl_list[0],
+            model.att_labels_seq_len_pl_list[0],
+            model.ctc_labels_pl_list[0],
+            model.keep_prob_input_pl_list[0],
+            model.keep_prob_hidden_pl_list[0],
+            model.keep_prob_output_pl_list[0])
+        _, decode_op_infer = model.decoder(
+            decoder_outputs_train,
+            decoder_outputs_infer)
+        per_op = model.compute_ler(
+            model.att_labels_st_true_pl, model.att_labels_st_pred_pl)
+
+        with tf.Session() as sess:
+            ckpt = tf.train.get_checkpoint_state(model.save_path)
+
+            # If check point exists
+            if ckpt:
+                # Use last saved model
+                model_path = ckpt.model_checkpoint_path
+                if epoch != -1:
+                    model_path = model_path.split('/')[:-1]
+                    model_path = '/'.join(model_path) + \
+                        '/model.ckpt-' + str(epoch)
+                # NOTE: map the names of the output layer of CTC in old
+                # checkpoints
+                saver = tf.train.Saver(
+                    var_list=model.checkpoint_var_list(model_path))
+                saver.restore(sess, model_path)
+            else:
+                raise ValueError('There are not any checkpoints.')
+
+            start_time = time.time()
+            if 'char' in params['label_type']:
+                ler, _ = do_eval_cer(
+                    session=sess,
+                    decode_op=decode_op_infer,
+                    model=model,
+                    dataset=dataset,
+                    label_type=params['label_type'],
+                    eval_batch_size=eval_batch_size,
+                    is_jointctcatt=True)
+            else:
+                ler = do_eval_per(
+                    session=sess,
+                    decode_op=decode_op_infer,
+                    per_op=per_op,
+                    model=model,
+                    dataset=dataset,
+                    label_type=params['label_type'],
+                    eval_batch_size=eval_batch_size,
+                    is_jointctcatt=True)
+            decode_time = (time.time() - start_time) / len(dataset)
+
+    return ler, decode_time
+
+
+def build_model(params, beam_width, ctc_weight, ctc_beam_width=None):
+    model = JointCTCAttention(
+        input_size=params['input_size'] * params['num_stack'],
+        encoder_num_unit=params['encoder_num_unit'],
+        encoder_num_layer=params['encoder_num_layer'],
+        attention_dim=params['attention_dim'],
+        attention_type=params['attention_type'],
+        decoder_num_unit=params['decoder_num_unit'],
+        decoder_num_layer=params['decoder_num_layer'],
+        embedding_dim=params['embedding_dim'],
+        att_num_classes=params['att_num_classes'],
+        ctc_num_classes=params['ctc_num_classes'],
+        att_task_weight=params['att_task_weight'],
+        sos_index=params['sos_index'],
+        eos_index=params['eos_index'],
+        max_decode_length=params['max_decode_length'],
+        attention_weights_tempareture=params['attention_weights_tempareture'],
+        logits_tempareture=params['logits_tempareture'],
+        parameter_init=params['weight_init'],
+        clip_grad=params['clip_grad'],
+        clip_activation_encoder=params['clip_activation_encoder'],
+        clip_activation_decoder=params['clip_activation_decoder'],
+        weight_decay=params['weight_decay'],
+        beam_width=beam_width,
+        decode_ctc_weight=ctc_weight,
+        ctc_beam_width=ctc_beam_width)
+    model.save_path = params['model_path']
+    return model
+
+
+def main():
+
+    args = parser.parse_args()
+
+    # Load config file
+    with open(os.path.join(args.model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        params = config['param']
+    params['model_path'] = args.model_path
+
+    params['sos_index'] = 0
+    params['eos_index'] = 1
+    if params['label_type'] == 'phone61':
+        params['att_num_classes'] = 63
+        params['ctc_num_classes'] = 61
+    elif params['label_type'] == 'phone48':
+        params['att_num_classes'] = 50
+        params['ctc_num_classes'] = 48
+    elif params['label_type'] == 'phone39':
+        params['att_num_classes'] = 41
+        params['ctc_num_classes'] = 39
+    elif params['label_type'] == 'character':
+        params['att_num_classes'] = 30
+        params['ctc_num_classes'] = 28
+    params['splice'] = params.get('splice', 1)
+    params['num_stack'] = params.get('num_stack', 1)
+    params['num_skip'] = params.get('num_skip', 1)
+
+    # Load dataset
+    dataset = Dataset(
+        data_type='test',
+        label_type='phone39' if 'phone' in params['label_type'] else params['label_type'],
+        batch_size=args.eval_batch_size, eos_index=params['eos_index'],
+        splice=params['splice'],
+        num_stack=params['num_stack'], num_skip=params['num_skip'],
+        shuffle=False)
+
+    name = 'CER' if 'char' in params['label_type'] else 'PER'
+
+    results = []
+    for beam_width in [int(b) for b in args.beam_widths.split(',')]:
+        for ctc_weight in [float(w) for w in args.ctc_weights.split(',')]:
+            ler, decode_time = do_eval(
+                params, args.epoch, dataset,
+                beam_width=beam_width,
+                ctc_weight=ctc_weight,
+                ctc_beam_width=args.ctc_beam_width,
+                eval_batch_size=args.eval_batch_size)
+            results.append((beam_width, ctc_weight, ler, decode_time * 1000))
+            print('Beam width %d / CTC weight %.2f: %s %f %% / %.2f ms per utterance' %
+                  (beam_width, ctc_weight, name, ler * 100, decode_time * 1000))
+
+    # Save as csv file
+    save_path = mkdir_join(args.model_path, 'joint_decoding')
+    np.savetxt(os.path.join(save_path, 'test.csv'),
+               np.array(results), delimiter=",",
+               header='beam_width,ctc_weight,' + name.lower() + ',ms_per_utt')
+
+
+if __name__ == '__main__':
+    main()
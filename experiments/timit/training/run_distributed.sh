@@ -0,0 +1,51 @@
+#!/bin/zsh
+
+MODEL_SAVE_PATH="/n/sd8/inaguma/result/tensorflow/timit"
+
+# Select model, config & GPUs
+if [ $# -lt 3 ]; then
+  echo "Error: set model type, config path & GPU numbers." 1>&2
+  echo "Usage: ./run_distributed.sh ctc|attention path_to_config_file gpu_index1 gpu_index2 ..." 1>&2
+  echo "       (set gpu_index to -1 to run the worker on CPU)" 1>&2
+  exit 1
+fi
+
+# Set path to CUDA
+export PATH=$PATH:/usr/local/cuda-8.0/bin
+export LD_LIBRARY_PATH=$LD_LIBRARY_PATH:/usr/local/cuda-8.0/lib64:/usr/local/cuda-8.0/extras/CUPTI/lib64
+
+# Set path to python
+PYTHON=/home/lab5/inaguma/.pyenv/versions/anaconda3-4.1.1/bin/python
+
+model_type=$1
+config_path=$2
+shift 2
+filename=$(basename $config_path | awk -F. '{print $1}')
+
+# One parameter server and one worker per GPU on localhost
+PS_PORT=2222
+WORKER_PORT=2223
+ps_hosts="localhost:"$PS_PORT
+worker_hosts=""
+for i in $(seq 0 $(($# - 1))); do
+  if [ -n "$worker_hosts" ]; then
+    worker_hosts=$worker_hosts","
+  fi
+  worker_hosts=$worker_hosts"localhost:"$(($WORKER_PORT + $i))
+done
+
+mkdir -p log
+
+# Parameter server (without GPU)
+CUDA_VISIBLE_DEVICES=-1 nohup $PYTHON train_$model_type.py \
+  $config_path $MODEL_SAVE_PATH $ps_hosts $worker_hosts ps 0 \
+  > log/$filename"_ps.log" &
+
+# Workers
+task_index=0
+for gpu_index in "$@"; do
+  CUDA_VISIBLE_DEVICES=$gpu_index nohup $PYTHON train_$model_type.py \
+    $config_path $MODEL_SAVE_PATH $ps_hosts $worker_hosts worker $task_index \
+    > log/$filename"_worker"$task_index".log" &
+  task_index=$(($task_index + 1))
+done
@@ -21,25 +21,44 @@ from experiments.timit.metrics.attention import do_eval_per, do_eval_cer
 from utils.io.labels.sparsetensor import list2sparsetensor
 from utils.training.learning_rate_controller import Controller
 from utils.training.plot import plot_loss, plot_ler
+from utils.training.throughput import ThroughputMonitor
+from utils.training.multi_gpu import build_towers, get_devices
+from utils.training.distributed import Cluster, split_for_worker
 from utils.directory import mkdir_join, mkdir
 from utils.parameter import count_total_parameters
 from models.attention import blstm_attention_seq2seq
 
 
-def do_train(model, params):
+def do_train(model, params, cluster=None):
     """Run training. If target labels are phone, the model is evaluated by PER
     with 39 phones.
     Args:
         model: the model to train
         params (dict): A dictionary of parameters
+        cluster (optional): An instance of `Cluster` in the between-graph
+            distributed training
     """
+    num_gpu = params.get('num_gpu', 1)
+    if cluster is None:
+        num_workers, task_index, is_chief = 1, 0, True
+    else:
+        num_workers = cluster.num_workers
+        task_index = cluster.task_index
+        is_chief = cluster.is_chief
+
+    # NOTE: every worker reads the same mini-batch sequence, and takes its
+    # own splits of each mini-batch
+    seed = params.get('seed', None)
+    if cluster is not None and seed is None:
+        seed = 1
+
     # Load dataset
     train_data = Dataset(
         data_type='train', label_type=params['label_type'],
         batch_size=params['batch_size'], eos_index=params['eos_index'],
         max_epoch=params['num_epoch'], splice=params['splice'],
         num_stack=params['num_stack'], num_skip=params['num_skip'],
-        sort_utt=True)
+        sort_utt=True, num_gpu=num_gpu * num_workers, seed=seed)
     dev_data = Dataset(
         data_type='dev', label_type=params['label_type'],
         batch_size=params['batch_size'], eos_index=params['eos_index'],
@@ -63,25 +82,54 @@ def do_train(model, params):
     # TODO(hirofumi): add frame_stacking & splice
 
     # Tell TensorFlow that the model will be built into the default graph
-    with tf.Graph().as_default():
+    # Place the variables on the parameter servers in the distributed
+    # training
+    device_fn = cluster.device_setter() if cluster is not None else None
+    with tf.Graph().as_default(), tf.device(device_fn):
 
-        # Define placeholders
-        model.create_placeholders()
-        learning_rate_pl = tf.placeholder(tf.float32, name='learning_rate')
+        # Create a variable to track the global step
+        global_step = tf.Variable(0, name='global_step', trainable=False)
 
-        # Add to the graph each operation (including model definition)
-        loss_op, logits, decoder_outputs_train, decoder_outputs_infer = model.compute_loss(
-            model.inputs_pl_list[0],
-            model.labels_pl_list[0],
-            model.inputs_seq_len_pl_list[0],
-            model.labels_seq_len_pl_list[0],
-            model.keep_prob_input_pl_list[0],
-            model.keep_prob_hidden_pl_list[0],
-            model.keep_prob_output_pl_list[0])
-        train_op = model.train(
-            loss_op,
-            optimizer=params['optimizer'],
-            learning_rate=learning_rate_pl)
+        # Set optimizer
+        learning_rate_pl = tf.placeholder(tf.float32, name='learning_rate')
+        learning_rate_op = learning_rate_pl
+        if cluster is not None:
+            # NOTE: the aggregated update is run by the queue runner of the
+            # chief, which can not feed placeholders
+            learning_rate_op = tf.Variable(float(params['learning_rate']),
+                                           trainable=False,
+                                           name='learning_rate_var')
+            update_lr_op = tf.assign(learning_rate_op, learning_rate_pl)
+        optimizer = model.set_optimizer(params['optimizer'], learning_rate_op)
+        if cluster is not None:
+            optimizer = cluster.wrap_optimizer(optimizer, model)
+
+        def tower_fn(i_gpu, scope):
+            # Define placeholders in each tower
+            model.create_placeholders()
+
+            # Add to the graph each operation (including model definition)
+            tower_loss, _, decoder_outputs_train, decoder_outputs_infer = model.compute_loss(
+                model.inputs_pl_list[i_gpu],
+                model.labels_pl_list[i_gpu],
+                model.inputs_seq_len_pl_list[i_gpu],
+                model.labels_seq_len_pl_list[i_gpu],
+                model.keep_prob_input_pl_list[i_gpu],
+                model.keep_prob_hidden_pl_list[i_gpu],
+                model.keep_prob_output_pl_list[i_gpu],
+                scope)
+            return tower_loss, (tower_loss, decoder_outputs_train,
+                                decoder_outputs_infer)
+
+        # Split each mini-batch over the towers, and average the gradients
+        train_op, _, tower_outputs = build_towers(
+            model, optimizer, tower_fn,
+            devices=get_devices(num_gpu),
+            global_step=global_step,
+            clip_global_norm=params.get('clip_global_norm', False))
+
+        # NOTE: the model is monitored and evaluated on the first tower
+        loss_op, decoder_outputs_train, decoder_outputs_infer = tower_outputs[0]
         _, decode_op_infer = model.decoder(
             decoder_outputs_train,
             decoder_outputs_infer)
@@ -119,40 +167,68 @@ def do_train(model, params):
         csv_steps, csv_loss_train, csv_loss_dev = [], [], []
         csv_ler_train, csv_ler_dev = [], []
         # Create a session for running operation on the graph
-        with tf.Session() as sess:
+        if cluster is None:
+            # NOTE: allow_soft_placement is needed for the ops without GPU
+            # kernels in the towers
+            sess = tf.Session(config=tf.ConfigProto(
+                allow_soft_placement=True))
+            sess.run(init_op)
+        else:
+            # The chief initializes the variables on the parameter servers
+            sess = cluster.create_session(init_op, global_step)
+        with sess:
 
             # Instantiate a SummaryWriter to output summaries and the graph
             summary_writer = tf.summary.FileWriter(
                 model.save_path, sess.graph)
 
-            # Initialize param
-            sess.run(init_op)
-
             # Train model
             start_time_train = time.time()
             start_time_epoch = time.time()
             start_time_step = time.time()
             ler_dev_best = 1
             learning_rate = float(params['learning_rate'])
+            monitor = ThroughputMonitor()
             for step, (data, is_new_epoch) in enumerate(train_data):
+                monitor.lap('data')
 
                 # Create feed dictionary for next mini batch (train)
-                inputs, labels_train, inputs_seq_len, labels_seq_len, _ = data
-                feed_dict_train = {
-                    model.inputs_pl_list[0]: inputs,
-                    model.labels_pl_list[0]: labels_train,
-                    model.inputs_seq_len_pl_list[0]: inputs_seq_len,
-                    model.labels_seq_len_pl_list[0]: labels_seq_len,
-                    model.keep_prob_input_pl_list[0]: params['dropout_input'],
-                    model.keep_prob_hidden_pl_list[0]: params['dropout_hidden'],
-                    model.keep_prob_output_pl_list[0]: params['dropout_output'],
-                    learning_rate_pl: learning_rate
-                }
+                inputs, labels_train, inputs_seq_len, labels_seq_len = split_for_worker(
+                    data[:4], num_gpu, num_workers, task_index)
+                monitor.add_batch(inputs, inputs_seq_len)
+                feed_dict_train = {learning_rate_pl: learning_rate}
+                for i_gpu in range(num_gpu):
+                    feed_dict_train[model.inputs_pl_list[i_gpu]
+                                    ] = inputs[i_gpu]
+                    feed_dict_train[model.labels_pl_list[i_gpu]
+                                    ] = labels_train[i_gpu]
+                    feed_dict_train[model.inputs_seq_len_pl_list[i_gpu]
+                                    ] = inputs_seq_len[i_gpu]
+                    feed_dict_train[model.labels_seq_len_pl_list[i_gpu]
+                                    ] = labels_seq_len[i_gpu]
+                    feed_dict_train[model.keep_prob_input_pl_list[i_gpu]
+                                    ] = params['dropout_input']
+                    feed_dict_train[model.keep_prob_hidden_pl_list[i_gpu]
+                                    ] = params['dropout_hidden']
+                    feed_dict_train[model.keep_prob_output_pl_list[i_gpu]
+                                    ] = params['dropout_output']
+                monitor.lap('feed')
 
                 # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % params['print_step'] == 0:
+                # NOTE: the loss, accuracy and summaries of the mini-batch
+                # are fetched with the update to avoid extra forward passes.
+                # They are computed with dropout.
+                is_print_step = (step + 1) % params['print_step'] == 0
+                if is_print_step:
+                    start_time_log = time.time()
+                    _, loss_train, predicted_ids_train, summary_str_train = sess.run(
+                        [train_op, loss_op, decode_op_infer, summary_train],
+                        feed_dict=feed_dict_train)
+                else:
+                    sess.run(train_op, feed_dict=feed_dict_train)
+                monitor.lap('run')
+
+                if is_print_step:
 
                     # Create feed dictionary for next mini batch (dev)
                     (inputs, labels_dev, inputs_seq_len,
@@ -167,23 +243,13 @@ def do_train(model, params):
                         model.keep_prob_output_pl_list[0]: 1.0
                     }
 
-                    # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
+                    # Compute loss & accuracy, and update event files in a
+                    # single run
+                    loss_dev, predicted_ids_dev, summary_str_dev = sess.run(
+                        [loss_op, decode_op_infer, summary_dev], feed_dict=feed_dict_dev)
                     csv_steps.append(step)
                     csv_loss_train.append(loss_train)
                     csv_loss_dev.append(loss_dev)
-
-                    # Change to evaluation mode
-                    feed_dict_train[model.keep_prob_input_pl_list[0]] = 1.0
-                    feed_dict_train[model.keep_prob_hidden_pl_list[0]] = 1.0
-                    feed_dict_train[model.keep_prob_output_pl_list[0]] = 1.0
-
-                    # Predict class ids & update even files
-                    predicted_ids_train, summary_str_train = sess.run(
-                        [decode_op_infer, summary_train], feed_dict=feed_dict_train)
-                    predicted_ids_dev, summary_str_dev = sess.run(
-                        [decode_op_infer, summary_dev], feed_dict=feed_dict_dev)
                     summary_writer.add_summary(summary_str_train, step + 1)
                     summary_writer.add_summary(summary_str_dev, step + 1)
                     summary_writer.flush()
@@ -191,7 +257,7 @@ def do_train(model, params):
                     # Convert to sparsetensor to compute LER
                     feed_dict_ler_train = {
                         model.labels_st_true_pl: list2sparsetensor(
-                            labels_train, padded_value=train_data.padded_value),
+                            labels_train[0], padded_value=train_data.padded_value),
                         model.labels_st_pred_pl: list2sparsetensor(
                             predicted_ids_train, padded_value=train_data.padded_value)
                     }
@@ -209,14 +275,23 @@ def do_train(model, params):
                     csv_ler_dev.append(ler_dev)
 
                     duration_step = time.time() - start_time_step
+                    duration_log = time.time() - start_time_log
+                    # The overhead of logging over the mean step time
+                    duration_log -= (duration_step - duration_log) / \
+                        max(params['print_step'] - 1, 1)
                     print("Step %d (epoch: %.3f): loss = %.3f (%.3f) / ler = %.3f (%.3f) / lr = %.5f (%.3f min)" %
                           (step + 1, train_data.epoch_detail, loss_train, loss_dev, ler_train, ler_dev,
                            learning_rate, duration_step / 60))
+                    print('  logging overhead: %.3f sec' % duration_log)
+                    monitor.lap('eval')
+                    monitor.report(step + 1, summary_writer)
                     # sys.stdout.flush()
                     start_time_step = time.time()
 
                 # Save checkpoint and evaluate model per epoch
-                if is_new_epoch:
+                # NOTE: only the chief evaluates the model in the distributed
+                # training
+                if is_new_epoch and is_chief:
                     duration_epoch = time.time() - start_time_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (train_data.epoch, duration_epoch / 60))
@@ -224,6 +299,7 @@ def do_train(model, params):
                     # Save fugure of loss & ler
                     plot_loss(csv_loss_train, csv_loss_dev, csv_steps,
                               save_path=model.save_path)
+                    monitor.save(model.save_path)
                     plot_ler(csv_ler_train, csv_ler_dev, csv_steps,
                              label_type=params['label_type'],
                              save_path=model.save_path)
@@ -307,8 +383,12 @@ def do_train(model, params):
                             learning_rate=learning_rate,
                             epoch=train_data.epoch,
                             value=ler_dev_epoch)
+                        if cluster is not None:
+                            sess.run(update_lr_op,
+                                     feed_dict={learning_rate_pl: learning_rate})
 
                     start_time_epoch = time.time()
+                    monitor.lap('eval')
 
             duration_train = time.time() - start_time_train
             print('Total time: %.3f hour' % (duration_train / 3600))
@@ -318,7 +398,8 @@ def do_train(model, params):
                 f.write('')
 
 
-def main(config_path, model_save_path):
+def main(config_path, model_save_path, ps_hosts=None, worker_hosts=None,
+         job_name=None, task_index=0):
 
     # Load a config file (.yml)
     with open(config_path, "r") as f:
@@ -363,6 +444,16 @@ def main(config_path, model_save_path):
         weight_decay=params['weight_decay'],
         beam_width=1)
 
+    # Distributed training
+    cluster = None
+    if ps_hosts is not None:
+        cluster = Cluster(ps_hosts, worker_hosts, job_name, task_index,
+                          sync=params.get('sync_replicas', True))
+        if job_name == 'ps':
+            setproctitle('timit_ps' + str(task_index))
+            cluster.join()
+            return
+
     # Set process name
     setproctitle('timit_' + model.name + '_' + params['label_type'])
 
@@ -382,11 +473,21 @@ def main(config_path, model_save_path):
             str(params['attention_weights_tempareture'])
     if params['weight_decay'] != 0:
         model.name += '_weightdecay' + str(params['weight_decay'])
+    if params.get('num_gpu', 1) >= 2:
+        model.name += '_gpu' + str(params['num_gpu'])
+    if cluster is not None:
+        model.name += '_worker' + str(cluster.num_workers)
 
     # Set save path
     model.save_path = mkdir_join(
         model_save_path, 'attention', params['label_type'], model.name)
 
+    # NOTE: the other workers than the chief only write logs
+    if cluster is not None and not cluster.is_chief:
+        model.save_path = mkdir(model.save_path + '_task' + str(task_index))
+        do_train(model=model, params=params, cluster=cluster)
+        return
+
     # Reset model directory
     model_index = 0
     new_model_path = model.save_path
@@ -411,12 +512,18 @@ def main(config_path, model_save_path):
 
     # sys.stdout = open(join(model.save_path, 'train.log'), 'w')
     # TODO(hirofumi): change to logger
-    do_train(model=model, params=params)
+    do_train(model=model, params=params, cluster=cluster)
 
 
 if __name__ == '__main__':
 
     args = sys.argv
-    if len(args) != 3:
-        raise ValueError('Length of args should be 3.')
-    main(config_path=args[1], model_save_path=args[2])
+    if len(args) == 3:
+        main(config_path=args[1], model_save_path=args[2])
+    elif len(args) == 7:
+        # Distributed training
+        main(config_path=args[1], model_save_path=args[2],
+             ps_hosts=args[3].split(','), worker_hosts=args[4].split(','),
+             job_name=args[5], task_index=int(args[6]))
+    else:
+        raise ValueError('Length of args should be 3 or 7.')
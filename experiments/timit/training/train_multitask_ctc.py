@@ -21,6 +21,8 @@ from experiments.timit.metrics.ctc import do_eval_per, do_eval_cer
 from utils.io.labels.sparsetensor import list2sparsetensor
 from utils.training.learning_rate_controller import Controller
 from utils.training.plot import plot_loss, plot_ler
+from utils.training.throughput import ThroughputMonitor
+from utils.training.multi_gpu import build_towers, get_devices
 from utils.directory import mkdir_join, mkdir
 from utils.parameter import count_total_parameters
 from models.ctc.multitask_ctc import Multitask_CTC
@@ -34,6 +36,8 @@ def do_train(model, params):
         model: the model to train
         params (dict): A dictionary of parameters
     """
+    num_gpu = params.get('num_gpu', 1)
+
     # Load dataset
     train_data = Dataset(
         data_type='train', label_type_main=params['label_type_main'],
@@ -41,7 +45,8 @@ def do_train(model, params):
         batch_size=params['batch_size'], max_epoch=params['num_epoch'],
         splice=params['splice'],
         num_stack=params['num_stack'], num_skip=params['num_skip'],
-        sort_utt=True, sort_stop_epoch=params['sort_stop_epoch'])
+        sort_utt=True, sort_stop_epoch=params['sort_stop_epoch'],
+        num_gpu=num_gpu)
     dev_data = Dataset(
         data_type='dev', label_type_main=params['label_type_main'],
         label_type_sub=params['label_type_sub'],
@@ -57,23 +62,39 @@ def do_train(model, params):
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
 
-        # Define placeholders
-        model.create_placeholders()
-        learning_rate_pl = tf.placeholder(tf.float32, name='learning_rate')
+        # Create a variable to track the global step
+        global_step = tf.Variable(0, name='global_step', trainable=False)
 
-        # Add to the graph each operation
-        loss_op, logits_main, logits_sub = model.compute_loss(
-            model.inputs_pl_list[0],
-            model.labels_pl_list[0],
-            model.labels_sub_pl_list[0],
-            model.inputs_seq_len_pl_list[0],
-            model.keep_prob_input_pl_list[0],
-            model.keep_prob_hidden_pl_list[0],
-            model.keep_prob_output_pl_list[0])
-        train_op = model.train(
-            loss_op,
-            optimizer=params['optimizer'],
-            learning_rate=learning_rate_pl)
+        # Set optimizer
+        learning_rate_pl = tf.placeholder(tf.float32, name='learning_rate')
+        optimizer = model._set_optimizer(
+            params['optimizer'], learning_rate_pl)
+
+        def tower_fn(i_gpu, scope):
+            # Define placeholders in each tower
+            model.create_placeholders()
+
+            # Add to the graph each operation
+            tower_loss, logits_main, logits_sub = model.compute_loss(
+                model.inputs_pl_list[i_gpu],
+                model.labels_pl_list[i_gpu],
+                model.labels_sub_pl_list[i_gpu],
+                model.inputs_seq_len_pl_list[i_gpu],
+                model.keep_prob_input_pl_list[i_gpu],
+                model.keep_prob_hidden_pl_list[i_gpu],
+                model.keep_prob_output_pl_list[i_gpu],
+                scope)
+            return tower_loss, (tower_loss, logits_main, logits_sub)
+
+        # Split each mini-batch over the towers, and average the gradients
+        train_op, _, tower_outputs = build_towers(
+            model, optimizer, tower_fn,
+            devices=get_devices(num_gpu),
+            global_step=global_step,
+            clip_global_norm=params.get('clip_global_norm', False))
+
+        # NOTE: the model is monitored and evaluated on the first tower
+        loss_op, logits_main, logits_sub = tower_outputs[0]
         decode_op_character, decode_op_phone = model.decoder(
             logits_main, logits_sub, model.inputs_seq_len_pl_list[0],
             beam_width=params['beam_width'])
@@ -113,7 +134,10 @@ def do_train(model, params):
         csv_cer_train, csv_cer_dev = [], []
         csv_per_train, csv_per_dev = [], []
         # Create a session for running operation on the graph
-        with tf.Session() as sess:
+        # NOTE: allow_soft_placement is needed for the ops without GPU
+        # kernels in the towers
+        with tf.Session(config=tf.ConfigProto(
+                allow_soft_placement=True)) as sess:
 
             # Instantiate a SummaryWriter to output summaries and the graph
             summary_writer = tf.summary.FileWriter(
@@ -128,27 +152,54 @@ def do_train(model, params):
             start_time_step = time.time()
             cer_dev_best = 1
             learning_rate = float(params['learning_rate'])
+            monitor = ThroughputMonitor()
             for step, (data, is_new_epoch) in enumerate(train_data):
+                monitor.lap('data')
 
                 # Create feed dictionary for next mini batch (train)
                 inputs, labels_char, labels_phone, inputs_seq_len, _ = data
-                feed_dict_train = {
-                    model.inputs_pl_list[0]: inputs,
-                    model.labels_pl_list[0]: list2sparsetensor(
-                        labels_char, padded_value=train_data.padded_value),
-                    model.labels_sub_pl_list[0]: list2sparsetensor(
-                        labels_phone, padded_value=train_data.padded_value),
-                    model.inputs_seq_len_pl_list[0]: inputs_seq_len,
-                    model.keep_prob_input_pl_list[0]: params['dropout_input'],
-                    model.keep_prob_hidden_pl_list[0]: params['dropout_hidden'],
-                    model.keep_prob_output_pl_list[0]: params['dropout_output'],
-                    learning_rate_pl: learning_rate
-                }
+                if num_gpu == 1:
+                    inputs = [inputs]
+                    labels_char = [labels_char]
+                    labels_phone = [labels_phone]
+                    inputs_seq_len = [inputs_seq_len]
+                monitor.add_batch(inputs, inputs_seq_len)
+                # NOTE: the cuDNN kernels allocate the reserve space for
+                # back-propagation only when updating parameters
+                feed_dict_train = {learning_rate_pl: learning_rate,
+                                   model.is_training_pl: True}
+                for i_gpu in range(num_gpu):
+                    feed_dict_train[model.inputs_pl_list[i_gpu]
+                                    ] = inputs[i_gpu]
+                    feed_dict_train[model.labels_pl_list[i_gpu]] = list2sparsetensor(
+                        labels_char[i_gpu], padded_value=train_data.padded_value)
+                    feed_dict_train[model.labels_sub_pl_list[i_gpu]] = list2sparsetensor(
+                        labels_phone[i_gpu], padded_value=train_data.padded_value)
+                    feed_dict_train[model.inputs_seq_len_pl_list[i_gpu]
+                                    ] = inputs_seq_len[i_gpu]
+                    feed_dict_train[model.keep_prob_input_pl_list[i_gpu]
+                                    ] = params['dropout_input']
+                    feed_dict_train[model.keep_prob_hidden_pl_list[i_gpu]
+                                    ] = params['dropout_hidden']
+                    feed_dict_train[model.keep_prob_output_pl_list[i_gpu]
+                                    ] = params['dropout_output']
+                monitor.lap('feed')
 
                 # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
+                # NOTE: the loss, accuracy and summaries of the mini-batch
+                # are fetched with the update to avoid extra forward passes.
+                # They are computed with dropout.
+                is_print_step = (step + 1) % params['print_step'] == 0
+                if is_print_step:
+                    start_time_log = time.time()
+                    _, loss_train, cer_train, per_train, summary_str_train = sess.run(
+                        [train_op, loss_op, cer_op, per_op, summary_train],
+                        feed_dict=feed_dict_train)
+                else:
+                    sess.run(train_op, feed_dict=feed_dict_train)
+                monitor.lap('run')
 
-                if (step + 1) % params['print_step'] == 0:
+                if is_print_step:
 
                     # Create feed dictionary for next mini batch (dev)
                     (inputs, labels_char, labels_phone,
@@ -165,25 +216,13 @@ def do_train(model, params):
                         model.keep_prob_output_pl_list[0]: 1.0
                     }
 
-                    # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
+                    # Compute loss & accuracy, and update event files in a
+                    # single run
+                    loss_dev, cer_dev, per_dev, summary_str_dev = sess.run(
+                        [loss_op, cer_op, per_op, summary_dev], feed_dict=feed_dict_dev)
                     csv_steps.append(step)
                     csv_loss_train.append(loss_train)
                     csv_loss_dev.append(loss_dev)
-
-                    # Change to evaluation mode
-                    feed_dict_train[model.keep_prob_input_pl_list[0]] = 1.0
-                    feed_dict_train[model.keep_prob_hidden_pl_list[0]] = 1.0
-                    feed_dict_train[model.keep_prob_output_pl_list[0]] = 1.0
-
-                    # Compute accuracy & update event files
-                    cer_train, per_train, summary_str_train = sess.run(
-                        [cer_op, per_op, summary_train],
-                        feed_dict=feed_dict_train)
-                    cer_dev, per_dev, summary_str_dev = sess.run(
-                        [cer_op, per_op,  summary_dev],
-                        feed_dict=feed_dict_dev)
                     csv_cer_train.append(cer_train)
                     csv_cer_dev.append(cer_dev)
                     csv_per_train.append(per_train)
@@ -193,9 +232,16 @@ def do_train(model, params):
                     summary_writer.flush()
 
                     duration_step = time.time() - start_time_step
+                    duration_log = time.time() - start_time_log
+                    # The overhead of logging over the mean step time
+                    duration_log -= (duration_step - duration_log) / \
+                        max(params['print_step'] - 1, 1)
                     print("Step %d (epoch: %.3f): loss = %.3f (%.3f) / cer = %.3f (%.3f) / per = % .3f (%.3f) / lr = %.5f (%.3f min)" %
                           (step + 1, train_data.epoch_detail, loss_train, loss_dev, cer_train, cer_dev,
                            per_train, per_dev, learning_rate, duration_step / 60))
+                    print('  logging overhead: %.3f sec' % duration_log)
+                    monitor.lap('eval')
+                    monitor.report(step + 1, summary_writer)
                     sys.stdout.flush()
                     start_time_step = time.time()
 
@@ -208,6 +254,7 @@ def do_train(model, params):
                     # Save fugure of loss & ler
                     plot_loss(csv_loss_train, csv_loss_dev, csv_steps,
                               save_path=model.save_path)
+                    monitor.save(model.save_path)
                     plot_ler(csv_cer_train, csv_cer_dev, csv_steps,
                              label_type=params['label_type_main'],
                              save_path=model.save_path)
@@ -284,6 +331,7 @@ def do_train(model, params):
                             value=cer_dev_epoch)
 
                     start_time_epoch = time.time()
+                    monitor.lap('eval')
 
             duration_train = time.time() - start_time_train
             print('Total time: %.3f hour' % (duration_train / 3600))
@@ -351,6 +399,8 @@ def main(config_path, model_save_path):
     if params['weight_decay'] != 0:
         model.name += '_wd' + str(params['weight_decay'])
     model.name += '_main' + str(params['main_task_weight'])
+    if params.get('num_gpu', 1) >= 2:
+        model.name += '_gpu' + str(params['num_gpu'])
 
     # Set save path
     model.save_path = mkdir_join(
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 from os.path import join
+from multiprocessing import Pool, cpu_count
 import numpy as np
 import matplotlib
 # matplotlib.use('Agg')
@@ -25,7 +26,8 @@ green = '#006400'
 
 
 def posterior_test(session, posteriors_op, model, dataset, label_type,
-                   num_stack=1, save_path=None, show=False):
+                   num_stack=1, save_path=None, show=False,
+                   eval_batch_size=None, num_workers=None):
     """Visualize label posteriors of CTC model.
     Args:
         session: session of training model
@@ -37,64 +39,48 @@ def posterior_test(session, posteriors_op, model, dataset, label_type,
         num_stack (int): the number of frames to stack
         save_path (string, string): path to save ctc outputs
         show (bool, optional): if True, show each figure
+        eval_batch_size (int, optional): the batch size when evaluating the
+            model. Default is the batch size of the dataset.
+        num_workers (int, optional): the number of processes to render
+            figures. Default is the number of CPUs. Figures are rendered in
+            the main process when show is True.
     """
     save_path = mkdir_join(save_path, 'ctc_output')
 
-    while True:
-
-        # Create feed dictionary for next mini batch
-        data, is_new_epoch = dataset.next(batch_size=1)
-        inputs, _, inputs_seq_len, input_names = data
-        # NOTE: Batch size is expected to be 1
-
-        feed_dict = {
-            model.inputs_pl_list[0]: inputs,
-            model.inputs_seq_len_pl_list[0]: inputs_seq_len,
-            model.keep_prob_input_pl_list[0]: 1.0,
-            model.keep_prob_hidden_pl_list[0]: 1.0,
-            model.keep_prob_output_pl_list[0]: 1.0
-        }
-
-        # Visualize
-        max_frame_num = inputs.shape[1]
-        posteriors = session.run(posteriors_op, feed_dict=feed_dict)
-
-        i_batch = 0  # index in mini-batch
-        posteriors_index = np.array(
-            [i_batch * max_frame_num + i for i in range(max_frame_num)])
-        posteriors = posteriors[posteriors_index][:int(inputs_seq_len[0]), :]
-
-        plt.clf()
-        plt.figure(figsize=(10, 4))
-        frame_num = posteriors.shape[0]
-        times_probs = np.arange(frame_num) * num_stack / 100
-
-        # NOTE: Blank class is set to the last class in TensorFlow
-        for i in range(0, posteriors.shape[1] - 1, 1):
-            plt.plot(times_probs, posteriors[:, i])
-        plt.plot(times_probs, posteriors[:, -1],
-                 ':', label='blank', color='grey')
-        plt.xlabel('Time [sec]', fontsize=12)
-        plt.ylabel('Posteriors', fontsize=12)
-        plt.xlim([0, frame_num * num_stack / 100])
-        plt.ylim([0.05, 1.05])
-        plt.xticks(list(range(0, int(frame_num * num_stack / 100) + 1, 1)))
-        plt.yticks(list(range(0, 2, 1)))
-        plt.legend(loc="upper right", fontsize=12)
+    with _Renderer(num_workers=num_workers, show=show) as renderer:
+        while True:
 
-        plt.show()
+            # Create feed dictionary for next mini batch
+            data, is_new_epoch = dataset.next(batch_size=eval_batch_size)
+            inputs, _, inputs_seq_len, input_names = data
+
+            feed_dict = {
+                model.inputs_pl_list[0]: inputs,
+                model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                model.keep_prob_input_pl_list[0]: 1.0,
+                model.keep_prob_hidden_pl_list[0]: 1.0,
+                model.keep_prob_output_pl_list[0]: 1.0
+            }
+
+            posteriors = session.run(posteriors_op, feed_dict=feed_dict)
+            posteriors = _split_posteriors(
+                posteriors, inputs.shape[1], inputs_seq_len)
 
-        # Save as a png file
-        if save_path is not None:
-            plt.savefig(join(save_path, input_names[0] + '.png'), dvi=500)
+            # Visualize
+            renderer.render(
+                _plot_posteriors,
+                [(posteriors[i_batch], num_stack,
+                  join(save_path, input_names[i_batch] + '.png'), show)
+                 for i_batch in range(len(posteriors))])
 
-        if is_new_epoch:
-            break
+            if is_new_epoch:
+                break
 
 
 def posterior_test_multitask(session, posteriors_op_main, posteriors_op_sub,
                              model, dataset, label_type_main, label_type_sub,
-                             save_path=None, show=False):
+                             save_path=None, show=False,
+                             eval_batch_size=None, num_workers=None):
     """Visualize label posteriors of the multi-task CTC model.
     Args:
         session: session of training model
@@ -105,77 +91,190 @@ def posterior_test_multitask(session, posteriors_op_main, posteriors_op_sub,
         label_type_sub (string): phone39 or phone48 or phone61
         save_path (string): path to save ctc outpus
         show (bool, optional): if True, show each figure
+        eval_batch_size (int, optional): the batch size when evaluating the
+            model. Default is the batch size of the dataset.
+        num_workers (int, optional): the number of processes to render
+            figures. Default is the number of CPUs. Figures are rendered in
+            the main process when show is True.
     """
     save_path = mkdir_join(save_path, 'ctc_output')
 
-    # NOTE: Batch size is expected to be 1
-    while True:
-
-        # Create feed dictionary for next mini batch
-        data, is_new_epoch = dataset.next(batch_size=1)
-        inputs, _, _, inputs_seq_len, input_names = data
-
-        feed_dict = {
-            model.inputs_pl_list[0]: inputs,
-            model.inputs_seq_len_pl_list[0]: inputs_seq_len,
-            model.keep_prob_input_pl_list[0]: 1.0,
-            model.keep_prob_hidden_pl_list[0]: 1.0,
-            model.keep_prob_output_pl_list[0]: 1.0
-        }
-
-        # Visualize
-        max_frame_num = inputs.shape[1]
-        posteriors_char = session.run(posteriors_op_main, feed_dict=feed_dict)
-        posteriors_phone = session.run(posteriors_op_sub, feed_dict=feed_dict)
-
-        i_batch = 0  # index in mini-batch
-        posteriors_index = np.array(
-            [i_batch * max_frame_num + i for i in range(max_frame_num)])
-        posteriors_char = posteriors_char[posteriors_index][:int(
-            inputs_seq_len[0]), :]
-        posteriors_phone = posteriors_phone[posteriors_index][:int(
-            inputs_seq_len[0]), :]
-
-        plt.clf()
-        plt.figure(figsize=(10, 4))
-        frame_num = posteriors_char.shape[0]
-        times_probs = np.arange(len(posteriors_char))
-
-        # NOTE: Blank class is set to the last class in TensorFlow
-        # Plot characters
-        plt.subplot(211)
-        for i in range(0, posteriors_char.shape[1] - 1, 1):
-            plt.plot(times_probs, posteriors_char[:, i])
-        plt.plot(
-            times_probs, posteriors_char[:, -1], ':', label='blank', color='grey')
-        plt.xlabel('Time [sec]', fontsize=12)
-        plt.ylabel('Characters', fontsize=12)
-        plt.xlim([0, frame_num])
-        plt.ylim([0.05, 1.05])
-        plt.xticks(list(range(0, int(len(posteriors_char) / 100) + 1, 1)))
-        plt.yticks(list(range(0, 2, 1)))
-        plt.legend(loc="upper right", fontsize=12)
-
-        # Plot phones
-        plt.subplot(212)
-        for i in range(0, posteriors_phone.shape[1] - 1, 1):
-            plt.plot(times_probs, posteriors_phone[:, i])
-        plt.plot(
-            times_probs, posteriors_phone[:, -1], ':', label='blank', color='grey')
-        plt.xlabel('Time [sec]', fontsize=12)
-        plt.ylabel('Phones', fontsize=12)
-        plt.xlim([0, frame_num])
-        plt.ylim([0.05, 1.05])
-        plt.xticks(list(range(0, int(len(posteriors_phone) / 100) + 1, 1)))
-        plt.yticks(list(range(0, 2, 1)))
-        plt.legend(loc="upper right", fontsize=12)
-
-        if show:
-            plt.show()
-
-        # Save as a png file
-        if save_path is not None:
-            plt.savefig(join(save_path, input_names[0] + '.png'), dvi=500)
-
-        if is_new_epoch:
-            break
+    with _Renderer(num_workers=num_workers, show=show) as renderer:
+        while True:
+
+            # Create feed dictionary for next mini batch
+            data, is_new_epoch = dataset.next(batch_size=eval_batch_size)
+            inputs, _, _, inputs_seq_len, input_names = data
+
+            feed_dict = {
+                model.inputs_pl_list[0]: inputs,
+                model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                model.keep_prob_input_pl_list[0]: 1.0,
+                model.keep_prob_hidden_pl_list[0]: 1.0,
+                model.keep_prob_output_pl_list[0]: 1.0
+            }
+
+            posteriors_char, posteriors_phone = session.run(
+                [posteriors_op_main, posteriors_op_sub], feed_dict=feed_dict)
+            posteriors_char = _split_posteriors(
+                posteriors_char, inputs.shape[1], inputs_seq_len)
+            posteriors_phone = _split_posteriors(
+                posteriors_phone, inputs.shape[1], inputs_seq_len)
+
+            # Visualize
+            renderer.render(
+                _plot_posteriors_multitask,
+                [(posteriors_char[i_batch], posteriors_phone[i_batch],
+                  join(save_path, input_names[i_batch] + '.png'), show)
+                 for i_batch in range(len(posteriors_char))])
+
+            if is_new_epoch:
+                break
+
+
+def _split_posteriors(posteriors, max_frame_num, inputs_seq_len):
+    """Split posteriors of the mini-batch into each utterance.
+    Args:
+        posteriors (np.ndarray): A tensor of size `[B * T, num_classes]`
+        max_frame_num (int): the number of frames in the mini-batch
+        inputs_seq_len (np.ndarray): A tensor of size `[B]`
+    Returns:
+        list of posteriors of size `[T_i, num_classes]`
+    """
+    posteriors = posteriors.reshape(-1, max_frame_num, posteriors.shape[-1])
+    return [posteriors[i_batch, :int(inputs_seq_len[i_batch])]
+            for i_batch in range(len(inputs_seq_len))]
+
+
+class _Renderer(object):
+    """Render figures in a process pool.
+    Args:
+        num_workers (int, optional): the number of processes
+        show (bool, optional): if True, render in the main process
+    """
+
+    def __init__(self, num_workers=None, show=False):
+        if num_workers is None:
+            num_workers = cpu_count()
+        self.pool = None
+        if not show and num_workers > 1:
+            self.pool = Pool(num_workers, initializer=_init_worker)
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._wait()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+    def render(self, plot_func, args_list):
+        """
+        Args:
+            plot_func: function to plot a figure
+            args_list (list): arguments of plot_func for each figure
+        """
+        if self.pool is None:
+            for args in args_list:
+                plot_func(*args)
+            return
+
+        # NOTE: wait for the previous mini-batch so that the posteriors of at
+        # most two mini-batches are kept in memory
+        self._wait()
+        self._pending = [self.pool.apply_async(plot_func, args)
+                         for args in args_list]
+
+    def _wait(self):
+        for result in self._pending:
+            result.get()
+        self._pending = []
+
+
+def _init_worker():
+    plt.switch_backend('Agg')
+
+
+def _plot_posteriors(posteriors, num_stack, save_path, show):
+    """
+    Args:
+        posteriors (np.ndarray): A tensor of size `[T, num_classes]`
+        num_stack (int): the number of frames to stack
+        save_path (string): path to save the figure
+        show (bool): if True, show the figure
+    """
+    fig = plt.figure(figsize=(10, 4))
+    frame_num = posteriors.shape[0]
+    times_probs = np.arange(frame_num) * num_stack / 100
+
+    # NOTE: Blank class is set to the last class in TensorFlow
+    for i in range(0, posteriors.shape[1] - 1, 1):
+        plt.plot(times_probs, posteriors[:, i])
+    plt.plot(times_probs, posteriors[:, -1],
+             ':', label='blank', color='grey')
+    plt.xlabel('Time [sec]', fontsize=12)
+    plt.ylabel('Posteriors', fontsize=12)
+    plt.xlim([0, frame_num * num_stack / 100])
+    plt.ylim([0.05, 1.05])
+    plt.xticks(list(range(0, int(frame_num * num_stack / 100) + 1, 1)))
+    plt.yticks(list(range(0, 2, 1)))
+    plt.legend(loc="upper right", fontsize=12)
+
+    if show:
+        plt.show()
+
+    # Save as a png file
+    plt.savefig(save_path, dpi=500)
+    plt.close(fig)
+
+
+def _plot_posteriors_multitask(posteriors_char, posteriors_phone, save_path,
+                               show):
+    """
+    Args:
+        posteriors_char (np.ndarray): A tensor of size `[T, num_classes_main]`
+        posteriors_phone (np.ndarray): A tensor of size `[T, num_classes_sub]`
+        save_path (string): path to save the figure
+        show (bool): if True, show the figure
+    """
+    fig = plt.figure(figsize=(10, 4))
+    frame_num = posteriors_char.shape[0]
+    times_probs = np.arange(len(posteriors_char))
+
+    # NOTE: Blank class is set to the last class in TensorFlow
+    # Plot characters
+    plt.subplot(211)
+    for i in range(0, posteriors_char.shape[1] - 1, 1):
+        plt.plot(times_probs, posteriors_char[:, i])
+    plt.plot(
+        times_probs, posteriors_char[:, -1], ':', label='blank', color='grey')
+    plt.xlabel('Time [sec]', fontsize=12)
+    plt.ylabel('Characters', fontsize=12)
+    plt.xlim([0, frame_num])
+    plt.ylim([0.05, 1.05])
+    plt.xticks(list(range(0, int(len(posteriors_char) / 100) + 1, 1)))
+    plt.yticks(list(range(0, 2, 1)))
+    plt.legend(loc="upper right", fontsize=12)
+
+    # Plot phones
+    plt.subplot(212)
+    for i in range(0, posteriors_phone.shape[1] - 1, 1):
+        plt.plot(times_probs, posteriors_phone[:, i])
+    plt.plot(
+        times_probs, posteriors_phone[:, -1], ':', label='blank', color='grey')
+    plt.xlabel('Time [sec]', fontsize=12)
+    plt.ylabel('Phones', fontsize=12)
+    plt.xlim([0, frame_num])
+    plt.ylim([0.05, 1.05])
+    plt.xticks(list(range(0, int(len(posteriors_phone) / 100) + 1, 1)))
+    plt.yticks(list(range(0, 2, 1)))
+    plt.legend(loc="upper right", fontsize=12)
+
+    if show:
+        plt.show()
+
+    # Save as a png file
+    plt.savefig(save_path, dpi=500)
+    plt.close(fig)
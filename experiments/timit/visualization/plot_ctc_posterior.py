@@ -23,19 +23,30 @@ parser.add_argument('--epoch', type=int, default=-1,
                     help='the epoch to restore')
 parser.add_argument('--model_path', type=str,
                     help='path to the model to evaluate')
+parser.add_argument('--eval_batch_size', type=int, default=64,
+                    help='the size of mini-batch when evaluation')
+parser.add_argument('--num_workers', type=int, default=None,
+                    help='the number of processes to render figures. ' +
+                    'Default is the number of CPUs.')
+parser.add_argument('--show', action='store_true',
+                    help='if set, show each figure (rendered one by one)')
 
 
-def do_plot(model, params, epoch):
+def do_plot(model, params, epoch, eval_batch_size, num_workers=None,
+            show=False):
     """Plot the CTC posteriors.
     Args:
         model: the model to restore
         params (dict): A dictionary of parameters
         epoch (int): epoch to restore
+        eval_batch_size (int): the size of mini-batch when evaluation
+        num_workers (int, optional): the number of processes to render figures
+        show (bool, optional): if True, show each figure
     """
     # Load dataset
     test_data = Dataset(
         data_type='test', label_type=params['label_type'],
-        batch_size=1, splice=params['splice'],
+        batch_size=eval_batch_size, splice=params['splice'],
         num_stack=params['num_stack'], num_skip=params['num_skip'],
         sort_utt=False, progressbar=True)
 
@@ -78,7 +89,9 @@ def do_plot(model, params, epoch):
                        label_type=params['label_type'],
                        num_stack=params['num_stack'],
                        save_path=model.save_path,
-                       show=True)
+                       show=show,
+                       eval_batch_size=eval_batch_size,
+                       num_workers=num_workers)
 
 
 def main():
@@ -118,7 +131,9 @@ def main():
         weight_decay=params['weight_decay'])
 
     model.save_path = args.model_path
-    do_plot(model=model, params=params, epoch=args.epoch)
+    do_plot(model=model, params=params, epoch=args.epoch,
+            eval_batch_size=args.eval_batch_size,
+            num_workers=args.num_workers, show=args.show)
 
 
 if __name__ == '__main__':
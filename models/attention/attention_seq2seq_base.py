@@ -10,6 +10,9 @@ from __future__ import print_function
 import tensorflow as tf
 from models.attention.decoders.beam_search.util import choose_top_k
 from models.attention.decoders.beam_search.beam_search_decoder import BeamSearchDecoder
+from utils.training.mixed_precision import DynamicLossScaler
+from utils.training.gradients import compute_gradients, apply_gradients, \
+    add_grad_norm_summary
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -121,7 +124,8 @@ class AttentionBase(object):
                 factor. 0.0 disables the penalty.
         Returns:
             A callable BeamSearchDecoder with the same interfaces as the
-                attention decoder
+                attention decoder. All utterances in the mini-batch are
+                decoded at once.
         """
         if beam_width is None or beam_width <= 1:
             # Greedy decoding
@@ -171,6 +175,14 @@ class AttentionBase(object):
 
         decoder_initial_state = bridge(reuse=False)
 
+        if decoder.fusible:
+            # Compute all steps at once (teacher forcing)
+            (decoder_outputs, final_state) = decoder.decode_train_fused(
+                initial_state=decoder_initial_state,
+                inputs=target_embedded[:, :-1, :],
+                sequence_length=labels_seq_len - 1)
+            return (decoder_outputs, final_state)
+
         # Call decoder class
         (decoder_outputs, final_state) = decoder(
             initial_state=decoder_initial_state,
@@ -192,12 +204,14 @@ class AttentionBase(object):
                 attention_values_length
         Returns:
             decoder_outputs: A tuple of `(AttentionDecoderOutput, final_state)`
+                or `(BeamSearchDecoderOutput, BeamSearchState)` when beam
+                search is used
         """
         batch_size = tf.shape(encoder_outputs.outputs)[0]
 
         if self.use_beam_search:
-            batch_size = self.beam_width
-        # TODO: make this batch version
+            # NOTE: all beams of all utterances are decoded at once
+            batch_size *= self.beam_width
 
         target_embedding = self._generate_target_embedding(reuse=True)
 
@@ -238,6 +252,7 @@ class AttentionBase(object):
                 the hidden-hidden layers
             keep_prob_output: A float value. A probability to keep nodes in
                 the hidden-output layer
+            scope: A scope in the model tower
         Returns:
             loss: operation for computing total loss (cross entropy sequence
                 loss + L2). This is a single scalar tensor to minimize.
@@ -281,7 +296,8 @@ class AttentionBase(object):
             tf.add_to_collection('losses', sequence_loss)
 
         # Compute total loss
-        total_loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        total_loss = tf.add_n(tf.get_collection('losses', scope),
+                              name='total_loss')
 
         # Add a scalar summary for the snapshot of loss
         if self.weight_decay > 0:
@@ -326,13 +342,16 @@ class AttentionBase(object):
             return OPTIMIZER_CLS_NAMES[optimizer_name](
                 learning_rate=learning_rate)
 
-    def train(self, loss, optimizer, learning_rate=None, clip_norm=False):
+    def train(self, loss, optimizer, learning_rate=None, clip_norm=False,
+              clip_global_norm=False):
         """Operation for training. Only the sigle GPU training is supported.
         Args:
             loss: An operation for computing loss
             optimizer: string, name of the optimizer in OPTIMIZER_CLS_NAMES
             learning_rate: A float value, a learning rate
             clip_norm: if True, clip gradients norm by self.clip_grad
+            clip_global_norm: if True, clip the global norm of all gradients
+                by self.clip_grad. This overrides clip_norm.
         Returns:
             train_op: operation for training
         """
@@ -344,58 +363,28 @@ class AttentionBase(object):
 
         # TODO: Optionally wrap with SyncReplicasOptimizer
 
-        if self.clip_grad is not None:
-            # Compute gradients
-            grads_and_vars = self.optimizer.compute_gradients(loss)
-
-            # Clip gradients
-            clipped_grads_and_vars = self._clip_gradients(grads_and_vars,
-                                                          clip_norm)
+        if self.mixed_precision:
+            self.loss_scaler = DynamicLossScaler()
+            self.summaries_train.append(
+                tf.summary.scalar('loss_scale', self.loss_scaler.loss_scale))
 
-            # Create gradient updates
-            train_op = self.optimizer.apply_gradients(
-                clipped_grads_and_vars,
-                global_step=global_step)
+        if clip_global_norm:
+            add_grad_norm_summary(self)
 
-        else:
+        # NOTE: the norm of gradients is recorded in apply_gradients
+        if (self.clip_grad is None and not self.mixed_precision and
+                self.grad_norm is None):
             # Use the optimizer to apply the gradients that minimize the loss
             # and also increment the global step counter as a single training
             # step
-            train_op = self.optimizer.minimize(loss, global_step=global_step)
-
-        return train_op
-
-    def _clip_gradients(self, grads_and_vars, _clip_norm):
-        """Clip gradients.
-        Args:
-            grads_and_vars: list of (grads, vars) tuples
-            _clip_norm: if True, clip gradients norm by self.clip_grad
-        Returns:
-            clipped_grads_and_vars: list of (clipped grads, vars)
-        """
-        # TODO: Optionally add gradient noise
-
-        clipped_grads_and_vars = []
-
-        if _clip_norm:
-            # Clip gradient norm
-            for grad, var in grads_and_vars:
-                if grad is not None:
-                    clipped_grads_and_vars.append(
-                        (tf.clip_by_norm(grad, clip_norm=self.clip_grad), var))
-        else:
-            # Clip gradient
-            for grad, var in grads_and_vars:
-                if grad is not None:
-                    clipped_grads_and_vars.append(
-                        (tf.clip_by_value(grad,
-                                          clip_value_min=-self.clip_grad,
-                                          clip_value_max=self.clip_grad), var))
+            return self.optimizer.minimize(loss, global_step=global_step)
 
-        # TODO: Add histograms for variables, gradients (norms)
-        # self._tensorboard(trainable_vars)
+        # Compute gradients
+        grads_and_vars = compute_gradients(self, self.optimizer, loss)
 
-        return clipped_grads_and_vars
+        # Clip gradients, and create gradient updates
+        return apply_gradients(self, self.optimizer, grads_and_vars,
+                               clip_norm, global_step, clip_global_norm)
 
     def decoder(self, decoder_outputs_train, decoder_outputs_infer):
         """Operation for decoding.
@@ -412,24 +401,12 @@ class AttentionBase(object):
 
         if self.use_beam_search:
             # Beam search decoding
-            decoded_infer = decoder_outputs_infer.predicted_ids[0]
-
-            # predicted_ids = decoder_outputs_infer.beam_search_output.predicted_ids
-            # scores = decoder_outputs_infer.beam_search_output.scores[:, :, -1]
-            # argmax_score = tf.argmax(scores, axis=0)[0]
-            # NOTE: predicted_ids: `[time, 1, beam_width]`
-
-            # Convert to `[beam_width, 1, time]`
-            # predicted_ids = tf.transpose(predicted_ids, (2, 1, 0))
-
-            # decoded_infer = predicted_ids[argmax_score]
-            # decoded_infer = decoder_outputs_infer.predicted_ids[-1]
+            # NOTE: predicted_ids: `[B, N, T]`, sorted by scores
+            decoded_infer = decoder_outputs_infer.predicted_ids[:, 0]
         else:
             # Greedy decoding
             decoded_infer = decoder_outputs_infer.predicted_ids
 
-            argmax_score = None
-
         return decoded_train, decoded_infer
 
     def compute_ler(self, labels_true, labels_pred):
@@ -38,6 +38,19 @@ class BLSTMAttetion(AttentionBase):
         attention_smoothing: bool, if True, replace exp to sigmoid function in
             the softmax layer of computing attention weights
         attention_weights_tempareture: A float value,
+        attention_window_size: int, the number of encoder frames to attend
+            at each step. None means attending all frames.
+        monotonic_attention: bool, if True, the attention window never moves
+            backward
+        input_feeding: bool, if True, the attention context is fed to the
+            decoder RNN at the next step. If False and attention does not
+            depend on the previous weights, the decoder is trained with all
+            steps computed at once.
+        encoder_type: string, blstm_encoder or pyramidal_blstm_encoder
+        downsample_list: list of booleans of size `[encoder_num_layer]`. If
+            True, the time resolution is halved after the layer of the
+            pyramidal BLSTM encoder.
+        downsample_type: string, concat or subsample
         logits_tempareture: A float value,
         parameter_init: A float value. Range of uniform distribution to
             initialize weight parameters
@@ -55,6 +68,9 @@ class BLSTMAttetion(AttentionBase):
             decoding (greedy decoding).
         weight_decay: A float value. Regularization parameter for weight decay
         time_major: bool, if True, time-major computatoin will be performed
+        mixed_precision: bool, if True, the encoder computes in float16 with
+            float32 master weights, and the loss is scaled dynamically in
+            training
     """
 
     def __init__(self,
@@ -83,6 +99,13 @@ class BLSTMAttetion(AttentionBase):
                  weight_decay=0.0,
                  beam_width=1,
                  time_major=False,
+                 attention_window_size=None,
+                 monotonic_attention=False,
+                 input_feeding=True,
+                 encoder_type='blstm_encoder',
+                 downsample_list=None,
+                 downsample_type='concat',
+                 mixed_precision=False,
                  name='blstm_attention_seq2seq'):
 
         # AttentionBase.__init__(self)
@@ -102,6 +125,12 @@ class BLSTMAttetion(AttentionBase):
         self.attention_smoothing = bool(attention_smoothing)
         self.attention_weights_tempareture = float(
             attention_weights_tempareture)
+        self.attention_window_size = attention_window_size
+        self.monotonic_attention = bool(monotonic_attention)
+        self.input_feeding = bool(input_feeding)
+        self.encoder_type = encoder_type
+        self.downsample_list = downsample_list
+        self.downsample_type = downsample_type
         self.logits_tempareture = float(logits_tempareture)
         self.parameter_init = float(parameter_init)
         self.clip_grad = float(clip_grad)
@@ -113,6 +142,9 @@ class BLSTMAttetion(AttentionBase):
         self.weight_decay = float(weight_decay)
         self.beam_width = int(beam_width)
         self.time_major = time_major
+        self.mixed_precision = bool(mixed_precision)
+        self.loss_scaler = None
+        self.grad_norm = None
         self.name = name
 
         # NOTE: attention_weights_tempareture is good for narrow focus.
@@ -148,12 +180,15 @@ class BLSTMAttetion(AttentionBase):
             `(outputs final_state attention_values attention_values_length)`
         """
         # Define encoder
-        encoder = load_encoder(model_type='blstm_encoder')(
+        encoder = load_encoder(model_type=self.encoder_type)(
             num_unit=self.encoder_num_unit,
             num_layer=self.encoder_num_layer,
             parameter_init=self.parameter_init,
             clip_activation=self.clip_activation_encoder,
-            num_proj=None)
+            num_proj=None,
+            downsample_list=self.downsample_list,
+            downsample_type=self.downsample_type,
+            mixed_precision=self.mixed_precision)
 
         encoder_outputs = encoder(inputs=inputs,
                                   inputs_seq_len=inputs_seq_len,
@@ -176,7 +211,9 @@ class BLSTMAttetion(AttentionBase):
             num_unit=self.attention_dim,
             attention_smoothing=self.attention_smoothing,
             attention_weights_tempareture=self.attention_weights_tempareture,
-            attention_type=self.attention_type)
+            attention_type=self.attention_type,
+            window_size=self.attention_window_size,
+            monotonic=self.monotonic_attention)
 
         # Define RNN decoder
         rnn_decoder = load_decoder(model_type='lstm_decoder')
@@ -194,7 +231,8 @@ class BLSTMAttetion(AttentionBase):
             attention_values=encoder_outputs.attention_values,
             attention_values_length=encoder_outputs.attention_values_length,
             attention_layer=self.attention_layer,
-            time_major=self.time_major)
+            time_major=self.time_major,
+            input_feeding=self.input_feeding)
 
         return decoder
 
@@ -257,30 +295,32 @@ class BLSTMAttetion(AttentionBase):
             logits = time2batch(decoder_outputs_train.logits)
             predicted_ids = time2batch(decoder_outputs_train.predicted_ids)
             cell_output = time2batch(decoder_outputs_train.cell_output)
-            attention_scores = time2batch(
-                decoder_outputs_train.attention_scores)
+            attention_weights = time2batch(
+                decoder_outputs_train.attention_weights)
             attention_context = time2batch(
                 decoder_outputs_train.attention_context)
             decoder_outputs_train = AttentionDecoderOutput(
                 logits=logits,
                 predicted_ids=predicted_ids,
                 cell_output=cell_output,
-                attention_scores=attention_scores,
+                attention_weights=attention_weights,
                 attention_context=attention_context)
 
-            logits = time2batch(decoder_outputs_infer.logits)
-            predicted_ids = time2batch(decoder_outputs_infer.predicted_ids)
-            cell_output = time2batch(decoder_outputs_infer.cell_output)
-            attention_scores = time2batch(
-                decoder_outputs_infer.attention_scores)
-            attention_context = time2batch(
-                decoder_outputs_infer.attention_context)
-            decoder_outputs_infer = AttentionDecoderOutput(
-                logits=logits,
-                predicted_ids=predicted_ids,
-                cell_output=cell_output,
-                attention_scores=attention_scores,
-                attention_context=attention_context)
+            # NOTE: outputs of the beam search decoder are batch-major
+            if not self.use_beam_search:
+                logits = time2batch(decoder_outputs_infer.logits)
+                predicted_ids = time2batch(decoder_outputs_infer.predicted_ids)
+                cell_output = time2batch(decoder_outputs_infer.cell_output)
+                attention_weights = time2batch(
+                    decoder_outputs_infer.attention_weights)
+                attention_context = time2batch(
+                    decoder_outputs_infer.attention_context)
+                decoder_outputs_infer = AttentionDecoderOutput(
+                    logits=logits,
+                    predicted_ids=predicted_ids,
+                    cell_output=cell_output,
+                    attention_weights=attention_weights,
+                    attention_context=attention_context)
 
         # Calculate loss per example
         logits = decoder_outputs_train.logits / self.logits_tempareture
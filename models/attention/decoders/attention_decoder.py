@@ -34,6 +34,21 @@ class AttentionDecoderOutput(namedtuple(
     pass
 
 
+class AttentionDecoderState(namedtuple(
+        "AttentionDecoderState",
+        [
+            "cell_state",
+            "attention_weights"
+        ])):
+    """
+    Args:
+        cell_state: The cell state of the decoder
+        attention_weights: The attention weights of the previous step.
+            A tensor of size `[batch_size, input_time]`
+    """
+    pass
+
+
 class RNNDecoder(tf.contrib.seq2seq.Decoder):
 
     def __init__(self,
@@ -61,6 +76,7 @@ class RNNDecoder(tf.contrib.seq2seq.Decoder):
         # Not initialized yet
         self.initial_state = None
         self.helper = None
+        self.attention_keys = None
 
     def _setup(self, initial_state, helper):
         """Sets the initial state and helper for the decoder."""
@@ -93,6 +109,10 @@ class AttentionDecoder(RNNDecoder):
             `(state, inputs)` to `(attention_weights, attention_context)`.
             For an example, see `decoders.attention_layer.AttentionLayer`.
         time-major: bool,
+        input_feeding: bool, if True, the attention context of the previous
+            step is concatenated to the inputs of the decoder RNN. If False,
+            the decoder RNN does not depend on attention and all steps can
+            be computed at once in training (see `decode_train_fused`).
     """
 
     def __init__(self,
@@ -105,6 +125,7 @@ class AttentionDecoder(RNNDecoder):
                  attention_values_length,
                  attention_layer,
                  time_major,
+                 input_feeding=True,
                  name='attention_decoder'):
         super(AttentionDecoder, self).__init__(cell,
                                                parameter_init,
@@ -116,6 +137,7 @@ class AttentionDecoder(RNNDecoder):
                                                attention_layer,
                                                time_major,
                                                name)
+        self.input_feeding = input_feeding
 
         self.reuse = True
         # NOTE: This is for beam search decoder
@@ -180,6 +202,10 @@ class AttentionDecoder(RNNDecoder):
             self.reuse = True
             maximum_iterations = self.max_decode_length
 
+        # Project encoder outputs once instead of at every step
+        if self.attention_keys is None:
+            self.attention_keys = self.compute_attention_keys()
+
         # outputs, final_state, final_seq_len =
         # tf.contrib.seq2seq.dynamic_decode(
         outputs, final_state = dynamic_decode(
@@ -195,6 +221,99 @@ class AttentionDecoder(RNNDecoder):
         # ./dynamic_decoder.py
         return self.finalize(outputs, final_state, None)
 
+    @property
+    def fusible(self):
+        """True if all steps can be computed at once in training."""
+        return (not self.input_feeding and
+                not self.attention_layer.depends_on_previous_weights)
+
+    def decode_train_fused(self, initial_state, inputs, sequence_length):
+        """Teacher-forced decoding in training mode. The decoder RNN runs over
+           all target labels in a single `tf.nn.dynamic_rnn` and the attention
+           and output projections are computed for all steps at once instead
+           of a step by step `dynamic_decode`. Parameters are shared with
+           `step`.
+        Args:
+            initial_state: A tensor or tuple of tensors used as the initial
+                cell state
+            inputs: The embedding of target labels of size
+                `[batch_size, max_label_len, embedding_dim]`
+            sequence_length: A tensor of size `[batch_size]`
+        Returns:
+            A tuple of `(outputs, final_state)`
+                outputs: An instance of `AttentionDecoderOutput`. This is
+                    time-major if `time_major` is True.
+                final_state: An instance of `AttentionDecoderState`
+        """
+        if not self.fusible:
+            raise ValueError('The decoder with input feeding or attention '
+                             'depending on previous weights can not be fused.')
+
+        print('===== AttentionDecoder build (fused) =====')
+        self.mode = tf.contrib.learn.ModeKeys.TRAIN
+        self.reuse = False
+
+        with tf.variable_scope(self.name):
+            scope = tf.get_variable_scope()
+            scope.set_initializer(tf.random_uniform_initializer(
+                -self.parameter_init,
+                self.parameter_init))
+
+            # NOTE: the same variable scope as dynamic_decode()
+            with tf.variable_scope('dynamic_decoder'):
+                with tf.variable_scope("step") as step_scope:
+                    # `[batch_size, max_label_len, decoder_num_unit]`
+                    cell_outputs, final_cell_state = tf.nn.dynamic_rnn(
+                        self.cell,
+                        inputs=inputs,
+                        sequence_length=sequence_length,
+                        initial_state=initial_state,
+                        scope=step_scope)
+
+                    # Project encoder outputs once as in dynamic_decode()
+                    if self.attention_keys is None:
+                        self.attention_keys = self.attention_layer.compute_keys(
+                            self.attention_encoder_states)
+
+                    attention_weights, attention_context = self.attention_layer.attend_all(
+                        encoder_states=self.attention_encoder_states,
+                        decoder_states=cell_outputs,
+                        values=self.attention_values,
+                        values_length=self.attention_values_length,
+                        attention_keys=self.attention_keys)
+
+                    softmax_input = tf.contrib.layers.fully_connected(
+                        inputs=tf.concat(
+                            [cell_outputs, attention_context], axis=2),
+                        num_outputs=self.cell.output_size,
+                        activation_fn=tf.nn.tanh,
+                        scope="attention_mix")
+                    logits = tf.contrib.layers.fully_connected(
+                        inputs=softmax_input,
+                        num_outputs=self.num_classes,
+                        activation_fn=None,
+                        scope="logits")
+
+        outputs = AttentionDecoderOutput(
+            logits=logits,
+            predicted_ids=tf.to_int32(tf.argmax(logits, axis=2)),
+            cell_output=softmax_input,
+            attention_weights=attention_weights,
+            attention_context=attention_context)
+        final_state = AttentionDecoderState(
+            cell_state=final_cell_state,
+            attention_weights=attention_weights[:, -1])
+
+        if self.time_major:
+            outputs = AttentionDecoderOutput(
+                logits=tf.transpose(logits, (1, 0, 2)),
+                predicted_ids=tf.transpose(outputs.predicted_ids, (1, 0)),
+                cell_output=tf.transpose(softmax_input, (1, 0, 2)),
+                attention_weights=tf.transpose(attention_weights, (1, 0, 2)),
+                attention_context=tf.transpose(attention_context, (1, 0, 2)))
+
+        return outputs, final_state
+
     def finalize(self, outputs, final_state, final_seq_len):
         """Applies final transformation to the decoder output once decoding is
            finished.
@@ -209,6 +328,18 @@ class AttentionDecoder(RNNDecoder):
         print('===== finalize =====')
         return outputs, final_state
 
+    def compute_attention_keys(self):
+        """Compute attention keys from the encoder outputs with the parameters
+           of the attention layer in the decoding step.
+        Returns:
+            attention_keys: A tensor of size
+                `[batch_size, input_time, attention_dim]` or None
+        """
+        with tf.variable_scope('dynamic_decoder'):
+            with tf.variable_scope("step", reuse=self.reuse):
+                return self.attention_layer.compute_keys(
+                    self.attention_encoder_states)
+
     def initialize(self, name=None):
         """Initialize the decoder.
         Args:
@@ -216,29 +347,35 @@ class AttentionDecoder(RNNDecoder):
         Returns:
             finished:
             first_inputs:
-            initial_state:
+            initial_state: An instance of `AttentionDecoderState`
         """
         print('=== initialize =====')
         # Create inputs for the first time step
         finished, first_inputs = self.helper.initialize()
         # NOTE: first_inputs: `[batch_size, embedding_dim]`
 
-        # Concat empty attention context
         batch_size = tf.shape(first_inputs)[0]
         encoder_num_unit = self.attention_values.get_shape().as_list()[-1]
         attention_context = tf.zeros(shape=[batch_size, encoder_num_unit])
-        self.attention_weights = tf.zeros(
+        attention_weights = tf.zeros(
             shape=[batch_size, tf.shape(self.attention_values)[1]])
 
-        # Create first inputs
-        first_inputs = tf.concat([first_inputs, attention_context], axis=1)
+        # Create first inputs (concat empty attention context)
+        if self.input_feeding:
+            first_inputs = tf.concat(
+                [first_inputs, attention_context], axis=1)
         # ex.) tf.concat
         # tensor t3 with shape [2, 3]
         # tensor t4 with shape [2, 3]
         # tf.shape(tf.concat([t3, t4], 0)) ==> [4, 3]
         # tf.shape(tf.concat([t3, t4], 1)) ==> [2, 6]
 
-        return finished, first_inputs, self.initial_state
+        # NOTE: attention weights are carried over steps in the state
+        initial_state = AttentionDecoderState(
+            cell_state=self.initial_state,
+            attention_weights=attention_weights)
+
+        return finished, first_inputs, initial_state
 
     def compute_output(self, cell_output, attention_weights):
         """Computes the decoder outputs at each time.
@@ -258,7 +395,8 @@ class AttentionDecoder(RNNDecoder):
             current_decoder_state=cell_output,
             values=self.attention_values,
             values_length=self.attention_values_length,
-            attention_weights=attention_weights)
+            attention_weights=attention_weights,
+            attention_keys=self.attention_keys)
 
         # TODO: Make this a parameter: We may or may not want this.
         # Transform attention context.
@@ -312,8 +450,9 @@ class AttentionDecoder(RNNDecoder):
                 sample_ids=sample_ids,
                 name=name)
 
-            next_inputs = tf.concat(
-                [next_inputs, outputs.attention_context], axis=1)
+            if self.input_feeding:
+                next_inputs = tf.concat(
+                    [next_inputs, outputs.attention_context], axis=1)
 
             return finished, next_inputs, next_state
 
@@ -327,11 +466,11 @@ class AttentionDecoder(RNNDecoder):
         Args:
            time: scalar `int32` tensor
            inputs: A input tensors
-           state: A state tensors and TensorArrays
+           state: An instance of `AttentionDecoderState`
            name: Name scope for any created operations
         Returns:
             outputs: An instance of AttentionDecoderOutput
-            next_state: A state tensors and TensorArrays
+            next_state: An instance of `AttentionDecoderState`
             next_inputs: The tensor that should be used as input for the
                 next step
             finished: A boolean tensor telling whether the sequence is
@@ -340,11 +479,10 @@ class AttentionDecoder(RNNDecoder):
         print('===== step =====')
         with tf.variable_scope("step", reuse=self.reuse):
             # Call LSTMCell
-            cell_output_prev, cell_state_prev = self.cell(inputs, state)
-            attention_weights_prev = self.attention_weights
+            cell_output_prev, cell_state_prev = self.cell(
+                inputs, state.cell_state)
             cell_output, logits, attention_weights, attention_context = self.compute_output(
-                cell_output_prev, attention_weights_prev)
-            self.attention_weights = attention_weights
+                cell_output_prev, state.attention_weights)
 
             sample_ids = self.helper.sample(time=time,
                                             outputs=logits,
@@ -360,7 +498,9 @@ class AttentionDecoder(RNNDecoder):
             finished, next_inputs, next_state = self.helper.next_inputs(
                 time=time,
                 outputs=outputs,
-                state=cell_state_prev,
+                state=AttentionDecoderState(
+                    cell_state=cell_state_prev,
+                    attention_weights=attention_weights),
                 sample_ids=sample_ids)
 
             return outputs, next_state, next_inputs, finished
@@ -27,23 +27,65 @@ class AttentionLayer(object):
             the softmax layer of computing attention weights
         attention_weights_tempareture: A float value,
         attention_type: string, content or location or hybrid or layer_dot
+        window_size: int, the number of encoder frames to attend at each
+            step. The window is centered on the peak of the previous attention
+            weights. None means attending all frames.
+        monotonic: bool, if True, the window starts at the peak of the
+            previous attention weights so that attention never moves backward
     """
 
     def __init__(self, num_unit, attention_smoothing,
                  attention_weights_tempareture,
-                 attention_type, name='attention_layer'):
+                 attention_type, window_size=None, monotonic=False,
+                 name='attention_layer'):
+        if window_size is not None and window_size <= 0:
+            raise ValueError('window_size must be larger than 0.')
+        if monotonic and window_size is None:
+            raise ValueError('Monotonic attention requires window_size.')
+
         self.num_unit = num_unit
         self.attention_smoothing = attention_smoothing
         self.attention_weights_tempareture = attention_weights_tempareture
         self.attention_type = attention_type
+        self.window_size = window_size
+        self.monotonic = monotonic
         self.name = name
 
     def __call__(self, *args, **kwargs):
         with tf.variable_scope(self.name):
             return self._build(*args, **kwargs)
 
+    @property
+    def depends_on_previous_weights(self):
+        """True if scores depend on the attention weights of the previous
+           step, i.e. attention can not be computed for all steps at once."""
+        return (self.attention_type in ['location', 'hybrid'] or
+                self.window_size is not None)
+
+    def compute_keys(self, encoder_states):
+        """Project encoder outputs to attention keys. This is independent of
+           the decoder and computed once per utterance.
+        Args:
+            encoder_states: A tensor of shape
+                `[batch_size, input_time, encoder_num_units]`
+        Returns:
+            attention_keys: V * h_j. A tensor of shape
+                `[batch_size, input_time, num_unit]`. None if the attention
+                does not use encoder outputs for scoring.
+        """
+        if self.attention_type == 'location':
+            return None
+
+        with tf.variable_scope(self.name):
+            # V * h_j (j: input time index)
+            return tf.contrib.layers.fully_connected(
+                inputs=encoder_states,
+                num_outputs=self.num_unit,
+                activation_fn=None,
+                scope="Vh")
+
     def _build(self, encoder_states, current_decoder_state, values,
-               values_length, attention_weights):
+               values_length, attention_weights, attention_keys=None):
         """Computes attention scores and outputs.
         Args:
             encoder_states: The outputs of the encoder and equivalent to
@@ -58,7 +100,10 @@ class AttentionLayer(object):
                 A tensor of shape `[batch_size, time, encoder_num_units]`.
             values_length: An int32 tensor of shape `[batch_size]` defining
                 the sequence length of the attention values.
-            attention_weights:
+            attention_weights: The attention weights of the previous step.
+                A tensor of shape `[batch_size, input_time]`
+            attention_keys: The outputs of `compute_keys`. If None, they are
+                computed from `encoder_states` at this step.
         Returns:
             A tuple `(attention_weights, attention_context)`.
                 `attention_weights` is vector of length `time` where each
@@ -69,56 +114,187 @@ class AttentionLayer(object):
                     corresponding to the weighted inputs.
                     A tensor of shape `[batch_size, encoder_num_units]`.
         """
-        # Compute attention scores over encoder outputs (energy: e_ij)
-        # e_ij = f(V * h_j,  W * s_{i-1}, (U * f_ij))
-        energy = self.attention_score_func(encoder_states,
-                                           current_decoder_state,
-                                           attention_weights)
-
-        # Replace all scores for padded inputs with tf.float32.min
-        num_scores = tf.shape(energy)[1]  # max_time
-        scores_mask = tf.sequence_mask(
-            lengths=tf.to_int32(values_length),
-            maxlen=tf.to_int32(num_scores),
-            dtype=tf.float32)
-        # ex.) tf.sequence_mask
-        # tf.sequence_mask([1, 3, 2], 5) = [[True, False, False, False, False],
-        #                                   [True, True, True, False, False],
-        #                                   [True, True, False, False, False]]
-        energy = energy * scores_mask + ((1.0 - scores_mask) * tf.float32.min)
-        # TODO: For underflow?
+        if self.window_size is None:
+            # Compute attention scores over encoder outputs (energy: e_ij)
+            # e_ij = f(V * h_j,  W * s_{i-1}, (U * f_ij))
+            energy = self.attention_score_func(encoder_states,
+                                               current_decoder_state,
+                                               attention_weights,
+                                               attention_keys)
+
+            # Mask scores for padded inputs
+            scores_mask = tf.sequence_mask(
+                lengths=tf.to_int32(values_length),
+                maxlen=tf.shape(energy)[1])
+            # ex.) tf.sequence_mask
+            # tf.sequence_mask([1, 3, 2], 5) = [[True, False, False, False, False],
+            #                                   [True, True, True, False, False],
+            #                                   [True, True, False, False, False]]
+        else:
+            # Compute attention scores only over encoder outputs in the window
+            window_indices, scores_mask = self._window(
+                attention_weights, values_length)
+            # NOTE: frames out of the range are regarded as zero padding
+            energy = self.attention_score_func(
+                tf.gather_nd(encoder_states, window_indices),
+                current_decoder_state,
+                tf.gather_nd(attention_weights, window_indices) *
+                tf.to_float(scores_mask),
+                None if attention_keys is None else
+                tf.gather_nd(attention_keys, window_indices))
+            values_all = values
+            values = tf.gather_nd(values, window_indices)
+            # NOTE: `[batch_size, window_size, encoder_num_units]`
 
         energy /= self.attention_weights_tempareture
 
+        # Replace all scores for padded inputs with tf.float32.min
+        energy = tf.where(scores_mask, energy,
+                          tf.fill(tf.shape(energy), tf.float32.min))
+
         # Normalize the scores (attention_weights: α_ij (j=0,1,...))
         if self.attention_smoothing:
-            attention_weights = tf.sigmoid(energy) / tf.reduce_sum(
-                tf.sigmoid(energy),
-                axis=-1,
-                keep_dims=True)
+            energy_sigmoid = tf.sigmoid(energy) * tf.to_float(scores_mask)
+            weights = energy_sigmoid / tf.reduce_sum(
+                energy_sigmoid, axis=-1, keep_dims=True)
         else:
-            # attention_weights = tf.nn.softmax(
-            #     scores, name="attention_weights")
-            attention_weights = tf.exp(energy) / tf.reduce_sum(
-                tf.exp(energy),
-                axis=-1,
-                keep_dims=True)
+            # NOTE: the maximum is subtracted before exp not to overflow
+            weights = tf.nn.softmax(energy, name="attention_weights")
 
         # Calculate the weighted average of the attention inputs
         # according to the scores
         # c_i = sum_{j}(α_ij * h_j)
-        attention_context = tf.expand_dims(
-            attention_weights, axis=2) * values
+        attention_context = tf.expand_dims(weights, axis=2) * values
         attention_context = tf.reduce_sum(
             attention_context, axis=1, name="attention_context")
         values_depth = values.get_shape().as_list()[-1]  # = encoder_num_units
         # `[batch_size, encoder_num_units]`
         attention_context.set_shape([None, values_depth])
 
+        if self.window_size is None:
+            attention_weights = weights
+        else:
+            # Scatter the weights in the window to all encoder frames
+            # NOTE: frames out of the range have zero weights
+            attention_weights = tf.scatter_nd(
+                window_indices,
+                weights * tf.to_float(scores_mask),
+                tf.shape(values_all)[:2])
+
         return (attention_weights, attention_context)
 
+    def attend_all(self, encoder_states, decoder_states, values,
+                   values_length, attention_keys=None):
+        """Computes attention of all decoder steps at once. This is available
+           only when scores do not depend on the previous attention weights.
+        Args:
+            encoder_states: A tensor of shape
+                `[batch_size, input_time, encoder_num_units]`
+            decoder_states: The outputs of the decoder RNN of all steps.
+                A tensor of shape
+                `[batch_size, output_time, decoder_num_units]`
+            values: A tensor of shape
+                `[batch_size, input_time, encoder_num_units]`
+            values_length: An int32 tensor of shape `[batch_size]`
+            attention_keys: The outputs of `compute_keys`. If None, they are
+                computed from encoder_states.
+        Returns:
+            attention_weights: A tensor of shape
+                `[batch_size, output_time, input_time]`
+            attention_context: A tensor of shape
+                `[batch_size, output_time, encoder_num_units]`
+        """
+        if self.depends_on_previous_weights:
+            raise ValueError('%s attention depends on the previous attention '
+                             'weights.' % self.attention_type)
+
+        if attention_keys is None:
+            # V * h_j: `[batch_size, input_time, num_unit]`
+            attention_keys = self.compute_keys(encoder_states)
+
+        with tf.variable_scope(self.name):
+            # W * s_{i-1}: `[batch_size, output_time, num_unit]`
+            Ws = tf.contrib.layers.fully_connected(
+                inputs=decoder_states,
+                num_outputs=self.num_unit,
+                activation_fn=None,
+                scope="Ws")
+
+            # `[batch_size, output_time, input_time]`
+            if self.attention_type == 'content':
+                w = tf.get_variable(
+                    "w", shape=[self.num_unit], dtype=tf.float32)
+                energy = tf.reduce_sum(
+                    w * tf.tanh(tf.expand_dims(Ws, axis=2) +
+                                tf.expand_dims(attention_keys, axis=1)),
+                    axis=-1)
+            elif self.attention_type == 'layer_dot':
+                energy = tf.matmul(Ws, attention_keys, transpose_b=True)
+            else:
+                raise NotImplementedError
+
+        energy /= self.attention_weights_tempareture
+
+        # Mask scores for padded inputs
+        output_time = tf.shape(energy)[1]
+        scores_mask = tf.tile(
+            tf.expand_dims(tf.sequence_mask(
+                lengths=tf.to_int32(values_length),
+                maxlen=tf.shape(energy)[2]), axis=1),
+            [1, output_time, 1])
+        energy = tf.where(scores_mask, energy,
+                          tf.fill(tf.shape(energy), tf.float32.min))
+
+        if self.attention_smoothing:
+            energy_sigmoid = tf.sigmoid(energy) * tf.to_float(scores_mask)
+            attention_weights = energy_sigmoid / tf.reduce_sum(
+                energy_sigmoid, axis=-1, keep_dims=True)
+        else:
+            attention_weights = tf.nn.softmax(energy)
+
+        # c_i = sum_{j}(α_ij * h_j)
+        attention_context = tf.matmul(attention_weights, values)
+
+        return attention_weights, attention_context
+
+    def _window(self, attention_weights, values_length):
+        """Select encoder frames to attend.
+        Args:
+            attention_weights: The attention weights of the previous step.
+                A tensor of shape `[batch_size, input_time]`
+            values_length: An int32 tensor of shape `[batch_size]`
+        Returns:
+            window_indices: A tensor of shape `[batch_size, window_size, 2]`.
+                Indices of `(batch, time)` of frames in the window.
+            window_mask: A boolean tensor of shape `[batch_size, window_size]`.
+                False for frames out of the range.
+        """
+        batch_size = tf.shape(attention_weights)[0]
+        max_time = tf.shape(attention_weights)[1]
+
+        # NOTE: the peak is the first frame at the first step
+        peak = tf.to_int32(tf.argmax(attention_weights, axis=1))
+        if self.monotonic:
+            start = peak
+        else:
+            start = peak - self.window_size // 2
+
+        # `[batch_size, window_size]`
+        time_indices = tf.expand_dims(start, axis=1) + \
+            tf.expand_dims(tf.range(self.window_size), axis=0)
+        window_mask = tf.logical_and(
+            time_indices >= 0,
+            time_indices < tf.expand_dims(tf.to_int32(values_length), axis=1))
+        time_indices = tf.clip_by_value(time_indices, 0, max_time - 1)
+
+        batch_indices = tf.tile(tf.expand_dims(tf.range(batch_size), axis=1),
+                                [1, self.window_size])
+        window_indices = tf.stack([batch_indices, time_indices], axis=2)
+
+        return window_indices, window_mask
+
     def attention_score_func(self, encoder_states, current_decoder_state,
-                             attention_weights):
+                             attention_weights, attention_keys=None):
         """An attention layer that calculates attention scores.
         Args:
             encoder_states: The sequence of encoder outputs
@@ -126,6 +302,8 @@ class AttentionLayer(object):
             current_decoder_state: The current state of the docoder
                 A tensor of shape `[batch_size, decoder_num_units]`
             attention_weights: A tensor of size `[batch_size, input_time]`
+            attention_keys: A tensor of size
+                `[batch_size, input_time, num_unit]`. Precomputed V * h_j.
         Returns:
             attention_sum: The summation of attention scores
                 A tensor of shape `[batch_size, input_time]`
@@ -142,7 +320,9 @@ class AttentionLayer(object):
             # reuse=True,
             scope="Ws")
 
-        if self.attention_type != 'location':
+        if attention_keys is not None:
+            Vh = attention_keys
+        elif self.attention_type != 'location':
             # V * h_j (j: input time index)
             Vh = tf.contrib.layers.fully_connected(
                 inputs=encoder_states,
@@ -173,11 +353,10 @@ class AttentionLayer(object):
             # location-based attention
             # e_ij = wT * tanh(W * s_{i-1} + U * f_ij + bias)
             ############################################################
-            with tf.control_dependencies(None):
-                F = tf.Variable(tf.truncated_normal(
-                    shape=[200, 1, 10],
-                    # shape=[100, 1, 10],
-                    stddev=0.1), name='filter')
+            F = tf.get_variable(
+                'filter', shape=[200, 1, 10],
+                # shape=[100, 1, 10],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
 
             f = tf.nn.conv1d(tf.expand_dims(attention_weights, axis=2), F,
                              stride=1, padding='SAME',
@@ -204,11 +383,10 @@ class AttentionLayer(object):
             # hybrid attention (content-based + location-based)
             # e_ij = wT * tanh(W * s_{i-1} + V * h_j + U * f_ij + bias)
             ############################################################
-            with tf.control_dependencies(None):
-                F = tf.Variable(tf.truncated_normal(
-                    shape=[200, 1, 10],
-                    # shape=[100, 1, 10],
-                    stddev=0.1), name='filter')
+            F = tf.get_variable(
+                'filter', shape=[200, 1, 10],
+                # shape=[100, 1, 10],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
 
             f = tf.nn.conv1d(tf.expand_dims(attention_weights, axis=2), F,
                              stride=1, padding='SAME',
@@ -0,0 +1,402 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batched beam search decoder for the attention decoder. All utterances in
+   the mini-batch and all beams are decoded in a single `dynamic_decode` loop,
+   where the batch dimension of the wrapped decoder is `B * beam_width`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+from models.attention.decoders.dynamic_decoder import dynamic_decode
+from models.attention.decoders.beam_search.util import choose_top_k
+from models.attention.decoders.beam_search.util import length_penalty
+from models.attention.decoders.beam_search.util import tile_batch
+from models.attention.decoders.beam_search.util import batch_gather
+from models.attention.decoders.beam_search.util import gather_tree
+
+# NOTE: log probability of invalid candidates. This is not -inf in order not
+# to produce NaN in the length normalization.
+LOG_PROB_MIN = -1e9
+
+
+class BeamSearchState(namedtuple(
+        "BeamSearchState",
+        [
+            "cell_state",
+            "attention_weights",
+            "log_probs",
+            "finished",
+            "lengths"
+        ])):
+    """
+    Args:
+        cell_state: The cell state of the decoder of size `[B * beam_width, ]`
+        attention_weights: A tensor of size `[B * beam_width, input_time]`
+        log_probs: The accumulated log probabilities of size `[B, beam_width]`
+        finished: A boolean tensor of size `[B, beam_width]`
+        lengths: The lengths of hypotheses of size `[B, beam_width]`
+    """
+    pass
+
+
+class BeamSearchStepOutput(namedtuple(
+        "BeamSearchStepOutput",
+        [
+            "scores",
+            "predicted_ids",
+            "beam_parent_ids"
+        ])):
+    """
+    Args:
+        scores: The length-normalized scores of size `[B, beam_width]`
+        predicted_ids: The labels chosen at each step of size `[B, beam_width]`
+        beam_parent_ids: The beams which the chosen labels follow of size
+            `[B, beam_width]`
+    """
+    pass
+
+
+class BeamSearchDecoderOutput(namedtuple(
+        "BeamSearchDecoderOutput",
+        [
+            "predicted_ids",
+            "scores",
+            "lengths"
+        ])):
+    """
+    Args:
+        predicted_ids: The N-best hypotheses of size `[B, N, T]`. Hypotheses
+            are sorted by scores in descending order.
+        scores: The length-normalized scores of size `[B, N]`
+        lengths: The lengths of the hypotheses (including <EOS>) of size
+            `[B, N]`
+    """
+    pass
+
+
+class BeamSearchDecoder(tf.contrib.seq2seq.Decoder):
+    """The beam search decoder wrapping the attention decoder.
+    Args:
+        decoder: An instance of the `AttentionDecoder` class
+        beam_width (int): the number of beams
+        vocab_size (int): the number of output classes
+        eos_index (int): index of the end of sentence tag (<EOS>)
+        length_penalty_weight (float, optional): weight for the length
+            penalty factor. 0 disables the penalty.
+        choose_successors_fn (optional): A function to choose successors of
+            beams from the scores of size `[B, beam_width * vocab_size]`
+        top_n (int, optional): the number of hypotheses to return.
+            None means all beams.
+    """
+
+    def __init__(self, decoder, beam_width, vocab_size, eos_index,
+                 length_penalty_weight=0.6, choose_successors_fn=choose_top_k,
+                 top_n=None):
+        if top_n is None:
+            top_n = beam_width
+        assert 0 < top_n <= beam_width, \
+            'top_n must be in the range of [1, beam_width].'
+
+        self.decoder = decoder
+        self.beam_width = int(beam_width)
+        self.vocab_size = int(vocab_size)
+        self.eos_index = int(eos_index)
+        self.length_penalty_weight = float(length_penalty_weight)
+        self.choose_successors_fn = choose_successors_fn
+        self.top_n = int(top_n)
+        self.name = decoder.name
+
+        # Not initialized yet
+        self.initial_state = None
+        self.helper = None
+
+    def __call__(self, *args, **kwargs):
+        with tf.variable_scope(self.name):
+            return self._build(*args, **kwargs)
+
+    @property
+    def output_size(self):
+        return BeamSearchStepOutput(
+            scores=tf.TensorShape([self.beam_width]),
+            predicted_ids=tf.TensorShape([self.beam_width]),
+            beam_parent_ids=tf.TensorShape([self.beam_width]))
+
+    @property
+    def output_dtype(self):
+        return BeamSearchStepOutput(
+            scores=tf.float32,
+            predicted_ids=tf.int32,
+            beam_parent_ids=tf.int32)
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    def _build(self, initial_state, helper, mode):
+        """
+        Args:
+            initial_state: A tensor or tuple of tensors used as the initial
+                cell state of size `[B, ]`
+            helper: An instance of `tf.contrib.seq2seq.GreedyEmbeddingHelper`
+                whose start tokens are of size `[B * beam_width]`
+            mode: tf.contrib.learn.ModeKeys.INFER
+        Returns:
+            outputs: An instance of `BeamSearchDecoderOutput`
+            final_state: An instance of `BeamSearchState`
+        """
+        if mode == tf.contrib.learn.ModeKeys.TRAIN:
+            raise ValueError('Beam search is used only in inference.')
+
+        self._batch_size = tf.shape(nest.flatten([initial_state])[0])[0]
+
+        # Tile the initial state and the encoder outputs for each beam
+        self.initial_state = nest.map_structure(
+            lambda state: tile_batch(state, self.beam_width), initial_state)
+        self.helper = helper
+
+        # NOTE: attention keys are projected before tiling
+        attention_keys = self.decoder.compute_attention_keys()
+        if attention_keys is not None:
+            self.decoder.attention_keys = tile_batch(
+                attention_keys, self.beam_width)
+        self.decoder.attention_encoder_states = tile_batch(
+            self.decoder.attention_encoder_states, self.beam_width)
+        self.decoder.attention_values = tile_batch(
+            self.decoder.attention_values, self.beam_width)
+        self.decoder.attention_values_length = tile_batch(
+            self.decoder.attention_values_length, self.beam_width)
+
+        outputs, final_state = dynamic_decode(
+            decoder=self,
+            output_time_major=True,
+            impute_finished=False,
+            maximum_iterations=self.decoder.max_decode_length,
+            scope='dynamic_decoder')
+
+        return self.finalize(outputs, final_state)
+
+    def finalize(self, outputs, final_state):
+        """Trace back the beams and select N-best hypotheses.
+        Args:
+            outputs: An instance of `BeamSearchStepOutput` (time-major)
+            final_state: An instance of `BeamSearchState`
+        Returns:
+            outputs: An instance of `BeamSearchDecoderOutput`
+            final_state: An instance of `BeamSearchState`
+        """
+        # `[T, B, beam_width]`
+        predicted_ids = gather_tree(outputs.predicted_ids,
+                                    outputs.beam_parent_ids)
+
+        # NOTE: beams are sorted by scores at every step
+        predicted_ids = tf.transpose(predicted_ids, (1, 2, 0))
+        outputs = BeamSearchDecoderOutput(
+            predicted_ids=predicted_ids[:, :self.top_n],
+            scores=outputs.scores[-1][:, :self.top_n],
+            lengths=final_state.lengths[:, :self.top_n])
+
+        return outputs, final_state
+
+    def initialize(self, name=None):
+        """Initialize the decoder.
+        Args:
+            name: Name scope for any created operations
+        Returns:
+            finished: A boolean tensor of size `[B]`
+            first_inputs: A tensor of size `[B * beam_width, embedding_dim]`
+            initial_state: An instance of `BeamSearchState`
+        """
+        _, first_inputs = self.helper.initialize()
+
+        # Concat empty attention context
+        batch_beam_size = tf.shape(first_inputs)[0]
+        if self.decoder.input_feeding:
+            encoder_num_unit = self.decoder.attention_values.get_shape(
+            ).as_list()[-1]
+            attention_context = tf.zeros(
+                shape=[batch_beam_size, encoder_num_unit])
+            first_inputs = tf.concat(
+                [first_inputs, attention_context], axis=1)
+
+        # Only the first beam is active at the first step
+        log_probs = tf.tile(
+            [[0.] + [LOG_PROB_MIN] * (self.beam_width - 1)],
+            [self.batch_size, 1])
+
+        initial_state = BeamSearchState(
+            cell_state=self.initial_state,
+            attention_weights=tf.zeros(
+                shape=[batch_beam_size,
+                       tf.shape(self.decoder.attention_values)[1]]),
+            log_probs=log_probs,
+            finished=tf.zeros([self.batch_size, self.beam_width],
+                              dtype=tf.bool),
+            lengths=tf.zeros([self.batch_size, self.beam_width],
+                             dtype=tf.int32))
+        finished = tf.zeros([self.batch_size], dtype=tf.bool)
+
+        return finished, first_inputs, initial_state
+
+    def step(self, time, inputs, state, name=None):
+        """Perform a decoding step of all beams.
+        Args:
+           time: scalar `int32` tensor
+           inputs: A tensor of size `[B * beam_width, input_size]`
+           state: An instance of `BeamSearchState`
+           name: Name scope for any created operations
+        Returns:
+            outputs: An instance of `BeamSearchStepOutput`
+            next_state: An instance of `BeamSearchState`
+            next_inputs: A tensor of size `[B * beam_width, input_size]`
+            finished: A boolean tensor of size `[B]`. True when all beams
+                of the utterance emit <EOS>.
+        """
+        (step_log_probs, next_cell_state,
+         attention_weights, attention_context) = self._compute_log_probs(
+            inputs, state)
+
+        (next_scores, next_predicted_ids, beam_parent_ids,
+         next_log_probs, next_finished, next_lengths) = self._choose_successors(
+            step_log_probs, state)
+
+        # Reorder the states of beams
+        flat_parent_ids = self._flat_parent_ids(beam_parent_ids)
+        next_cell_state = nest.map_structure(
+            lambda s: tf.gather(s, flat_parent_ids), next_cell_state)
+        next_attention_weights = tf.gather(attention_weights, flat_parent_ids)
+        next_attention_context = tf.gather(attention_context, flat_parent_ids)
+
+        next_inputs = self._next_inputs(
+            time, next_predicted_ids, next_attention_context)
+
+        outputs = BeamSearchStepOutput(
+            scores=next_scores,
+            predicted_ids=next_predicted_ids,
+            beam_parent_ids=beam_parent_ids)
+        next_state = BeamSearchState(
+            cell_state=next_cell_state,
+            attention_weights=next_attention_weights,
+            log_probs=next_log_probs,
+            finished=next_finished,
+            lengths=next_lengths)
+        finished = tf.reduce_all(next_finished, axis=1)
+
+        return outputs, next_state, next_inputs, finished
+
+    def _compute_log_probs(self, inputs, state):
+        """Run the wrapped decoder for one step.
+        Args:
+            inputs: A tensor of size `[B * beam_width, input_size]`
+            state: An instance of `BeamSearchState`
+        Returns:
+            step_log_probs: A tensor of size `[B, beam_width, vocab_size]`
+            next_cell_state: The cell state of size `[B * beam_width, ]`
+            attention_weights: A tensor of size
+                `[B * beam_width, input_time]`
+            attention_context: A tensor of size
+                `[B * beam_width, encoder_num_unit]`
+        """
+        with tf.variable_scope("step", reuse=True):
+            # Share parameters with the wrapped decoder
+            cell_output, next_cell_state = self.decoder.cell(
+                inputs, state.cell_state)
+            _, logits, attention_weights, attention_context = self.decoder.compute_output(
+                cell_output, state.attention_weights)
+
+        step_log_probs = tf.reshape(
+            tf.nn.log_softmax(logits),
+            [self.batch_size, self.beam_width, self.vocab_size])
+
+        return (step_log_probs, next_cell_state,
+                attention_weights, attention_context)
+
+    def _choose_successors(self, step_log_probs, state):
+        """Extend all beams and keep the best `beam_width` hypotheses.
+        Args:
+            step_log_probs: A tensor of size `[B, beam_width, vocab_size]`
+            state: An instance of `BeamSearchState`
+        Returns:
+            next_scores: A tensor of size `[B, beam_width]`
+            next_predicted_ids: A tensor of size `[B, beam_width]`
+            beam_parent_ids: A tensor of size `[B, beam_width]`
+            next_log_probs: A tensor of size `[B, beam_width]`
+            next_finished: A boolean tensor of size `[B, beam_width]`
+            next_lengths: A tensor of size `[B, beam_width]`
+        """
+        batch_size = self.batch_size
+        beam_width = self.beam_width
+        vocab_size = self.vocab_size
+
+        # Finished beams are extended only by <EOS> without any cost
+        eos_log_probs = tf.zeros_like(step_log_probs) + tf.one_hot(
+            self.eos_index, vocab_size,
+            on_value=0., off_value=LOG_PROB_MIN)
+        finished_3d = tf.tile(tf.expand_dims(state.finished, axis=2),
+                              [1, 1, vocab_size])
+        step_log_probs = tf.where(finished_3d, eos_log_probs, step_log_probs)
+
+        log_probs = tf.expand_dims(state.log_probs, axis=2) + step_log_probs
+        lengths = state.lengths + tf.to_int32(tf.logical_not(state.finished))
+
+        # Length normalization
+        scores = log_probs / tf.expand_dims(
+            length_penalty(lengths, self.length_penalty_weight), axis=2)
+
+        # Choose successors over `beam_width * vocab_size` candidates
+        next_scores, word_indices = self.choose_successors_fn(
+            tf.reshape(scores, [batch_size, beam_width * vocab_size]),
+            beam_width)
+        next_predicted_ids = tf.mod(word_indices, vocab_size)
+        beam_parent_ids = tf.floordiv(word_indices, vocab_size)
+
+        next_log_probs = batch_gather(
+            tf.reshape(log_probs, [batch_size, beam_width * vocab_size]),
+            word_indices)
+        next_finished = tf.logical_or(
+            batch_gather(state.finished, beam_parent_ids),
+            tf.equal(next_predicted_ids, self.eos_index))
+        next_lengths = batch_gather(lengths, beam_parent_ids)
+
+        return (next_scores, next_predicted_ids, beam_parent_ids,
+                next_log_probs, next_finished, next_lengths)
+
+    def _flat_parent_ids(self, beam_parent_ids):
+        """
+        Args:
+            beam_parent_ids: A tensor of size `[B, beam_width]`
+        Returns:
+            A tensor of size `[B * beam_width]`. Indices of the parent beams
+                in `B * beam_width`.
+        """
+        # NOTE: beams of the same utterance are contiguous
+        return tf.reshape(
+            beam_parent_ids +
+            tf.expand_dims(tf.range(self.batch_size) * self.beam_width,
+                           axis=1), [-1])
+
+    def _next_inputs(self, time, predicted_ids, attention_context):
+        """Embed the chosen labels and append the attention context when the
+           decoder uses input feeding.
+        Args:
+            time: scalar `int32` tensor
+            predicted_ids: A tensor of size `[B, beam_width]`
+            attention_context: A tensor of size
+                `[B * beam_width, encoder_num_unit]`
+        Returns:
+            A tensor of size `[B * beam_width, input_size]`
+        """
+        _, next_inputs, _ = self.helper.next_inputs(
+            time=time,
+            outputs=None,
+            state=None,
+            sample_ids=tf.reshape(predicted_ids, [-1]))
+        if not self.decoder.input_feeding:
+            return next_inputs
+        return tf.concat([next_inputs, attention_context], axis=1)
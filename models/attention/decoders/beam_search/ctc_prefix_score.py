@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""CTC prefix scoring for joint CTC-attention decoding. This implementation
+   is based on
+        https://arxiv.org/abs/1706.02737.
+          Hori, Takaaki, Shinji Watanabe, and John R. Hershey.
+          "Joint CTC/attention decoding for end-to-end speech recognition."
+          in Proceedings of ACL, 2017.
+   All hypotheses and candidate labels are scored at once. Probabilities are
+   computed in the log domain.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+# NOTE: log probability of impossible paths. This is not -inf in order not to
+# produce NaN in subtraction.
+LOG_PROB_MIN = -1e9
+
+
+def _log_add(x, y):
+    """log(exp(x) + exp(y)) computed stably."""
+    max_value = tf.maximum(x, y)
+    return max_value + tf.log(tf.exp(x - max_value) + tf.exp(y - max_value))
+
+
+def initial_ctc_states(ctc_log_probs, blank_index):
+    """The forward probabilities of the empty prefix.
+    Args:
+        ctc_log_probs: A tensor of size `[T, N, num_classes]`
+        blank_index (int): the index of the blank class
+    Returns:
+        A tensor of size `[T, N, 2]`. The forward log probabilities of paths
+            ending with a non-blank label (index 0) and a blank (index 1).
+    """
+    log_probs_blank = ctc_log_probs[:, :, blank_index]
+    return tf.stack([tf.fill(tf.shape(log_probs_blank), LOG_PROB_MIN),
+                     tf.cumsum(log_probs_blank, axis=0)], axis=2)
+
+
+def ctc_prefix_score(ctc_log_probs, seq_len, prev_states, prev_labels,
+                     labels, blank_index):
+    """Compute the CTC prefix scores of the hypotheses extended by candidate
+       labels.
+    Args:
+        ctc_log_probs: A tensor of size `[T, N, num_classes]`
+        seq_len: A tensor of size `[N]`
+        prev_states: A tensor of size `[T, N, 2]`. The forward log
+            probabilities of the current prefixes.
+        prev_labels: A tensor of size `[N]`. The last labels of the current
+            prefixes. -1 means the empty prefix.
+        labels: A tensor of size `[N, P]`. Candidate labels to extend the
+            prefixes with (except for the blank).
+        blank_index (int): the index of the blank class
+    Returns:
+        log_psi: A tensor of size `[N, P]`. The log probabilities of all
+            label sequences beginning with the extended prefixes.
+        log_psi_eos: A tensor of size `[N]`. The log probabilities of the
+            current prefixes as complete label sequences.
+        states: A tensor of size `[T, N, P, 2]`. The forward log
+            probabilities of the extended prefixes.
+    """
+    max_time = tf.shape(ctc_log_probs)[0]
+    num = tf.shape(ctc_log_probs)[1]
+    num_classes = tf.shape(ctc_log_probs)[2]
+    num_candidates = tf.shape(labels)[1]
+
+    # Gather log probabilities of candidate labels: `[T, N, P]`
+    log_probs_label = tf.gather(
+        tf.reshape(tf.transpose(ctc_log_probs, (1, 2, 0)),
+                   [num * num_classes, max_time]),
+        labels + tf.expand_dims(tf.range(num) * num_classes, axis=1))
+    log_probs_label = tf.transpose(log_probs_label, (2, 0, 1))
+    log_probs_blank = ctc_log_probs[:, :, blank_index]
+
+    def tile_candidates(x):
+        return tf.tile(tf.expand_dims(x, axis=2), [1, 1, num_candidates])
+
+    prev_nonblank = tile_candidates(prev_states[:, :, 0])
+    prev_blank = tile_candidates(prev_states[:, :, 1])
+
+    # The log probability that the prefix has been completed before t.
+    # The repeated label must be separated by a blank.
+    is_repeated = tf.tile(
+        tf.expand_dims(tf.equal(labels, tf.expand_dims(prev_labels, 1)), 0),
+        [max_time, 1, 1])
+    phi = tf.where(is_repeated, prev_blank,
+                   _log_add(prev_blank, prev_nonblank))
+
+    # Initialization (t = 0)
+    is_empty = tf.tile(tf.expand_dims(tf.equal(prev_labels, -1), 1),
+                       [1, num_candidates])
+    min_values = tf.fill([num, num_candidates], LOG_PROB_MIN)
+    nonblank_init = tf.where(is_empty, log_probs_label[0], min_values)
+    blank_init = min_values
+
+    # Forward recursion (t = 1, ..., T - 1)
+    def recurrence(prev, elems):
+        prev_nonblank_t, prev_blank_t = prev
+        phi_t, log_probs_label_t, log_probs_blank_t = elems
+        nonblank_t = _log_add(prev_nonblank_t, phi_t) + log_probs_label_t
+        blank_t = _log_add(prev_blank_t, prev_nonblank_t) + \
+            tf.expand_dims(log_probs_blank_t, axis=1)
+        return nonblank_t, blank_t
+
+    nonblank, blank = tf.scan(
+        recurrence,
+        (phi[:-1], log_probs_label[1:], log_probs_blank[1:]),
+        initializer=(nonblank_init, blank_init))
+    nonblank = tf.concat([tf.expand_dims(nonblank_init, 0), nonblank], 0)
+    blank = tf.concat([tf.expand_dims(blank_init, 0), blank], 0)
+    states = tf.stack([nonblank, blank], axis=3)
+
+    # Prefix probabilities summed over frames in each utterance
+    time_mask = tile_candidates(
+        tf.transpose(tf.sequence_mask(seq_len, max_time), (1, 0)))
+    log_psi = tf.concat(
+        [tf.expand_dims(nonblank_init, 0), phi[:-1] + log_probs_label[1:]], 0)
+    log_psi = tf.reduce_logsumexp(
+        tf.where(time_mask, log_psi, tf.fill(tf.shape(log_psi), LOG_PROB_MIN)),
+        axis=0)
+
+    # The probabilities of the complete sequences at the last frame
+    last_states = tf.gather_nd(
+        tf.transpose(prev_states, (1, 0, 2)),
+        tf.stack([tf.range(num), seq_len - 1], axis=1))
+    log_psi_eos = _log_add(last_states[:, 0], last_states[:, 1])
+
+    return log_psi, log_psi_eos, states
@@ -0,0 +1,277 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batched beam search decoder rescoring attention hypotheses with CTC prefix
+   scores on the fly (one-pass joint CTC-attention decoding). This
+   implementation is based on
+        https://arxiv.org/abs/1706.02737.
+          Hori, Takaaki, Shinji Watanabe, and John R. Hershey.
+          "Joint CTC/attention decoding for end-to-end speech recognition."
+          in Proceedings of ACL, 2017.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+from models.attention.decoders.beam_search.beam_search_decoder import BeamSearchDecoder
+from models.attention.decoders.beam_search.beam_search_decoder import BeamSearchStepOutput
+from models.attention.decoders.beam_search.beam_search_decoder import LOG_PROB_MIN
+from models.attention.decoders.beam_search.ctc_prefix_score import ctc_prefix_score
+from models.attention.decoders.beam_search.ctc_prefix_score import initial_ctc_states
+from models.attention.decoders.beam_search.util import choose_top_k
+from models.attention.decoders.beam_search.util import tile_batch
+
+
+class JointBeamSearchState(namedtuple(
+        "JointBeamSearchState",
+        [
+            "cell_state",
+            "attention_weights",
+            "log_probs",
+            "finished",
+            "lengths",
+            "ctc_states",
+            "ctc_scores",
+            "ctc_last_labels"
+        ])):
+    """
+    Args:
+        cell_state: The cell state of the decoder of size `[B * beam_width, ]`
+        attention_weights: A tensor of size `[B * beam_width, input_time]`
+        log_probs: The accumulated joint log probabilities of size
+            `[B, beam_width]`
+        finished: A boolean tensor of size `[B, beam_width]`
+        lengths: The lengths of hypotheses of size `[B, beam_width]`
+        ctc_states: The CTC forward log probabilities of size
+            `[T, B * beam_width, 2]`
+        ctc_scores: The CTC prefix scores of size `[B * beam_width]`
+        ctc_last_labels: The last CTC labels of size `[B * beam_width]`.
+            -1 means the empty prefix.
+    """
+    pass
+
+
+class JointCTCBeamSearchDecoder(BeamSearchDecoder):
+    """The beam search decoder combining the attention decoder and CTC.
+       The score of a hypothesis is
+       `(1 - ctc_weight) * log p_att + ctc_weight * log p_ctc`.
+    Args:
+        decoder: An instance of the `AttentionDecoder` class
+        beam_width (int): the number of beams
+        vocab_size (int): the number of output classes of the attention
+            decoder
+        sos_index (int): index of the start of sentence tag (<SOS>)
+        eos_index (int): index of the end of sentence tag (<EOS>)
+        ctc_logits: A tensor of size `[T, B, ctc_num_classes]`. The last class
+            is the blank. Labels of the attention decoder except for <SOS> and
+            <EOS> correspond to CTC labels in the same order.
+        ctc_seq_len: A tensor of size `[B]`
+        ctc_weight (float, optional): weight for CTC prefix scores
+        ctc_beam_width (int, optional): the number of candidate labels per
+            hypothesis scored by CTC, pruned by the attention scores.
+            None means all labels.
+        length_penalty_weight (float, optional): weight for the length
+            penalty factor. 0 disables the penalty.
+        choose_successors_fn (optional): A function to choose successors of
+            beams from the scores of size `[B, beam_width * vocab_size]`
+        top_n (int, optional): the number of hypotheses to return.
+            None means all beams.
+    """
+
+    def __init__(self, decoder, beam_width, vocab_size, sos_index, eos_index,
+                 ctc_logits, ctc_seq_len, ctc_weight=0.3, ctc_beam_width=None,
+                 length_penalty_weight=0.6, choose_successors_fn=choose_top_k,
+                 top_n=None):
+        super(JointCTCBeamSearchDecoder, self).__init__(
+            decoder, beam_width, vocab_size, eos_index,
+            length_penalty_weight=length_penalty_weight,
+            choose_successors_fn=choose_successors_fn,
+            top_n=top_n)
+
+        # Labels except for <SOS> and <EOS>
+        if ctc_beam_width is None:
+            ctc_beam_width = vocab_size - 2
+        assert 0 < ctc_beam_width <= vocab_size - 2, \
+            'ctc_beam_width must be in the range of [1, vocab_size - 2].'
+        assert 0 <= ctc_weight <= 1, 'ctc_weight must be in the range of [0, 1].'
+
+        self.sos_index = int(sos_index)
+        self.ctc_logits = ctc_logits
+        self.ctc_seq_len = ctc_seq_len
+        self.ctc_weight = float(ctc_weight)
+        self.ctc_beam_width = int(ctc_beam_width)
+        self.blank_index = ctc_logits.get_shape().as_list()[-1] - 1
+
+        # Map labels of the attention decoder to CTC labels
+        att2ctc, ctc_index = [], 0
+        for att_index in range(vocab_size):
+            if att_index in [self.sos_index, self.eos_index]:
+                att2ctc.append(self.blank_index)
+            else:
+                att2ctc.append(ctc_index)
+                ctc_index += 1
+        assert ctc_index == self.blank_index, \
+            'The number of CTC labels does not match the attention decoder.'
+        self.att2ctc = tf.constant(att2ctc, dtype=tf.int32)
+
+    def _build(self, initial_state, helper, mode):
+        # Tile CTC posteriors for each beam: `[T, B * beam_width, num_classes]`
+        ctc_log_probs = tf.nn.log_softmax(
+            tf.transpose(self.ctc_logits, (1, 0, 2)))
+        self.ctc_log_probs = tf.transpose(
+            tile_batch(ctc_log_probs, self.beam_width), (1, 0, 2))
+        self.ctc_seq_len_tiled = tile_batch(self.ctc_seq_len, self.beam_width)
+
+        return super(JointCTCBeamSearchDecoder, self)._build(
+            initial_state, helper, mode)
+
+    def initialize(self, name=None):
+        """Initialize the decoder.
+        Args:
+            name: Name scope for any created operations
+        Returns:
+            finished: A boolean tensor of size `[B]`
+            first_inputs: A tensor of size `[B * beam_width, embedding_dim]`
+            initial_state: An instance of `JointBeamSearchState`
+        """
+        finished, first_inputs, initial_state = super(
+            JointCTCBeamSearchDecoder, self).initialize(name)
+
+        batch_beam_size = tf.shape(first_inputs)[0]
+        initial_state = JointBeamSearchState(
+            cell_state=initial_state.cell_state,
+            attention_weights=initial_state.attention_weights,
+            log_probs=initial_state.log_probs,
+            finished=initial_state.finished,
+            lengths=initial_state.lengths,
+            ctc_states=initial_ctc_states(self.ctc_log_probs,
+                                          self.blank_index),
+            ctc_scores=tf.zeros([batch_beam_size]),
+            ctc_last_labels=tf.fill([batch_beam_size], -1))
+
+        return finished, first_inputs, initial_state
+
+    def step(self, time, inputs, state, name=None):
+        """Perform a decoding step of all beams.
+        Args:
+           time: scalar `int32` tensor
+           inputs: A tensor of size `[B * beam_width, input_size]`
+           state: An instance of `JointBeamSearchState`
+           name: Name scope for any created operations
+        Returns:
+            outputs: An instance of `BeamSearchStepOutput`
+            next_state: An instance of `JointBeamSearchState`
+            next_inputs: A tensor of size `[B * beam_width, input_size]`
+            finished: A boolean tensor of size `[B]`. True when all beams
+                of the utterance emit <EOS>.
+        """
+        (att_log_probs, next_cell_state,
+         attention_weights, attention_context) = self._compute_log_probs(
+            inputs, state)
+
+        batch_beam_size = tf.shape(state.ctc_scores)[0]
+        vocab_size = self.vocab_size
+        att_log_probs = tf.reshape(att_log_probs,
+                                   [batch_beam_size, vocab_size])
+
+        # Prune candidates by the attention scores (<SOS> and <EOS> are
+        # excluded)
+        labels = tf.range(vocab_size)
+        special_mask = tf.logical_or(tf.equal(labels, self.sos_index),
+                                     tf.equal(labels, self.eos_index))
+        special_mask = tf.tile(tf.expand_dims(special_mask, 0),
+                               [batch_beam_size, 1])
+        min_values = tf.fill([batch_beam_size, vocab_size], LOG_PROB_MIN)
+        _, candidates = tf.nn.top_k(
+            tf.where(special_mask, min_values, att_log_probs),
+            k=self.ctc_beam_width)
+
+        # CTC prefix scores of the candidates
+        log_psi, log_psi_eos, ctc_states = ctc_prefix_score(
+            ctc_log_probs=self.ctc_log_probs,
+            seq_len=self.ctc_seq_len_tiled,
+            prev_states=state.ctc_states,
+            prev_labels=state.ctc_last_labels,
+            labels=tf.gather(self.att2ctc, candidates),
+            blank_index=self.blank_index)
+
+        # Scatter to `[B * beam_width, vocab_size]`. Labels not scored are
+        # pruned.
+        indices = tf.stack(
+            [tf.tile(tf.expand_dims(tf.range(batch_beam_size), 1),
+                     [1, self.ctc_beam_width]), candidates], axis=2)
+        is_scored = tf.scatter_nd(
+            indices, tf.ones_like(log_psi), [batch_beam_size, vocab_size])
+        ctc_scores = tf.where(
+            is_scored > 0,
+            tf.scatter_nd(indices, log_psi, [batch_beam_size, vocab_size]),
+            min_values)
+        is_eos = tf.tile(
+            tf.expand_dims(tf.equal(labels, self.eos_index), 0),
+            [batch_beam_size, 1])
+        ctc_scores = tf.where(
+            is_eos,
+            tf.tile(tf.expand_dims(log_psi_eos, 1), [1, vocab_size]),
+            ctc_scores)
+
+        # Joint scores
+        step_log_probs = (1 - self.ctc_weight) * att_log_probs + \
+            self.ctc_weight * (
+                ctc_scores - tf.expand_dims(state.ctc_scores, axis=1))
+        step_log_probs = tf.reshape(
+            step_log_probs, [self.batch_size, self.beam_width, vocab_size])
+
+        (next_scores, next_predicted_ids, beam_parent_ids,
+         next_log_probs, next_finished, next_lengths) = self._choose_successors(
+            step_log_probs, state)
+
+        # Reorder the states of beams
+        flat_parent_ids = self._flat_parent_ids(beam_parent_ids)
+        flat_predicted_ids = tf.reshape(next_predicted_ids, [-1])
+        next_cell_state = nest.map_structure(
+            lambda s: tf.gather(s, flat_parent_ids), next_cell_state)
+        next_attention_weights = tf.gather(attention_weights, flat_parent_ids)
+        next_attention_context = tf.gather(attention_context, flat_parent_ids)
+
+        next_ctc_scores = tf.gather(
+            tf.reshape(ctc_scores, [-1]),
+            flat_parent_ids * vocab_size + flat_predicted_ids)
+
+        # NOTE: the positions of <EOS> are not used because finished
+        # hypotheses are not extended
+        candidate_positions = tf.argmax(tf.to_int32(tf.equal(
+            tf.gather(candidates, flat_parent_ids),
+            tf.expand_dims(flat_predicted_ids, 1))), axis=1)
+        max_time = tf.shape(ctc_states)[0]
+        next_ctc_states = tf.gather(
+            tf.reshape(tf.transpose(ctc_states, (1, 2, 0, 3)),
+                       [batch_beam_size * self.ctc_beam_width, max_time, 2]),
+            flat_parent_ids * self.ctc_beam_width +
+            tf.to_int32(candidate_positions))
+        next_ctc_states = tf.transpose(next_ctc_states, (1, 0, 2))
+        next_ctc_last_labels = tf.gather(self.att2ctc, flat_predicted_ids)
+
+        next_inputs = self._next_inputs(
+            time, next_predicted_ids, next_attention_context)
+
+        outputs = BeamSearchStepOutput(
+            scores=next_scores,
+            predicted_ids=next_predicted_ids,
+            beam_parent_ids=beam_parent_ids)
+        next_state = JointBeamSearchState(
+            cell_state=next_cell_state,
+            attention_weights=next_attention_weights,
+            log_probs=next_log_probs,
+            finished=next_finished,
+            lengths=next_lengths,
+            ctc_states=next_ctc_states,
+            ctc_scores=next_ctc_scores,
+            ctc_last_labels=next_ctc_last_labels)
+        finished = tf.reduce_all(next_finished, axis=1)
+
+        return outputs, next_state, next_inputs, finished
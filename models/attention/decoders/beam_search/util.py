@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Utilities for the batched beam search decoder."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def choose_top_k(scores_flat, beam_width):
+    """Chooses the top-k beams as successors.
+    Args:
+        scores_flat: A tensor of size `[B, beam_width * vocab_size]`
+        beam_width (int): the number of beams
+    Returns:
+        next_scores: A tensor of size `[B, beam_width]`
+        word_indices: A tensor of size `[B, beam_width]`. Indices in
+            `beam_width * vocab_size`
+    """
+    next_scores, word_indices = tf.nn.top_k(scores_flat, k=beam_width)
+    return next_scores, word_indices
+
+
+def length_penalty(sequence_lengths, penalty_factor):
+    """Calculates the length penalty according to
+        https://arxiv.org/abs/1609.08144.
+            Wu, Yonghui, et al.
+            "Google's neural machine translation system: Bridging the gap
+                between human and machine translation."
+            arXiv preprint arXiv:1609.08144 (2016).
+    Args:
+        sequence_lengths: A tensor of size `[B, beam_width]`
+        penalty_factor (float): A weight for the length penalty factor.
+            0 disables the penalty.
+    Returns:
+        A tensor of size `[B, beam_width]`
+    """
+    return tf.pow((5. + tf.to_float(sequence_lengths)) / 6., penalty_factor)
+
+
+def tile_batch(tensor, multiplier):
+    """Tiles each batch entry `multiplier` times.
+       `[B, ...]` is converted to `[B * multiplier, ...]`, where the entries of
+       the same batch are contiguous.
+    Args:
+        tensor: A tensor of size `[B, ...]`
+        multiplier (int): the number of copies
+    Returns:
+        A tensor of size `[B * multiplier, ...]`
+    """
+    shape = tf.shape(tensor)
+    static_shape = tensor.get_shape()
+    tiling = [1] * (static_shape.ndims + 1)
+    tiling[1] = multiplier
+    tiled = tf.tile(tf.expand_dims(tensor, axis=1), tiling)
+    tiled = tf.reshape(
+        tiled, tf.concat([[shape[0] * multiplier], shape[1:]], axis=0))
+    tiled.set_shape(tf.TensorShape([None]).concatenate(static_shape[1:]))
+    return tiled
+
+
+def batch_gather(params, indices):
+    """Gathers values in each batch entry.
+    Args:
+        params: A tensor of size `[B, N]`
+        indices: A tensor of size `[B, M]`
+    Returns:
+        A tensor of size `[B, M]`
+    """
+    batch_size = tf.shape(params)[0]
+    num = tf.shape(params)[1]
+    offsets = tf.expand_dims(tf.range(batch_size) * num, axis=1)
+    return tf.gather(tf.reshape(params, [-1]), indices + offsets)
+
+
+def gather_tree(predicted_ids, beam_parent_ids):
+    """Backtracks the beam search to recover the full sequence of each beam.
+    Args:
+        predicted_ids: A tensor of size `[T, B, beam_width]`
+        beam_parent_ids: A tensor of size `[T, B, beam_width]`
+    Returns:
+        A tensor of size `[T, B, beam_width]`. Each beam at the last step is
+            traced back to the first step.
+    """
+    batch_size = tf.shape(predicted_ids)[1]
+    beam_width = tf.shape(predicted_ids)[2]
+    initial_beams = tf.tile(
+        tf.expand_dims(tf.range(beam_width), axis=0), [batch_size, 1])
+
+    def backtrack(acc, elems):
+        _, beams = acc
+        ids_t, parent_ids_t = elems
+        return (batch_gather(ids_t, beams),
+                batch_gather(parent_ids_t, beams))
+
+    sequences, _ = tf.scan(
+        backtrack,
+        (tf.reverse(predicted_ids, axis=[0]),
+         tf.reverse(beam_parent_ids, axis=[0])),
+        initializer=(tf.zeros_like(initial_beams), initial_beams))
+
+    return tf.reverse(sequences, axis=[0])
@@ -0,0 +1,148 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Select & load encoder of attention models."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import tensorflow as tf
+
+from models.encoders.load_encoder import load as load_rnn_encoder
+from utils.training.mixed_precision import float16_scope, cast_structure
+
+
+class EncoderOutput(namedtuple(
+        "EncoderOutput",
+        [
+            "outputs",
+            "final_state",
+            "attention_values",
+            "attention_values_length"
+        ])):
+    """
+    Args:
+        outputs: A tensor of size `[B, T', encoder_num_unit * 2]`
+        final_state: A final hidden state of the encoder
+        attention_values: The sequence to attend over. Same as `outputs`.
+        attention_values_length: A tensor of size `[B]`. The length of
+            `outputs`, which is shorter than the input when the encoder
+            reduces the time resolution.
+    """
+    pass
+
+
+class AttentionEncoder(object):
+    """Wrap an encoder in models/encoders to return hidden states for
+       attention.
+    Args:
+        encoder: An instance of the encoder class with `num_classes=0`
+        mixed_precision (bool, optional): if True, the encoder computes in
+            float16 with float32 master weights, and returns float32 outputs
+    """
+
+    def __init__(self, encoder, mixed_precision=False):
+        self.encoder = encoder
+        self.mixed_precision = mixed_precision
+
+    def __call__(self, inputs, inputs_seq_len,
+                 keep_prob_input, keep_prob_hidden):
+        """
+        Args:
+            inputs: A tensor of `[B, T, input_size]`
+            inputs_seq_len: A tensor of `[B]`
+            keep_prob_input: A float value. A probability to keep nodes in the
+                input-hidden layer
+            keep_prob_hidden: A float value. A probability to keep nodes in the
+                hidden-hidden layers
+        Returns:
+            An instance of `EncoderOutput`
+        """
+        if self.mixed_precision:
+            with float16_scope():
+                outputs, final_state = self.encoder(
+                    tf.cast(inputs, tf.float16), inputs_seq_len,
+                    tf.cast(keep_prob_input, tf.float16),
+                    tf.cast(keep_prob_hidden, tf.float16),
+                    keep_prob_output=1.0)
+            # NOTE: the decoder is computed in float32
+            outputs = tf.cast(outputs, tf.float32)
+            final_state = cast_structure(final_state, tf.float32)
+        else:
+            outputs, final_state = self.encoder(
+                inputs, inputs_seq_len,
+                keep_prob_input, keep_prob_hidden, keep_prob_output=1.0)
+
+        if hasattr(self.encoder, 'output_seq_len'):
+            outputs_seq_len = self.encoder.output_seq_len(inputs_seq_len)
+        else:
+            outputs_seq_len = inputs_seq_len
+
+        return EncoderOutput(outputs=outputs,
+                             final_state=final_state,
+                             attention_values=outputs,
+                             attention_values_length=outputs_seq_len)
+
+
+class load(object):
+    """Select & load encoder.
+    Args:
+        model_type: string, blstm_encoder or pyramidal_blstm_encoder
+    Returns:
+        model: An instance of `AttentionEncoder`
+    """
+
+    def __init__(self, model_type):
+        if model_type not in ['blstm_encoder', 'pyramidal_blstm_encoder']:
+            raise ValueError(
+                'model_type should be one of ["blstm_encoder", "pyramidal_blstm_encoder"], you provided %s.' %
+                (model_type))
+
+        self.model_type = model_type
+
+    def __call__(self, num_unit, num_layer, parameter_init,
+                 clip_activation=None, num_proj=None,
+                 downsample_list=None, downsample_type='concat',
+                 mixed_precision=False):
+        """
+        Args:
+            num_unit: int, the number of units in each layer of the encoder
+            num_layer: int, the number of layers of the encoder
+            parameter_init: A float value. Range of uniform distribution to
+                initialize weight parameters
+            clip_activation: A float value. Range of activation clipping (> 0)
+            num_proj: int, the number of nodes in the projection layer
+            downsample_list: list of booleans of size `[num_layer]`. If True,
+                the time resolution is halved after the layer. This is used
+                only for the pyramidal BLSTM encoder.
+            downsample_type: string, concat or subsample. This is used only
+                for the pyramidal BLSTM encoder.
+            mixed_precision: bool, if True, the encoder computes in float16
+        """
+        if self.model_type == 'blstm_encoder':
+            encoder = load_rnn_encoder('blstm')(
+                num_units=num_unit,
+                num_layers=num_layer,
+                num_classes=0,
+                lstm_impl='LSTMCell',
+                use_peephole=True,
+                parameter_init=parameter_init,
+                clip_activation=clip_activation,
+                num_proj=num_proj)
+
+        elif self.model_type == 'pyramidal_blstm_encoder':
+            encoder = load_rnn_encoder('pblstm')(
+                num_units=num_unit,
+                num_layers=num_layer,
+                num_classes=0,
+                lstm_impl='LSTMCell',
+                use_peephole=True,
+                parameter_init=parameter_init,
+                clip_activation=clip_activation,
+                num_proj=num_proj,
+                downsample_list=downsample_list,
+                downsample_type=downsample_type)
+
+        return AttentionEncoder(encoder, mixed_precision=mixed_precision)
@@ -13,6 +13,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import math
 import tensorflow as tf
 
 from models.attention.attention_seq2seq_base import AttentionBase
@@ -21,6 +22,7 @@ from models.attention.decoders.load_decoder import load as load_decoder
 from models.attention.decoders.attention_layer import AttentionLayer
 from models.attention.decoders.attention_decoder import AttentionDecoder
 from models.attention.decoders.attention_decoder import AttentionDecoderOutput
+from models.attention.decoders.beam_search.joint_beam_search_decoder import JointCTCBeamSearchDecoder
 from models.attention.decoders.dynamic_decoder import _transpose_batch_time as time2batch
 from models.attention.bridge import InitialStateBridge
 
@@ -46,6 +48,19 @@ class JointCTCAttention(AttentionBase):
         attention_smoothing: bool, if True, replace exp to sigmoid function in
             the softmax layer of computing attention weights
         attention_weights_tempareture: A float value,
+        attention_window_size: int, the number of encoder frames to attend
+            at each step. None means attending all frames.
+        monotonic_attention: bool, if True, the attention window never moves
+            backward
+        input_feeding: bool, if True, the attention context is fed to the
+            decoder RNN at the next step. If False and attention does not
+            depend on the previous weights, the decoder is trained with all
+            steps computed at once.
+        encoder_type: string, blstm_encoder or pyramidal_blstm_encoder
+        downsample_list: list of booleans of size `[encoder_num_layer]`. If
+            True, the time resolution is halved after the layer of the
+            pyramidal BLSTM encoder.
+        downsample_type: string, concat or subsample
         logits_tempareture: A float value,
         parameter_init: A float value. Range of uniform distribution to
             initialize weight parameters
@@ -60,7 +75,20 @@ class JointCTCAttention(AttentionBase):
         dropout_ratio_output: A float value. Dropout ratio in the hidden-output
             layer
         weight_decay: A float value. Regularization parameter for weight decay
+        beam_width: int, the number of beams to use. 1 diables the beam search
+            decoding (greedy decoding).
+        decode_ctc_weight: A float value. Weight for CTC prefix scores in
+            joint CTC-attention decoding. 0 disables joint decoding (only the
+            attention decoder is used).
+        ctc_beam_width: int, the number of candidate labels per hypothesis
+            scored by CTC in joint decoding, pruned by the attention scores.
+            None means 1.5 * beam_width. -1 means all labels, which is exact
+            but expensive because CTC prefix scores are computed over the
+            whole vocabulary for each hypothesis.
         time_major: bool, if True, time-major computatoin will be performed
+        mixed_precision: bool, if True, the encoder computes in float16 with
+            float32 master weights, and the loss is scaled dynamically in
+            training
     """
 
     def __init__(self,
@@ -90,7 +118,16 @@ class JointCTCAttention(AttentionBase):
                  dropout_ratio_output=1.0,
                  weight_decay=0.0,
                  beam_width=0,
+                 decode_ctc_weight=0.0,
+                 ctc_beam_width=None,
                  time_major=False,
+                 attention_window_size=None,
+                 monotonic_attention=False,
+                 input_feeding=True,
+                 encoder_type='blstm_encoder',
+                 downsample_list=None,
+                 downsample_type='concat',
+                 mixed_precision=False,
                  name='blstm_attention_seq2seq'):
 
         # AttentionBase.__init__(self)
@@ -110,6 +147,12 @@ class JointCTCAttention(AttentionBase):
         self.attention_smoothing = bool(attention_smoothing)
         self.attention_weights_tempareture = float(
             attention_weights_tempareture)
+        self.attention_window_size = attention_window_size
+        self.monotonic_attention = bool(monotonic_attention)
+        self.input_feeding = bool(input_feeding)
+        self.encoder_type = encoder_type
+        self.downsample_list = downsample_list
+        self.downsample_type = downsample_type
         self.logits_tempareture = float(logits_tempareture)
         self.parameter_init = float(parameter_init)
         self.clip_grad = float(clip_grad)
@@ -120,7 +163,12 @@ class JointCTCAttention(AttentionBase):
         self.dropout_ratio_output = float(dropout_ratio_output)
         self.weight_decay = float(weight_decay)
         self.beam_width = int(beam_width)
+        self.decode_ctc_weight = float(decode_ctc_weight)
+        self.ctc_beam_width = ctc_beam_width
         self.time_major = time_major
+        self.mixed_precision = bool(mixed_precision)
+        self.loss_scaler = None
+        self.grad_norm = None
         self.name = name
 
         # NOTE: attention_weights_tempareture is good for narrow focus.
@@ -196,12 +244,15 @@ class JointCTCAttention(AttentionBase):
             `(outputs final_state attention_values attention_values_length)`
         """
         # Define encoder
-        encoder = load_encoder(model_type='blstm_encoder')(
+        encoder = load_encoder(model_type=self.encoder_type)(
             num_unit=self.encoder_num_unit,
             num_layer=self.encoder_num_layer,
             parameter_init=self.parameter_init,
             clip_activation=self.clip_activation_encoder,
-            num_proj=None)
+            num_proj=None,
+            downsample_list=self.downsample_list,
+            downsample_type=self.downsample_type,
+            mixed_precision=self.mixed_precision)
 
         encoder_outputs = encoder(inputs=inputs,
                                   inputs_seq_len=inputs_seq_len,
@@ -224,7 +275,9 @@ class JointCTCAttention(AttentionBase):
             num_unit=self.attention_dim,
             attention_smoothing=self.attention_smoothing,
             attention_weights_tempareture=self.attention_weights_tempareture,
-            attention_type=self.attention_type)
+            attention_type=self.attention_type,
+            window_size=self.attention_window_size,
+            monotonic=self.monotonic_attention)
 
         # Define RNN decoder
         rnn_decoder = load_decoder(model_type='lstm_decoder')
@@ -242,7 +295,8 @@ class JointCTCAttention(AttentionBase):
             attention_values=encoder_outputs.attention_values,
             attention_values_length=encoder_outputs.attention_values_length,
             attention_layer=self.attention_layer,
-            time_major=self.time_major)
+            time_major=self.time_major,
+            input_feeding=self.input_feeding)
 
         return decoder
 
@@ -270,17 +324,56 @@ class JointCTCAttention(AttentionBase):
         encoder_outputs = self._encode(
             inputs, inputs_seq_len, keep_prob_input, keep_prob_hidden)
 
+        ##############################
+        # Define CTC decoder
+        ##############################
+        # NOTE: the encoder may reduce the time resolution
+        self.encoder_outputs_seq_len = encoder_outputs.attention_values_length
+
+        # Reshape to apply the same weights over the timesteps
+        encoder_outputs_dim = encoder_outputs.outputs.get_shape(
+        ).as_list()[-1]
+        ctc_outputs = tf.reshape(encoder_outputs.outputs,
+                                 shape=[-1, encoder_outputs_dim])
+
+        # `[batch_size, time, input_size_splice]`
+        batch_size = tf.shape(inputs)[0]
+
+        with tf.variable_scope('ctc_output'):
+            # Affine
+            W_ctc_output = tf.get_variable(
+                'W_ctc_output',
+                shape=[encoder_outputs_dim, self.ctc_num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_ctc_output = tf.get_variable(
+                'b_ctc_output', shape=[self.ctc_num_classes],
+                initializer=tf.zeros_initializer())
+            ctc_logits_2d = tf.matmul(ctc_outputs, W_ctc_output) + b_ctc_output
+
+            # Reshape back to the original shape
+            ctc_logits = tf.reshape(
+                ctc_logits_2d, shape=[batch_size, -1, self.ctc_num_classes])
+
+            # Convert to `[time, batch_size, ctc_num_classes]'
+            ctc_logits = tf.transpose(ctc_logits, (1, 0, 2))
+
+        ##############################
+        # Define attention decoder
+        ##############################
         # Define decoder (initialization)
         decoder_train = self._create_decoder(encoder_outputs, labels)
         decoder_infer = self._create_decoder(encoder_outputs, labels)
         # NOTE: initial_state and helper will be substituted in
         # self._decode_train() or self._decode_infer()
 
-        # Wrap decoder
-        decoder_train = self._beam_search_decoder_wrapper(
-            decoder_train, beam_width=self.beam_width)
-        decoder_infer = self._beam_search_decoder_wrapper(
-            decoder_infer, beam_width=self.beam_width)
+        # Wrap decoder only when inference
+        if self.decode_ctc_weight > 0:
+            decoder_infer = self._joint_decoder_wrapper(
+                decoder_infer, ctc_logits, self.encoder_outputs_seq_len,
+                beam_width=self.beam_width)
+        else:
+            decoder_infer = self._beam_search_decoder_wrapper(
+                decoder_infer, beam_width=self.beam_width)
 
         # Connect between encoder and decoder
         bridge = InitialStateBridge(
@@ -308,30 +401,32 @@ class JointCTCAttention(AttentionBase):
             att_logits = time2batch(decoder_outputs_train.logits)
             predicted_ids = time2batch(decoder_outputs_train.predicted_ids)
             cell_output = time2batch(decoder_outputs_train.cell_output)
-            attention_scores = time2batch(
-                decoder_outputs_train.attention_scores)
+            attention_weights = time2batch(
+                decoder_outputs_train.attention_weights)
             attention_context = time2batch(
                 decoder_outputs_train.attention_context)
             decoder_outputs_train = AttentionDecoderOutput(
                 logits=att_logits,
                 predicted_ids=predicted_ids,
                 cell_output=cell_output,
-                attention_scores=attention_scores,
+                attention_weights=attention_weights,
                 attention_context=attention_context)
 
-            att_logits = time2batch(decoder_outputs_infer.logits)
-            predicted_ids = time2batch(decoder_outputs_infer.predicted_ids)
-            cell_output = time2batch(decoder_outputs_infer.cell_output)
-            attention_scores = time2batch(
-                decoder_outputs_infer.attention_scores)
-            attention_context = time2batch(
-                decoder_outputs_infer.attention_context)
-            decoder_outputs_infer = AttentionDecoderOutput(
-                logits=att_logits,
-                predicted_ids=predicted_ids,
-                cell_output=cell_output,
-                attention_scores=attention_scores,
-                attention_context=attention_context)
+            # NOTE: outputs of the beam search decoder are batch-major
+            if not self.use_beam_search:
+                att_logits = time2batch(decoder_outputs_infer.logits)
+                predicted_ids = time2batch(decoder_outputs_infer.predicted_ids)
+                cell_output = time2batch(decoder_outputs_infer.cell_output)
+                attention_weights = time2batch(
+                    decoder_outputs_infer.attention_weights)
+                attention_context = time2batch(
+                    decoder_outputs_infer.attention_context)
+                decoder_outputs_infer = AttentionDecoderOutput(
+                    logits=att_logits,
+                    predicted_ids=predicted_ids,
+                    cell_output=cell_output,
+                    attention_weights=attention_weights,
+                    attention_context=attention_context)
 
         # Calculate loss per example
         att_logits = decoder_outputs_train.logits / self.logits_tempareture
@@ -342,35 +437,50 @@ class JointCTCAttention(AttentionBase):
         # "Towards better decoding and language model integration in sequence
         # to sequence models." arXiv preprint arXiv:1612.02695 (2016).
 
-        ##############################
-        # Define CTC decoder
-        ##############################
-        # Reshape to apply the same weights over the timesteps
-        ctc_outputs = tf.reshape(encoder_outputs.outputs,
-                                 shape=[-1, self.encoder_num_unit * 2])
-
-        # `[batch_size, time, input_size_splice]`
-        batch_size = tf.shape(inputs)[0]
-
-        with tf.name_scope('ctc_output'):
-            # Affine
-            W_ctc_output = tf.Variable(tf.truncated_normal(
-                shape=[self.encoder_num_unit * 2, self.ctc_num_classes],
-                stddev=0.1, name='W_ctc_output'))
-            b_ctc_output = tf.Variable(tf.zeros(
-                shape=[self.ctc_num_classes], name='b_ctc_output'))
-            ctc_logits_2d = tf.matmul(ctc_outputs, W_ctc_output) + b_ctc_output
-
-            # Reshape back to the original shape
-            ctc_logits = tf.reshape(
-                ctc_logits_2d, shape=[batch_size, -1, self.ctc_num_classes])
-
-            # Convert to `[time, batch_size, ctc_num_classes]'
-            ctc_logits = tf.transpose(ctc_logits, (1, 0, 2))
-
         return (att_logits, ctc_logits,
                 decoder_outputs_train, decoder_outputs_infer)
 
+    def _joint_decoder_wrapper(self, decoder, ctc_logits, inputs_seq_len,
+                               beam_width=None, length_penalty_weight=0.6):
+        """Wraps a decoder into a joint CTC-attention beam search decoder.
+        Args:
+            decoder: An instance of `RNNDecoder` class
+            ctc_logits: A tensor of `[T, B, ctc_num_classes]`
+            inputs_seq_len: A tensor of `[B]`
+            beam_width: int, the number of beams to use. Joint decoding is
+                performed even if this is 1.
+            length_penalty_weight: A float value, weight for the length penalty
+                factor. 0.0 disables the penalty.
+        Returns:
+            A callable JointCTCBeamSearchDecoder with the same interfaces as
+                the beam search decoder
+        """
+        if beam_width is None or beam_width < 1:
+            beam_width = 1
+        self.beam_width = beam_width
+        self.use_beam_search = True
+
+        # Labels except for <SOS> and <EOS>
+        num_labels = self.num_classes - 2
+        if self.ctc_beam_width is None:
+            ctc_beam_width = min(int(math.ceil(1.5 * beam_width)), num_labels)
+        elif self.ctc_beam_width == -1:
+            ctc_beam_width = num_labels
+        else:
+            ctc_beam_width = self.ctc_beam_width
+
+        return JointCTCBeamSearchDecoder(
+            decoder=decoder,
+            beam_width=beam_width,
+            vocab_size=self.num_classes,
+            sos_index=self.sos_index,
+            eos_index=self.eos_index,
+            ctc_logits=ctc_logits,
+            ctc_seq_len=inputs_seq_len,
+            ctc_weight=self.decode_ctc_weight,
+            ctc_beam_width=ctc_beam_width,
+            length_penalty_weight=length_penalty_weight)
+
     def compute_loss(self, inputs, att_labels, inputs_seq_len,
                      att_labels_seq_len, ctc_labels,
                      keep_prob_input, keep_prob_hidden, keep_prob_output,
@@ -388,6 +498,7 @@ class JointCTCAttention(AttentionBase):
                 the hidden-hidden layers
             keep_prob_output: A float value. A probability to keep nodes in
                 the hidden-output layer
+            scope: A scope in the model tower
         Returns:
             loss: operation for computing total loss (cross entropy sequence
                 loss + ctc loss + L2).
@@ -443,7 +554,7 @@ class JointCTCAttention(AttentionBase):
             ctc_losses = tf.nn.ctc_loss(
                 ctc_labels,
                 ctc_logits,
-                tf.cast(inputs_seq_len, tf.int32),
+                tf.cast(self.encoder_outputs_seq_len, tf.int32),
                 preprocess_collapse_repeated=False,
                 ctc_merge_repeated=True,
                 ignore_longer_outputs_than_inputs=False,
@@ -452,7 +563,8 @@ class JointCTCAttention(AttentionBase):
             tf.add_to_collection('losses', ctc_loss * self.ctc_task_weight)
 
         # Compute total loss
-        total_loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        total_loss = tf.add_n(tf.get_collection('losses', scope),
+                              name='total_loss')
 
         # Add a scalar summary for the snapshot of loss
         if self.weight_decay > 0:
@@ -482,3 +594,37 @@ class JointCTCAttention(AttentionBase):
 
         return (total_loss, ctc_logits, att_logits,
                 decoder_outputs_train, decoder_outputs_infer)
+
+    def checkpoint_var_list(self, checkpoint_path):
+        """Map the names in a checkpoint to the variables in the graph to
+           restore. The checkpoints saved before the output layer of CTC was
+           created by `tf.get_variable` have `ctc_output/Variable` and
+           `ctc_output/Variable_1` instead of `ctc_output/W_ctc_output` and
+           `ctc_output/b_ctc_output`.
+        Args:
+            checkpoint_path (string): path to the checkpoint
+        Returns:
+            var_list (dict): A dictionary of the names in the checkpoint and
+                the variables. This can be passed to `tf.train.Saver`.
+        """
+        reader = tf.train.NewCheckpointReader(checkpoint_path)
+        var_names = reader.get_variable_to_shape_map().keys()
+        old_names = {'W_ctc_output': 'Variable', 'b_ctc_output': 'Variable_1'}
+
+        var_list = {}
+        for var in tf.global_variables():
+            var_name = var.op.name
+            base_name = var_name.split('/')[-1]
+            if (not reader.has_tensor(var_name) and
+                    var_name.split('/')[-2:-1] == ['ctc_output'] and
+                    base_name in old_names):
+                # NOTE: the old names may have a different prefix such as
+                # the name scope of the tower
+                candidates = [
+                    name for name in var_names
+                    if name.split('/')[-2:] == ['ctc_output',
+                                                old_names[base_name]]]
+                if len(candidates) == 1:
+                    var_name = candidates[0]
+            var_list[var_name] = var
+        return var_list
@@ -9,6 +9,10 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from utils.training.mixed_precision import float16_scope, DynamicLossScaler
+from utils.training.gradient_accumulation import GradientAccumulator
+from utils.training.gradients import compute_gradients, apply_gradients, \
+    add_grad_norm_summary
 
 OPTIMIZER_CLS_NAMES = {
     "adagrad": tf.train.AdagradOptimizer,
@@ -34,10 +38,13 @@ class CTCBase(object):
             Choose the background implementation of tensorflow.
         clip_grad (float): the range of gradient clipping (> 0)
         weight_decay (float): a parameter for weight decay
+        mixed_precision (bool, optional): if True, the encoder computes in
+            float16 with float32 master weights, and the loss is scaled
+            dynamically in training
     """
 
     def __init__(self, input_size, splice, num_classes, lstm_impl,
-                 clip_grad, weight_decay):
+                 clip_grad, weight_decay, mixed_precision=False):
         assert input_size % 3 == 0, 'input_size must be divisible by 3 (+ delta, double delta features).'
         # NOTE: input features are expected to including Δ and ΔΔ features
         assert splice % 2 == 1, 'splice must be the odd number'
@@ -56,6 +63,13 @@ class CTCBase(object):
         self.clip_grad = clip_grad
         self.weight_decay = float(weight_decay)
 
+        # Mixed precision
+        self.mixed_precision = bool(mixed_precision)
+        self.loss_scaler = None
+
+        # The norm of gradients before global norm clipping
+        self.grad_norm = None
+
         # Summaries for TensorBoard
         self.summaries_train = []
         self.summaries_dev = []
@@ -68,6 +82,9 @@ class CTCBase(object):
         self.keep_prob_hidden_pl_list = []
         self.keep_prob_output_pl_list = []
 
+        # NOTE: this is shared across the model towers
+        self.is_training_pl = None
+
     def __call__(self, inputs, inputs_seq_len,
                  keep_prob_input, keep_prob_hidden, keep_prob_output):
         """Construct model graph.
@@ -83,12 +100,54 @@ class CTCBase(object):
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
         """
+        is_training = self._create_is_training_placeholder()
+
+        if self.mixed_precision:
+            with float16_scope():
+                logits, final_state = self.encoder(
+                    tf.cast(inputs, tf.float16), inputs_seq_len,
+                    tf.cast(keep_prob_input, tf.float16),
+                    tf.cast(keep_prob_hidden, tf.float16),
+                    tf.cast(keep_prob_output, tf.float16),
+                    is_training=is_training)
+            # NOTE: CTC loss and decoders are computed in float32
+            return tf.cast(logits, tf.float32)
+
         logits, final_state = self.encoder(
             inputs, inputs_seq_len,
-            keep_prob_input, keep_prob_hidden, keep_prob_output)
+            keep_prob_input, keep_prob_hidden, keep_prob_output,
+            is_training=is_training)
 
         return logits
 
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of logits. This differs from the input
+           length when the encoder reduces the time resolution.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        if hasattr(self.encoder, 'output_seq_len'):
+            return self.encoder.output_seq_len(inputs_seq_len)
+        return inputs_seq_len
+
+    def _create_is_training_placeholder(self):
+        """Create the placeholder to switch batch normalization to the
+           training mode, which is shared across the model towers. This must
+           be fed True in training, and the moving averages of batch
+           normalization are used by default.
+        Returns:
+            A boolean placeholder
+        """
+        if (self.is_training_pl is None or
+                self.is_training_pl.graph is not tf.get_default_graph()):
+            # NOTE: not to be created in the name scope of a tower
+            with tf.name_scope(None):
+                self.is_training_pl = tf.placeholder_with_default(
+                    False, shape=[], name='is_training')
+        return self.is_training_pl
+
     def create_placeholders(self):
         """Create placeholders and append them to list."""
         self.inputs_pl_list.append(
@@ -172,7 +231,7 @@ class CTCBase(object):
                 labels,
                 logits,
                 # tf.cast(inputs_seq_len, tf.int32),
-                inputs_seq_len,
+                self.output_seq_len(inputs_seq_len),
                 preprocess_collapse_repeated=False,
                 ctc_merge_repeated=True,
                 ignore_longer_outputs_than_inputs=False,
@@ -233,7 +292,8 @@ class CTCBase(object):
             return OPTIMIZER_CLS_NAMES[optimizer](
                 learning_rate=learning_rate)
 
-    def train(self, loss, optimizer, learning_rate, clip_norm=False):
+    def train(self, loss, optimizer, learning_rate, clip_norm=False,
+              clip_global_norm=False, accum_steps=1):
         """Operation for training. Only the sigle GPU training is supported.
         Args:
             loss: An operation for computing loss
@@ -241,6 +301,11 @@ class CTCBase(object):
             learning_rate (placeholder): A learning rate
             clip_norm (bool, optional): if True, clip gradients norm by
                 self.clip_grad
+            clip_global_norm (bool, optional): if True, clip the global norm
+                of all gradients by self.clip_grad. This overrides clip_norm.
+            accum_steps (int, optional): the number of mini-batches to
+                accumulate gradients over. The averaged gradients are applied
+                once every accum_steps runs of train_op.
         Returns:
             train_op: operation for training
         """
@@ -250,59 +315,41 @@ class CTCBase(object):
         # Set optimizer
         self.optimizer = self._set_optimizer(optimizer, learning_rate)
 
-        if self.clip_grad is not None:
-            # Compute gradients
-            grads_and_vars = self.optimizer.compute_gradients(loss)
+        if self.mixed_precision:
+            self.loss_scaler = DynamicLossScaler()
+            self.summaries_train.append(
+                tf.summary.scalar('loss_scale', self.loss_scaler.loss_scale))
+
+        if clip_global_norm:
+            add_grad_norm_summary(self)
+
+        # Update the moving averages of batch normalization in each step
+        update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
+        with tf.control_dependencies(update_ops):
+            # NOTE: the norm of gradients is recorded in apply_gradients
+            if (self.clip_grad is None and not self.mixed_precision and
+                    accum_steps == 1 and self.grad_norm is None):
+                # Use the optimizer to apply the gradients that minimize the loss
+                # and also increment the global step counter as a single training
+                # step
+                return self.optimizer.minimize(loss, global_step=global_step)
 
-            # Clip gradients
-            clipped_grads_and_vars = self._clip_gradients(grads_and_vars,
-                                                          clip_norm)
+            # Compute gradients
+            grads_and_vars = compute_gradients(self, self.optimizer, loss)
 
-            # Create gradient updates
-            train_op = self.optimizer.apply_gradients(
-                clipped_grads_and_vars,
-                global_step=global_step)
+            def apply_fn(grads_and_vars):
+                return apply_gradients(self, self.optimizer, grads_and_vars,
+                                       clip_norm, global_step,
+                                       clip_global_norm)
 
-        else:
-            # Use the optimizer to apply the gradients that minimize the loss
-            # and also increment the global step counter as a single training
-            # step
-            train_op = self.optimizer.minimize(loss, global_step=global_step)
+            if accum_steps > 1:
+                accumulator = GradientAccumulator(accum_steps)
+                train_op = accumulator.accumulate(grads_and_vars, apply_fn)
+            else:
+                train_op = apply_fn(grads_and_vars)
 
         return train_op
 
-    def _clip_gradients(self, grads_and_vars, _clip_norm):
-        """Clip gradients.
-        Args:
-            grads_and_vars: list of (grads, vars) tuples
-            _clip_norm: if True, clip gradients norm by self.clip_grad
-        Returns:
-            clipped_grads_and_vars: list of (clipped grads, vars)
-        """
-        # TODO: Optionally add gradient noise
-
-        clipped_grads_and_vars = []
-
-        if _clip_norm:
-            # Clip gradient norm
-            for grad, var in grads_and_vars:
-                if grad is not None:
-                    clipped_grads_and_vars.append(
-                        (tf.clip_by_norm(grad, clip_norm=self.clip_grad), var))
-        else:
-            # Clip gradient
-            for grad, var in grads_and_vars:
-                if grad is not None:
-                    clipped_grads_and_vars.append(
-                        (tf.clip_by_value(grad,
-                                          clip_value_min=-self.clip_grad,
-                                          clip_value_max=self.clip_grad), var))
-
-        # TODO: Add histograms for variables, gradients (norms)
-        # self._tensorboard(trainable_vars)
-
-        return clipped_grads_and_vars
-
     def decoder(self, logits, inputs_seq_len, beam_width=1):
         """Operation for decoding.
         Args:
@@ -317,6 +364,7 @@ class CTCBase(object):
         assert beam_width >= 1, "beam_width must be >= 1"
 
         # inputs_seq_len = tf.cast(inputs_seq_len, tf.int32)
+        inputs_seq_len = self.output_seq_len(inputs_seq_len)
 
         if beam_width == 1:
             decoded, _ = tf.nn.ctc_greedy_decoder(
@@ -62,9 +62,12 @@ class MultitaskCTCBase(CTCBase):
             logits_main: A tensor of size `[T, B, num_classes]`
             logits_sub: A tensor of size `[T, B, num_classes]`
         """
+        is_training = self._create_is_training_placeholder()
+
         logits_main, logits_sub, final_state, final_state_sub = self.encoder(
             inputs, inputs_seq_len,
-            keep_prob_input, keep_prob_hidden, keep_prob_output)
+            keep_prob_input, keep_prob_hidden, keep_prob_output,
+            is_training=is_training)
 
         return logits_main, logits_sub
 
@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export the CTC model as a frozen inference-only graph, and load it.
+   The exported graph contains only the path from input features to
+   posteriors and decoded labels. Variables are converted to constants, and
+   dropout is removed (keep probabilities are fixed to 1).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+from models.encoders.core.cnn_util import fold_batch_norm, convert_to_folded
+
+INPUT_NAMES = ['input', 'inputs_seq_len']
+OUTPUT_NAMES = ['posteriors',
+                'decoded_indices', 'decoded_values', 'decoded_shape']
+
+
+def export_inference_graph(model, checkpoint_path, save_path, beam_width=1,
+                           fold_bn=False):
+    """Export the frozen inference graph.
+    Args:
+        model: An instance of the `CTC` class
+        checkpoint_path (string): path to the checkpoint to restore
+        save_path (string): path to save the frozen graph (.pb)
+        beam_width (int, optional): beam width for beam search.
+            1 disables beam search, which mean greedy decoding.
+        fold_bn (bool, optional): if True, the checkpoint is of the model
+            trained with `batch_norm=True`, and batch normalization is
+            folded into the convolutional layers. The model must be built
+            with `batch_norm=False`.
+    Returns:
+        graph_def: A frozen GraphDef
+    """
+    with tf.Graph().as_default() as graph:
+        inputs = tf.placeholder(
+            tf.float32,
+            shape=[None, None, model.input_size * model.splice],
+            name=INPUT_NAMES[0])
+        inputs_seq_len = tf.placeholder(
+            tf.int32, shape=[None], name=INPUT_NAMES[1])
+
+        # NOTE: dropout with constant keep probability 1 is not added to
+        # the graph
+        logits = model(inputs, inputs_seq_len,
+                       keep_prob_input=1.0,
+                       keep_prob_hidden=1.0,
+                       keep_prob_output=1.0)
+
+        # Convert to batch-major: `[B, T, num_classes]`
+        tf.nn.softmax(tf.transpose(logits, (1, 0, 2)), name=OUTPUT_NAMES[0])
+
+        decode_op = model.decoder(logits, inputs_seq_len,
+                                  beam_width=beam_width)
+        tf.identity(decode_op.indices, name=OUTPUT_NAMES[1])
+        tf.identity(decode_op.values, name=OUTPUT_NAMES[2])
+        tf.identity(decode_op.dense_shape, name=OUTPUT_NAMES[3])
+
+        saver = tf.train.Saver()
+        with tf.Session() as sess:
+            if fold_bn:
+                convert_to_folded(sess, fold_batch_norm(checkpoint_path),
+                                  checkpoint_path)
+            else:
+                saver.restore(sess, checkpoint_path)
+            graph_def = tf.graph_util.convert_variables_to_constants(
+                sess, graph.as_graph_def(), OUTPUT_NAMES)
+
+    # Remove unused nodes and fold constants
+    graph_def = TransformGraph(
+        graph_def, INPUT_NAMES, OUTPUT_NAMES,
+        ['strip_unused_nodes',
+         'remove_nodes(op=CheckNumerics)',
+         'fold_constants(ignore_errors=true)',
+         'sort_by_execution_order'])
+
+    with tf.gfile.GFile(save_path, 'wb') as f:
+        f.write(graph_def.SerializeToString())
+
+    return graph_def
+
+
+class FrozenCTC(object):
+    """Decode by the frozen inference graph.
+    Args:
+        graph_path (string): path to the frozen graph (.pb)
+        config (optional): tf.ConfigProto for the session
+    """
+
+    def __init__(self, graph_path, config=None):
+        start_time = time.time()
+
+        graph_def = tf.GraphDef()
+        with tf.gfile.GFile(graph_path, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+
+        self.inputs = self.graph.get_tensor_by_name(INPUT_NAMES[0] + ':0')
+        self.inputs_seq_len = self.graph.get_tensor_by_name(
+            INPUT_NAMES[1] + ':0')
+        self.posteriors_op, self.indices_op, self.values_op, self.shape_op = [
+            self.graph.get_tensor_by_name(name + ':0')
+            for name in OUTPUT_NAMES]
+
+        self.session = tf.Session(graph=self.graph, config=config)
+
+        # The time to be ready for decoding
+        self.startup_time = time.time() - start_time
+
+    def close(self):
+        self.session.close()
+
+    def posteriors(self, inputs, inputs_seq_len):
+        """
+        Args:
+            inputs (np.ndarray): A tensor of size `[B, T, input_size]`
+            inputs_seq_len (np.ndarray): A tensor of size `[B]`
+        Returns:
+            posteriors (np.ndarray): A tensor of size `[B, T, num_classes]`
+        """
+        return self.session.run(
+            self.posteriors_op,
+            feed_dict={self.inputs: inputs,
+                       self.inputs_seq_len: inputs_seq_len})
+
+    def decode(self, inputs, inputs_seq_len):
+        """
+        Args:
+            inputs (np.ndarray): A tensor of size `[B, T, input_size]`
+            inputs_seq_len (np.ndarray): A tensor of size `[B]`
+        Returns:
+            labels (list): list of np.ndarray, size of `[B]`
+        """
+        indices, values = self.session.run(
+            [self.indices_op, self.values_op],
+            feed_dict={self.inputs: inputs,
+                       self.inputs_seq_len: inputs_seq_len})
+        return [values[indices[:, 0] == i_batch]
+                for i_batch in range(len(inputs))]
@@ -0,0 +1,291 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Chunk-wise inference of the CTC model.
+   StreamingCTC: a unidirectional encoder (LSTM or GRU). Hidden states of the
+       encoder are carried over fixed-size chunks of input features, so the
+       posteriors of each chunk are the same as those of the whole utterance.
+   LatencyControlledCTC: a bidirectional LSTM encoder (BLSTM or VGG-BLSTM).
+       Each chunk is followed by a right context. Forward states are carried
+       over chunks, and backward states are re-initialized in each chunk.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import numpy as np
+import tensorflow as tf
+
+from models.encoders.core.lstm import LSTM_Encoder
+from models.encoders.core.gru import GRU_Encoder
+from models.encoders.core.blstm import BLSTM_Encoder
+from models.encoders.core.vgg_blstm import VGG_BLSTM_Encoder
+
+
+class StreamingCTC(object):
+    """Streaming inference of the CTC model.
+    Args:
+        model: An instance of the `CTC` class whose encoder is
+            unidirectional (lstm or gru)
+        chunk_size (int, optional): the number of frames in each chunk
+            (after frame stacking)
+    """
+
+    def __init__(self, model, chunk_size=10):
+        if not isinstance(model.encoder, (LSTM_Encoder, GRU_Encoder)):
+            raise ValueError(
+                'Streaming inference is supported only for the ' +
+                'unidirectional LSTM or GRU encoder.')
+        assert chunk_size > 0, 'chunk_size must be larger than 0.'
+
+        self.model = model
+        self.chunk_size = int(chunk_size)
+        self.blank_index = model.num_classes - 1
+
+        self._build()
+        self.reset()
+
+    def _build(self):
+        """Define the graph of one chunk."""
+        encoder = self.model.encoder
+
+        self.inputs_pl = tf.placeholder(
+            tf.float32,
+            shape=[1, None, self.model.input_size * self.model.splice],
+            name='chunk_input')
+        self.inputs_seq_len_pl = tf.placeholder(
+            tf.int32, shape=[1], name='chunk_seq_len')
+
+        # Placeholders of the hidden state with the same structure as the
+        # final state of the encoder
+        self.state_pl = _state_placeholders(encoder.state_size, batch_size=1)
+
+        logits, self.final_state_op = encoder(
+            self.inputs_pl, self.inputs_seq_len_pl,
+            keep_prob_input=1.0,
+            keep_prob_hidden=1.0,
+            keep_prob_output=1.0,
+            initial_state=self.state_pl)
+
+        # Convert to batch-major: `[1, T, num_classes]`
+        self.posteriors_op = tf.nn.softmax(tf.transpose(logits, (1, 0, 2)))
+
+    def reset(self):
+        """Reset the state for a new utterance."""
+        self._state = _zero_state(self.model.encoder.state_size, batch_size=1)
+
+        self._prev_label = self.blank_index
+        self.hypothesis = []
+        self.latencies = []
+
+    def feed(self, session, chunk):
+        """Run the model on a chunk and update the state.
+        Args:
+            session: session of the restored model
+            chunk (np.ndarray): A tensor of size `[T_chunk, input_size]`
+        Returns:
+            posteriors (np.ndarray): A tensor of size
+                `[T_chunk, num_classes]`
+            new_labels (list): labels emitted in this chunk
+        """
+        feed_dict = {
+            self.inputs_pl: chunk[np.newaxis],
+            self.inputs_seq_len_pl: [len(chunk)]
+        }
+        feed_dict.update(_state_feed_dict(self.state_pl, self._state))
+
+        start_time = time.time()
+        posteriors, self._state = session.run(
+            [self.posteriors_op, self.final_state_op], feed_dict=feed_dict)
+        self.latencies.append(time.time() - start_time)
+
+        posteriors = posteriors[0]
+
+        # Greedy decoding (repeated labels over chunk boundaries are merged)
+        new_labels = []
+        for label in np.argmax(posteriors, axis=1):
+            if label != self._prev_label and label != self.blank_index:
+                new_labels.append(int(label))
+            self._prev_label = label
+        self.hypothesis.extend(new_labels)
+
+        return posteriors, new_labels
+
+    def __call__(self, session, inputs):
+        """Decode an utterance chunk by chunk.
+        Args:
+            session: session of the restored model
+            inputs (np.ndarray): A tensor of size `[T, input_size]`
+        Yields:
+            posteriors (np.ndarray): A tensor of size
+                `[T_chunk, num_classes]`
+            new_labels (list): labels emitted in the chunk
+            latency (float): the time [sec] to compute the chunk
+        """
+        self.reset()
+        for t in range(0, len(inputs), self.chunk_size):
+            posteriors, new_labels = self.feed(
+                session, inputs[t:t + self.chunk_size])
+            yield posteriors, new_labels, self.latencies[-1]
+
+
+class LatencyControlledCTC(object):
+    """Latency-controlled inference of the CTC model with a bidirectional
+       LSTM encoder. The algorithmic latency is
+       `(chunk_size + right_context)` frames.
+    Args:
+        model: An instance of the `CTC` class whose encoder is blstm or
+            vgg_blstm
+        chunk_size (int, optional): the number of frames in each chunk
+            (after frame stacking)
+        right_context (int, optional): the number of future frames to look
+            ahead in each chunk
+    """
+
+    def __init__(self, model, chunk_size=20, right_context=10):
+        if not isinstance(model.encoder, (BLSTM_Encoder, VGG_BLSTM_Encoder)):
+            raise ValueError(
+                'Latency-controlled inference is supported only for the ' +
+                'BLSTM or VGG-BLSTM encoder.')
+        assert chunk_size > 0, 'chunk_size must be larger than 0.'
+        assert right_context >= 0, 'right_context must not be a negative value.'
+
+        self.model = model
+        self.chunk_size = int(chunk_size)
+        self.right_context = int(right_context)
+        self.blank_index = model.num_classes - 1
+
+        self._build()
+        self.latencies = []
+
+    def _build(self):
+        """Define the graph of one chunk (+ right context)."""
+        encoder = self.model.encoder
+
+        self.inputs_pl = tf.placeholder(
+            tf.float32,
+            shape=[None, self.chunk_size + self.right_context,
+                   self.model.input_size * self.model.splice],
+            name='chunk_input')
+        self.inputs_seq_len_pl = tf.placeholder(
+            tf.int32, shape=[None], name='chunk_seq_len_with_context')
+        self.chunk_seq_len_pl = tf.placeholder(
+            tf.int32, shape=[None], name='chunk_seq_len')
+        self.state_pl = _state_placeholders(encoder.state_size_fw)
+
+        logits, self.final_state_op = encoder(
+            self.inputs_pl, self.inputs_seq_len_pl,
+            keep_prob_input=1.0,
+            keep_prob_hidden=1.0,
+            keep_prob_output=1.0,
+            chunk_size=self.chunk_size,
+            right_context=self.right_context,
+            chunk_seq_len=self.chunk_seq_len_pl,
+            initial_state_fw=self.state_pl)
+
+        # Convert to batch-major: `[B, chunk_size, num_classes]`
+        # NOTE: outputs of the right context are discarded
+        logits = tf.transpose(logits, (1, 0, 2))[:, :self.chunk_size]
+        self.posteriors_op = tf.nn.softmax(logits)
+
+    def __call__(self, session, inputs, inputs_seq_len):
+        """Compute posteriors of a mini-batch chunk by chunk.
+        Args:
+            session: session of the restored model
+            inputs (np.ndarray): A tensor of size `[B, T, input_size]`
+            inputs_seq_len (np.ndarray): A tensor of size `[B]`
+        Returns:
+            posteriors (np.ndarray): A tensor of size `[B, T, num_classes]`
+        """
+        batch_size, max_time = inputs.shape[:2]
+        inputs_seq_len = np.array(inputs_seq_len, dtype=np.int32)
+
+        # Pad so that every chunk has the right context
+        chunk_num = int(np.ceil(max_time / self.chunk_size))
+        pad_len = chunk_num * self.chunk_size + self.right_context - max_time
+        inputs = np.pad(inputs, ((0, 0), (0, pad_len), (0, 0)),
+                        mode='constant')
+
+        posteriors = np.zeros(
+            (batch_size, chunk_num * self.chunk_size, self.model.num_classes),
+            dtype=np.float32)
+        state = _zero_state(self.model.encoder.state_size_fw, batch_size)
+        self.latencies = []
+        for t in range(0, chunk_num * self.chunk_size, self.chunk_size):
+            feed_dict = {
+                self.inputs_pl: inputs[:, t:t + self.chunk_size + self.right_context],
+                self.inputs_seq_len_pl: np.clip(
+                    inputs_seq_len - t, 0, self.chunk_size + self.right_context),
+                self.chunk_seq_len_pl: np.clip(
+                    inputs_seq_len - t, 0, self.chunk_size)
+            }
+            feed_dict.update(_state_feed_dict(self.state_pl, state))
+
+            start_time = time.time()
+            posteriors[:, t:t + self.chunk_size], state = session.run(
+                [self.posteriors_op, self.final_state_op], feed_dict=feed_dict)
+            self.latencies.append(time.time() - start_time)
+
+        return posteriors[:, :max_time]
+
+
+def _state_placeholders(state_size, batch_size=None):
+    """
+    Args:
+        state_size (tuple): sizes of the hidden state in each layer
+        batch_size (int, optional): the size of mini-batch
+    Returns:
+        tuple of placeholders with the same structure as state_size
+    """
+    state_pl = []
+    for i_layer, size in enumerate(state_size):
+        if isinstance(size, tf.contrib.rnn.LSTMStateTuple):
+            state_pl.append(tf.contrib.rnn.LSTMStateTuple(
+                tf.placeholder(tf.float32, shape=[batch_size, size.c],
+                               name='state_c_l' + str(i_layer + 1)),
+                tf.placeholder(tf.float32, shape=[batch_size, size.h],
+                               name='state_h_l' + str(i_layer + 1))))
+        else:
+            state_pl.append(
+                tf.placeholder(tf.float32, shape=[batch_size, size],
+                               name='state_l' + str(i_layer + 1)))
+    return tuple(state_pl)
+
+
+def _zero_state(state_size, batch_size):
+    """
+    Args:
+        state_size (tuple): sizes of the hidden state in each layer
+        batch_size (int): the size of mini-batch
+    Returns:
+        tuple of zero arrays with the same structure as state_size
+    """
+    state = []
+    for size in state_size:
+        if isinstance(size, tf.contrib.rnn.LSTMStateTuple):
+            state.append(tf.contrib.rnn.LSTMStateTuple(
+                np.zeros((batch_size, size.c), dtype=np.float32),
+                np.zeros((batch_size, size.h), dtype=np.float32)))
+        else:
+            state.append(np.zeros((batch_size, size), dtype=np.float32))
+    return tuple(state)
+
+
+def _state_feed_dict(state_pl, state):
+    """
+    Args:
+        state_pl (tuple): placeholders of the hidden state
+        state (tuple): values of the hidden state
+    Returns:
+        feed_dict (dict)
+    """
+    feed_dict = {}
+    for state_pl_layer, state_layer in zip(state_pl, state):
+        if isinstance(state_pl_layer, tf.contrib.rnn.LSTMStateTuple):
+            feed_dict[state_pl_layer.c] = state_layer.c
+            feed_dict[state_pl_layer.h] = state_layer.h
+        else:
+            feed_dict[state_pl_layer] = state_layer
+    return feed_dict
@@ -16,6 +16,7 @@ class CTC(CTCBase):
     Args:
         encoder_type (string): The type of an encoder
             blstm: bidirectional LSTM
+            pblstm: pyramidal bidirectional LSTM
             lstm: unidirectional LSTM
             bgru: bidirectional GRU
             gru: unidirectional GRU
@@ -27,13 +28,13 @@ class CTC(CTCBase):
         num_layers (int): the number of layers
         num_classes (int): the number of classes of target labels
             (except for a blank label)
-        lstm_impl (string, optional): a base implementation of LSTM. This is
-            not used for GRU models.
+        lstm_impl (string, optional): a base implementation of LSTM. In GRU
+            models, only CudnnLSTM is used to select the cuDNN kernels.
                 BasicLSTMCell: tf.contrib.rnn.BasicLSTMCell (no peephole)
                 LSTMCell: tf.contrib.rnn.LSTMCell
                 LSTMBlockCell: tf.contrib.rnn.LSTMBlockCell
                 LSTMBlockFusedCell: under implementation
-                CudnnLSTM: under implementation
+                CudnnLSTM: tf.contrib.cudnn_rnn (no peephole, GPU only)
             Choose the background implementation of tensorflow.
             Default is LSTMBlockCell (the fastest).
         use_peephole (bool, optional): if True, use peephole connection. This
@@ -49,6 +50,20 @@ class CTC(CTCBase):
             This is not used for GRU models.
         weight_decay (float, optional): a parameter for weight decay
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution is halved after the layer. This is
+            not used for CNN models.
+        downsample_type (string, optional): concat or subsample. This is not
+            used for CNN models.
+        batch_norm (bool, optional): if True, batch normalization is
+            performed after each convolutional layer of VGG models
+        time_conv (bool, optional): if True, the cnn_zhang encoder convolves
+            over the unspliced inputs with the receptive field of `splice`
+            frames, and inputs are not spliced on the host.
+        mixed_precision (bool, optional): if True, the encoder computes in
+            float16 with float32 master weights, and the loss is scaled
+            dynamically in training. Batch normalization, LSTMBlockCell and
+            LSTMBlockFusedCell are not supported.
     """
 
     def __init__(self,
@@ -65,11 +80,30 @@ class CTC(CTCBase):
                  clip_activation=None,
                  num_proj=None,
                  weight_decay=0.0,
-                 bottleneck_dim=None):
+                 bottleneck_dim=None,
+                 downsample_list=None,
+                 downsample_type='concat',
+                 batch_norm=False,
+                 time_conv=False,
+                 mixed_precision=False):
 
         super(CTC, self).__init__(
             input_size, splice, num_classes, lstm_impl,
-            clip_grad, weight_decay)
+            clip_grad, weight_decay, mixed_precision)
+
+        if mixed_precision and batch_norm:
+            # NOTE: the fused kernel of batch normalization supports only
+            # float32
+            raise NotImplementedError(
+                'batch_norm is not supported in mixed precision training.')
+        if mixed_precision and lstm_impl in ['LSTMBlockCell',
+                                             'LSTMBlockFusedCell']:
+            # NOTE: the kernels of LSTMBlockCell and LSTMBlockFusedCell
+            # support only float32. Replacing them silently would change
+            # the variable names, and checkpoints could not be restored with
+            # the configuration.
+            raise ValueError('%s does not support float16. Use LSTMCell in '
+                             'mixed precision training.' % lstm_impl)
 
         self.name = encoder_type + '_ctc'
 
@@ -82,7 +116,22 @@ class CTC(CTCBase):
                                               parameter_init=parameter_init,
                                               clip_activation=clip_activation,
                                               num_proj=num_proj,
-                                              bottleneck_dim=bottleneck_dim)
+                                              bottleneck_dim=bottleneck_dim,
+                                              downsample_list=downsample_list,
+                                              downsample_type=downsample_type)
+
+        elif encoder_type == 'pblstm':
+            self.encoder = load(encoder_type)(num_units=num_units,
+                                              num_layers=num_layers,
+                                              num_classes=num_classes + 1,
+                                              lstm_impl=lstm_impl,
+                                              use_peephole=use_peephole,
+                                              parameter_init=parameter_init,
+                                              clip_activation=clip_activation,
+                                              num_proj=num_proj,
+                                              bottleneck_dim=bottleneck_dim,
+                                              downsample_list=downsample_list,
+                                              downsample_type=downsample_type)
 
         elif encoder_type in ['vgg_blstm', 'vgg_lstm']:
             self.encoder = load(encoder_type)(input_size=input_size,
@@ -95,20 +144,43 @@ class CTC(CTCBase):
                                               parameter_init=parameter_init,
                                               clip_activation=clip_activation,
                                               num_proj=num_proj,
-                                              bottleneck_dim=bottleneck_dim)
+                                              bottleneck_dim=bottleneck_dim,
+                                              downsample_list=downsample_list,
+                                              downsample_type=downsample_type,
+                                              batch_norm=batch_norm)
 
         elif encoder_type in ['bgru', 'gru']:
             self.encoder = load(encoder_type)(num_units=num_units,
                                               num_layers=num_layers,
                                               num_classes=num_classes + 1,
                                               parameter_init=parameter_init,
-                                              bottleneck_dim=bottleneck_dim)
+                                              bottleneck_dim=bottleneck_dim,
+                                              use_cudnn=lstm_impl == 'CudnnLSTM',
+                                              downsample_list=downsample_list,
+                                              downsample_type=downsample_type)
 
-        elif encoder_type in ['vgg_wang', 'resnet_wang', 'cnn_zhang']:
+        elif encoder_type == 'vgg_wang':
+            self.encoder = load(encoder_type)(input_size=input_size,
+                                              splice=splice,
+                                              num_classes=num_classes + 1,
+                                              parameter_init=parameter_init,
+                                              batch_norm=batch_norm)
+
+        elif encoder_type == 'resnet_wang':
             self.encoder = load(encoder_type)(input_size=input_size,
                                               splice=splice,
                                               num_classes=num_classes + 1,
                                               parameter_init=parameter_init)
 
+        elif encoder_type == 'cnn_zhang':
+            self.encoder = load(encoder_type)(input_size=input_size,
+                                              splice=splice,
+                                              num_classes=num_classes + 1,
+                                              parameter_init=parameter_init,
+                                              time_conv=time_conv)
+            if time_conv:
+                # NOTE: the context of splice frames is covered in the graph
+                self.splice = 1
+
         else:
             raise NotImplementedError
@@ -9,6 +9,11 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from models.encoders.core.rnn_util import time_reduction
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+from models.encoders.core.cudnn_rnn import CudnnRNN_Encoder
+
 
 class BGRU_Encoder(object):
     """Bidirectional GRU-CTC model.
@@ -21,6 +26,13 @@ class BGRU_Encoder(object):
         parameter_init (float, optional): the range of uniform distribution to
             initialize weight parameters (>= 0)
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        use_cudnn (bool, optional): if True, use the fused cuDNN kernels
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is no subsampling.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
         name (string, optional): the name of encoder
     """
 
@@ -30,6 +42,9 @@ class BGRU_Encoder(object):
                  num_classes,
                  parameter_init=0.1,
                  bottleneck_dim=None,
+                 use_cudnn=False,
+                 downsample_list=None,
+                 downsample_type='concat',
                  name='bgru_encoder'):
 
         self.num_units = num_units
@@ -38,12 +53,39 @@ class BGRU_Encoder(object):
         self.parameter_init = parameter_init
         self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
             None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
         self.name = name
 
+        self.use_cudnn = use_cudnn
         self.return_hidden_states = True if num_classes == 0 else False
 
+        if use_cudnn:
+            self.cudnn_encoder = CudnnRNN_Encoder(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=num_classes,
+                rnn_type='gru',
+                bidirectional=True,
+                parameter_init=parameter_init,
+                bottleneck_dim=bottleneck_dim,
+                downsample_list=downsample_list,
+                downsample_type=downsample_type,
+                name=name)
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -54,10 +96,19 @@ class BGRU_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            is_training (bool or placeholder, optional): if False, the
+                cuDNN kernels do not allocate the reserve space for
+                back-propagation. This is used only with the cuDNN kernels.
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
             final_state: A final hidden state of the encoder
         """
+        if self.use_cudnn:
+            return self.cudnn_encoder(inputs, inputs_seq_len,
+                                      keep_prob_input, keep_prob_hidden,
+                                      keep_prob_output,
+                                      is_training=is_training)
+
         # inputs: `[B, T, input_size]`
         batch_size = tf.shape(inputs)[0]
 
@@ -87,17 +138,26 @@ class BGRU_Encoder(object):
                     cell_bw=gru_bw,
                     inputs=outputs,
                     sequence_length=inputs_seq_len,
-                    dtype=tf.float32,
+                    dtype=outputs.dtype,
                     scope=scope)
                 # NOTE: initial states are zero states by default
 
                 outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
 
+                # Reduce the time resolution for the next layer
+                if self.downsample_list[i_layer - 1]:
+                    outputs, inputs_seq_len = time_reduction(
+                        outputs, inputs_seq_len,
+                        factor=2, reduction_type=self.downsample_type)
+
         if self.return_hidden_states:
             return outputs, final_state
 
         # Reshape to apply the same weights over the timesteps
-        outputs = tf.reshape(outputs, shape=[-1, self.num_units * 2])
+        # NOTE: the feature size is doubled by concat-pooling in the last
+        # layer
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
             with tf.variable_scope('bottleneck') as scope:
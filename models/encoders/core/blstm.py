@@ -9,6 +9,15 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from models.encoders.core.rnn_util import latency_controlled_bidirectional_rnn
+from models.encoders.core.rnn_util import time_reduction
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+from models.encoders.core.lstm_factory import lstm_cell
+from models.encoders.core.lstm_factory import lstm_layer
+from models.encoders.core.lstm_factory import check_lstm_impl
+from models.encoders.core.cudnn_rnn import CudnnRNN_Encoder
+
 
 class BLSTM_Encoder(object):
     """Bidirectional LSTM encoder.
@@ -29,6 +38,12 @@ class BLSTM_Encoder(object):
         clip_activation (float, optional): the range of activation clipping (> 0)
         num_proj (int, optional): the number of nodes in the projection layer
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is no subsampling.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
         name (string, optional): the name of encoder
     """
 
@@ -42,6 +57,8 @@ class BLSTM_Encoder(object):
                  clip_activation=5.0,
                  num_proj=None,
                  bottleneck_dim=None,
+                 downsample_list=None,
+                 downsample_type='concat',
                  name='blstm_encoder'):
 
         self.num_units = num_units
@@ -51,7 +68,7 @@ class BLSTM_Encoder(object):
         self.use_peephole = use_peephole
         self.parameter_init = parameter_init
         self.clip_activation = clip_activation
-        if lstm_impl != 'LSTMCell':
+        if lstm_impl not in ['LSTMCell', 'LSTMBlockFusedCell']:
             self.num_proj = None
         elif num_proj not in [None, 0]:
             self.num_proj = int(num_proj)
@@ -59,12 +76,50 @@ class BLSTM_Encoder(object):
             self.num_proj = None
         self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
             None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
         self.name = name
 
         self.return_hidden_states = True if num_classes == 0 else False
 
+        check_lstm_impl(lstm_impl)
+        if lstm_impl == 'CudnnLSTM':
+            # NOTE: peephole and activation clipping are not supported
+            self.cudnn_encoder = CudnnRNN_Encoder(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=num_classes,
+                rnn_type='lstm',
+                bidirectional=True,
+                parameter_init=parameter_init,
+                num_proj=num_proj,
+                bottleneck_dim=bottleneck_dim,
+                downsample_list=downsample_list,
+                downsample_type=downsample_type,
+                name=name)
+
+    @property
+    def state_size_fw(self):
+        """The sizes of the forward hidden state in each layer, which is
+           carried over chunks in the latency-controlled mode."""
+        output_size = self.num_units if self.num_proj is None else self.num_proj
+        return tuple(tf.contrib.rnn.LSTMStateTuple(self.num_units, output_size)
+                     for _ in range(self.num_layers))
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 chunk_size=None, right_context=0, chunk_seq_len=None,
+                 initial_state_fw=None, is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -75,13 +130,43 @@ class BLSTM_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            chunk_size (int, optional): the number of frames in a chunk. If
+                set, the latency-controlled mode is used for inference, and
+                inputs are a chunk followed by the right context.
+            right_context (int, optional): the number of frames in the right
+                context in the latency-controlled mode
+            chunk_seq_len (placeholder, optional): A tensor of size `[B]`.
+                The number of valid frames in the chunk (except for the right
+                context) in the latency-controlled mode
+            initial_state_fw (optional): Initial forward states of all layers
+                with the structure of `state_size_fw` in the
+                latency-controlled mode. Default is zero states.
+            is_training (bool or placeholder, optional): if False, the
+                cuDNN kernels do not allocate the reserve space for
+                back-propagation. This is used only with CudnnLSTM.
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
-            final_state: A final hidden state of the encoder
+            final_state: A final hidden state of the encoder. In the
+                latency-controlled mode, forward states of all layers at the
+                end of the chunk.
         """
+        if chunk_size is not None and self.lstm_impl in ['LSTMBlockFusedCell', 'CudnnLSTM']:
+            raise NotImplementedError(
+                'The latency-controlled mode is not supported for %s.' %
+                self.lstm_impl)
+        if chunk_size is not None and any(self.downsample_list):
+            raise NotImplementedError(
+                'The latency-controlled mode is not supported with time '
+                'subsampling.')
+
+        if self.lstm_impl == 'CudnnLSTM':
+            return self.cudnn_encoder(inputs, inputs_seq_len,
+                                      keep_prob_input, keep_prob_hidden,
+                                      keep_prob_output,
+                                      is_training=is_training)
+
         # inputs: `[B, T, input_size]`
         batch_size = tf.shape(inputs)[0]
-        input_size = tf.shape(inputs)[2]
 
         # Dropout for the input-hidden connection
         outputs = tf.nn.dropout(
@@ -90,172 +175,79 @@ class BLSTM_Encoder(object):
         initializer = tf.random_uniform_initializer(
             minval=-self.parameter_init, maxval=self.parameter_init)
 
-        # Hidden layers
-        if self.lstm_impl == 'CudnnLSTM':
-            stacked_lstm = tf.contrib.cudnn_rnn.CudnnLSTM(
-                num_layers=self.num_layers,
-                num_units=self.num_units,
-                input_size=input_size,
-                input_mode='auto_select',
-                direction='bidirectional',
-                dropout=0,
-                seed=0)
-
-            params_size_t = stacked_lstm.params_size()
-            init_h = tf.zeros(
-                [self.num_layers * 2, batch_size, self.num_units],
-                dtype=tf.float32, name="init_lstm_h")
-            init_c = tf.zeros(
-                [self.num_layers * 2, batch_size, self.num_units],
-                dtype=tf.float32, name="init_lstm_c")
-            # cudnn_params = tf.Variable(tf.random_uniform(
-            #     [params_size_t], -self.parameter_init, self.parameter_init),
-            #     validate_shape=False, name="lstm_params", trainable=True)
-            lstm_params = tf.get_variable(
-                "lstm_params",
-                initializer=tf.random_uniform(
-                    [params_size_t], -self.parameter_init, self.parameter_init),
-                validate_shape=False,
-                trainable=True)
-            # TODO is_training=is_training should be changed!
-
-            # outputs = tf.contrib.layers.fully_connected(
-            #     activation_fn=None, inputs=outputs,
-            #     num_outputs=nproj, scope="projection")
-            # TODO: add projection layers
-
-            outputs, output_h, output_c = stacked_lstm(
-                input_data=inputs,
-                input_h=init_h,
-                input_c=init_c,
-                params=lstm_params,
-                is_training=True)
-            # NOTE: outputs: `[T, B, num_units * num_direction]`
-
-            final_state = tf.contrib.rnn.LSTMStateTuple(h=output_h, c=output_c)
-            # TODO: add dropout
-            # raise NotImplementedError
+        if chunk_size is None:
+            # NOTE: stack time-major layers to avoid transposes in each layer
+            outputs = tf.transpose(outputs, (1, 0, 2))
 
-        else:
-            for i_layer in range(1, self.num_layers + 1, 1):
-                with tf.variable_scope('blstm_hidden' + str(i_layer),
-                                       initializer=initializer) as scope:
-
-                    if self.lstm_impl == 'BasicLSTMCell':
-                        lstm_fw = tf.contrib.rnn.BasicLSTMCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            state_is_tuple=True,
-                            activation=tf.tanh)
-                        lstm_bw = tf.contrib.rnn.BasicLSTMCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            state_is_tuple=True,
-                            activation=tf.tanh)
-
-                    elif self.lstm_impl == 'LSTMCell':
-                        lstm_fw = tf.contrib.rnn.LSTMCell(
-                            self.num_units,
-                            use_peepholes=self.use_peephole,
-                            cell_clip=self.clip_activation,
-                            num_proj=self.num_proj,
-                            forget_bias=1.0,
-                            state_is_tuple=True)
-                        lstm_bw = tf.contrib.rnn.LSTMCell(
-                            self.num_units,
-                            use_peepholes=self.use_peephole,
-                            cell_clip=self.clip_activation,
-                            num_proj=self.num_proj,
-                            forget_bias=1.0,
-                            state_is_tuple=True)
-
-                    elif self.lstm_impl == 'LSTMBlockCell':
-                        # NOTE: This should be faster than
-                        # tf.contrib.rnn.LSTMCell
-                        lstm_fw = tf.contrib.rnn.LSTMBlockCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            # clip_cell=True,
-                            use_peephole=self.use_peephole)
-                        lstm_bw = tf.contrib.rnn.LSTMBlockCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            # clip_cell=True,
-                            use_peephole=self.use_peephole)
-                        # TODO: cell clipping (update for rc1.3)
-
-                    elif self.lstm_impl == 'LSTMBlockFusedCell':
-                        # NOTE: This should be faster than
-                        # tf.contrib.rnn.LSTMBlockFusedCell
-                        lstm_fw = tf.contrib.rnn.LSTMBlockFusedCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            # clip_cell=True,
-                            use_peephole=self.use_peephole)
-                        lstm_bw = tf.contrib.rnn.LSTMBlockFusedCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            # clip_cell=True,
-                            use_peephole=self.use_peephole)
-                        # TODO: cell clipping (update for rc1.3)
-                        lstm_bw = tf.contrib.rnn.TimeReversedFusedRNN(lstm_bw)
-
-                    else:
-                        raise IndexError(
-                            'lstm_impl is "BasicLSTMCell" or "LSTMCell" or ' +
-                            '"LSTMBlockCell" or "LSTMBlockFusedCell" or ' +
-                            '"CudnnLSTM".')
-
-                    if self.lstm_impl == 'LSTMBlockFusedCell':
-                        with tf.variable_scope("lstm_fw") as scope:
-                            outputs_fw, final_state_fw = lstm_bw(
-                                outputs, dtype=tf.float32,
-                                sequence_length=inputs_seq_len, scope=scope)
-                        with tf.variable_scope("lstm_bw") as scope:
-                            outputs_bw, final_state_bw = lstm_bw(
-                                outputs, dtype=tf.float32,
-                                sequence_length=inputs_seq_len, scope=scope)
-                        final_state = tf.contrib.rnn.LSTMStateTuple(
-                            h=final_state_fw, c=final_state_bw)
-
-                        # TODO: add dropout
-
-                        # outputs = tf.concat_v2([outputs_fw, outputs_bw], 2, name="output")
-                        outputs = tf.concat(
-                            axis=2, values=[outputs_fw, outputs_bw])
-
-                        # if self.num_proj > 0:
-                        #     outputs = tf.contrib.layers.fully_connected(
-                        #         activation_fn=None, inputs=outputs,
-                        #         num_outputs=self.num_proj, scope="projection")
-                        # TODO: add projection layers
-                    else:
-                        # Dropout for the hidden-hidden connections
-                        lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                            lstm_fw, output_keep_prob=keep_prob_hidden)
-                        lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                            lstm_bw, output_keep_prob=keep_prob_hidden)
-
-                        (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                            cell_fw=lstm_fw,
-                            cell_bw=lstm_bw,
-                            inputs=outputs,
-                            sequence_length=inputs_seq_len,
-                            dtype=tf.float32,
-                            scope=scope)
-                        # NOTE: initial states are zero states by default
-
-                        outputs = tf.concat(
-                            axis=2, values=[outputs_fw, outputs_bw])
+        # Hidden layers
+        final_state_fw_list = []
+        for i_layer in range(1, self.num_layers + 1, 1):
+            with tf.variable_scope('blstm_hidden' + str(i_layer),
+                                   initializer=initializer) as scope:
+
+                if chunk_size is None:
+                    outputs, final_state = lstm_layer(
+                        outputs, inputs_seq_len,
+                        lstm_impl=self.lstm_impl,
+                        num_units=self.num_units,
+                        keep_prob=keep_prob_hidden,
+                        bidirectional=True,
+                        use_peephole=self.use_peephole,
+                        clip_activation=self.clip_activation,
+                        num_proj=self.num_proj,
+                        parameter_init=self.parameter_init,
+                        time_major=True,
+                        scope=scope)
+                    # NOTE: initial states are zero states by default
+
+                else:
+                    # Dropout for the hidden-hidden connections
+                    lstm_fw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_cell(self.lstm_impl, self.num_units,
+                                  self.use_peephole, self.clip_activation,
+                                  self.num_proj),
+                        output_keep_prob=keep_prob_hidden)
+                    lstm_bw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_cell(self.lstm_impl, self.num_units,
+                                  self.use_peephole, self.clip_activation,
+                                  self.num_proj),
+                        output_keep_prob=keep_prob_hidden)
+
+                    (outputs_fw, outputs_bw), final_state_fw = latency_controlled_bidirectional_rnn(
+                        cell_fw=lstm_fw,
+                        cell_bw=lstm_bw,
+                        inputs=outputs,
+                        inputs_seq_len=inputs_seq_len,
+                        chunk_size=chunk_size,
+                        right_context=right_context,
+                        chunk_seq_len=chunk_seq_len,
+                        initial_state_fw=None if initial_state_fw is None else initial_state_fw[i_layer - 1],
+                        scope=scope)
+                    final_state_fw_list.append(final_state_fw)
+                    final_state = tuple(final_state_fw_list)
+
+                    outputs = tf.concat(
+                        axis=2, values=[outputs_fw, outputs_bw])
+
+                # Reduce the time resolution for the next layer
+                if self.downsample_list[i_layer - 1]:
+                    outputs, inputs_seq_len = time_reduction(
+                        outputs, inputs_seq_len,
+                        factor=2, reduction_type=self.downsample_type,
+                        time_major=chunk_size is None)
+
+        if chunk_size is None:
+            # Convert to batch-major: `[B, T, output_size]`
+            outputs = tf.transpose(outputs, (1, 0, 2))
 
         if self.return_hidden_states:
             return outputs, final_state
 
         # Reshape to apply the same weights over the timesteps
-        if self.num_proj is None:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_units * 2])
-        else:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_proj * 2])
+        # NOTE: the feature size is doubled by concat-pooling in the last
+        # layer
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
             with tf.variable_scope('bottleneck') as scope:
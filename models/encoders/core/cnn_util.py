@@ -7,8 +7,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
 import tensorflow as tf
 
+# Parameters of batch normalization
+BN_DECAY = 0.999
+BN_EPSILON = 0.001
+
 
 def max_pool(bottom, name='max_pool'):
     """A max pooling layer.
@@ -44,27 +49,122 @@ def avg_pool(bottom, name='avg_pool'):
 
 
 def conv_layer(bottom, filter_shape, parameter_init,
-               relu=True, name='conv'):
+               relu=True, batch_norm=False, is_training=True, name='conv'):
     """A convolutional layer
     Args:
         bottom: A tensor of size `[B * T, H, W, C]`
         filter_shape (list): A list of
             `[height, width, input_channel, output_channel]`
+        batch_norm (bool, optional): if True, batch normalization is
+            performed before the activation instead of adding the bias. Use
+            `fold_batch_norm` to convert the trained weights to the layer
+            without batch normalization for inference.
+        is_training (bool or placeholder, optional): if True, normalize with
+            the statistics of the mini-batch and update the moving averages
         name (string): A layer name
     Returns:
         outputs: A tensor of size `[B * T, H, W, output_channel]`
     """
     with tf.variable_scope(name):
-        W = tf.Variable(tf.truncated_normal(shape=filter_shape,
-                                            stddev=parameter_init),
-                        name='weight')
-        b = tf.Variable(tf.zeros(shape=filter_shape[-1]), name='bias')
-        conv_bottom = tf.nn.conv2d(bottom, W,
+        # NOTE: variables are shared across the model towers
+        W = tf.get_variable(
+            'weight', shape=filter_shape,
+            initializer=tf.truncated_normal_initializer(stddev=parameter_init))
+        # NOTE: the weights are cast to float16 in mixed precision training
+        conv_bottom = tf.nn.conv2d(bottom, tf.cast(W, bottom.dtype),
                                    strides=[1, 1, 1, 1],
                                    padding='SAME')
-        outputs = tf.nn.bias_add(conv_bottom, b)
+
+        if batch_norm:
+            # NOTE: the bias is absorbed in the shift of batch normalization
+            outputs = tf.contrib.layers.batch_norm(
+                conv_bottom,
+                decay=BN_DECAY,
+                center=True,
+                scale=True,
+                epsilon=BN_EPSILON,
+                is_training=is_training,
+                fused=True,
+                scope='batch_norm')
+            # NOTE: the moving averages are updated by tf.GraphKeys.UPDATE_OPS
+        else:
+            b = tf.get_variable('bias', shape=filter_shape[-1:],
+                                initializer=tf.zeros_initializer())
+            outputs = tf.nn.bias_add(conv_bottom, tf.cast(b, bottom.dtype))
 
         if not relu:
             return outputs
 
         return tf.nn.relu(outputs)
+
+
+def fold_batch_norm(bn_model_path):
+    """Fold batch normalization into the weights and biases of the
+       convolutional layers.
+    Args:
+        bn_model_path (string): path to the checkpoint of the model with
+            `batch_norm=True`
+    Returns:
+        folded_weights (dict): A dictionary of the names of variables of
+            convolutional layers without batch normalization and the
+            folded values
+    """
+    reader = tf.train.NewCheckpointReader(bn_model_path)
+    var_names = reader.get_variable_to_shape_map().keys()
+
+    folded_weights = {}
+    for var_name in var_names:
+        if not var_name.endswith('/batch_norm/moving_mean'):
+            continue
+        layer_name = var_name[:-len('/batch_norm/moving_mean')]
+
+        weight = reader.get_tensor(layer_name + '/weight')
+        gamma = reader.get_tensor(layer_name + '/batch_norm/gamma')
+        beta = reader.get_tensor(layer_name + '/batch_norm/beta')
+        mean = reader.get_tensor(layer_name + '/batch_norm/moving_mean')
+        variance = reader.get_tensor(
+            layer_name + '/batch_norm/moving_variance')
+
+        # y = gamma * (conv(x, W) - mean) / sqrt(variance + eps) + beta
+        #   = conv(x, W * scale) + (beta - mean * scale)
+        scale = gamma / np.sqrt(variance + BN_EPSILON)
+        folded_weights[layer_name + '/weight'] = weight * scale
+        folded_weights[layer_name + '/bias'] = beta - mean * scale
+
+    return folded_weights
+
+
+def convert_to_folded(session, folded_weights, bn_model_path,
+                      save_path=None):
+    """Restore the model without batch normalization, which runs faster in
+       inference, from the checkpoint of the model with batch normalization.
+    Args:
+        session: A session of the graph built with `batch_norm=False`
+        folded_weights (dict): the outputs of `fold_batch_norm`
+        bn_model_path (string): path to the checkpoint of the model with
+            `batch_norm=True`
+        save_path (string, optional): path to save the converted checkpoint
+    Returns:
+        The path to the saved checkpoint, or None if save_path is None
+    """
+    var_dict = dict((v.name.split(':')[0], v) for v in tf.global_variables())
+    for var_name in folded_weights.keys():
+        if var_name not in var_dict:
+            raise ValueError('%s is not found in the graph.' % var_name)
+
+    # Restore the other variables such as the LSTM layers by names
+    other_vars = [v for var_name, v in var_dict.items()
+                  if var_name not in folded_weights]
+    session.run(tf.global_variables_initializer())
+    tf.train.Saver(var_list=other_vars).restore(session, bn_model_path)
+
+    for var_name, value in folded_weights.items():
+        var = var_dict[var_name]
+        if tuple(var.get_shape().as_list()) != value.shape:
+            raise ValueError('The shape of %s should be %s.' %
+                             (var.name, str(value.shape)))
+        var.load(value, session)
+
+    if save_path is None:
+        return None
+    return tf.train.Saver().save(session, save_path)
@@ -26,6 +26,11 @@ class CNN_Encoder(object):
             (except for a blank label)
         parameter_init (float, optional): Range of uniform distribution to
             initialize weight parameters
+        time_conv (bool, optional): if True, convolve over the whole
+            utterance of unspliced inputs `[B, T, input_size]` instead of
+            the spliced window of each frame. The time widths of filters are
+            chosen so that the receptive field is `splice` frames, and each
+            frame is computed only once.
         name (string, optional): the name of encoder
     """
 
@@ -34,19 +39,36 @@ class CNN_Encoder(object):
                  splice,
                  num_classes,
                  parameter_init=0.1,
+                 time_conv=False,
                  name='cnn_encoder'):
 
         self.input_size = input_size
         self.splice = splice
         self.num_classes = num_classes
         self.parameter_init = parameter_init
+        self.time_conv = time_conv
         self.name = name
 
+    @property
+    def time_widths(self):
+        """The time widths of filters of the 10 convolutional layers in the
+           time convolution. Widths of 5 frames are used in lower layers until
+           the receptive field reaches `splice` frames."""
+        time_widths = []
+        receptive_field = 1
+        for _ in range(10):
+            time_width = min(5, self.splice - receptive_field + 1)
+            time_widths.append(time_width)
+            receptive_field += time_width - 1
+        return time_widths
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_hidden, keep_prob_input, keep_prob_output):
+                 keep_prob_hidden, keep_prob_input, keep_prob_output,
+                 is_training=True):
         """Construct model graph.
         Args:
-            inputs (placeholder): A tensor of size`[B, T, input_size]`
+            inputs (placeholder): A tensor of size`[B, T, input_size * splice]`,
+                or `[B, T, input_size]` in the time convolution
             inputs_seq_len (placeholder): A tensor of size` [B]`
             keep_prob_input (placeholder, float): A probability to keep nodes
                 in the input-hidden connection
@@ -54,12 +76,18 @@ class CNN_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            is_training (bool or placeholder, optional): not used. This is
+                for the same interface as the encoders with batch
+                normalization.
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
             final_state: A final hidden state of the encoder
         """
         # TODO: input dropout is not performed
 
+        if self.time_conv:
+            return self._time_conv(inputs, inputs_seq_len, keep_prob_hidden)
+
         # inputs: 3D `[batch_size, max_time, input_size * splice]`
         batch_size = tf.shape(inputs)[0]
         max_time = tf.shape(inputs)[1]
@@ -173,18 +201,99 @@ class CNN_Encoder(object):
 
         return logits, None
 
+    def _time_conv(self, inputs, inputs_seq_len, keep_prob_hidden):
+        """Construct model graph of the time convolution. Convolutional
+           layers are applied once over the feature map of the whole
+           utterance, so the overlapping windows of neighbouring frames are
+           not recomputed.
+        Args:
+            inputs (placeholder): A tensor of size`[B, T, input_size]`
+            inputs_seq_len (placeholder): A tensor of size` [B]`
+            keep_prob_hidden (placeholder, float): A probability to keep nodes
+                in the hidden-hidden connection
+        Returns:
+            logits: A tensor of size `[T, B, num_classes]`
+            final_state: None
+        """
+        # inputs: 3D `[batch_size, max_time, input_size]`
+        batch_size = tf.shape(inputs)[0]
+        max_time = tf.shape(inputs)[1]
+
+        # Reshape to 4D tensor `[batch_size, max_time, input_size / 3, 3]`
+        outputs = tf.reshape(
+            inputs,
+            shape=[batch_size, max_time, int(self.input_size / 3), 3])
+
+        # NOTE: outputs of the padded frames must be zero as the padding of
+        # the convolution at the end of each utterance
+        mask = tf.sequence_mask(
+            inputs_seq_len, maxlen=max_time, dtype=inputs.dtype)
+        mask = tf.reshape(mask, shape=[batch_size, max_time, 1, 1])
+
+        time_widths = self.time_widths
+        in_channels = 3
+
+        # 1-10 layers
+        for i_layer in range(1, 11, 1):
+            out_channels = 128 if i_layer <= 4 else 256
+            scope = 'conv128' if i_layer <= 4 else 'conv256'
+            with tf.variable_scope(scope):
+                outputs = self._conv_layer(
+                    outputs,
+                    filter_shape=[time_widths[i_layer - 1], 3,
+                                  in_channels, out_channels],
+                    name='conv%d' % i_layer)
+                outputs = self._activation(outputs, layer='relu')
+                if i_layer == 1:
+                    outputs = self._max_pool(outputs, name='pool')
+                outputs *= mask
+
+                # Dropout
+                outputs = tf.nn.dropout(outputs, keep_prob_hidden)
+            in_channels = out_channels
+
+        # Reshape to 2D tensor `[batch_size * max_time, new_h * 256]`
+        new_h = math.ceil(self.input_size / 3 / 3)  # expected to be 14
+        outputs = tf.reshape(
+            outputs, shape=[batch_size * max_time, new_h * 256])
+
+        # 11-13th fc
+        with tf.variable_scope('fc'):
+            for i_layer in range(11, 14, 1):
+                num_outputs = 1024 if i_layer != 13 else self.num_classes
+                outputs = tf.contrib.layers.fully_connected(
+                    inputs=outputs,
+                    num_outputs=num_outputs,
+                    activation_fn=tf.nn.relu,
+                    scope='fc%d' % i_layer)
+
+                if i_layer != 13:
+                    # Dropout
+                    outputs = tf.nn.dropout(outputs, keep_prob_hidden)
+
+        # Reshape back to 3D tensor `[batch_size, max_time, num_classes]`
+        logits = tf.reshape(
+            outputs, shape=[batch_size, max_time, self.num_classes])
+
+        # Convert to time-major: `[max_time, batch_size, num_classes]'
+        logits = tf.transpose(logits, (1, 0, 2))
+
+        return logits, None
+
     def _max_pool(self, bottom, name='max_pool'):
-        """A max pooling layer.
+        """A max pooling layer along the frequency axis.
         Args:
-            bottom: A tensor of size `[B * T, H, W, C]`
+            bottom: A tensor of size `[B * T, H, W, C]`, or `[B, T, H, C]` in
+                the time convolution
             name: A layer name
         Returns:
-            A tensor of size `[B * T, H / 3, W, C]`
+            A tensor of size `[B * T, H / 3, W, C]`, or `[B, T, H / 3, C]`
         """
+        ksize = [1, 1, 3, 1] if self.time_conv else [1, 3, 1, 1]
         return tf.nn.max_pool(
             bottom,
-            ksize=[1, 3, 1, 1],
-            strides=[1, 3, 1, 1],
+            ksize=ksize,
+            strides=ksize,
             padding='SAME', name=name)
 
     def _conv_layer(self, bottom, filter_shape, name):
@@ -198,15 +307,18 @@ class CNN_Encoder(object):
             outputs: A tensor of size `[B * T, H, W, output_channel]`
         """
         with tf.variable_scope(name):
-            W = tf.Variable(tf.truncated_normal(shape=filter_shape,
-                                                stddev=self.parameter_init),
-                            name='weight')
-            b = tf.Variable(tf.zeros(shape=filter_shape[-1]),
-                            name='bias')
-            conv_bottom = tf.nn.conv2d(bottom, W,
+            W = tf.get_variable(
+                'weight', shape=filter_shape,
+                initializer=tf.truncated_normal_initializer(
+                    stddev=self.parameter_init))
+            b = tf.get_variable('bias', shape=filter_shape[-1:],
+                                initializer=tf.zeros_initializer())
+            # NOTE: the weights are cast to float16 in mixed precision
+            # training
+            conv_bottom = tf.nn.conv2d(bottom, tf.cast(W, bottom.dtype),
                                        strides=[1, 1, 1, 1],
                                        padding='SAME')
-            return tf.nn.bias_add(conv_bottom, b)
+            return tf.nn.bias_add(conv_bottom, tf.cast(b, bottom.dtype))
             # NOTE: not performe activation
 
     def _activation(self, bottom, layer):
@@ -0,0 +1,521 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""RNN encoder on the fused cuDNN kernels, and conversion of the trained
+   weights to tf.contrib.rnn.LSTMBlockCell for inference on CPU."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from models.encoders.core.rnn_util import time_reduction
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+
+
+class CudnnRNN_Encoder(object):
+    """(Bidirectional) LSTM or GRU encoder on the fused cuDNN kernels.
+       Each layer and direction is a single-layer cuDNN RNN so that dropout,
+       projection and time subsampling can be applied between layers, and
+       the backward direction starts from the last valid frame of each
+       utterance.
+    Args:
+        num_units (int): the number of units in each layer
+        num_layers (int): the number of layers
+        num_classes (int): the number of classes of target labels
+            (except for a blank label). if 0, return hidden states before
+            passing through the softmax layer
+        rnn_type (string, optional): lstm or gru
+        bidirectional (bool, optional): if True, use bidirectional RNNs
+        parameter_init (float, optional): the range of uniform distribution to
+            initialize weight parameters (>= 0)
+        num_proj (int, optional): the number of nodes in the linear projection
+            layer after each layer
+        bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is no subsampling.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
+        name (string, optional): the name of encoder
+    """
+
+    def __init__(self,
+                 num_units,
+                 num_layers,
+                 num_classes,
+                 rnn_type='lstm',
+                 bidirectional=True,
+                 parameter_init=0.1,
+                 num_proj=None,
+                 bottleneck_dim=None,
+                 downsample_list=None,
+                 downsample_type='concat',
+                 name='cudnn_rnn_encoder'):
+
+        if rnn_type not in ['lstm', 'gru']:
+            raise ValueError(
+                'rnn_type should be one of ["lstm", "gru"], you provided %s.' %
+                (rnn_type))
+
+        self.num_units = num_units
+        self.num_layers = num_layers
+        self.num_classes = num_classes
+        self.rnn_type = rnn_type
+        self.bidirectional = bidirectional
+        self.parameter_init = parameter_init
+        self.num_proj = int(num_proj) if num_proj not in [
+            None, 0] else None
+        self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
+            None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
+        self.name = name
+
+        self.return_hidden_states = True if num_classes == 0 else False
+
+        # (cudnn_rnn, params) of each layer and direction
+        self._rnn_list = []
+
+    @property
+    def state_size(self):
+        """The sizes of the hidden state in each layer of the unidirectional
+           encoder. This has the same structure as the final state returned
+           by `__call__`."""
+        if self.rnn_type == 'lstm':
+            return tuple(tf.contrib.rnn.LSTMStateTuple(self.num_units,
+                                                       self.num_units)
+                         for _ in range(self.num_layers))
+        return tuple(self.num_units for _ in range(self.num_layers))
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
+    def __call__(self, inputs, inputs_seq_len,
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 initial_state=None, is_training=True):
+        """Construct model graph.
+        Args:
+            inputs (placeholder): A tensor of size`[B, T, input_size]`
+            inputs_seq_len (placeholder): A tensor of size` [B]`
+            keep_prob_input (placeholder, float): A probability to keep nodes
+                in the input-hidden connection
+            keep_prob_hidden (placeholder, float): A probability to keep nodes
+                in the hidden-hidden connection
+            keep_prob_output (placeholder, float): A probability to keep nodes
+                in the hidden-output connection
+            initial_state (optional): An initial hidden state of the
+                unidirectional encoder with the structure of `state_size`.
+                Default is zero states.
+            is_training (bool or placeholder, optional): if False, build
+                the graph for inference only. With a boolean placeholder,
+                both graphs are built and switched by the placeholder.
+        Returns:
+            logits: A tensor of size `[T, B, num_classes]`
+            final_state: A final hidden state of the encoder. This is the
+                final state of each layer in the unidirectional encoder, and
+                `(fw, bw)` of the last layer in the bidirectional encoder.
+        """
+        if initial_state is not None and self.bidirectional:
+            raise NotImplementedError(
+                'initial_state is not supported in the bidirectional encoder.')
+
+        # inputs: `[B, T, input_size]`
+        batch_size = tf.shape(inputs)[0]
+
+        # Dropout for the input-hidden connection
+        outputs = tf.nn.dropout(
+            inputs, keep_prob_input, name='dropout_input')
+
+        # Convert to time-major: `[T, B, input_size]`
+        outputs = tf.transpose(outputs, (1, 0, 2))
+
+        # Hidden layers
+        self._rnn_list = []
+        final_state_list = []
+        for i_layer in range(1, self.num_layers + 1, 1):
+            if self.bidirectional:
+                scope = 'b' + self.rnn_type + '_hidden' + str(i_layer)
+            else:
+                scope = self.rnn_type + '_hidden' + str(i_layer)
+            with tf.variable_scope(scope):
+                outputs, final_state = cudnn_rnn_layer(
+                    outputs, inputs_seq_len,
+                    num_units=self.num_units,
+                    rnn_type=self.rnn_type,
+                    bidirectional=self.bidirectional,
+                    initial_state=None if initial_state is None else initial_state[
+                        i_layer - 1],
+                    parameter_init=self.parameter_init,
+                    is_training=is_training,
+                    rnn_list=self._rnn_list)
+            final_state_list.append(final_state)
+
+            # Linear projection
+            if self.num_proj is not None:
+                with tf.variable_scope('projection' + str(i_layer)) as scope:
+                    outputs = tf.contrib.layers.fully_connected(
+                        outputs, self.num_proj,
+                        activation_fn=None,
+                        weights_initializer=tf.truncated_normal_initializer(
+                            stddev=self.parameter_init),
+                        biases_initializer=None,
+                        scope=scope)
+
+            # Dropout for the hidden-hidden connections
+            outputs = tf.nn.dropout(
+                outputs, keep_prob_hidden, name='dropout_hidden' + str(i_layer))
+
+            # Reduce the time resolution for the next layer
+            if self.downsample_list[i_layer - 1]:
+                outputs, inputs_seq_len = time_reduction(
+                    outputs, inputs_seq_len,
+                    factor=2, reduction_type=self.downsample_type,
+                    time_major=True)
+
+        if not self.bidirectional:
+            final_state = tuple(final_state_list)
+
+        # Convert to batch-major: `[B, T, output_size]`
+        outputs = tf.transpose(outputs, (1, 0, 2))
+
+        if self.return_hidden_states:
+            return outputs, final_state
+
+        # Reshape to apply the same weights over the timesteps
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
+
+        if self.bottleneck_dim is not None:
+            with tf.variable_scope('bottleneck') as scope:
+                outputs = tf.contrib.layers.fully_connected(
+                    outputs, self.bottleneck_dim,
+                    activation_fn=tf.nn.relu,
+                    weights_initializer=tf.truncated_normal_initializer(
+                        stddev=self.parameter_init),
+                    biases_initializer=tf.zeros_initializer(),
+                    scope=scope)
+
+                # Dropout for the hidden-output connections
+                outputs = tf.nn.dropout(
+                    outputs, keep_prob_output, name='dropout_output_bottle')
+
+        with tf.variable_scope('output') as scope:
+            logits_2d = tf.contrib.layers.fully_connected(
+                outputs, self.num_classes,
+                activation_fn=None,
+                weights_initializer=tf.truncated_normal_initializer(
+                    stddev=self.parameter_init),
+                biases_initializer=tf.zeros_initializer(),
+                scope=scope)
+
+            # Reshape back to the original shape
+            logits = tf.reshape(
+                logits_2d, shape=[batch_size, -1, self.num_classes])
+
+            # Convert to time-major: `[T, B, num_classes]'
+            logits = tf.transpose(logits, (1, 0, 2))
+
+            # Dropout for the hidden-output connections
+            logits = tf.nn.dropout(
+                logits, keep_prob_output, name='dropout_output')
+            # NOTE: This may lead to bad results
+
+            return logits, final_state
+
+    def block_cell_weights(self, session):
+        """Evaluate the weights of all layers in the layout of
+           tf.contrib.rnn.LSTMBlockCell. This requires cuDNN (GPU).
+        Args:
+            session: A session in which the trained weights are restored
+        Returns:
+            A list of `(kernel, bias)` of each layer and direction in the
+                order of the creation of LSTMBlockCell variables in the
+                encoders with `lstm_impl='LSTMBlockCell'`
+        """
+        if self.rnn_type != 'lstm':
+            raise NotImplementedError(
+                'Only LSTM can be converted to LSTMBlockCell.')
+        if any(self.downsample_list):
+            raise NotImplementedError(
+                'Time subsampling is not supported in the encoders with '
+                'LSTMBlockCell.')
+        return cudnn_to_block_cell_weights(session, self._rnn_list,
+                                           self.num_units, self.num_proj)
+
+
+def _cudnn_rnn(inputs, num_units, rnn_type, initial_state, parameter_init,
+               is_training, rnn_list):
+    """Run a single-layer unidirectional cuDNN RNN.
+    Args:
+        inputs: A tensor of size `[T, B, input_size]`
+        num_units (int): the number of units
+        rnn_type (string): lstm or gru
+        initial_state: An initial state of the layer. If None, zero state.
+        parameter_init (float): the range of uniform distribution to
+            initialize the parameters
+        is_training (bool or placeholder): if False, the reserve space for
+            back-propagation is not allocated
+        rnn_list (list): `(cudnn_rnn, params)` is appended if not None
+    Returns:
+        outputs: A tensor of size `[T, B, num_units]`
+        final_state: A final state of the layer
+    """
+    input_size = inputs.get_shape().as_list()[-1]
+    batch_size = tf.shape(inputs)[1]
+
+    if rnn_type == 'lstm':
+        rnn = tf.contrib.cudnn_rnn.CudnnLSTM(
+            num_layers=1,
+            num_units=num_units,
+            input_size=input_size,
+            input_mode='linear_input',
+            direction='unidirectional')
+    else:
+        rnn = tf.contrib.cudnn_rnn.CudnnGRU(
+            num_layers=1,
+            num_units=num_units,
+            input_size=input_size,
+            input_mode='linear_input',
+            direction='unidirectional')
+    # NOTE: input_mode must be linear_input to convert the weights to
+    # tf.contrib.rnn.LSTMBlockCell
+
+    params = tf.get_variable(
+        'cudnn_params',
+        initializer=tf.random_uniform(
+            [rnn.params_size()], -parameter_init, parameter_init),
+        validate_shape=False,
+        trainable=True)
+    if rnn_list is not None:
+        rnn_list.append((rnn, params))
+
+    if initial_state is None:
+        input_h = tf.zeros([1, batch_size, num_units],
+                           dtype=inputs.dtype, name='input_h')
+        input_c = input_h
+    elif rnn_type == 'lstm':
+        input_h = tf.expand_dims(initial_state.h, axis=0)
+        input_c = tf.expand_dims(initial_state.c, axis=0)
+    else:
+        input_h = tf.expand_dims(initial_state, axis=0)
+
+    def run(is_training):
+        if rnn_type == 'lstm':
+            return rnn(input_data=inputs,
+                       input_h=input_h,
+                       input_c=input_c,
+                       params=params,
+                       is_training=is_training)
+        return rnn(input_data=inputs,
+                   input_h=input_h,
+                   params=params,
+                   is_training=is_training)
+
+    if isinstance(is_training, bool):
+        rnn_outputs = run(is_training)
+    else:
+        # NOTE: is_training of the cuDNN kernels must be a python bool, so
+        # the kernels for training and inference share the parameters
+        rnn_outputs = tf.cond(is_training,
+                              lambda: run(True), lambda: run(False))
+
+    outputs, output_h = rnn_outputs[0], rnn_outputs[1]
+    if rnn_type == 'lstm':
+        final_state = tf.contrib.rnn.LSTMStateTuple(
+            c=rnn_outputs[2][0], h=output_h[0])
+    else:
+        final_state = output_h[0]
+    # NOTE: final states are those after the padded frames
+
+    return outputs, final_state
+
+
+def cudnn_rnn_layer(inputs, inputs_seq_len, num_units, rnn_type='lstm',
+                    bidirectional=True, initial_state=None,
+                    parameter_init=0.1, is_training=True, rnn_list=None):
+    """A (bidirectional) cuDNN RNN layer. The backward direction starts from
+       the last valid frame of each utterance, and the outputs of the padded
+       frames are zero.
+    Args:
+        inputs: A tensor of size `[T, B, input_size]`
+        inputs_seq_len: A tensor of size `[B]`
+        num_units (int): the number of units
+        rnn_type (string, optional): lstm or gru
+        bidirectional (bool, optional): if True, use a bidirectional RNN
+        initial_state (optional): An initial state of the unidirectional
+            layer. Default is zero state.
+        parameter_init (float, optional): the range of uniform distribution
+            to initialize the parameters
+        is_training (bool or placeholder, optional): if False, the reserve
+            space for back-propagation is not allocated
+        rnn_list (list, optional): if given, `(cudnn_rnn, params)` of each
+            direction is appended, which is used for the weight conversion
+    Returns:
+        outputs: A tensor of size `[T, B, num_units]`, or
+            `[T, B, num_units * 2]` in the bidirectional layer
+        final_state: A final state of the layer, or a tuple of forward and
+            backward final states in the bidirectional layer
+    """
+    if initial_state is not None and bidirectional:
+        raise NotImplementedError(
+            'initial_state is not supported in the bidirectional layer.')
+
+    max_time = tf.shape(inputs)[0]
+
+    if bidirectional:
+        with tf.variable_scope('fw'):
+            outputs_fw, final_state_fw = _cudnn_rnn(
+                inputs, num_units, rnn_type, None, parameter_init,
+                is_training, rnn_list)
+        with tf.variable_scope('bw'):
+            # Reverse only the valid frames of each utterance
+            inputs_bw = tf.reverse_sequence(
+                inputs, seq_lengths=inputs_seq_len, seq_axis=0,
+                batch_axis=1)
+            outputs_bw, final_state_bw = _cudnn_rnn(
+                inputs_bw, num_units, rnn_type, None, parameter_init,
+                is_training, rnn_list)
+            outputs_bw = tf.reverse_sequence(
+                outputs_bw, seq_lengths=inputs_seq_len, seq_axis=0,
+                batch_axis=1)
+        outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
+        final_state = (final_state_fw, final_state_bw)
+    else:
+        outputs, final_state = _cudnn_rnn(
+            inputs, num_units, rnn_type, initial_state, parameter_init,
+            is_training, rnn_list)
+
+    # Zero out the padded frames
+    mask = tf.sequence_mask(
+        inputs_seq_len, maxlen=max_time, dtype=inputs.dtype)
+    outputs *= tf.expand_dims(tf.transpose(mask), axis=2)
+
+    return outputs, final_state
+
+
+def cudnn_to_block_cell_weights(session, rnn_list, num_units, num_proj=None):
+    """Evaluate the weights of CudnnLSTM layers in the layout of
+       tf.contrib.rnn.LSTMBlockCell. This requires cuDNN (GPU).
+    Args:
+        session: A session in which the trained weights are restored
+        rnn_list (list): `(cudnn_rnn, params)` of each layer and direction
+            collected by `cudnn_rnn_layer`
+        num_units (int): the number of units
+        num_proj (int, optional): the number of nodes in the projection
+            layer of the encoder
+    Returns:
+        A list of `(kernel, bias)` of each layer and direction in the order
+            of `rnn_list`
+    """
+    if num_proj is not None:
+        raise NotImplementedError(
+            'The projection layers cannot be converted to LSTMBlockCell.')
+    if len(rnn_list) == 0:
+        raise ValueError('The encoder is not built with CudnnLSTM.')
+
+    canonical_list = session.run(
+        [rnn.params_to_canonical(params) for rnn, params in rnn_list])
+    return [lstm_canonical_to_block_cell(weights, biases, num_units)
+            for weights, biases in canonical_list]
+
+
+def lstm_canonical_to_block_cell(weights, biases, num_units, forget_bias=1.0):
+    """Convert the canonical weights of a single-layer unidirectional
+       CudnnLSTM to the weights of tf.contrib.rnn.LSTMBlockCell without
+       peephole.
+    Args:
+        weights (list): 8 arrays of the input weights (i, f, c, o) and the
+            recurrent weights (i, f, c, o)
+        biases (list): 8 arrays of the input biases (i, f, c, o) and the
+            recurrent biases (i, f, c, o)
+        num_units (int): the number of units
+        forget_bias (float, optional): the forget bias of LSTMBlockCell
+    Returns:
+        kernel: An array of size `[input_size + num_units, num_units * 4]`
+        bias: An array of size `[num_units * 4]`
+    """
+    # cuDNN: `[num_units, input_size]`, LSTMBlockCell: `[input_size, num_units]`
+    weights = [np.reshape(w, [num_units, -1]).T for w in weights]
+    biases = [np.reshape(b, [-1]) for b in biases]
+
+    # LSTMBlockCell multiplies `[x, h]` by the kernel
+    w_i, w_f, w_c, w_o = [np.concatenate([weights[i], weights[i + 4]], axis=0)
+                          for i in range(4)]
+    b_i, b_f, b_c, b_o = [biases[i] + biases[i + 4] for i in range(4)]
+
+    # NOTE: gates of LSTMBlockCell are in the order of (i, c, f, o), and
+    # the forget bias is added in the cell
+    kernel = np.concatenate([w_i, w_c, w_f, w_o], axis=1)
+    bias = np.concatenate([b_i, b_c, b_f - forget_bias, b_o], axis=0)
+
+    return kernel, bias
+
+
+def load_block_cell_weights(session, block_cell_weights, var_list=None):
+    """Load the converted weights to LSTMBlockCell variables.
+    Args:
+        session: A session of the graph built with `lstm_impl='LSTMBlockCell'`
+            and `use_peephole=False`
+        block_cell_weights (list): the outputs of
+            `cudnn_to_block_cell_weights`
+        var_list (list, optional): variables to search. Default is all
+            global variables.
+    """
+    if var_list is None:
+        var_list = tf.global_variables()
+    weights_list = [v for v in var_list
+                    if 'lstm_cell/' in v.name and v.name.endswith('weights:0')]
+    biases_list = [v for v in var_list
+                   if 'lstm_cell/' in v.name and v.name.endswith('biases:0')]
+
+    if any('lstm_cell/' in v.name and '_diag' in v.name for v in var_list):
+        raise ValueError('LSTMBlockCell must be built without peephole.')
+    if len(weights_list) != len(block_cell_weights) or len(biases_list) != len(block_cell_weights):
+        raise ValueError(
+            'The number of LSTMBlockCell layers does not match: %d vs. %d.' %
+            (len(weights_list), len(block_cell_weights)))
+
+    for (kernel, bias), w, b in zip(block_cell_weights, weights_list, biases_list):
+        if tuple(w.get_shape().as_list()) != kernel.shape:
+            raise ValueError('The shape of %s should be %s.' %
+                             (w.name, str(kernel.shape)))
+        w.load(kernel, session)
+        b.load(bias, session)
+
+
+def convert_to_block_cell(session, block_cell_weights, cudnn_model_path,
+                          save_path):
+    """Save a checkpoint for the model with LSTMBlockCell, which can be used
+       on CPU-only machines.
+    Args:
+        session: A session of the graph built with `lstm_impl='LSTMBlockCell'`
+            and `use_peephole=False`
+        block_cell_weights (list): the outputs of
+            `cudnn_to_block_cell_weights`
+        cudnn_model_path (string): path to the checkpoint of the model with
+            CudnnLSTM
+        save_path (string): path to save the converted checkpoint
+    Returns:
+        The path to the saved checkpoint
+    """
+    # Restore the other variables such as the output layer by names
+    other_vars = [v for v in tf.global_variables()
+                  if 'lstm_cell/' not in v.name]
+    session.run(tf.global_variables_initializer())
+    tf.train.Saver(var_list=other_vars).restore(session, cudnn_model_path)
+
+    load_block_cell_weights(session, block_cell_weights)
+
+    return tf.train.Saver().save(session, save_path)
@@ -5,6 +5,11 @@
 
 import tensorflow as tf
 
+from models.encoders.core.rnn_util import subsampled_dynamic_rnn
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+from models.encoders.core.cudnn_rnn import CudnnRNN_Encoder
+
 
 class GRU_Encoder(object):
     """Unidirectional GRU encoder.
@@ -17,6 +22,13 @@ class GRU_Encoder(object):
         parameter_init (float, optional): the range of uniform distribution to
             initialize weight parameters (>= 0)
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        use_cudnn (bool, optional): if True, use the fused cuDNN kernels
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is no subsampling.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
         name (string, optional): the name of encoder
     """
 
@@ -26,6 +38,9 @@ class GRU_Encoder(object):
                  num_classes,
                  parameter_init=0.1,
                  bottleneck_dim=None,
+                 use_cudnn=False,
+                 downsample_list=None,
+                 downsample_type='concat',
                  name='gru_encoder'):
 
         self.num_units = num_units
@@ -34,12 +49,45 @@ class GRU_Encoder(object):
         self.parameter_init = parameter_init
         self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
             None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
         self.name = name
 
+        self.use_cudnn = use_cudnn
         self.return_hidden_states = True if num_classes == 0 else False
 
+        if use_cudnn:
+            self.cudnn_encoder = CudnnRNN_Encoder(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=num_classes,
+                rnn_type='gru',
+                bidirectional=False,
+                parameter_init=parameter_init,
+                bottleneck_dim=bottleneck_dim,
+                downsample_list=downsample_list,
+                downsample_type=downsample_type,
+                name=name)
+
+    @property
+    def state_size(self):
+        """The sizes of the hidden state in each layer. This has the same
+           structure as the final state returned by `__call__`."""
+        return tuple(self.num_units for _ in range(self.num_layers))
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 initial_state=None, is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -50,10 +98,24 @@ class GRU_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            initial_state (optional): An initial hidden state of the encoder
+                with the structure of `state_size`. This is used to carry
+                the state over chunks in streaming inference. Default is
+                zero states.
+            is_training (bool or placeholder, optional): if False, the
+                cuDNN kernels do not allocate the reserve space for
+                back-propagation. This is used only with the cuDNN kernels.
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
             final_state: A final hidden state of the encoder
         """
+        if self.use_cudnn:
+            return self.cudnn_encoder(inputs, inputs_seq_len,
+                                      keep_prob_input, keep_prob_hidden,
+                                      keep_prob_output,
+                                      initial_state=initial_state,
+                                      is_training=is_training)
+
         # inputs: `[B, T, input_size]`
         batch_size = tf.shape(inputs)[0]
 
@@ -78,22 +140,23 @@ class GRU_Encoder(object):
                 gru_list.append(gru)
 
         # Stack multiple cells
-        stacked_gru = tf.contrib.rnn.MultiRNNCell(
-            gru_list, state_is_tuple=True)
-
-        # Ignore 2nd return (the last state)
-        outputs, final_state = tf.nn.dynamic_rnn(
-            cell=stacked_gru,
+        outputs, final_state, _ = subsampled_dynamic_rnn(
+            cell_list=gru_list,
             inputs=inputs,
-            sequence_length=inputs_seq_len,
-            dtype=tf.float32)
+            inputs_seq_len=inputs_seq_len,
+            downsample_list=self.downsample_list,
+            downsample_type=self.downsample_type,
+            initial_state=initial_state)
         # NOTE: initial states are zero states by default
 
         if self.return_hidden_states:
             return outputs, final_state
 
         # Reshape to apply the same weights over the timesteps
-        outputs = tf.reshape(outputs, shape=[-1, self.num_units])
+        # NOTE: the feature size is doubled by concat-pooling in the last
+        # layer
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
             with tf.variable_scope('bottleneck') as scope:
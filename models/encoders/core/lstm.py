@@ -9,6 +9,12 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from models.encoders.core.lstm_factory import stacked_lstm
+from models.encoders.core.lstm_factory import check_lstm_impl
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+from models.encoders.core.cudnn_rnn import CudnnRNN_Encoder
+
 
 class LSTM_Encoder(object):
     """Unidirectional LSTM encoder.
@@ -19,7 +25,8 @@ class LSTM_Encoder(object):
             (except for a blank label). if 0, return hidden states before
             passing through the softmax layer
         lstm_impl (string, optional):
-            BasicLSTMCell or LSTMCell or LSTMBlockCell or LSTMBlockFusedCell.
+            BasicLSTMCell or LSTMCell or LSTMBlockCell or
+                LSTMBlockFusedCell or CudnnLSTM.
             Choose the background implementation of tensorflow.
             Default is LSTMBlockCell (the fastest implementation).
         use_peephole (bool, optional): if True, use peephole
@@ -28,6 +35,12 @@ class LSTM_Encoder(object):
         clip_activation (float, optional): the range of activation clipping (> 0)
         num_proj (int, optional): the number of nodes in the projection layer
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is no subsampling.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
         name (string, optional): the name of encoder
     """
 
@@ -41,6 +54,8 @@ class LSTM_Encoder(object):
                  clip_activation=5.0,
                  num_proj=None,
                  bottleneck_dim=None,
+                 downsample_list=None,
+                 downsample_type='concat',
                  name='lstm_encoder'):
 
         self.num_units = num_units
@@ -58,12 +73,49 @@ class LSTM_Encoder(object):
             self.num_proj = None
         self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
             None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
         self.name = name
 
         self.return_hidden_states = True if num_classes == 0 else False
 
+        check_lstm_impl(lstm_impl)
+        if lstm_impl == 'CudnnLSTM':
+            # NOTE: peephole and activation clipping are not supported
+            self.cudnn_encoder = CudnnRNN_Encoder(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=num_classes,
+                rnn_type='lstm',
+                bidirectional=False,
+                parameter_init=parameter_init,
+                num_proj=num_proj,
+                bottleneck_dim=bottleneck_dim,
+                downsample_list=downsample_list,
+                downsample_type=downsample_type,
+                name=name)
+
+    @property
+    def state_size(self):
+        """The sizes of the hidden state in each layer. This has the same
+           structure as the final state returned by `__call__`."""
+        output_size = self.num_units if self.num_proj is None else self.num_proj
+        return tuple(tf.contrib.rnn.LSTMStateTuple(self.num_units, output_size)
+                     for _ in range(self.num_layers))
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 initial_state=None, is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -74,10 +126,24 @@ class LSTM_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            initial_state (optional): An initial hidden state of the encoder
+                with the structure of `state_size`. This is used to carry
+                the state over chunks in streaming inference. Default is
+                zero states.
+            is_training (bool or placeholder, optional): if False, the
+                cuDNN kernels do not allocate the reserve space for
+                back-propagation. This is used only with CudnnLSTM.
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
             final_state: A final hidden state of the encoder
         """
+        if self.lstm_impl == 'CudnnLSTM':
+            return self.cudnn_encoder(inputs, inputs_seq_len,
+                                      keep_prob_input, keep_prob_hidden,
+                                      keep_prob_output,
+                                      initial_state=initial_state,
+                                      is_training=is_training)
+
         # inputs: `[B, T, input_size]`
         batch_size = tf.shape(inputs)[0]
 
@@ -89,63 +155,20 @@ class LSTM_Encoder(object):
             minval=-self.parameter_init, maxval=self.parameter_init)
 
         # Hidden layers
-        lstm_list = []
         with tf.variable_scope('multi_lstm', initializer=initializer) as scope:
-            for i_layer in range(1, self.num_layers + 1, 1):
-
-                if self.lstm_impl == 'BasicLSTMCell':
-                    lstm = tf.contrib.rnn.BasicLSTMCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        state_is_tuple=True,
-                        activation=tf.tanh)
-
-                elif self.lstm_impl == 'LSTMCell':
-                    lstm = tf.contrib.rnn.LSTMCell(
-                        self.num_units,
-                        use_peepholes=self.use_peephole,
-                        cell_clip=self.clip_activation,
-                        num_proj=self.num_proj,
-                        forget_bias=1.0,
-                        state_is_tuple=True)
-
-                elif self.lstm_impl == 'LSTMBlockCell':
-                    # NOTE: This should be faster than tf.contrib.rnn.LSTMCell
-                    lstm = tf.contrib.rnn.LSTMBlockCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        # clip_cell=True,
-                        use_peephole=self.use_peephole)
-                    # TODO: cell clipping (update for rc1.3)
-
-                elif self.lstm_impl == 'LSTMBlockFusedCell':
-                    raise NotImplementedError
-
-                elif self.lstm_impl == 'CudnnLSTM':
-                    raise NotImplementedError
-
-                else:
-                    raise IndexError(
-                        'lstm_impl is "BasicLSTMCell" or "LSTMCell" or ' +
-                        '"LSTMBlockCell" or "LSTMBlockFusedCell" or ' +
-                        '"CudnnLSTM".')
-
-                # Dropout for the hidden-hidden connections
-                lstm = tf.contrib.rnn.DropoutWrapper(
-                    lstm, output_keep_prob=keep_prob_hidden)
-
-                lstm_list.append(lstm)
-
-            # Stack multiple cells
-            stacked_lstm = tf.contrib.rnn.MultiRNNCell(
-                lstm_list, state_is_tuple=True)
-
-            # Ignore 2nd return (the last state)
-            outputs, final_state = tf.nn.dynamic_rnn(
-                cell=stacked_lstm,
-                inputs=inputs,
-                sequence_length=inputs_seq_len,
-                dtype=tf.float32,
+            outputs, final_state, _ = stacked_lstm(
+                inputs, inputs_seq_len,
+                lstm_impl=self.lstm_impl,
+                num_units=self.num_units,
+                num_layers=self.num_layers,
+                keep_prob=keep_prob_hidden,
+                use_peephole=self.use_peephole,
+                clip_activation=self.clip_activation,
+                num_proj=self.num_proj,
+                parameter_init=self.parameter_init,
+                downsample_list=self.downsample_list,
+                downsample_type=self.downsample_type,
+                initial_state=initial_state,
                 scope=scope)
             # NOTE: initial states are zero states by default
 
@@ -153,10 +176,10 @@ class LSTM_Encoder(object):
             return outputs, final_state
 
         # Reshape to apply the same weights over the timesteps
-        if self.num_proj is None:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_units])
-        else:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_proj])
+        # NOTE: the feature size is doubled by concat-pooling in the last
+        # layer
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
             with tf.variable_scope('bottleneck') as scope:
@@ -0,0 +1,324 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Construct LSTM cells and layers on each backend of tensorflow. All LSTM
+   encoders build their recurrent layers through this module so that every
+   encoder supports the same set of `lstm_impl`."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from models.encoders.core.rnn_util import time_reduction
+from models.encoders.core.rnn_util import subsampled_dynamic_rnn
+from models.encoders.core.rnn_util import fused_bidirectional_lstm
+from models.encoders.core.cudnn_rnn import cudnn_rnn_layer
+
+# Backends with the RNNCell interface (step by step)
+CELL_IMPLS = ['BasicLSTMCell', 'LSTMCell', 'LSTMBlockCell']
+# Backends which run all timesteps in a single op
+FUSED_IMPLS = ['LSTMBlockFusedCell', 'CudnnLSTM']
+LSTM_IMPLS = CELL_IMPLS + FUSED_IMPLS
+
+
+def check_lstm_impl(lstm_impl):
+    """Check the backend of LSTM.
+    Args:
+        lstm_impl (string): BasicLSTMCell or LSTMCell or LSTMBlockCell or
+            LSTMBlockFusedCell or CudnnLSTM
+    """
+    if lstm_impl not in LSTM_IMPLS:
+        raise IndexError(
+            'lstm_impl is "BasicLSTMCell" or "LSTMCell" or ' +
+            '"LSTMBlockCell" or "LSTMBlockFusedCell" or ' +
+            '"CudnnLSTM".')
+
+
+def lstm_cell(lstm_impl, num_units, use_peephole=True, clip_activation=None,
+              num_proj=None):
+    """Create a LSTM cell.
+    Args:
+        lstm_impl (string): BasicLSTMCell or LSTMCell or LSTMBlockCell
+        num_units (int): the number of units
+        use_peephole (bool, optional): if True, use peephole
+            (not used in BasicLSTMCell)
+        clip_activation (float, optional): the range of cell clipping (> 0)
+            (only used in LSTMCell)
+        num_proj (int, optional): the number of nodes in the projection layer
+            (only used in LSTMCell)
+    Returns:
+        An instance of `tf.contrib.rnn.RNNCell`
+    """
+    if lstm_impl == 'BasicLSTMCell':
+        return tf.contrib.rnn.BasicLSTMCell(
+            num_units,
+            forget_bias=1.0,
+            state_is_tuple=True,
+            activation=tf.tanh)
+
+    elif lstm_impl == 'LSTMCell':
+        return tf.contrib.rnn.LSTMCell(
+            num_units,
+            use_peepholes=use_peephole,
+            cell_clip=clip_activation,
+            num_proj=num_proj,
+            forget_bias=1.0,
+            state_is_tuple=True)
+
+    elif lstm_impl == 'LSTMBlockCell':
+        # NOTE: This should be faster than tf.contrib.rnn.LSTMCell
+        return tf.contrib.rnn.LSTMBlockCell(
+            num_units,
+            forget_bias=1.0,
+            # clip_cell=True,
+            use_peephole=use_peephole)
+        # TODO: cell clipping (update for rc1.3)
+
+    check_lstm_impl(lstm_impl)
+    raise ValueError(
+        '%s has no cell interface. Use lstm_layer instead.' % lstm_impl)
+
+
+def lstm_layer(inputs, inputs_seq_len, lstm_impl, num_units, keep_prob,
+               bidirectional=True, use_peephole=True, clip_activation=None,
+               num_proj=None, parameter_init=0.1, time_major=False,
+               initial_state=None, is_training=True, rnn_list=None,
+               scope=None):
+    """A (bidirectional) LSTM layer on any backend, followed by dropout.
+       Variables of the cell backends are named in the same way as
+       `tf.nn.bidirectional_dynamic_rnn` and `tf.nn.dynamic_rnn`.
+    Args:
+        inputs: A tensor of size `[B, T, input_size]`, or
+            `[T, B, input_size]` if time_major is True
+        inputs_seq_len: A tensor of size `[B]`
+        lstm_impl (string): BasicLSTMCell or LSTMCell or LSTMBlockCell or
+            LSTMBlockFusedCell or CudnnLSTM
+        num_units (int): the number of units
+        keep_prob (placeholder, float): A probability to keep nodes in the
+            outputs
+        bidirectional (bool, optional): if True, use a bidirectional LSTM
+        use_peephole (bool, optional): if True, use peephole
+            (not supported in BasicLSTMCell and CudnnLSTM)
+        clip_activation (float, optional): the range of cell clipping (> 0)
+            (not supported in LSTMBlockCell and CudnnLSTM)
+        num_proj (int, optional): the number of nodes in the projection layer
+            (not supported in BasicLSTMCell and LSTMBlockCell)
+        parameter_init (float, optional): the range of uniform distribution to
+            initialize the parameters of CudnnLSTM, and the standard deviation
+            of the weights of the projection layer in the fused backends
+        time_major (bool, optional): if True, inputs and outputs are
+            time-major. The fused backends are time-major, so stacking
+            time-major layers avoids transposes.
+        initial_state (optional): An initial `LSTMStateTuple` of the
+            unidirectional layer. Default is zero state.
+        is_training (bool or placeholder, optional): if False, the cuDNN
+            kernels do not allocate the reserve space for back-propagation.
+            This is used only in CudnnLSTM.
+        rnn_list (list, optional): if given, `(cudnn_rnn, params)` of each
+            direction of CudnnLSTM is appended, which is used for the weight
+            conversion to LSTMBlockCell
+        scope (optional): VariableScope for the created subgraph
+    Returns:
+        outputs: A tensor of size `[B, T, output_size]` (or `[T, B,
+            output_size]`), where output_size is doubled in the bidirectional
+            layer
+        final_state: A final `LSTMStateTuple` of the layer, or a tuple of
+            forward and backward ones in the bidirectional layer
+    """
+    check_lstm_impl(lstm_impl)
+    if initial_state is not None and bidirectional:
+        raise NotImplementedError(
+            'initial_state is not supported in the bidirectional layer.')
+
+    if lstm_impl in CELL_IMPLS:
+        cell_fw = tf.contrib.rnn.DropoutWrapper(
+            lstm_cell(lstm_impl, num_units, use_peephole, clip_activation,
+                      num_proj),
+            output_keep_prob=keep_prob)
+
+        if not bidirectional:
+            return tf.nn.dynamic_rnn(
+                cell=cell_fw,
+                inputs=inputs,
+                sequence_length=inputs_seq_len,
+                initial_state=initial_state,
+                dtype=inputs.dtype,
+                time_major=time_major,
+                scope=scope)
+
+        cell_bw = tf.contrib.rnn.DropoutWrapper(
+            lstm_cell(lstm_impl, num_units, use_peephole, clip_activation,
+                      num_proj),
+            output_keep_prob=keep_prob)
+        (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
+            cell_fw=cell_fw,
+            cell_bw=cell_bw,
+            inputs=inputs,
+            sequence_length=inputs_seq_len,
+            dtype=inputs.dtype,
+            time_major=time_major,
+            scope=scope)
+        outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
+        return outputs, final_state
+
+    # The fused backends are time-major
+    if not time_major:
+        inputs = tf.transpose(inputs, (1, 0, 2))
+
+    if lstm_impl == 'LSTMBlockFusedCell' and bidirectional:
+        outputs, final_state = fused_bidirectional_lstm(
+            inputs, inputs_seq_len,
+            num_units=num_units,
+            keep_prob=keep_prob,
+            use_peephole=use_peephole,
+            clip_activation=clip_activation,
+            num_proj=num_proj,
+            parameter_init=parameter_init,
+            scope=scope)
+
+    else:
+        with tf.variable_scope(scope or 'rnn'):
+            if lstm_impl == 'LSTMBlockFusedCell':
+                lstm = tf.contrib.rnn.LSTMBlockFusedCell(
+                    num_units,
+                    forget_bias=1.0,
+                    cell_clip=clip_activation,
+                    use_peephole=use_peephole)
+                outputs, (c, h) = lstm(
+                    inputs, initial_state=initial_state,
+                    sequence_length=inputs_seq_len, dtype=inputs.dtype,
+                    scope='fw')
+                final_state = tf.contrib.rnn.LSTMStateTuple(c=c, h=h)
+            else:
+                # NOTE: peephole and activation clipping are not supported
+                outputs, final_state = cudnn_rnn_layer(
+                    inputs, inputs_seq_len,
+                    num_units=num_units,
+                    rnn_type='lstm',
+                    bidirectional=bidirectional,
+                    initial_state=initial_state,
+                    parameter_init=parameter_init,
+                    is_training=is_training,
+                    rnn_list=rnn_list)
+
+            if num_proj is not None:
+                # NOTE: the projection is not fed back to the recurrence.
+                # Each direction is projected as in the cell backends and
+                # fused_bidirectional_lstm.
+                if bidirectional:
+                    outputs_list = zip(['projection_fw', 'projection_bw'],
+                                       tf.split(outputs, 2, axis=2))
+                else:
+                    outputs_list = [('projection', outputs)]
+                projected = []
+                for proj_scope_name, outputs_dir in outputs_list:
+                    with tf.variable_scope(proj_scope_name) as proj_scope:
+                        projected.append(tf.contrib.layers.fully_connected(
+                            outputs_dir, num_proj,
+                            activation_fn=None,
+                            weights_initializer=tf.truncated_normal_initializer(
+                                stddev=parameter_init),
+                            biases_initializer=None,
+                            scope=proj_scope))
+                outputs = tf.concat(axis=2, values=projected)
+
+        # Dropout for the hidden-hidden connections
+        outputs = tf.nn.dropout(outputs, keep_prob)
+
+    if not time_major:
+        outputs = tf.transpose(outputs, (1, 0, 2))
+
+    return outputs, final_state
+
+
+def stacked_lstm(inputs, inputs_seq_len, lstm_impl, num_units, num_layers,
+                 keep_prob, use_peephole=True, clip_activation=None,
+                 num_proj=None, parameter_init=0.1, downsample_list=None,
+                 downsample_type='concat', initial_state=None,
+                 is_training=True, rnn_list=None, scope=None):
+    """Stacked unidirectional LSTM layers on any backend. The cell backends
+       are stacked by `tf.contrib.rnn.MultiRNNCell`, and the fused backends
+       are stacked layer by layer in the time-major layout.
+    Args:
+        inputs: A tensor of size `[B, T, input_size]`
+        inputs_seq_len: A tensor of size `[B]`
+        lstm_impl (string): BasicLSTMCell or LSTMCell or LSTMBlockCell or
+            LSTMBlockFusedCell or CudnnLSTM
+        num_units (int): the number of units in each layer
+        num_layers (int): the number of layers
+        keep_prob (placeholder, float): A probability to keep nodes in the
+            outputs of each layer
+        use_peephole (bool, optional): if True, use peephole
+        clip_activation (float, optional): the range of cell clipping (> 0)
+        num_proj (int, optional): the number of nodes in the projection layer
+        parameter_init (float, optional): see `lstm_layer`
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            Default is no subsampling.
+        downsample_type (string, optional): concat or subsample
+        initial_state (optional): A tuple of initial states of each layer.
+            Default is zero states.
+        is_training (bool or placeholder, optional): see `lstm_layer`
+        rnn_list (list, optional): see `lstm_layer`
+        scope (optional): VariableScope for the created subgraph
+    Returns:
+        outputs: A tensor of size `[B, T', output_size]`
+        final_state: A tuple of final states of each layer
+        outputs_seq_len: A tensor of size `[B]`
+    """
+    check_lstm_impl(lstm_impl)
+    if downsample_list is None:
+        downsample_list = [False] * num_layers
+
+    if lstm_impl in CELL_IMPLS:
+        # Dropout for the hidden-hidden connections
+        cell_list = [tf.contrib.rnn.DropoutWrapper(
+            lstm_cell(lstm_impl, num_units, use_peephole, clip_activation,
+                      num_proj),
+            output_keep_prob=keep_prob) for _ in range(num_layers)]
+
+        return subsampled_dynamic_rnn(
+            cell_list=cell_list,
+            inputs=inputs,
+            inputs_seq_len=inputs_seq_len,
+            downsample_list=downsample_list,
+            downsample_type=downsample_type,
+            initial_state=initial_state,
+            scope=scope)
+
+    # Convert to time-major: `[T, B, input_size]`
+    outputs = tf.transpose(inputs, (1, 0, 2))
+
+    final_state = []
+    with tf.variable_scope(scope or 'rnn'):
+        for i_layer in range(1, num_layers + 1, 1):
+            outputs, layer_final_state = lstm_layer(
+                outputs, inputs_seq_len,
+                lstm_impl=lstm_impl,
+                num_units=num_units,
+                keep_prob=keep_prob,
+                bidirectional=False,
+                use_peephole=use_peephole,
+                clip_activation=clip_activation,
+                num_proj=num_proj,
+                parameter_init=parameter_init,
+                time_major=True,
+                initial_state=None if initial_state is None else initial_state[
+                    i_layer - 1],
+                is_training=is_training,
+                rnn_list=rnn_list,
+                scope='lstm_hidden' + str(i_layer))
+            final_state.append(layer_final_state)
+
+            # Reduce the time resolution for the next layer
+            if downsample_list[i_layer - 1]:
+                outputs, inputs_seq_len = time_reduction(
+                    outputs, inputs_seq_len,
+                    factor=2, reduction_type=downsample_type,
+                    time_major=True)
+
+    # Convert to batch-major: `[B, T', output_size]`
+    outputs = tf.transpose(outputs, (1, 0, 2))
+
+    return outputs, tuple(final_state), inputs_seq_len
@@ -9,6 +9,10 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from models.encoders.core.lstm_factory import lstm_layer
+from models.encoders.core.lstm_factory import check_lstm_impl
+from models.encoders.core.cudnn_rnn import cudnn_to_block_cell_weights
+
 
 class Multitask_BLSTM_Encoder(object):
     """Multi-task bidirectional LSTM encoder.
@@ -21,7 +25,8 @@ class Multitask_BLSTM_Encoder(object):
         num_classes_sub (int): the number of classes of target labels in the
             sub task (except for a blank label)
         lstm_impl (string, optional):
-            BasicLSTMCell or LSTMCell or LSTMBlockCell or LSTMBlockFusedCell.
+            BasicLSTMCell or LSTMCell or LSTMBlockCell or
+                LSTMBlockFusedCell or CudnnLSTM.
             Choose the background implementation of tensorflow.
             Default is LSTMBlockCell (the fastest implementation).
         use_peephole (bool, optional): if True, use peephole
@@ -56,7 +61,7 @@ class Multitask_BLSTM_Encoder(object):
         self.use_peephole = use_peephole
         self.parameter_init = parameter_init
         self.clip_activation = clip_activation
-        if lstm_impl != 'LSTMCell':
+        if lstm_impl not in ['LSTMCell', 'LSTMBlockFusedCell', 'CudnnLSTM']:
             self.num_proj = None
         elif num_proj not in [None, 0]:
             self.num_proj = int(num_proj)
@@ -72,8 +77,14 @@ class Multitask_BLSTM_Encoder(object):
 
         self.return_hidden_states = True if num_classes_main == 0 or num_classes_sub == 0 else False
 
+        check_lstm_impl(lstm_impl)
+
+        # (cudnn_rnn, params) of each layer and direction of CudnnLSTM
+        self._rnn_list = []
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -84,6 +95,9 @@ class Multitask_BLSTM_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            is_training (bool or placeholder, optional): if False, the cuDNN
+                kernels do not allocate the reserve space for
+                back-propagation. This is used only with CudnnLSTM.
         Returns:
             logits: A tensor of size `[T, B, input_size]` in the main task
             logits_sub: A tensor of size `[T, B, input_size]` in the sub task
@@ -100,120 +114,69 @@ class Multitask_BLSTM_Encoder(object):
         initializer = tf.random_uniform_initializer(
             minval=-self.parameter_init, maxval=self.parameter_init)
 
+        # NOTE: stack time-major layers to avoid transposes in each layer
+        outputs = tf.transpose(outputs, (1, 0, 2))
+
         # Hidden layers
-        if self.lstm_impl == 'CudnnLSTM':
-            raise ValueError
+        self._rnn_list = []
+        for i_layer in range(1, self.num_layers_main + 1, 1):
+            with tf.variable_scope('blstm_hidden' + str(i_layer), initializer=initializer) as scope:
+
+                outputs, final_state = lstm_layer(
+                    outputs, inputs_seq_len,
+                    lstm_impl=self.lstm_impl,
+                    num_units=self.num_units,
+                    keep_prob=keep_prob_hidden,
+                    bidirectional=True,
+                    use_peephole=self.use_peephole,
+                    clip_activation=self.clip_activation,
+                    num_proj=self.num_proj,
+                    parameter_init=self.parameter_init,
+                    is_training=is_training,
+                    rnn_list=self._rnn_list,
+                    time_major=True,
+                    scope=scope)
+                # NOTE: initial states are zero states by default
 
-        else:
-            for i_layer in range(1, self.num_layers_main + 1, 1):
-                with tf.variable_scope('blstm_hidden' + str(i_layer), initializer=initializer) as scope:
-
-                    if self.lstm_impl == 'BasicLSTMCell':
-                        lstm_fw = tf.contrib.rnn.BasicLSTMCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            state_is_tuple=True,
-                            activation=tf.tanh)
-                        lstm_bw = tf.contrib.rnn.BasicLSTMCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            state_is_tuple=True,
-                            activation=tf.tanh)
-
-                    elif self.lstm_impl == 'LSTMCell':
-                        lstm_fw = tf.contrib.rnn.LSTMCell(
-                            self.num_units,
-                            use_peepholes=self.use_peephole,
-                            cell_clip=self.clip_activation,
-                            num_proj=self.num_proj,
-                            forget_bias=1.0,
-                            state_is_tuple=True)
-                        lstm_bw = tf.contrib.rnn.LSTMCell(
-                            self.num_units,
-                            use_peepholes=self.use_peephole,
-                            cell_clip=self.clip_activation,
-                            num_proj=self.num_proj,
-                            forget_bias=1.0,
-                            state_is_tuple=True)
-
-                    elif self.lstm_impl == 'LSTMBlockCell':
-                        # NOTE: This should be faster than
-                        # tf.contrib.rnn.LSTMCell
-                        lstm_fw = tf.contrib.rnn.LSTMBlockCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            # clip_cell=True,
-                            use_peephole=self.use_peephole)
-                        lstm_bw = tf.contrib.rnn.LSTMBlockCell(
-                            self.num_units,
-                            forget_bias=1.0,
-                            # clip_cell=True,
-                            use_peephole=self.use_peephole)
-                        # TODO: cell clipping (update for rc1.3)
-
-                    elif self.lstm_impl == 'LSTMBlockFusedCell':
-                        raise NotImplementedError
+                if i_layer == self.num_layers_sub:
+                    # Convert to batch-major: `[B, T, output_size]`
+                    outputs_sub = tf.transpose(outputs, (1, 0, 2))
 
+                    # Reshape to apply the same weights over the timesteps
+                    if self.num_proj is None:
+                        output_node = self.num_units * 2
                     else:
-                        raise IndexError(
-                            'lstm_impl is "BasicLSTMCell" or "LSTMCell" or ' +
-                            '"LSTMBlockCell" or "LSTMBlockFusedCell" or ' +
-                            '"CudnnLSTM".')
-
-                    # Dropout for the hidden-hidden connections
-                    lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                        lstm_fw, output_keep_prob=keep_prob_hidden)
-                    lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                        lstm_bw, output_keep_prob=keep_prob_hidden)
-
-                    # Ignore 2nd return (the last state)
-                    (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                        cell_fw=lstm_fw,
-                        cell_bw=lstm_bw,
-                        inputs=outputs,
-                        sequence_length=inputs_seq_len,
-                        dtype=tf.float32,
-                        scope=scope)
-                    # NOTE: initial states are zero states by default
-
-                    outputs = tf.concat(
-                        axis=2, values=[outputs_fw, outputs_bw])
-
-                    if i_layer == self.num_layers_sub:
-                        outputs_sub = outputs
-
-                        # Reshape to apply the same weights over the timesteps
-                        if self.num_proj is None:
-                            output_node = self.num_units * 2
-                        else:
-                            output_node = self.num_proj * 2
-                        outputs_sub_2d = tf.reshape(
-                            outputs_sub, shape=[-1, output_node])
-
-                        with tf.variable_scope('output_sub') as scope:
-                            logits_sub_2d = tf.contrib.layers.fully_connected(
-                                outputs_sub_2d, self.num_classes_sub,
-                                activation_fn=None,
-                                weights_initializer=tf.truncated_normal_initializer(
-                                    stddev=self.parameter_init),
-                                biases_initializer=tf.zeros_initializer(),
-                                scope=scope)
-
-                            # Reshape back to the original shape
-                            logits_sub = tf.reshape(
-                                logits_sub_2d,
-                                shape=[batch_size, -1, self.num_classes_sub])
-
-                            # Convert to time-major: `[T, B, num_classes]'
-                            logits_sub = tf.transpose(logits_sub, (1, 0, 2))
-
-                            # Dropout for the hidden-output connections
-                            logits_sub = tf.nn.dropout(
-                                logits_sub, keep_prob_output,
-                                name='dropout_output_sub')
-                            # NOTE: This may lead to bad results
-
-                            final_state_sub = final_state
+                        output_node = self.num_proj * 2
+                    outputs_sub_2d = tf.reshape(
+                        outputs_sub, shape=[-1, output_node])
+
+                    with tf.variable_scope('output_sub') as scope:
+                        logits_sub_2d = tf.contrib.layers.fully_connected(
+                            outputs_sub_2d, self.num_classes_sub,
+                            activation_fn=None,
+                            weights_initializer=tf.truncated_normal_initializer(
+                                stddev=self.parameter_init),
+                            biases_initializer=tf.zeros_initializer(),
+                            scope=scope)
+
+                        # Reshape back to the original shape
+                        logits_sub = tf.reshape(
+                            logits_sub_2d,
+                            shape=[batch_size, -1, self.num_classes_sub])
+
+                        # Convert to time-major: `[T, B, num_classes]'
+                        logits_sub = tf.transpose(logits_sub, (1, 0, 2))
+
+                        # Dropout for the hidden-output connections
+                        logits_sub = tf.nn.dropout(
+                            logits_sub, keep_prob_output,
+                            name='dropout_output_sub')
+                        # NOTE: This may lead to bad results
+
+                        final_state_sub = final_state
+
+        # Convert to batch-major: `[B, T, output_size]`
+        outputs = tf.transpose(outputs, (1, 0, 2))
 
         if self.return_hidden_states:
             return outputs, final_state, outputs_sub, final_state_sub
@@ -261,3 +224,17 @@ class Multitask_BLSTM_Encoder(object):
             # NOTE: This may lead to bad results
 
             return logits, logits_sub, final_state, final_state_sub
+
+    def block_cell_weights(self, session):
+        """Evaluate the weights of the LSTM layers in the layout of
+           tf.contrib.rnn.LSTMBlockCell. This requires cuDNN (GPU).
+        Args:
+            session: A session in which the trained weights are restored
+        Returns:
+            A list of `(kernel, bias)` of each layer and direction. See
+                `cudnn_to_block_cell_weights`.
+        """
+        if self.lstm_impl != 'CudnnLSTM':
+            raise ValueError('The encoder is not built with CudnnLSTM.')
+        return cudnn_to_block_cell_weights(session, self._rnn_list,
+                                           self.num_units, self.num_proj)
@@ -9,6 +9,10 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from models.encoders.core.lstm_factory import stacked_lstm
+from models.encoders.core.lstm_factory import check_lstm_impl
+from models.encoders.core.cudnn_rnn import cudnn_to_block_cell_weights
+
 
 class Multitask_LSTM_Encoder(object):
     """Multi-task unidirectional LSTM encoder.
@@ -21,7 +25,8 @@ class Multitask_LSTM_Encoder(object):
         num_classes_sub (int): the number of classes of target labels in the
             sub task (except for a blank label)
         lstm_impl (string, optional):
-            BasicLSTMCell or LSTMCell or LSTMBlockCell or LSTMBlockFusedCell.
+            BasicLSTMCell or LSTMCell or LSTMBlockCell or
+                LSTMBlockFusedCell or CudnnLSTM.
             Choose the background implementation of tensorflow.
             Default is LSTMBlockCell (the fastest implementation).
         use_peephole (bool, optional): if True, use peephole
@@ -72,8 +77,14 @@ class Multitask_LSTM_Encoder(object):
 
         self.return_hidden_states = True if num_classes_main == 0 or num_classes_sub == 0 else False
 
+        check_lstm_impl(lstm_impl)
+
+        # (cudnn_rnn, params) of each layer and direction of CudnnLSTM
+        self._rnn_list = []
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -84,6 +95,9 @@ class Multitask_LSTM_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            is_training (bool or placeholder, optional): if False, the cuDNN
+                kernels do not allocate the reserve space for
+                back-propagation. This is used only with CudnnLSTM.
         Returns:
             logits: A tensor of size `[T, B, input_size]` in the main task
             logits_sub: A tensor of size `[T, B, input_size]` in the sub task
@@ -94,87 +108,43 @@ class Multitask_LSTM_Encoder(object):
         batch_size = tf.shape(inputs)[0]
 
         # Dropout for the input-hidden connection
-        outputs = tf.nn.dropout(
+        inputs = tf.nn.dropout(
             inputs, keep_prob_input, name='dropout_input')
 
         initializer = tf.random_uniform_initializer(
             minval=-self.parameter_init, maxval=self.parameter_init)
 
         # Hidden layers
-        lstm_list = []
+        self._rnn_list = []
         with tf.variable_scope('multi_lstm', initializer=initializer) as scope_lstm:
-            for i_layer in range(1, self.num_layers_main + 1, 1):
-
-                if self.lstm_impl == 'BasicLSTMCell':
-                    lstm = tf.contrib.rnn.BasicLSTMCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        state_is_tuple=True,
-                        activation=tf.tanh)
-
-                elif self.lstm_impl == 'LSTMCell':
-                    lstm = tf.contrib.rnn.LSTMCell(
-                        self.num_units,
-                        use_peepholes=self.use_peephole,
-                        cell_clip=self.clip_activation,
-                        num_proj=self.num_proj,
-                        forget_bias=1.0,
-                        state_is_tuple=True)
-
-                elif self.lstm_impl == 'LSTMBlockCell':
-                    # NOTE: This should be faster than tf.contrib.rnn.LSTMCell
-                    lstm = tf.contrib.rnn.LSTMBlockCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        # clip_cell=True,
-                        use_peephole=self.use_peephole)
-                    # TODO: cell clipping (update for rc1.3)
-
-                elif self.lstm_impl == 'LSTMBlockFusedCell':
-                    raise NotImplementedError
-
-                elif self.lstm_impl == 'CudnnLSTM':
-                    raise ValueError
-
-                else:
-                    raise IndexError(
-                        'lstm_impl is "BasicLSTMCell" or "LSTMCell" or ' +
-                        '"LSTMBlockCell" or "LSTMBlockFusedCell" or ' +
-                        '"CudnnLSTM".')
-
-                # Dropout for the hidden-hidden connections
-                lstm = tf.contrib.rnn.DropoutWrapper(
-                    lstm, output_keep_prob=keep_prob_hidden)
-
-                lstm_list.append(lstm)
-
-                if i_layer == self.num_layers_sub:
-                    lstm_list_sub = lstm_list
-
-            # Stack multiple cells
-            stacked_lstm = tf.contrib.rnn.MultiRNNCell(
-                lstm_list, state_is_tuple=True)
-
-            # Ignore 2nd return (the last state)
-            outputs, final_state = tf.nn.dynamic_rnn(
-                cell=stacked_lstm,
-                inputs=inputs,
-                sequence_length=inputs_seq_len,
-                dtype=tf.float32,
+            outputs, final_state, _ = stacked_lstm(
+                inputs, inputs_seq_len,
+                lstm_impl=self.lstm_impl,
+                num_units=self.num_units,
+                num_layers=self.num_layers_main,
+                keep_prob=keep_prob_hidden,
+                use_peephole=self.use_peephole,
+                clip_activation=self.clip_activation,
+                num_proj=self.num_proj,
+                parameter_init=self.parameter_init,
+                is_training=is_training,
+                rnn_list=self._rnn_list,
                 scope=scope_lstm)
             # NOTE: initial states are zero states by default
 
         with tf.variable_scope('multi_lstm', initializer=initializer, reuse=True) as scope_lstm:
-            # Stack multiple cells
-            stacked_lstm_sub = tf.contrib.rnn.MultiRNNCell(
-                lstm_list_sub, state_is_tuple=True)
-
-            # Ignore 2nd return (the last state)
-            outputs_sub, final_state_sub = tf.nn.dynamic_rnn(
-                cell=stacked_lstm_sub,
-                inputs=inputs,
-                sequence_length=inputs_seq_len,
-                dtype=tf.float32,
+            # Share the lower layers with the main task
+            outputs_sub, final_state_sub, _ = stacked_lstm(
+                inputs, inputs_seq_len,
+                lstm_impl=self.lstm_impl,
+                num_units=self.num_units,
+                num_layers=self.num_layers_sub,
+                keep_prob=keep_prob_hidden,
+                use_peephole=self.use_peephole,
+                clip_activation=self.clip_activation,
+                num_proj=self.num_proj,
+                parameter_init=self.parameter_init,
+                is_training=is_training,
                 scope=scope_lstm)
 
             # Reshape to apply the same weights over the timesteps
@@ -254,3 +224,17 @@ class Multitask_LSTM_Encoder(object):
             # NOTE: This may lead to bad results
 
             return logits, logits_sub, final_state, final_state_sub
+
+    def block_cell_weights(self, session):
+        """Evaluate the weights of the LSTM layers in the layout of
+           tf.contrib.rnn.LSTMBlockCell. This requires cuDNN (GPU).
+        Args:
+            session: A session in which the trained weights are restored
+        Returns:
+            A list of `(kernel, bias)` of each layer and direction. See
+                `cudnn_to_block_cell_weights`.
+        """
+        if self.lstm_impl != 'CudnnLSTM':
+            raise ValueError('The encoder is not built with CudnnLSTM.')
+        return cudnn_to_block_cell_weights(session, self._rnn_list,
+                                           self.num_units, self.num_proj)
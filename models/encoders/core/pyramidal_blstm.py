@@ -1,7 +1,12 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-"""Pyramidal bidirectional LSTM Encoder class."""
+"""Pyramidal bidirectional LSTM encoder. This implementation is based on
+        https://arxiv.org/abs/1508.01211.
+          Chan, William, et al.
+          "Listen, attend and spell."
+          arXiv preprint arXiv:1508.01211 (2015).
+"""
 
 from __future__ import absolute_import
 from __future__ import division
@@ -9,9 +14,16 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from models.encoders.core.rnn_util import time_reduction
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+from models.encoders.core.lstm_factory import lstm_layer
+from models.encoders.core.lstm_factory import check_lstm_impl
+from models.encoders.core.cudnn_rnn import cudnn_to_block_cell_weights
 
-class PyramidalBLSTMEncoder(EncoderBase):
-    """Pyramidal Bidirectional LSTM Encoder.
+
+class PyramidalBLSTM_Encoder(object):
+    """Pyramidal bidirectional LSTM encoder.
     Args:
         num_units (int): the number of units in each layer
         num_layers (int): the number of layers
@@ -27,8 +39,14 @@ class PyramidalBLSTMEncoder(EncoderBase):
         parameter_init (float, optional): the range of uniform distribution to
             initialize weight parameters (>= 0)
         clip_activation (float, optional): the range of activation clipping (> 0)
-        # num_proj (int, optional): the number of nodes in the projection layer
-        # bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        num_proj (int, optional): the number of nodes in the projection layer
+        bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is True in all layers except for the last layer.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
         name (string, optional): the name of encoder
     """
 
@@ -42,11 +60,12 @@ class PyramidalBLSTMEncoder(EncoderBase):
                  clip_activation=5.0,
                  num_proj=None,
                  bottleneck_dim=None,
-                 concat=False,
+                 downsample_list=None,
+                 downsample_type='concat',
                  name='pblstm_encoder'):
 
-        if num_units % 2 != 0:
-            raise ValueError('num_unit should be even number.')
+        if downsample_list is None:
+            downsample_list = [True] * (num_layers - 1) + [False]
 
         self.num_units = num_units
         self.num_layers = num_layers
@@ -55,15 +74,44 @@ class PyramidalBLSTMEncoder(EncoderBase):
         self.use_peephole = use_peephole
         self.parameter_init = parameter_init
         self.clip_activation = clip_activation
-        self.num_proj = None
-        self.bottleneck_dim = None
+        if lstm_impl not in ['LSTMCell', 'LSTMBlockFusedCell', 'CudnnLSTM']:
+            self.num_proj = None
+        elif num_proj not in [None, 0]:
+            self.num_proj = int(num_proj)
+        else:
+            self.num_proj = None
+        self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
+            None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
         self.name = name
 
         self.return_hidden_states = True if num_classes == 0 else False
 
-    def _build(self, inputs, inputs_seq_len,
-               keep_prob_input, keep_prob_hidden, keep_prob_output):
-        """Construct Pyramidal Bidirectional LSTM encoder.
+        check_lstm_impl(lstm_impl)
+
+        # (cudnn_rnn, params) of each layer and direction of CudnnLSTM
+        self._rnn_list = []
+
+    @property
+    def downsample_factor(self):
+        """The total reduction factor of the time resolution."""
+        return 2 ** sum(self.downsample_list)
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
+    def __call__(self, inputs, inputs_seq_len,
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 is_training=True):
+        """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
             inputs_seq_len (placeholder): A tensor of size` [B]`
@@ -73,8 +121,13 @@ class PyramidalBLSTMEncoder(EncoderBase):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            is_training (bool or placeholder, optional): if False, the cuDNN
+                kernels do not allocate the reserve space for
+                back-propagation. This is used only with CudnnLSTM.
         Returns:
-            logits: A tensor of size `[T, B, num_classes]`
+            logits: A tensor of size `[T', B, num_classes]`, where
+                `T' = ceil(T / downsample_factor)`. Use `output_seq_len` for
+                the sequence length.
             final_state: A final hidden state of the encoder
         """
         # inputs: `[B, T, input_size]`
@@ -87,77 +140,62 @@ class PyramidalBLSTMEncoder(EncoderBase):
         initializer = tf.random_uniform_initializer(
             minval=-self.parameter_init, maxval=self.parameter_init)
 
+        # NOTE: stack time-major layers to avoid transposes in each layer
+        outputs = tf.transpose(outputs, (1, 0, 2))
+
         # Hidden layers
+        self._rnn_list = []
         for i_layer in range(1, self.num_layers + 1, 1):
             with tf.variable_scope('pblstm_hidden' + str(i_layer),
                                    initializer=initializer) as scope:
 
-                lstm_fw = tf.contrib.rnn.LSTMCell(
-                    self.num_units,
-                    use_peepholes=self.use_peephole,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=None,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-                lstm_bw = tf.contrib.rnn.LSTMCell(
-                    self.num_units,
-                    use_peepholes=self.use_peephole,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
+                outputs, final_state = lstm_layer(
+                    outputs, inputs_seq_len,
+                    lstm_impl=self.lstm_impl,
+                    num_units=self.num_units,
+                    keep_prob=keep_prob_hidden,
+                    bidirectional=True,
+                    use_peephole=self.use_peephole,
+                    clip_activation=self.clip_activation,
                     num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-
-                # Dropout for the hidden-hidden connections
-                lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_fw, output_keep_prob=keep_prob_hidden)
-                lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_bw, output_keep_prob=keep_prob_hidden)
-
-                if i_layer > 0:
-                    # Convert to time-major: `[T, B, input_size]`
-                    outputs = tf.transpose(outputs, (1, 0, 2))
-                    max_time = tf.shape(outputs)[0]
-
-                    max_time_half = tf.floor(max_time / 2) + 1
-
-                    # Apply concat_fn to each tensor in outputs along
-                    # dimension 0 (times-axis)
-                    i_time = tf.constant(0)
-                    final_time, outputs, tensor_list = tf.while_loop(
-                        cond=lambda t, hidden, tensor_list: t < max_time,
-                        body=lambda t, hidden, tensor_list: self._concat_fn(
-                            t, hidden, tensor_list),
-                        loop_vars=[i_time, outputs, tf.Variable([])],
-                        shape_invariants=[i_time.get_shape(),
-                                          outputs.get_shape(),
-                                          tf.TensorShape([None])])
-
-                    outputs = tf.stack(tensor_list, axis=0)
-
-                    inputs_seq_len = tf.cast(tf.floor(
-                        tf.cast(inputs_seq_len, tf.float32) / 2),
-                        tf.int32)
-
-                    # Transpose to `[batch_size, time, input_size]`
-                    outputs = tf.transpose(outputs, (1, 0, 2))
-
-                (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                    cell_fw=lstm_fw,
-                    cell_bw=lstm_bw,
-                    inputs=outputs,
-                    sequence_length=inputs_seq_len,
-                    dtype=tf.float32,
+                    parameter_init=self.parameter_init,
+                    is_training=is_training,
+                    rnn_list=self._rnn_list,
+                    time_major=True,
                     scope=scope)
                 # NOTE: initial states are zero states by default
 
-                # Concatenate each direction
-                outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
+                # Reduce the time resolution for the next layer
+                if self.downsample_list[i_layer - 1]:
+                    outputs, inputs_seq_len = time_reduction(
+                        outputs, inputs_seq_len,
+                        factor=2, reduction_type=self.downsample_type,
+                        time_major=True)
+
+        # Convert to batch-major: `[B, T', output_size]`
+        outputs = tf.transpose(outputs, (1, 0, 2))
 
         if self.return_hidden_states:
             return outputs, final_state
 
+        # Reshape to apply the same weights over the timesteps
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
+
+        if self.bottleneck_dim is not None:
+            with tf.variable_scope('bottleneck') as scope:
+                outputs = tf.contrib.layers.fully_connected(
+                    outputs, self.bottleneck_dim,
+                    activation_fn=tf.nn.relu,
+                    weights_initializer=tf.truncated_normal_initializer(
+                        stddev=self.parameter_init),
+                    biases_initializer=tf.zeros_initializer(),
+                    scope=scope)
+
+                # Dropout for the hidden-output connections
+                outputs = tf.nn.dropout(
+                    outputs, keep_prob_output, name='dropout_output_bottle')
+
         with tf.variable_scope('output') as scope:
             logits_2d = tf.contrib.layers.fully_connected(
                 outputs, self.num_classes,
@@ -171,7 +209,7 @@ class PyramidalBLSTMEncoder(EncoderBase):
             logits = tf.reshape(
                 logits_2d, shape=[batch_size, -1, self.num_classes])
 
-            # Convert to time-major: `[T, B, num_classes]'
+            # Convert to time-major: `[T', B, num_classes]'
             logits = tf.transpose(logits, (1, 0, 2))
 
             # Dropout for the hidden-output connections
@@ -179,41 +217,18 @@ class PyramidalBLSTMEncoder(EncoderBase):
                 logits, keep_prob_output, name='dropout_output')
             # NOTE: This may lead to bad results
 
-        return logits, final_state
+            return logits, final_state
 
-    def _concat_fn(self, current_time, x, tensor_list):
-        """Concatenate each 2 time steps to reduce time resolution.
+    def block_cell_weights(self, session):
+        """Evaluate the weights of the LSTM layers in the layout of
+           tf.contrib.rnn.LSTMBlockCell. This requires cuDNN (GPU).
         Args:
-            current_time: The current timestep
-            x: A tensor of size `[max_time, batch_size, feature_dim]`
-            result: A tensor of size `[t, batch_size, feature_dim * 2]`
+            session: A session in which the trained weights are restored
         Returns:
-            current_time: current_time + 2
-            x: A tensor of size `[max_time, batch_size, feature_dim]`
-            result: A tensor of size `[t + 1, batch_size, feature_dim * 2]`
+            A list of `(kernel, bias)` of each layer and direction. See
+                `cudnn_to_block_cell_weights`.
         """
-        print(tensor_list)
-        print(current_time)
-        print('-----')
-
-        batch_size = tf.shape(x)[1]
-        feature_dim = x.get_shape().as_list()[2]
-
-        # Concat features in 2 timesteps
-        concat_x = tf.concat(
-            axis=0,
-            values=[tf.reshape(x[current_time],
-                               shape=[1, batch_size, feature_dim]),
-                    tf.reshape(x[current_time + 1],
-                               shape=[1, batch_size, feature_dim])])
-
-        # Reshape to `[1, batch_size, feature_dim * 2]`
-        concat_x = tf.reshape(concat_x,
-                              shape=[1, batch_size, feature_dim * 2])
-
-        tensor_list = tf.concat(axis=0, values=[tensor_list, [concat_x]])
-
-        # Skip 2 timesteps
-        current_time += 2
-
-        return current_time, x, tensor_list
+        if self.lstm_impl != 'CudnnLSTM':
+            raise ValueError('The encoder is not built with CudnnLSTM.')
+        return cudnn_to_block_cell_weights(session, self._rnn_list,
+                                           self.num_units, self.num_proj)
@@ -25,3 +25,300 @@ def sequence_length(inputs, time_major=True, dtype=tf.int32):
         seq_len = tf.reduce_sum(used, axis=time_axis)
         seq_len = tf.cast(seq_len, dtype)
     return seq_len
+
+
+def latency_controlled_bidirectional_rnn(cell_fw, cell_bw, inputs,
+                                         inputs_seq_len, chunk_size,
+                                         right_context, chunk_seq_len,
+                                         initial_state_fw=None, scope=None):
+    """Latency-controlled bidirectional RNN for a chunk (+ right context).
+       The forward state is carried over chunks, while the backward direction
+       is re-initialized in each chunk and sees only `right context` frames
+       of the future. This creates the same variables as
+       `tf.nn.bidirectional_dynamic_rnn`.
+    Args:
+        cell_fw: An instance of RNNCell for the forward direction
+        cell_bw: An instance of RNNCell for the backward direction
+        inputs: A tensor of size `[B, chunk_size + right_context, input_size]`
+        inputs_seq_len: A tensor of size `[B]`. The number of valid frames in
+            the chunk and the right context
+        chunk_size (int): the number of frames in the chunk
+        right_context (int): the number of frames in the right context
+        chunk_seq_len: A tensor of size `[B]`. The number of valid frames in
+            the chunk (<= chunk_size)
+        initial_state_fw (optional): An initial state of the forward direction
+        scope (optional): VariableScope for the created subgraph
+    Returns:
+        outputs: A tuple `(outputs_fw, outputs_bw)` of tensors of size
+            `[B, chunk_size + right_context, num_units]`
+        final_state_fw: A forward state at the end of the chunk (not the
+            right context), which is used as initial_state_fw in the next
+            chunk
+    """
+    with tf.variable_scope(scope or "bidirectional_rnn"):
+        # Forward direction
+        with tf.variable_scope("fw") as fw_scope:
+            outputs_fw, final_state_fw = tf.nn.dynamic_rnn(
+                cell=cell_fw,
+                inputs=inputs[:, :chunk_size],
+                sequence_length=chunk_seq_len,
+                initial_state=initial_state_fw,
+                dtype=inputs.dtype,
+                scope=fw_scope)
+
+        if right_context > 0:
+            # NOTE: the right context is processed from the state at the end
+            # of the chunk, but the state is not carried to the next chunk
+            with tf.variable_scope(fw_scope, reuse=True) as fw_scope:
+                outputs_fw_right, _ = tf.nn.dynamic_rnn(
+                    cell=cell_fw,
+                    inputs=inputs[:, chunk_size:],
+                    sequence_length=inputs_seq_len - chunk_seq_len,
+                    initial_state=final_state_fw,
+                    dtype=inputs.dtype,
+                    scope=fw_scope)
+            outputs_fw = tf.concat(
+                axis=1, values=[outputs_fw, outputs_fw_right])
+
+        # Backward direction (zero initial states in each chunk)
+        with tf.variable_scope("bw") as bw_scope:
+            inputs_reverse = tf.reverse_sequence(
+                inputs, seq_lengths=inputs_seq_len, seq_axis=1, batch_axis=0)
+            outputs_bw, _ = tf.nn.dynamic_rnn(
+                cell=cell_bw,
+                inputs=inputs_reverse,
+                sequence_length=inputs_seq_len,
+                dtype=inputs.dtype,
+                scope=bw_scope)
+            outputs_bw = tf.reverse_sequence(
+                outputs_bw, seq_lengths=inputs_seq_len, seq_axis=1,
+                batch_axis=0)
+
+    return (outputs_fw, outputs_bw), final_state_fw
+
+
+def time_reduction(inputs, inputs_seq_len, factor=2,
+                   reduction_type='concat', time_major=False):
+    """Reduce the time resolution of sequences.
+    Args:
+        inputs: A tensor of size `[B, T, input_size]`, or `[T, B, input_size]`
+            if time_major is True
+        inputs_seq_len: A tensor of size `[B]`
+        factor (int, optional): the reduction factor of the time resolution
+        reduction_type (string, optional): concat or subsample.
+            concat: concatenate every `factor` frames along the feature axis
+            subsample: keep the first frame of every `factor` frames
+        time_major (bool, optional): if True, inputs and outputs are
+            time-major
+    Returns:
+        outputs: A tensor of size `[B, ceil(T / factor), input_size * factor]`
+            (concat) or `[B, ceil(T / factor), input_size]` (subsample).
+            The first two axes are swapped if time_major is True.
+        outputs_seq_len: A tensor of size `[B]`
+    """
+    if reduction_type not in ['concat', 'subsample']:
+        raise ValueError(
+            'reduction_type should be one of ["concat", "subsample"], you provided %s.' %
+            (reduction_type))
+
+    time_axis = 0 if time_major else 1
+    batch_size = tf.shape(inputs)[1 - time_axis]
+    max_time = tf.shape(inputs)[time_axis]
+    input_size = inputs.get_shape().as_list()[-1]
+
+    # Pad with zero frames to a multiple of factor
+    num_pad = (factor - max_time % factor) % factor
+    paddings = [[0, 0], [0, 0], [0, 0]]
+    paddings[time_axis] = [0, num_pad]
+    inputs = tf.pad(inputs, paddings)
+
+    if reduction_type == 'subsample':
+        outputs = inputs[::factor] if time_major else inputs[:, ::factor]
+    elif time_major:
+        # `[T / factor, factor, B, input_size]` -> `[T / factor, B, factor, input_size]`
+        outputs = tf.reshape(
+            inputs, shape=[-1, factor, batch_size, input_size])
+        outputs = tf.transpose(outputs, (0, 2, 1, 3))
+        outputs = tf.reshape(
+            outputs, shape=[-1, batch_size, input_size * factor])
+    else:
+        outputs = tf.reshape(
+            inputs, shape=[batch_size, -1, input_size * factor])
+
+    outputs_seq_len = (inputs_seq_len + factor - 1) // factor
+
+    return outputs, outputs_seq_len
+
+
+def parse_downsample_list(downsample_list, num_layers, downsample_type):
+    """Check options of time subsampling between layers.
+    Args:
+        downsample_list (list): booleans of size `[num_layers]`. If True, the
+            time resolution of the outputs of the layer is halved. None means
+            no subsampling.
+        num_layers (int): the number of layers
+        downsample_type (string): concat or subsample
+    Returns:
+        downsample_list (list): booleans of size `[num_layers]`
+    """
+    if downsample_list is None:
+        return [False] * num_layers
+    if len(downsample_list) != num_layers:
+        raise ValueError('downsample_list must have num_layers elements.')
+    if downsample_type not in ['concat', 'subsample']:
+        raise ValueError(
+            'downsample_type should be one of ["concat", "subsample"], you provided %s.' %
+            (downsample_type))
+    return [bool(d) for d in downsample_list]
+
+
+def downsampled_seq_len(inputs_seq_len, downsample_list):
+    """Compute the sequence length after time subsampling between layers.
+    Args:
+        inputs_seq_len: A tensor of size `[B]`
+        downsample_list (list): booleans of size `[num_layers]`
+    Returns:
+        A tensor of size `[B]`
+    """
+    for downsample in downsample_list:
+        if downsample:
+            inputs_seq_len = (inputs_seq_len + 1) // 2
+    return inputs_seq_len
+
+
+def subsampled_dynamic_rnn(cell_list, inputs, inputs_seq_len, downsample_list,
+                           downsample_type='concat', initial_state=None,
+                           scope=None):
+    """Run stacked unidirectional RNNs with time subsampling between layers.
+       Layers are split into blocks at the subsampling points, and each block
+       is run as a `MultiRNNCell`. Without subsampling, this is the same as
+       `tf.nn.dynamic_rnn` with a `MultiRNNCell` of all layers.
+    Args:
+        cell_list (list): RNN cells of each layer
+        inputs: A tensor of size `[B, T, input_size]`
+        inputs_seq_len: A tensor of size `[B]`
+        downsample_list (list): booleans of size `[num_layers]`
+        downsample_type (string, optional): concat or subsample
+        initial_state (optional): A tuple of initial states of each layer.
+            Default is zero states.
+        scope (optional): VariableScope for the created subgraph
+    Returns:
+        outputs: A tensor of size `[B, T', output_size]`
+        final_state: A tuple of final states of each layer
+        outputs_seq_len: A tensor of size `[B]`
+    """
+    if not any(downsample_list):
+        outputs, final_state = tf.nn.dynamic_rnn(
+            cell=tf.contrib.rnn.MultiRNNCell(cell_list, state_is_tuple=True),
+            inputs=inputs,
+            sequence_length=inputs_seq_len,
+            initial_state=initial_state,
+            dtype=inputs.dtype,
+            scope=scope)
+        return outputs, final_state, inputs_seq_len
+
+    # Split layers into blocks at the subsampling points
+    num_layers = len(cell_list)
+    block_list = [[]]
+    for i_layer in range(num_layers):
+        block_list[-1].append(i_layer)
+        if downsample_list[i_layer] and i_layer != num_layers - 1:
+            block_list.append([])
+
+    outputs = inputs
+    final_state = []
+    with tf.variable_scope(scope or 'rnn'):
+        for i_block, block in enumerate(block_list):
+            if initial_state is None:
+                block_initial_state = None
+            else:
+                block_initial_state = tuple(
+                    initial_state[i_layer] for i_layer in block)
+
+            outputs, block_final_state = tf.nn.dynamic_rnn(
+                cell=tf.contrib.rnn.MultiRNNCell(
+                    [cell_list[i_layer] for i_layer in block],
+                    state_is_tuple=True),
+                inputs=outputs,
+                sequence_length=inputs_seq_len,
+                initial_state=block_initial_state,
+                dtype=inputs.dtype,
+                scope='block' + str(i_block + 1))
+            final_state.extend(block_final_state)
+
+            # Reduce the time resolution for the next block
+            if downsample_list[block[-1]]:
+                outputs, inputs_seq_len = time_reduction(
+                    outputs, inputs_seq_len,
+                    factor=2, reduction_type=downsample_type)
+
+    return outputs, tuple(final_state), inputs_seq_len
+
+
+def fused_bidirectional_lstm(inputs, inputs_seq_len, num_units, keep_prob,
+                             use_peephole=True, clip_activation=None,
+                             num_proj=None, parameter_init=0.1, scope=None):
+    """Bidirectional LSTM layer on tf.contrib.rnn.LSTMBlockFusedCell, which
+       runs all timesteps in a single op. Inputs and outputs are time-major
+       so that layers are stacked without transposes.
+    Args:
+        inputs: A tensor of size `[T, B, input_size]`
+        inputs_seq_len: A tensor of size `[B]`
+        num_units (int): the number of units
+        keep_prob (placeholder, float): A probability to keep nodes in the
+            outputs
+        use_peephole (bool, optional): if True, use peephole
+        clip_activation (float, optional): the range of cell clipping (> 0)
+        num_proj (int, optional): the number of nodes in the linear projection
+            layer of the outputs in each direction
+        parameter_init (float, optional): the standard deviation of the
+            weights of the projection layer
+        scope (optional): VariableScope for the created subgraph
+    Returns:
+        outputs: A tensor of size `[T, B, num_units * 2]`, or
+            `[T, B, num_proj * 2]` if num_proj is set
+        final_state: A tuple of forward and backward `LSTMStateTuple`
+    """
+    with tf.variable_scope(scope or 'bidirectional_rnn'):
+        lstm_fw = tf.contrib.rnn.LSTMBlockFusedCell(
+            num_units,
+            forget_bias=1.0,
+            cell_clip=clip_activation,
+            use_peephole=use_peephole)
+        lstm_bw = tf.contrib.rnn.LSTMBlockFusedCell(
+            num_units,
+            forget_bias=1.0,
+            cell_clip=clip_activation,
+            use_peephole=use_peephole)
+        lstm_bw = tf.contrib.rnn.TimeReversedFusedRNN(lstm_bw)
+
+        # NOTE: outputs of padded frames are zero
+        outputs_fw, (c_fw, h_fw) = lstm_fw(
+            inputs, sequence_length=inputs_seq_len, dtype=inputs.dtype,
+            scope='fw')
+        outputs_bw, (c_bw, h_bw) = lstm_bw(
+            inputs, sequence_length=inputs_seq_len, dtype=inputs.dtype,
+            scope='bw')
+        final_state = (tf.contrib.rnn.LSTMStateTuple(c=c_fw, h=h_fw),
+                       tf.contrib.rnn.LSTMStateTuple(c=c_bw, h=h_bw))
+
+        if num_proj is not None:
+            # NOTE: the projection is not fed back to the recurrence
+            projected = []
+            for direction, outputs in [('fw', outputs_fw), ('bw', outputs_bw)]:
+                with tf.variable_scope('projection_' + direction) as scope:
+                    projected.append(tf.contrib.layers.fully_connected(
+                        outputs, num_proj,
+                        activation_fn=None,
+                        weights_initializer=tf.truncated_normal_initializer(
+                            stddev=parameter_init),
+                        biases_initializer=None,
+                        scope=scope))
+            outputs_fw, outputs_bw = projected
+
+        outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
+
+    # Dropout for the hidden-hidden connections
+    outputs = tf.nn.dropout(outputs, keep_prob)
+
+    return outputs, final_state
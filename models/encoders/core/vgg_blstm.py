@@ -11,6 +11,14 @@ import math
 import tensorflow as tf
 
 from models.encoders.core.cnn_util import conv_layer, max_pool
+from models.encoders.core.rnn_util import latency_controlled_bidirectional_rnn
+from models.encoders.core.rnn_util import time_reduction
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+from models.encoders.core.lstm_factory import lstm_cell
+from models.encoders.core.lstm_factory import lstm_layer
+from models.encoders.core.lstm_factory import check_lstm_impl
+from models.encoders.core.cudnn_rnn import cudnn_to_block_cell_weights
 
 
 class VGG_BLSTM_Encoder(object):
@@ -24,7 +32,8 @@ class VGG_BLSTM_Encoder(object):
             (except for a blank label). if 0, return hidden states before
             passing through the softmax layer
         lstm_impl (string, optional):
-            BasicLSTMCell or LSTMCell or LSTMBlockCell or LSTMBlockFusedCell.
+            BasicLSTMCell or LSTMCell or LSTMBlockCell or
+                LSTMBlockFusedCell or CudnnLSTM.
             Choose the background implementation of tensorflow.
             Default is LSTMBlockCell (the fastest implementation).
         use_peephole (bool, optional): if True, use peephole
@@ -33,6 +42,14 @@ class VGG_BLSTM_Encoder(object):
         clip_activation (float, optional): the range of activation clipping (> 0)
         num_proj (int, optional): the number of nodes in the projection layer
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is no subsampling.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
+        batch_norm (bool, optional): if True, batch normalization is
+            performed after each convolutional layer
         name (string, optional): the name of encoder
     """
 
@@ -48,6 +65,9 @@ class VGG_BLSTM_Encoder(object):
                  clip_activation=5.0,
                  num_proj=None,
                  bottleneck_dim=None,
+                 downsample_list=None,
+                 downsample_type='concat',
+                 batch_norm=False,
                  name='vgg_blstm_encoder'):
 
         self.input_size = input_size
@@ -59,7 +79,7 @@ class VGG_BLSTM_Encoder(object):
         self.use_peephole = use_peephole
         self.parameter_init = parameter_init
         self.clip_activation = clip_activation
-        if lstm_impl != 'LSTMCell':
+        if lstm_impl not in ['LSTMCell', 'LSTMBlockFusedCell', 'CudnnLSTM']:
             self.num_proj = None
         elif num_proj not in [None, 0]:
             self.num_proj = int(num_proj)
@@ -67,12 +87,40 @@ class VGG_BLSTM_Encoder(object):
             self.num_proj = None
         self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
             None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
+        self.batch_norm = batch_norm
         self.name = name
 
         self.return_hidden_states = True if num_classes == 0 else False
 
+        check_lstm_impl(lstm_impl)
+
+        # (cudnn_rnn, params) of each layer and direction of CudnnLSTM
+        self._rnn_list = []
+
+    @property
+    def state_size_fw(self):
+        """The sizes of the forward hidden state in each layer, which is
+           carried over chunks in the latency-controlled mode."""
+        output_size = self.num_units if self.num_proj is None else self.num_proj
+        return tuple(tf.contrib.rnn.LSTMStateTuple(self.num_units, output_size)
+                     for _ in range(self.num_layers))
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 chunk_size=None, right_context=0, chunk_seq_len=None,
+                 initial_state_fw=None, is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -83,10 +131,34 @@ class VGG_BLSTM_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            chunk_size (int, optional): the number of frames in a chunk. If
+                set, the latency-controlled mode is used for inference, and
+                inputs are a chunk followed by the right context.
+            right_context (int, optional): the number of frames in the right
+                context in the latency-controlled mode
+            chunk_seq_len (placeholder, optional): A tensor of size `[B]`.
+                The number of valid frames in the chunk (except for the right
+                context) in the latency-controlled mode
+            initial_state_fw (optional): Initial forward states of all layers
+                with the structure of `state_size_fw` in the
+                latency-controlled mode. Default is zero states.
+            is_training (bool or placeholder, optional): if False, batch
+                normalization uses the moving averages
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
-            final_state: A final hidden state of the encoder
+            final_state: A final hidden state of the encoder. In the
+                latency-controlled mode, forward states of all layers at the
+                end of the chunk.
         """
+        if chunk_size is not None and self.lstm_impl in ['LSTMBlockFusedCell', 'CudnnLSTM']:
+            raise NotImplementedError(
+                'The latency-controlled mode is not supported for %s.' %
+                self.lstm_impl)
+        if chunk_size is not None and any(self.downsample_list):
+            raise NotImplementedError(
+                'The latency-controlled mode is not supported with time '
+                'subsampling.')
+
         # inputs: `[B, T, input_size * splice]`
         batch_size = tf.shape(inputs)[0]
         max_time = tf.shape(inputs)[1]
@@ -102,28 +174,34 @@ class VGG_BLSTM_Encoder(object):
                                 filter_shape=[3, 3, 3, 64],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv1')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 64, 64],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv2')
             inputs = max_pool(inputs, name='max_pool')
-            # TODO(hirofumi): try batch normalization
 
         with tf.variable_scope('VGG2'):
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 64, 128],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv1')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 128, 128],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv2')
             inputs = max_pool(inputs, name='max_pool')
-            # TODO(hirofumi): try batch normalization
 
         # Reshape to 2D tensor `[B * T, new_h * new_w * 128]`
         new_h = math.ceil(self.input_size / 3 / 4)  # expected to be 11 ro 10
@@ -150,91 +228,82 @@ class VGG_BLSTM_Encoder(object):
             minval=-self.parameter_init,
             maxval=self.parameter_init)
 
+        if chunk_size is None:
+            # NOTE: stack time-major layers to avoid transposes in each layer
+            outputs = tf.transpose(outputs, (1, 0, 2))
+
         # Hidden layers
+        self._rnn_list = []
+        final_state_fw_list = []
         for i_layer in range(1, self.num_layers + 1, 1):
             with tf.variable_scope('blstm_hidden' + str(i_layer),
                                    initializer=initializer) as scope:
 
-                if self.lstm_impl == 'BasicLSTMCell':
-                    lstm_fw = tf.contrib.rnn.BasicLSTMCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        state_is_tuple=True,
-                        activation=tf.tanh)
-                    lstm_bw = tf.contrib.rnn.BasicLSTMCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        state_is_tuple=True,
-                        activation=tf.tanh)
-
-                elif self.lstm_impl == 'LSTMCell':
-                    lstm_fw = tf.contrib.rnn.LSTMCell(
-                        self.num_units,
-                        use_peepholes=self.use_peephole,
-                        cell_clip=self.clip_activation,
+                if chunk_size is None:
+                    outputs, final_state = lstm_layer(
+                        outputs, inputs_seq_len,
+                        lstm_impl=self.lstm_impl,
+                        num_units=self.num_units,
+                        keep_prob=keep_prob_hidden,
+                        bidirectional=True,
+                        use_peephole=self.use_peephole,
+                        clip_activation=self.clip_activation,
                         num_proj=self.num_proj,
-                        forget_bias=1.0,
-                        state_is_tuple=True)
-                    lstm_bw = tf.contrib.rnn.LSTMCell(
-                        self.num_units,
-                        use_peepholes=self.use_peephole,
-                        cell_clip=self.clip_activation,
-                        num_proj=self.num_proj,
-                        forget_bias=1.0,
-                        state_is_tuple=True)
-
-                elif self.lstm_impl == 'LSTMBlockCell':
-                    # NOTE: This should be faster than tf.contrib.rnn.LSTMCell
-                    lstm_fw = tf.contrib.rnn.LSTMBlockCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        # clip_cell=True,
-                        use_peephole=self.use_peephole)
-                    lstm_bw = tf.contrib.rnn.LSTMBlockCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        # clip_cell=True,
-                        use_peephole=self.use_peephole)
-                    # TODO: cell clipping (update for rc1.3)
-
-                elif self.lstm_impl == 'LSTMBlockFusedCell':
-                    raise NotImplementedError
-
-                elif self.lstm_impl == 'CudnnLSTM':
-                    raise ValueError
+                        parameter_init=self.parameter_init,
+                        is_training=is_training,
+                        rnn_list=self._rnn_list,
+                        time_major=True,
+                        scope=scope)
+                    # NOTE: initial states are zero states by default
 
                 else:
-                    raise IndexError(
-                        'lstm_impl is "BasicLSTMCell" or "LSTMCell" or ' +
-                        '"LSTMBlockCell" or "LSTMBlockFusedCell" or ' +
-                        '"CudnnLSTM".')
-
-                # Dropout for the hidden-hidden connections
-                lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_fw, output_keep_prob=keep_prob_hidden)
-                lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_bw, output_keep_prob=keep_prob_hidden)
-
-                # Ignore 2nd return (the last state)
-                (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                    cell_fw=lstm_fw,
-                    cell_bw=lstm_bw,
-                    inputs=outputs,
-                    sequence_length=inputs_seq_len,
-                    dtype=tf.float32,
-                    scope=scope)
-                # NOTE: initial states are zero states by default
-
-                outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
+                    # Dropout for the hidden-hidden connections
+                    lstm_fw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_cell(self.lstm_impl, self.num_units,
+                                  self.use_peephole, self.clip_activation,
+                                  self.num_proj),
+                        output_keep_prob=keep_prob_hidden)
+                    lstm_bw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_cell(self.lstm_impl, self.num_units,
+                                  self.use_peephole, self.clip_activation,
+                                  self.num_proj),
+                        output_keep_prob=keep_prob_hidden)
+
+                    (outputs_fw, outputs_bw), final_state_fw = latency_controlled_bidirectional_rnn(
+                        cell_fw=lstm_fw,
+                        cell_bw=lstm_bw,
+                        inputs=outputs,
+                        inputs_seq_len=inputs_seq_len,
+                        chunk_size=chunk_size,
+                        right_context=right_context,
+                        chunk_seq_len=chunk_seq_len,
+                        initial_state_fw=None if initial_state_fw is None else initial_state_fw[i_layer - 1],
+                        scope=scope)
+                    final_state_fw_list.append(final_state_fw)
+                    final_state = tuple(final_state_fw_list)
+
+                    outputs = tf.concat(
+                        axis=2, values=[outputs_fw, outputs_bw])
+
+                # Reduce the time resolution for the next layer
+                if self.downsample_list[i_layer - 1]:
+                    outputs, inputs_seq_len = time_reduction(
+                        outputs, inputs_seq_len,
+                        factor=2, reduction_type=self.downsample_type,
+                        time_major=chunk_size is None)
+
+        if chunk_size is None:
+            # Convert to batch-major: `[B, T, output_size]`
+            outputs = tf.transpose(outputs, (1, 0, 2))
 
         if self.return_hidden_states:
             return outputs, final_state
 
         # Reshape to apply the same weights over the timesteps
-        if self.num_proj is None:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_units * 2])
-        else:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_proj * 2])
+        # NOTE: the feature size is doubled by concat-pooling in the last
+        # layer
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
             with tf.variable_scope('bottleneck') as scope:
@@ -271,3 +340,17 @@ class VGG_BLSTM_Encoder(object):
                 logits, keep_prob_output, name='dropout_output')
 
             return logits, final_state
+
+    def block_cell_weights(self, session):
+        """Evaluate the weights of the LSTM layers in the layout of
+           tf.contrib.rnn.LSTMBlockCell. This requires cuDNN (GPU).
+        Args:
+            session: A session in which the trained weights are restored
+        Returns:
+            A list of `(kernel, bias)` of each layer and direction. See
+                `cudnn_to_block_cell_weights`.
+        """
+        if self.lstm_impl != 'CudnnLSTM':
+            raise ValueError('The encoder is not built with CudnnLSTM.')
+        return cudnn_to_block_cell_weights(session, self._rnn_list,
+                                           self.num_units, self.num_proj)
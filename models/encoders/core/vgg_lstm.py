@@ -11,6 +11,11 @@ import math
 import tensorflow as tf
 
 from models.encoders.core.cnn_util import conv_layer, max_pool
+from models.encoders.core.lstm_factory import stacked_lstm
+from models.encoders.core.lstm_factory import check_lstm_impl
+from models.encoders.core.rnn_util import parse_downsample_list
+from models.encoders.core.rnn_util import downsampled_seq_len
+from models.encoders.core.cudnn_rnn import cudnn_to_block_cell_weights
 
 
 class VGG_LSTM_Encoder(object):
@@ -24,7 +29,8 @@ class VGG_LSTM_Encoder(object):
             (except for a blank label). if 0, return hidden states before
             passing through the softmax layer
         lstm_impl (string, optional):
-            BasicLSTMCell or LSTMCell or LSTMBlockCell or LSTMBlockFusedCell.
+            BasicLSTMCell or LSTMCell or LSTMBlockCell or
+                LSTMBlockFusedCell or CudnnLSTM.
             Choose the background implementation of tensorflow.
             Default is LSTMBlockCell (the fastest implementation).
         use_peephole (bool, optional): if True, use peephole
@@ -33,6 +39,14 @@ class VGG_LSTM_Encoder(object):
         clip_activation (float, optional): the range of activation clipping (> 0)
         num_proj (int, optional): the number of nodes in the projection layer
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        downsample_list (list, optional): booleans of size `[num_layers]`.
+            If True, the time resolution of the outputs of the layer is
+            halved. Default is no subsampling.
+        downsample_type (string, optional): concat or subsample.
+            concat: concatenate outputs of 2 consecutive frames
+            subsample: drop every other frame
+        batch_norm (bool, optional): if True, batch normalization is
+            performed after each convolutional layer
         name (string, optional): the name of encoder
     """
 
@@ -48,6 +62,9 @@ class VGG_LSTM_Encoder(object):
                  clip_activation=5.0,
                  num_proj=None,
                  bottleneck_dim=None,
+                 downsample_list=None,
+                 downsample_type='concat',
+                 batch_norm=False,
                  name='vgg_lstm_encoder'):
 
         self.input_size = input_size
@@ -67,12 +84,31 @@ class VGG_LSTM_Encoder(object):
             self.num_proj = None
         self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
             None, 0] else None
+        self.downsample_list = parse_downsample_list(
+            downsample_list, num_layers, downsample_type)
+        self.downsample_type = downsample_type
+        self.batch_norm = batch_norm
         self.name = name
 
         self.return_hidden_states = True if num_classes == 0 else False
 
+        check_lstm_impl(lstm_impl)
+
+        # (cudnn_rnn, params) of each layer and direction of CudnnLSTM
+        self._rnn_list = []
+
+    def output_seq_len(self, inputs_seq_len):
+        """Compute the sequence length of the outputs.
+        Args:
+            inputs_seq_len: A tensor of size `[B]`
+        Returns:
+            A tensor of size `[B]`
+        """
+        return downsampled_seq_len(inputs_seq_len, self.downsample_list)
+
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -83,6 +119,8 @@ class VGG_LSTM_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            is_training (bool or placeholder, optional): if False, batch
+                normalization uses the moving averages
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
             final_state: A final hidden state of the encoder
@@ -101,28 +139,34 @@ class VGG_LSTM_Encoder(object):
                                 filter_shape=[3, 3, 3, 64],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv1')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 64, 64],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv2')
             inputs = max_pool(inputs, name='max_pool')
-            # TODO(hirofumi): try batch normalization
 
         with tf.variable_scope('VGG2'):
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 64, 128],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv1')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 128, 128],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv2')
             inputs = max_pool(inputs, name='max_pool')
-            # TODO(hirofumi): try batch normalization
 
         # Reshape to 2D tensor `[B * T, new_h * new_w * 128]`
         new_h = math.ceil(self.input_size / 3 / 4)  # expected to be 11 ro 10
@@ -152,63 +196,22 @@ class VGG_LSTM_Encoder(object):
             maxval=self.parameter_init)
 
         # Hidden layers
-        lstm_list = []
+        self._rnn_list = []
         with tf.variable_scope('multi_lstm', initializer=initializer) as scope:
-            for i_layer in range(1, self.num_layers + 1, 1):
-
-                if self.lstm_impl == 'BasicLSTMCell':
-                    lstm = tf.contrib.rnn.BasicLSTMCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        state_is_tuple=True,
-                        activation=tf.tanh)
-
-                elif self.lstm_impl == 'LSTMCell':
-                    lstm = tf.contrib.rnn.LSTMCell(
-                        self.num_units,
-                        use_peepholes=self.use_peephole,
-                        cell_clip=self.clip_activation,
-                        num_proj=self.num_proj,
-                        forget_bias=1.0,
-                        state_is_tuple=True)
-
-                elif self.lstm_impl == 'LSTMBlockCell':
-                    # NOTE: This should be faster than tf.contrib.rnn.LSTMCell
-                    lstm = tf.contrib.rnn.LSTMBlockCell(
-                        self.num_units,
-                        forget_bias=1.0,
-                        # clip_cell=True,
-                        use_peephole=self.use_peephole)
-                    # TODO: cell clipping (update for rc1.3)
-
-                elif self.lstm_impl == 'LSTMBlockFusedCell':
-                    raise NotImplementedError
-
-                elif self.lstm_impl == 'CudnnLSTM':
-                    raise NotImplementedError
-
-                else:
-                    raise IndexError(
-                        'lstm_impl is "BasicLSTMCell" or "LSTMCell" or ' +
-                        '"LSTMBlockCell" or "LSTMBlockFusedCell" or ' +
-                        '"CudnnLSTM".')
-
-                # Dropout for the hidden-hidden connections
-                lstm = tf.contrib.rnn.DropoutWrapper(
-                    lstm, output_keep_prob=keep_prob_hidden)
-
-                lstm_list.append(lstm)
-
-            # Stack multiple cells
-            stacked_lstm = tf.contrib.rnn.MultiRNNCell(
-                lstm_list, state_is_tuple=True)
-
-            # Ignore 2nd return (the last state)
-            outputs, final_state = tf.nn.dynamic_rnn(
-                cell=stacked_lstm,
-                inputs=inputs,
-                sequence_length=inputs_seq_len,
-                dtype=tf.float32,
+            outputs, final_state, _ = stacked_lstm(
+                inputs, inputs_seq_len,
+                lstm_impl=self.lstm_impl,
+                num_units=self.num_units,
+                num_layers=self.num_layers,
+                keep_prob=keep_prob_hidden,
+                use_peephole=self.use_peephole,
+                clip_activation=self.clip_activation,
+                num_proj=self.num_proj,
+                parameter_init=self.parameter_init,
+                is_training=is_training,
+                rnn_list=self._rnn_list,
+                downsample_list=self.downsample_list,
+                downsample_type=self.downsample_type,
                 scope=scope)
             # NOTE: initial states are zero states by default
 
@@ -216,10 +219,10 @@ class VGG_LSTM_Encoder(object):
             return outputs, final_state
 
         # Reshape to apply the same weights over the timesteps
-        if self.num_proj is None:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_units])
-        else:
-            outputs = tf.reshape(outputs, shape=[-1, self.num_proj])
+        # NOTE: the feature size is doubled by concat-pooling in the last
+        # layer
+        outputs_dim = outputs.get_shape().as_list()[-1]
+        outputs = tf.reshape(outputs, shape=[-1, outputs_dim])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
             with tf.variable_scope('bottleneck') as scope:
@@ -256,3 +259,17 @@ class VGG_LSTM_Encoder(object):
                 logits, keep_prob_output, name='dropout_output')
 
             return logits, final_state
+
+    def block_cell_weights(self, session):
+        """Evaluate the weights of the LSTM layers in the layout of
+           tf.contrib.rnn.LSTMBlockCell. This requires cuDNN (GPU).
+        Args:
+            session: A session in which the trained weights are restored
+        Returns:
+            A list of `(kernel, bias)` of each layer and direction. See
+                `cudnn_to_block_cell_weights`.
+        """
+        if self.lstm_impl != 'CudnnLSTM':
+            raise ValueError('The encoder is not built with CudnnLSTM.')
+        return cudnn_to_block_cell_weights(session, self._rnn_list,
+                                           self.num_units, self.num_proj)
@@ -42,6 +42,8 @@ class VGG_Encoder(object):
             initialize weight parameters (>= 0)
         clip_activation (float, optional): the range of activation clipping (> 0)
         bottleneck_dim (int, optional): the dimensions of the bottleneck layer
+        batch_norm (bool, optional): if True, batch normalization is
+            performed after each convolutional layer
         name (string, optional): the name of encoder
     """
 
@@ -52,6 +54,7 @@ class VGG_Encoder(object):
                  parameter_init=0.1,
                  clip_activation=5.0,
                  bottleneck_dim=None,
+                 batch_norm=False,
                  name='vgg_encoder'):
 
         self.input_size = input_size
@@ -61,10 +64,12 @@ class VGG_Encoder(object):
         self.clip_activation = clip_activation
         self.bottleneck_dim = int(bottleneck_dim) if bottleneck_dim not in [
             None, 0] else None
+        self.batch_norm = batch_norm
         self.name = name
 
     def __call__(self, inputs, inputs_seq_len,
-                 keep_prob_input, keep_prob_hidden, keep_prob_output):
+                 keep_prob_input, keep_prob_hidden, keep_prob_output,
+                 is_training=True):
         """Construct model graph.
         Args:
             inputs (placeholder): A tensor of size`[B, T, input_size]`
@@ -75,6 +80,8 @@ class VGG_Encoder(object):
                 in the hidden-hidden connection
             keep_prob_output (placeholder, float): A probability to keep nodes
                 in the hidden-output connection
+            is_training (bool or placeholder, optional): if False, batch
+                normalization uses the moving averages
         Returns:
             logits: A tensor of size `[T, B, num_classes]`
             final_state: A final hidden state of the encoder
@@ -94,67 +101,86 @@ class VGG_Encoder(object):
                                 filter_shape=[3, 3, 3, 96],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv1')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 96, 96],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv2')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 96, 96],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv3')
             inputs = max_pool(inputs, name='max_pool')
-            # TODO(hirofumi): try batch normalization
 
         with tf.variable_scope('VGG2'):
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 96, 192],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv1')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 192, 192],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv2')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 192, 192],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv3')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 192, 192],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv4')
             inputs = max_pool(inputs, name='max_pool')
-            # TODO(hirofumi): try batch normalization
 
         with tf.variable_scope('VGG3'):
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 192, 384],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv1')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 384, 384],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv2')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 384, 384],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv3')
             inputs = conv_layer(inputs,
                                 filter_shape=[3, 3, 384, 384],
                                 parameter_init=self.parameter_init,
                                 relu=True,
+                                batch_norm=self.batch_norm,
+                                is_training=is_training,
                                 name='conv4')
             inputs = max_pool(inputs, name='max_pool')
-            # TODO(hirofumi): try batch normalization
 
         # Reshape to 2D tensor `[batch_size * max_time, new_h * new_w * 384]`
         new_h = math.ceil(self.input_size / (3 * 2**3)
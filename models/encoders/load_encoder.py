@@ -9,6 +9,7 @@ from __future__ import print_function
 
 from models.encoders.core.blstm import BLSTM_Encoder
 from models.encoders.core.lstm import LSTM_Encoder
+from models.encoders.core.pyramidal_blstm import PyramidalBLSTM_Encoder
 from models.encoders.core.bgru import BGRU_Encoder
 from models.encoders.core.gru import GRU_Encoder
 from models.encoders.core.cnn_zhang import CNN_Encoder
@@ -22,6 +23,7 @@ from models.encoders.core.multitask_lstm import Multitask_LSTM_Encoder
 ENCODERS = {
     "blstm": BLSTM_Encoder,
     "lstm": LSTM_Encoder,
+    "pblstm": PyramidalBLSTM_Encoder,
     "bgru": BGRU_Encoder,
     "gru": GRU_Encoder,
     "cnn_zhang": CNN_Encoder,
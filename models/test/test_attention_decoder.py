@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.attention.decoders.attention_layer import AttentionLayer
+from models.attention.decoders.attention_decoder import AttentionDecoder
+from models.test.util import measure_time
+
+
+class TestAttentionDecoder(tf.test.TestCase):
+
+    def test_attention_decoder(self):
+        print("Fused attention decoder Working check.")
+
+        self.check_fused_training(attention_type='content')
+        self.check_fused_training(attention_type='layer_dot')
+        self.check_fused_training(attention_type='content', time_major=True)
+
+    @measure_time
+    def check_fused_training(self, attention_type, time_major=False,
+                             batch_size=32, max_time=300, max_label_len=80,
+                             num_classes=63, num_trials=20):
+
+        print('==================================================')
+        print('  attention_type: %s' % attention_type)
+        print('  time_major: %s' % str(time_major))
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Dummy encoder outputs
+            encoder_num_unit = 512
+            encoder_outputs = tf.constant(np.random.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            encoder_outputs_seq_len = tf.constant(np.random.randint(
+                max_time // 2, max_time + 1, size=batch_size).astype(np.int32))
+            labels_seq_len_np = np.random.randint(
+                max_label_len // 2, max_label_len + 1,
+                size=batch_size).astype(np.int32)
+            labels_seq_len_np[0] = max_label_len
+            labels_seq_len = tf.constant(labels_seq_len_np)
+            inputs = tf.constant(np.random.randn(
+                batch_size, max_label_len, 64).astype(np.float32))
+
+            attention_layer = AttentionLayer(
+                num_unit=128,
+                attention_smoothing=False,
+                attention_weights_tempareture=1.0,
+                attention_type=attention_type)
+
+            def create_decoder():
+                return AttentionDecoder(
+                    cell=tf.contrib.rnn.LSTMCell(num_units=256),
+                    parameter_init=0.1,
+                    max_decode_length=100,
+                    num_classes=num_classes,
+                    attention_encoder_states=encoder_outputs,
+                    attention_values=encoder_outputs,
+                    attention_values_length=encoder_outputs_seq_len,
+                    attention_layer=attention_layer,
+                    time_major=time_major,
+                    input_feeding=False)
+
+            initial_state = tf.contrib.rnn.LSTMStateTuple(
+                c=tf.zeros([batch_size, 256]), h=tf.zeros([batch_size, 256]))
+
+            # Fused training (create parameters)
+            decoder_fused = create_decoder()
+            self.assertTrue(decoder_fused.fusible)
+            outputs_fused, _ = decoder_fused.decode_train_fused(
+                initial_state=initial_state,
+                inputs=inputs,
+                sequence_length=labels_seq_len)
+
+            # Step by step training (share parameters)
+            decoder_step = create_decoder()
+            with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+                outputs_step, _ = decoder_step(
+                    initial_state=initial_state,
+                    helper=tf.contrib.seq2seq.TrainingHelper(
+                        inputs=inputs,
+                        sequence_length=labels_seq_len),
+                    mode=tf.contrib.learn.ModeKeys.INFER)
+
+            loss_fused = tf.reduce_sum(outputs_fused.logits ** 2)
+            loss_step = tf.reduce_sum(outputs_step.logits ** 2)
+            train_op_fused = tf.train.GradientDescentOptimizer(
+                1e-6).minimize(loss_fused)
+            train_op_step = tf.train.GradientDescentOptimizer(
+                1e-6).minimize(loss_step)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                logits_fused, logits_step = sess.run(
+                    [outputs_fused.logits, outputs_step.logits])
+                if time_major:
+                    logits_fused = logits_fused.transpose((1, 0, 2))
+                    logits_step = logits_step.transpose((1, 0, 2))
+
+                # Same logits for valid steps
+                for i_batch in range(batch_size):
+                    label_len = labels_seq_len_np[i_batch]
+                    self.assertAllClose(logits_fused[i_batch, :label_len],
+                                        logits_step[i_batch, :label_len],
+                                        atol=1e-4)
+
+                # Training step time
+                for name, op in [('step by step', train_op_step),
+                                 ('fused', train_op_fused)]:
+                    sess.run(op)
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(op)
+                    elapsed = (time.time() - start_time) / num_trials
+                    print('%s: %.3f ms per training step' %
+                          (name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    tf.test.main()
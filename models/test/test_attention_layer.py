@@ -0,0 +1,245 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.attention.decoders.attention_layer import AttentionLayer
+from models.test.util import measure_time
+
+
+class TestAttentionLayer(tf.test.TestCase):
+
+    def test_attention_layer(self):
+        print("Attention layer Working check.")
+
+        # Windowed attention covering all frames is full attention
+        self.check_attention_layer(attention_type='content', window_size=201)
+        self.check_attention_layer(attention_type='location', window_size=201)
+        self.check_attention_layer(attention_type='content', window_size=201,
+                                   attention_smoothing=True)
+
+        # Monotonic attention
+        self.check_attention_layer(attention_type='content', window_size=20,
+                                   monotonic=True)
+
+        # Numerical stability
+        self.check_attention_layer(attention_type='content', window_size=None,
+                                   scale=1000)
+        self.check_attention_layer(attention_type='content', window_size=20,
+                                   scale=1000)
+
+        # Step time for long utterances
+        self.check_step_time(max_time=500)
+        self.check_step_time(max_time=2000)
+
+        # Precomputed attention keys
+        self.check_attention_keys(attention_type='content')
+        self.check_attention_keys(attention_type='hybrid')
+        self.check_attention_keys(attention_type='content', window_size=64)
+
+    @measure_time
+    def check_attention_layer(self, attention_type, window_size,
+                              monotonic=False, attention_smoothing=False,
+                              scale=1, batch_size=4, max_time=100):
+
+        print('==================================================')
+        print('  attention_type: %s' % attention_type)
+        print('  window_size: %s' % str(window_size))
+        print('  monotonic: %s' % str(monotonic))
+        print('  attention_smoothing: %s' % str(attention_smoothing))
+        print('  scale: %d' % scale)
+        print('==================================================')
+
+        encoder_num_unit, decoder_num_unit = 32, 16
+        encoder_states = np.random.randn(
+            batch_size, max_time, encoder_num_unit).astype(np.float32) * scale
+        decoder_state = np.random.randn(
+            batch_size, decoder_num_unit).astype(np.float32) * scale
+        values_length = np.random.randint(
+            max_time // 2, max_time + 1, size=batch_size).astype(np.int32)
+        peaks = np.random.randint(0, max_time // 2, size=batch_size)
+        prev_weights = np.zeros((batch_size, max_time), dtype=np.float32)
+        prev_weights[np.arange(batch_size), peaks] = 1
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            def attend(window_size, monotonic, name):
+                attention_layer = AttentionLayer(
+                    num_unit=16,
+                    attention_smoothing=attention_smoothing,
+                    attention_weights_tempareture=1.0,
+                    attention_type=attention_type,
+                    window_size=window_size,
+                    monotonic=monotonic,
+                    name=name)
+                return attention_layer(
+                    encoder_states=tf.constant(encoder_states),
+                    current_decoder_state=tf.constant(decoder_state),
+                    values=tf.constant(encoder_states),
+                    values_length=tf.constant(values_length),
+                    attention_weights=tf.constant(prev_weights))
+
+            with tf.variable_scope('attention') as scope:
+                weights_full, context_full = attend(None, False, 'full')
+                scope.reuse_variables()
+                weights, context = attend(window_size, monotonic, 'full')
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                (weights_full, context_full,
+                 weights, context) = sess.run(
+                    [weights_full, context_full, weights, context])
+
+        for w in [weights_full, weights]:
+            self.assertFalse(np.any(np.isnan(w)))
+            self.assertAllClose(np.sum(w, axis=1), np.ones(batch_size),
+                                atol=1e-5)
+            for i_batch in range(batch_size):
+                # Padded frames are not attended
+                self.assertTrue(
+                    np.all(w[i_batch, values_length[i_batch]:] == 0))
+
+        if window_size is None:
+            return
+        if monotonic:
+            for i_batch in range(batch_size):
+                self.assertTrue(np.all(weights[i_batch, :peaks[i_batch]] == 0))
+                self.assertTrue(
+                    np.all(weights[i_batch, peaks[i_batch] + window_size:] == 0))
+        elif window_size >= 2 * max_time + 1:
+            self.assertAllClose(weights, weights_full, atol=1e-5)
+            self.assertAllClose(context, context_full, atol=1e-4)
+
+    @measure_time
+    def check_step_time(self, max_time, window_size=64, batch_size=16,
+                        num_trials=100):
+
+        print('==================================================')
+        print('  max_time: %d' % max_time)
+        print('  window_size: %d' % window_size)
+        print('==================================================')
+
+        encoder_num_unit, decoder_num_unit = 512, 320
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            encoder_states = tf.constant(np.random.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            decoder_state = tf.constant(np.random.randn(
+                batch_size, decoder_num_unit).astype(np.float32))
+            values_length = tf.fill([batch_size], max_time)
+            prev_weights = tf.one_hot(
+                tf.fill([batch_size], max_time // 2), max_time)
+
+            ops = []
+            for name, size in [('full', None), ('windowed', window_size)]:
+                attention_layer = AttentionLayer(
+                    num_unit=128,
+                    attention_smoothing=False,
+                    attention_weights_tempareture=1.0,
+                    attention_type='content',
+                    window_size=size,
+                    name=name)
+                ops.append((name, attention_layer(
+                    encoder_states=encoder_states,
+                    current_decoder_state=decoder_state,
+                    values=encoder_states,
+                    values_length=values_length,
+                    attention_weights=prev_weights)[1]))
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for name, op in ops:
+                    # Warm up
+                    sess.run(op)
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(op)
+                    elapsed = (time.time() - start_time) / num_trials
+                    print('%s: %.3f ms per step' % (name, elapsed * 1000))
+
+    @measure_time
+    def check_attention_keys(self, attention_type, window_size=None,
+                             batch_size=32, max_time=300, num_trials=100):
+
+        print('==================================================')
+        print('  attention_type: %s' % attention_type)
+        print('  window_size: %s' % str(window_size))
+        print('==================================================')
+
+        # NOTE: the sizes of the TIMIT attention model
+        encoder_num_unit, decoder_num_unit = 256 * 2, 256
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            encoder_states = tf.constant(np.random.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            decoder_state = tf.constant(np.random.randn(
+                batch_size, decoder_num_unit).astype(np.float32))
+            values_length = tf.fill([batch_size], max_time)
+            prev_weights = tf.one_hot(
+                tf.fill([batch_size], max_time // 2), max_time)
+
+            attention_layer = AttentionLayer(
+                num_unit=128,
+                attention_smoothing=False,
+                attention_weights_tempareture=1.0,
+                attention_type=attention_type,
+                window_size=window_size)
+
+            def attend(attention_keys):
+                return attention_layer(
+                    encoder_states=encoder_states,
+                    current_decoder_state=decoder_state,
+                    values=encoder_states,
+                    values_length=values_length,
+                    attention_weights=prev_weights,
+                    attention_keys=attention_keys)
+
+            with tf.variable_scope('attention') as scope:
+                # Project encoder outputs at every step
+                weights_step, context_step = attend(None)
+                scope.reuse_variables()
+
+                # Project encoder outputs once
+                attention_keys_op = attention_layer.compute_keys(
+                    encoder_states)
+                attention_keys = tf.placeholder(
+                    tf.float32, shape=[None, None, 128])
+                weights_cached, context_cached = attend(attention_keys)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                feed_dict = {
+                    attention_keys: sess.run(attention_keys_op)}
+                (weights_step_np, context_step_np,
+                 weights_cached_np, context_cached_np) = sess.run(
+                    [weights_step, context_step,
+                     weights_cached, context_cached], feed_dict=feed_dict)
+                self.assertAllClose(weights_step_np, weights_cached_np,
+                                    atol=1e-5)
+                self.assertAllClose(context_step_np, context_cached_np,
+                                    atol=1e-4)
+
+                # Profile of the attention in a decoding step
+                for name, op in [('before (keys at every step)', context_step),
+                                 ('after (cached keys)', context_cached)]:
+                    sess.run(op, feed_dict=feed_dict)
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(op, feed_dict=feed_dict)
+                    elapsed = (time.time() - start_time) / num_trials
+                    print('%s: %.3f ms per step' % (name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.test.util import measure_time
+from utils.training.multi_gpu import average_gradients
+
+
+def _average_gradients_concat(total_grads_and_vars):
+    """The previous implementation, which stacks copies of gradients."""
+    average_grads_and_vars = []
+    for tower_grads_and_vars in zip(*total_grads_and_vars):
+        tower_grads = [tf.expand_dims(grad, axis=0)
+                       for grad, _ in tower_grads_and_vars]
+        tower_grads = tf.concat(axis=0, values=tower_grads)
+        average_grads_and_vars.append(
+            (tf.reduce_mean(tower_grads, axis=0), tower_grads_and_vars[0][1]))
+    return average_grads_and_vars
+
+
+class TestAverageGradients(tf.test.TestCase):
+
+    def test_average_gradients(self):
+        print("Gradient averaging Working check.")
+
+        self.check_average(num_towers=1)
+        self.check_average(num_towers=4)
+
+        # Step time with CPU device replicas
+        for num_towers in [2, 4, 8]:
+            self.check_step_time(num_towers)
+
+    def _build_towers(self, num_towers, num_units, vocab_size=100,
+                      batch_size=8, sparse=True):
+        """Build towers of a small model with an embedding lookup."""
+        total_grads_and_vars = []
+        with tf.variable_scope('model'):
+            for i_tower in range(num_towers):
+                with tf.device('/cpu:%d' % i_tower):
+                    with tf.name_scope('tower%d' % i_tower):
+                        ids = tf.random_uniform(
+                            [batch_size], maxval=vocab_size, dtype=tf.int32)
+                        embedding = tf.get_variable(
+                            'embedding', shape=[vocab_size, num_units])
+                        W = tf.get_variable(
+                            'W', shape=[num_units, num_units])
+                        if sparse:
+                            inputs = tf.nn.embedding_lookup(embedding, ids)
+                        else:
+                            inputs = tf.gather(embedding + 0, ids)
+                        loss = tf.reduce_sum(tf.tanh(tf.matmul(inputs, W)))
+                        total_grads_and_vars.append(list(zip(
+                            tf.gradients(loss, [embedding, W]),
+                            [embedding, W])))
+                        tf.get_variable_scope().reuse_variables()
+        return total_grads_and_vars
+
+    @measure_time
+    def check_average(self, num_towers, num_units=16):
+
+        print('==================================================')
+        print('  num_towers: %d' % num_towers)
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            total_grads_and_vars = self._build_towers(num_towers, num_units)
+            self.assertTrue(isinstance(total_grads_and_vars[0][0][0],
+                                       tf.IndexedSlices))
+            average_grads_and_vars = average_gradients(total_grads_and_vars)
+
+            # Sparse gradients are not converted to dense ones
+            if num_towers > 1:
+                self.assertTrue(isinstance(average_grads_and_vars[0][0],
+                                           tf.IndexedSlices))
+
+            total_grads = [[tf.convert_to_tensor(grad) for grad, _ in
+                            tower_grads_and_vars]
+                           for tower_grads_and_vars in total_grads_and_vars]
+            average_grads = [tf.convert_to_tensor(grad) for grad, _ in
+                             average_grads_and_vars]
+
+            config = tf.ConfigProto(device_count={'CPU': num_towers})
+            with tf.Session(config=config) as sess:
+                sess.run(tf.global_variables_initializer())
+                total_grads, average_grads = sess.run(
+                    [total_grads, average_grads])
+
+        for i_var, average_grad in enumerate(average_grads):
+            self.assertAllClose(
+                average_grad,
+                np.mean([tower_grads[i_var] for tower_grads in total_grads],
+                        axis=0),
+                atol=1e-6)
+
+    @measure_time
+    def check_step_time(self, num_towers, num_units=1024, num_trials=10):
+
+        print('==================================================')
+        print('  num_towers: %d' % num_towers)
+        print('==================================================')
+
+        for name, average_fn in [('concat', _average_gradients_concat),
+                                 ('add_n', average_gradients)]:
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                total_grads_and_vars = self._build_towers(
+                    num_towers, num_units, sparse=False)
+                with tf.device('/cpu:0'):
+                    average_grads_and_vars = average_fn(total_grads_and_vars)
+                    train_op = tf.train.GradientDescentOptimizer(
+                        1e-6).apply_gradients(average_grads_and_vars)
+
+                config = tf.ConfigProto(device_count={'CPU': num_towers})
+                with tf.Session(config=config) as sess:
+                    sess.run(tf.global_variables_initializer())
+                    # Warm up
+                    sess.run(train_op)
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(train_op)
+                    elapsed = (time.time() - start_time) / num_trials
+            print('%s: %.2f ms per step' % (name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.encoders.load_encoder import load
+from models.encoders.core.cnn_util import fold_batch_norm, convert_to_folded
+from models.test.util import measure_time
+
+
+class TestBatchNormFolding(tf.test.TestCase):
+
+    def test_batch_norm_folding(self):
+        print("Batch normalization folding Working check.")
+
+        self.check_folding(encoder_type='vgg_wang')
+        self.check_folding(encoder_type='vgg_blstm')
+        self.check_folding(encoder_type='vgg_lstm')
+
+    def _build(self, encoder_type, batch_norm, inputs, inputs_seq_len,
+               is_training, input_size, splice):
+        if encoder_type == 'vgg_wang':
+            encoder = load(encoder_type)(
+                input_size=input_size,
+                splice=splice,
+                num_classes=10,
+                parameter_init=0.1,
+                batch_norm=batch_norm)
+        else:
+            encoder = load(encoder_type)(
+                input_size=input_size,
+                splice=splice,
+                num_units=32,
+                num_layers=2,
+                num_classes=10,
+                lstm_impl='LSTMBlockCell',
+                use_peephole=False,
+                parameter_init=0.1,
+                batch_norm=batch_norm)
+        logits, _ = encoder(inputs=inputs,
+                            inputs_seq_len=inputs_seq_len,
+                            keep_prob_input=1.0,
+                            keep_prob_hidden=1.0,
+                            keep_prob_output=1.0,
+                            is_training=is_training)
+        return logits
+
+    @measure_time
+    def check_folding(self, encoder_type, batch_size=4, max_time=50,
+                      input_size=123, splice=11, num_steps=5, num_trials=10):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('==================================================')
+
+        inputs_np = np.random.randn(
+            batch_size, max_time, input_size * splice).astype(np.float32)
+        inputs_seq_len_np = np.full([batch_size], max_time, dtype=np.int32)
+        bn_model_path = os.path.join(self.get_temp_dir(), 'bn_model')
+        folded_model_path = os.path.join(self.get_temp_dir(), 'folded_model')
+
+        # Train with batch normalization
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            is_training = tf.placeholder_with_default(True, shape=[])
+            logits = self._build(encoder_type, True, tf.constant(inputs_np),
+                                 tf.constant(inputs_seq_len_np), is_training,
+                                 input_size, splice)
+            update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
+            with tf.control_dependencies(update_ops):
+                train_op = tf.train.GradientDescentOptimizer(1e-3).minimize(
+                    tf.reduce_mean(logits ** 2))
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for _ in range(num_steps):
+                    sess.run(train_op)
+                tf.train.Saver().save(sess, bn_model_path)
+
+                logits_bn = sess.run(logits, feed_dict={is_training: False})
+                start_time = time.time()
+                for _ in range(num_trials):
+                    sess.run(logits, feed_dict={is_training: False})
+                elapsed_bn = (time.time() - start_time) / num_trials
+
+        # Inference without batch normalization
+        folded_weights = fold_batch_norm(bn_model_path)
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            logits = self._build(encoder_type, False, tf.constant(inputs_np),
+                                 tf.constant(inputs_seq_len_np), False,
+                                 input_size, splice)
+
+            with tf.Session() as sess:
+                convert_to_folded(sess, folded_weights, bn_model_path,
+                                  folded_model_path)
+
+                logits_folded = sess.run(logits)
+                start_time = time.time()
+                for _ in range(num_trials):
+                    sess.run(logits)
+                elapsed_folded = (time.time() - start_time) / num_trials
+
+        self.assertAllClose(logits_bn, logits_folded, atol=1e-4)
+
+        print('batch normalization: %.3f sec per inference step' % elapsed_bn)
+        print('folded: %.3f sec per inference step' % elapsed_folded)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,252 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import itertools
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.attention.decoders.attention_layer import AttentionLayer
+from models.attention.decoders.attention_decoder import AttentionDecoder
+from models.attention.decoders.beam_search.beam_search_decoder import BeamSearchDecoder
+from models.attention.decoders.beam_search.joint_beam_search_decoder import JointCTCBeamSearchDecoder
+from models.attention.decoders.beam_search.ctc_prefix_score import ctc_prefix_score, initial_ctc_states
+from models.test.util import measure_time
+
+
+class TestBeamSearch(tf.test.TestCase):
+
+    def test_beam_search(self):
+        print("Batched beam search Working check.")
+
+        self.check_beam_search(beam_width=1)
+        self.check_beam_search(beam_width=4)
+        self.check_beam_search(beam_width=4, top_n=2)
+        self.check_beam_search(beam_width=8, batch_size=32)
+
+        self.check_ctc_prefix_score()
+        self.check_beam_search(beam_width=4, ctc_weight=0.3)
+        self.check_beam_search(beam_width=4, ctc_weight=0.3, ctc_beam_width=6)
+
+    @measure_time
+    def check_beam_search(self, beam_width, top_n=None, batch_size=8,
+                          num_classes=30, max_decode_length=40,
+                          ctc_weight=0, ctc_beam_width=None):
+
+        print('==================================================')
+        print('  beam_width: %d' % beam_width)
+        print('  top_n: %s' % str(top_n))
+        print('  batch_size: %d' % batch_size)
+        print('  ctc_weight: %.1f' % ctc_weight)
+        print('  ctc_beam_width: %s' % str(ctc_beam_width))
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Dummy encoder outputs
+            max_time, encoder_num_unit = 50, 64
+            encoder_outputs = tf.constant(np.random.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            encoder_outputs_seq_len = tf.constant(np.random.randint(
+                max_time // 2, max_time + 1, size=batch_size).astype(np.int32))
+            labels = tf.constant(np.random.randint(
+                0, num_classes, size=(batch_size, 10)).astype(np.int32))
+            sos_index, eos_index = num_classes - 2, num_classes - 1
+
+            cell = tf.contrib.rnn.LSTMCell(num_units=64)
+            attention_layer = AttentionLayer(
+                num_unit=32,
+                attention_smoothing=False,
+                attention_weights_tempareture=1.0,
+                attention_type='content')
+
+            def create_decoder():
+                return AttentionDecoder(
+                    cell=cell,
+                    parameter_init=0.1,
+                    max_decode_length=max_decode_length,
+                    num_classes=num_classes,
+                    attention_encoder_states=encoder_outputs,
+                    attention_values=encoder_outputs,
+                    attention_values_length=encoder_outputs_seq_len,
+                    attention_layer=attention_layer,
+                    time_major=False)
+
+            with tf.variable_scope("target_embedding"):
+                embedding = tf.get_variable(
+                    name="W_embedding",
+                    shape=[num_classes, 20],
+                    initializer=tf.random_uniform_initializer(-0.1, 0.1))
+            initial_state = cell.zero_state(batch_size, tf.float32)
+
+            # Training (create parameters)
+            create_decoder()(
+                initial_state=initial_state,
+                helper=tf.contrib.seq2seq.TrainingHelper(
+                    inputs=tf.nn.embedding_lookup(embedding, labels),
+                    sequence_length=tf.fill([batch_size], 10)),
+                mode=tf.contrib.learn.ModeKeys.TRAIN)
+
+            # Greedy decoding
+            greedy_outputs, _ = create_decoder()(
+                initial_state=initial_state,
+                helper=tf.contrib.seq2seq.GreedyEmbeddingHelper(
+                    embedding=embedding,
+                    start_tokens=tf.fill([batch_size], sos_index),
+                    end_token=eos_index),
+                mode=tf.contrib.learn.ModeKeys.INFER)
+
+            # Beam search decoding (all utterances at once)
+            if ctc_weight > 0:
+                # NOTE: <SOS> and <EOS> are not CTC labels
+                ctc_logits = tf.constant(np.random.randn(
+                    max_time, batch_size, num_classes - 1).astype(np.float32))
+                beam_search_decoder = JointCTCBeamSearchDecoder(
+                    decoder=create_decoder(),
+                    beam_width=beam_width,
+                    vocab_size=num_classes,
+                    sos_index=sos_index,
+                    eos_index=eos_index,
+                    ctc_logits=ctc_logits,
+                    ctc_seq_len=encoder_outputs_seq_len,
+                    ctc_weight=ctc_weight,
+                    ctc_beam_width=ctc_beam_width,
+                    top_n=top_n)
+            else:
+                beam_search_decoder = BeamSearchDecoder(
+                    decoder=create_decoder(),
+                    beam_width=beam_width,
+                    vocab_size=num_classes,
+                    eos_index=eos_index,
+                    length_penalty_weight=0.0 if beam_width == 1 else 0.6,
+                    top_n=top_n)
+            beam_outputs, _ = beam_search_decoder(
+                initial_state=initial_state,
+                helper=tf.contrib.seq2seq.GreedyEmbeddingHelper(
+                    embedding=embedding,
+                    start_tokens=tf.fill([batch_size * beam_width],
+                                         sos_index),
+                    end_token=eos_index),
+                mode=tf.contrib.learn.ModeKeys.INFER)
+
+            init_op = tf.global_variables_initializer()
+
+            with tf.Session() as sess:
+                sess.run(init_op)
+
+                predicted_ids_greedy = sess.run(greedy_outputs.predicted_ids)
+                predicted_ids, scores, lengths = sess.run(
+                    [beam_outputs.predicted_ids,
+                     beam_outputs.scores,
+                     beam_outputs.lengths])
+
+                top_n = beam_width if top_n is None else top_n
+                self.assertEqual(predicted_ids.shape[:2],
+                                 (batch_size, top_n))
+                self.assertEqual(scores.shape, (batch_size, top_n))
+
+                # Hypotheses are sorted by scores
+                self.assertTrue(np.all(np.diff(scores, axis=1) <= 1e-6))
+
+                for i_batch in range(batch_size):
+                    hyp = predicted_ids[i_batch, 0, :lengths[i_batch, 0]]
+                    self.assertTrue(np.all(hyp[:-1] != eos_index))
+
+                    # Beam search with a beam width of 1 is greedy decoding
+                    if beam_width == 1:
+                        greedy = predicted_ids_greedy[i_batch]
+                        self.assertAllEqual(hyp, greedy[:len(hyp)])
+
+                # Throughput
+                num_trials = 10
+                for name, op in [('greedy', greedy_outputs.predicted_ids),
+                                 ('beam search', beam_outputs.predicted_ids)]:
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(op)
+                    elapsed = (time.time() - start_time) / num_trials
+                    print('%s: %.2f utterances/sec' %
+                          (name, batch_size / elapsed))
+
+    @measure_time
+    def check_ctc_prefix_score(self, max_time=5, num_classes=3):
+
+        print('==================================================')
+        print('  CTC prefix score')
+        print('==================================================')
+
+        blank_index = num_classes - 1
+        seq_len = np.array([max_time, max_time - 1], dtype=np.int32)
+        logits = np.random.randn(max_time, 2, num_classes)
+        probs = np.exp(logits) / np.sum(np.exp(logits), axis=2, keepdims=True)
+
+        def collapse(path):
+            labels = [path[t] for t in range(len(path))
+                      if (t == 0 or path[t] != path[t - 1]) and
+                      path[t] != blank_index]
+            return labels
+
+        def brute_force(i_batch, prefix, complete=False):
+            # Sum over all CTC paths
+            prob = 0
+            for path in itertools.product(range(num_classes),
+                                          repeat=seq_len[i_batch]):
+                labels = collapse(path)
+                if complete:
+                    is_matched = labels == prefix
+                else:
+                    is_matched = labels[:len(prefix)] == prefix
+                if is_matched:
+                    prob += np.prod([probs[t, i_batch, path[t]]
+                                     for t in range(len(path))])
+            return prob
+
+        with tf.Graph().as_default():
+            ctc_log_probs = tf.constant(np.log(probs).astype(np.float32))
+            labels = tf.constant([[0, 1], [0, 1]])
+
+            # The empty prefix
+            states = initial_ctc_states(ctc_log_probs, blank_index)
+            log_psi_1, log_psi_eos_1, states_1 = ctc_prefix_score(
+                ctc_log_probs, seq_len, states,
+                prev_labels=tf.constant([-1, -1]),
+                labels=labels,
+                blank_index=blank_index)
+
+            # The prefix of `[0]`
+            log_psi_2, log_psi_eos_2, _ = ctc_prefix_score(
+                ctc_log_probs, seq_len, states_1[:, :, 0],
+                prev_labels=tf.constant([0, 0]),
+                labels=labels,
+                blank_index=blank_index)
+
+            with tf.Session() as sess:
+                psi_1, psi_eos_1, psi_2, psi_eos_2 = sess.run(
+                    [tf.exp(log_psi_1), tf.exp(log_psi_eos_1),
+                     tf.exp(log_psi_2), tf.exp(log_psi_eos_2)])
+
+        for i_batch in range(2):
+            self.assertAllClose(psi_eos_1[i_batch],
+                                brute_force(i_batch, [], complete=True),
+                                atol=1e-5)
+            self.assertAllClose(psi_eos_2[i_batch],
+                                brute_force(i_batch, [0], complete=True),
+                                atol=1e-5)
+            for i_label, label in enumerate([0, 1]):
+                self.assertAllClose(psi_1[i_batch, i_label],
+                                    brute_force(i_batch, [label]),
+                                    atol=1e-5)
+                self.assertAllClose(psi_2[i_batch, i_label],
+                                    brute_force(i_batch, [0, label]),
+                                    atol=1e-5)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,126 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.encoders.load_encoder import load
+from models.test.util import measure_time
+
+
+def _allocated_bytes(run_metadata):
+    """Sum up the bytes allocated for the outputs of all ops in a step."""
+    total_bytes = 0
+    for dev_stats in run_metadata.step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            for output in node_stats.output:
+                total_bytes += output.tensor_description.allocation_description.requested_bytes
+    return total_bytes
+
+
+class TestCNNTimeConv(tf.test.TestCase):
+
+    def test_cnn_time_conv(self):
+        print("CNN time convolution Working check.")
+
+        self.check_time_widths()
+        self.check_encode(time_conv=False)
+        self.check_encode(time_conv=True)
+
+        # Step time and memory on CPU
+        self.check_step_time()
+
+    def check_time_widths(self):
+        encoder = load('cnn_zhang')(input_size=123, splice=11, num_classes=10,
+                                    time_conv=True)
+        self.assertEqual(encoder.time_widths, [5, 5, 3, 1, 1, 1, 1, 1, 1, 1])
+        self.assertEqual(sum(encoder.time_widths) - 10 + 1, 11)
+
+        encoder = load('cnn_zhang')(input_size=123, splice=1, num_classes=10,
+                                    time_conv=True)
+        self.assertEqual(encoder.time_widths, [1] * 10)
+
+    def _build(self, time_conv, batch_size, max_time, input_size, splice,
+               num_classes):
+        encoder = load('cnn_zhang')(input_size=input_size,
+                                    splice=splice,
+                                    num_classes=num_classes,
+                                    parameter_init=0.1,
+                                    time_conv=time_conv)
+        input_dim = input_size if time_conv else input_size * splice
+        inputs = tf.constant(np.random.randn(
+            batch_size, max_time, input_dim).astype(np.float32))
+        inputs_seq_len = tf.constant(np.random.randint(
+            max_time // 2, max_time + 1, size=batch_size).astype(np.int32))
+        logits, _ = encoder(inputs=inputs,
+                            inputs_seq_len=inputs_seq_len,
+                            keep_prob_hidden=1.0,
+                            keep_prob_input=1.0,
+                            keep_prob_output=1.0)
+        return logits
+
+    @measure_time
+    def check_encode(self, time_conv, batch_size=2, max_time=20,
+                     input_size=123, splice=11, num_classes=10):
+
+        print('==================================================')
+        print('  time_conv: %s' % str(time_conv))
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            logits = self._build(time_conv, batch_size, max_time, input_size,
+                                 splice, num_classes)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                logits = sess.run(logits)
+
+        self.assertEqual(logits.shape, (max_time, batch_size, num_classes))
+
+    @measure_time
+    def check_step_time(self, batch_size=8, max_time=100, input_size=123,
+                        splice=11, num_classes=10, num_trials=3):
+
+        print('==================================================')
+        print('  Step time and memory on CPU')
+        print('==================================================')
+
+        for time_conv in [False, True]:
+            tf.reset_default_graph()
+            with tf.Graph().as_default(), tf.device('/cpu:0'):
+                logits = self._build(time_conv, batch_size, max_time,
+                                     input_size, splice, num_classes)
+                train_op = tf.train.GradientDescentOptimizer(1e-6).minimize(
+                    tf.reduce_sum(logits ** 2))
+
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+
+                    # Warm up and measure the memory
+                    run_metadata = tf.RunMetadata()
+                    sess.run(train_op,
+                             options=tf.RunOptions(
+                                 trace_level=tf.RunOptions.FULL_TRACE),
+                             run_metadata=run_metadata)
+
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(train_op)
+                    elapsed = (time.time() - start_time) / num_trials
+
+            print('%s: %.3f sec per training step, %.1f MB allocated' %
+                  ('time convolution' if time_conv else 'spliced frames',
+                   elapsed, _allocated_bytes(run_metadata) / 1024 ** 2))
+
+
+if __name__ == "__main__":
+    tf.test.main()
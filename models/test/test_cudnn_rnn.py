@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.encoders.load_encoder import load
+from models.encoders.core.cudnn_rnn import load_block_cell_weights
+from models.test.util import measure_time
+
+
+class TestCudnnRNN(tf.test.TestCase):
+
+    def test_cudnn_rnn(self):
+        print("CudnnLSTM encoder Working check.")
+
+        if not tf.test.is_gpu_available(cuda_only=True):
+            print('Skipped: cuDNN is not available.')
+            return
+
+        self.check_conversion(encoder_type='blstm')
+        self.check_conversion(encoder_type='lstm')
+        self.check_is_training(encoder_type='blstm')
+
+    @measure_time
+    def check_conversion(self, encoder_type, batch_size=4, max_time=50,
+                         input_size=40, num_units=64, num_layers=3):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('==================================================')
+
+        inputs = np.random.randn(
+            batch_size, max_time, input_size).astype(np.float32)
+        inputs_seq_len = np.random.randint(
+            max_time // 2, max_time + 1, size=batch_size).astype(np.int32)
+        inputs_seq_len[0] = max_time
+
+        def build(lstm_impl):
+            encoder = load(encoder_type)(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=0,  # return hidden states
+                lstm_impl=lstm_impl,
+                use_peephole=False,
+                parameter_init=0.1)
+            outputs, _ = encoder(
+                inputs=tf.constant(inputs),
+                inputs_seq_len=tf.constant(inputs_seq_len),
+                keep_prob_input=1.0,
+                keep_prob_hidden=1.0,
+                keep_prob_output=1.0)
+            return encoder, outputs
+
+        # Train on cuDNN (GPU)
+        with tf.Graph().as_default():
+            encoder, outputs_op = build('CudnnLSTM')
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                outputs_cudnn = sess.run(outputs_op)
+                block_cell_weights = encoder.cudnn_encoder.block_cell_weights(
+                    sess)
+
+        # Inference with LSTMBlockCell (CPU)
+        with tf.Graph().as_default():
+            with tf.device('/cpu:0'):
+                _, outputs_op = build('LSTMBlockCell')
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                load_block_cell_weights(sess, block_cell_weights)
+                outputs_cpu = sess.run(outputs_op)
+
+        for i_batch in range(batch_size):
+            self.assertAllClose(
+                outputs_cudnn[i_batch, :inputs_seq_len[i_batch]],
+                outputs_cpu[i_batch, :inputs_seq_len[i_batch]],
+                atol=1e-4)
+
+    @measure_time
+    def check_is_training(self, encoder_type, batch_size=4, max_time=50,
+                          input_size=40, num_units=64, num_layers=2):
+
+        print('==================================================')
+        print('  is_training placeholder, encoder_type: %s' % encoder_type)
+        print('==================================================')
+
+        inputs = np.random.randn(
+            batch_size, max_time, input_size).astype(np.float32)
+        inputs_seq_len = np.array([max_time] * batch_size, dtype=np.int32)
+
+        with tf.Graph().as_default():
+            is_training_pl = tf.placeholder_with_default(
+                False, shape=[], name='is_training')
+            encoder = load(encoder_type)(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=0,  # return hidden states
+                lstm_impl='CudnnLSTM',
+                use_peephole=False,
+                parameter_init=0.1)
+            outputs_op, _ = encoder(
+                inputs=tf.constant(inputs),
+                inputs_seq_len=tf.constant(inputs_seq_len),
+                keep_prob_input=1.0,
+                keep_prob_hidden=1.0,
+                keep_prob_output=1.0,
+                is_training=is_training_pl)
+            grads_op = tf.gradients(tf.reduce_sum(outputs_op),
+                                    tf.trainable_variables())
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                outputs_infer = sess.run(outputs_op)
+                outputs_train, grads = sess.run(
+                    [outputs_op, grads_op], feed_dict={is_training_pl: True})
+
+        # The kernels for training and inference share the parameters
+        self.assertAllClose(outputs_infer, outputs_train, atol=1e-5)
+        for grad in grads:
+            self.assertTrue(np.all(np.isfinite(grad)))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import socket
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.test.util import measure_time
+from models.test.data import generate_data
+from utils.training.multi_gpu import build_towers, get_devices
+from utils.training.distributed import Cluster, split_for_worker
+from utils.dataset.all_load.ctc_all_load import DatasetBase
+
+
+class _Dataset(DatasetBase):
+    """A dataset of dummy utterances in memory."""
+
+    def __init__(self, num_utt, batch_size, num_gpu, seed=None):
+        super(_Dataset, self).__init__()
+        self.batch_size = batch_size
+        self.max_epoch = 2
+        self.splice = 1
+        self.shuffle = False
+        self.sort_utt = True
+        self.sort_stop_epoch = 1
+        self.num_gpu = num_gpu
+        self.padded_value = -1
+        if seed is not None:
+            self.rng.seed(seed)
+
+        self.input_paths = np.array(['utt%d.npy' % i for i in range(num_utt)])
+        self.input_list = np.empty((num_utt,), dtype=object)
+        self.label_list = np.empty((num_utt,), dtype=object)
+        for i in range(num_utt):
+            self.input_list[i] = np.zeros((i + 1, 3), dtype=np.float32)
+            self.label_list[i] = np.array([i % 26], dtype=np.int32)
+        self.rest = set(range(0, num_utt, 1))
+
+
+def _get_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _run_ps(ps_hosts, worker_hosts):
+    cluster = Cluster(ps_hosts, worker_hosts, 'ps', 0)
+    cluster.join()
+
+
+def _run_worker(ps_hosts, worker_hosts, task_index, sync, num_steps,
+                queue, timeout=60):
+    cluster = Cluster(ps_hosts, worker_hosts, 'worker', task_index,
+                      sync=sync)
+
+    # Each worker takes its own split of the global mini-batch
+    inputs, labels, inputs_seq_len = generate_data(
+        label_type='character', model='ctc', batch_size=4)
+    inputs, labels, inputs_seq_len = split_for_worker(
+        [np.array_split(inputs, cluster.num_workers),
+         np.array_split(labels, cluster.num_workers),
+         np.array_split(inputs_seq_len, cluster.num_workers)],
+        num_gpu=1, num_workers=cluster.num_workers, task_index=task_index)
+
+    with tf.Graph().as_default(), tf.device(cluster.device_setter()):
+        model = CTC(encoder_type='blstm',
+                    input_size=inputs[0].shape[-1],
+                    num_units=32,
+                    num_layers=2,
+                    num_classes=26,
+                    lstm_impl='LSTMBlockCell',
+                    parameter_init=0.1)
+
+        def tower_fn(i_tower, scope):
+            model.create_placeholders()
+            tower_loss, _ = model.compute_loss(
+                model.inputs_pl_list[i_tower],
+                model.labels_pl_list[i_tower],
+                model.inputs_seq_len_pl_list[i_tower],
+                model.keep_prob_input_pl_list[i_tower],
+                model.keep_prob_hidden_pl_list[i_tower],
+                model.keep_prob_output_pl_list[i_tower],
+                scope)
+            return tower_loss, None
+
+        global_step = tf.Variable(0, name='global_step', trainable=False)
+        optimizer = cluster.wrap_optimizer(
+            tf.train.GradientDescentOptimizer(0.1), model)
+        train_op, loss_op, _ = build_towers(
+            model, optimizer, tower_fn,
+            devices=get_devices(1, device_type='cpu'),
+            global_step=global_step)
+        checksum_op = tf.add_n([tf.reduce_sum(var)
+                                for var in tf.trainable_variables()])
+        init_op = tf.global_variables_initializer()
+
+        feed_dict = {
+            model.inputs_pl_list[0]: inputs[0],
+            model.labels_pl_list[0]: labels[0],
+            model.inputs_seq_len_pl_list[0]: inputs_seq_len[0],
+            model.keep_prob_input_pl_list[0]: 1.0,
+            model.keep_prob_hidden_pl_list[0]: 1.0,
+            model.keep_prob_output_pl_list[0]: 1.0
+        }
+
+        sess = cluster.create_session(init_op, global_step)
+        start_time = time.time()
+        for _ in range(num_steps):
+            _, loss_np = sess.run([train_op, loss_op], feed_dict=feed_dict)
+        elapsed = time.time() - start_time
+
+        # Wait for the updates by the other workers
+        num_updates = num_steps if sync else num_steps * cluster.num_workers
+        start_time_wait = time.time()
+        while sess.run(global_step) < num_updates:
+            if time.time() - start_time_wait > timeout:
+                break
+            time.sleep(0.1)
+
+        queue.put((task_index, sess.run(global_step), sess.run(checksum_op),
+                   loss_np, num_steps / elapsed))
+
+
+class TestDistributed(tf.test.TestCase):
+
+    def test_distributed(self):
+        print("Between-graph distributed training Working check.")
+
+        self.check_split()
+        self.check_data_split(num_workers=2)
+        self.check_training(num_workers=2, sync=True)
+        self.check_training(num_workers=2, sync=False)
+
+    def check_split(self):
+        data = [np.arange(4), np.arange(4) * 2]
+        inputs, labels = split_for_worker(data, num_gpu=1)
+        self.assertEqual(len(inputs), 1)
+        self.assertAllEqual(labels[0], data[1])
+
+        data = [np.array_split(x, 4) for x in data]
+        inputs, labels = split_for_worker(data, num_gpu=2, num_workers=2,
+                                          task_index=1)
+        self.assertEqual(len(inputs), 2)
+        self.assertAllEqual(inputs[0], [2])
+        self.assertAllEqual(labels[1], [6])
+
+    @measure_time
+    def check_data_split(self, num_workers, num_gpu=1, seed=1):
+
+        print('==================================================')
+        print('  Data split, num_workers: %d' % num_workers)
+        print('==================================================')
+
+        # Each worker has its own dataset
+        datasets = [_Dataset(num_utt=50, batch_size=8,
+                             num_gpu=num_gpu * num_workers, seed=seed)
+                    for _ in range(num_workers)]
+        # The global mini-batch without splitting
+        reference = _Dataset(num_utt=50, batch_size=8, num_gpu=1, seed=seed)
+
+        num_steps = 0
+        for batches in zip(*datasets):
+            names_global, _ = reference.next()
+            names_global = names_global[3]
+
+            names_workers = []
+            for task_index, (data, _) in enumerate(batches):
+                names, = split_for_worker([data[3]], num_gpu, num_workers,
+                                          task_index)
+                names_workers.extend(np.concatenate(names).tolist())
+
+            # The splits of the workers are disjoint, and cover the batch
+            self.assertEqual(len(names_workers), len(set(names_workers)))
+            self.assertEqual(sorted(names_workers), sorted(names_global))
+            num_steps += 1
+        print('%d steps' % num_steps)
+
+    @measure_time
+    def check_training(self, num_workers, sync, num_steps=10):
+
+        print('==================================================')
+        print('  num_workers: %d' % num_workers)
+        print('  sync: %s' % str(sync))
+        print('==================================================')
+
+        ps_hosts = ['localhost:%d' % _get_free_port()]
+        worker_hosts = ['localhost:%d' % _get_free_port()
+                        for _ in range(num_workers)]
+
+        queue = multiprocessing.Queue()
+        ps = multiprocessing.Process(target=_run_ps,
+                                     args=(ps_hosts, worker_hosts))
+        workers = [multiprocessing.Process(
+            target=_run_worker,
+            args=(ps_hosts, worker_hosts, task_index, sync, num_steps, queue))
+            for task_index in range(num_workers)]
+        ps.start()
+        for worker in workers:
+            worker.start()
+
+        try:
+            results = sorted([queue.get(timeout=300)
+                              for _ in range(num_workers)])
+        finally:
+            # NOTE: the servers and the queue runner of the chief are
+            # blocked forever
+            for process in [ps] + workers:
+                process.terminate()
+                process.join()
+
+        num_updates = num_steps if sync else num_steps * num_workers
+        for task_index, step, checksum, loss_np, steps_per_sec in results:
+            self.assertEqual(step, num_updates)
+            self.assertTrue(np.isfinite(loss_np))
+            print('worker%d: loss: %.3f, %.2f steps/sec' %
+                  (task_index, loss_np, steps_per_sec))
+
+        # The variables are shared across the workers
+        checksums = [result[2] for result in results]
+        self.assertAllClose(checksums, [checksums[0]] * num_workers)
+
+
+if __name__ == "__main__":
+    tf.test.main()
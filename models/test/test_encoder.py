@@ -69,14 +69,87 @@ class TestEncoder(unittest.TestCase):
         self.check_encode(encoder_type='multitask_lstm',
                           lstm_impl='LSTMBlockCell')
 
-        # Dynamic
-        # self.check_encode(encoder_type='pyramidal_blstm')
+        # Pyramidal
+        self.check_encode(encoder_type='pblstm', lstm_impl='LSTMCell')
+        self.check_encode(encoder_type='pblstm', lstm_impl='LSTMBlockCell')
+        self.check_encode(encoder_type='pblstm', lstm_impl='LSTMBlockCell',
+                          downsample_type='subsample')
 
-    def check_encode(self, encoder_type, lstm_impl=None):
+        # Time subsampling between layers
+        for encoder_type in ['blstm', 'lstm', 'bgru', 'gru',
+                             'vgg_blstm', 'vgg_lstm']:
+            self.check_subsampling(encoder_type, downsample_type='concat')
+            self.check_subsampling(encoder_type, downsample_type='subsample')
+
+    def check_subsampling(self, encoder_type, downsample_type):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('  downsample_type: %s' % downsample_type)
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            batch_size = 4
+            splice = 11 if encoder_type in ['vgg_blstm', 'vgg_lstm'] else 1
+            inputs, _, inputs_seq_len = generate_data(
+                label_type='character',
+                model='ctc',
+                batch_size=batch_size,
+                splice=splice)
+            frame_num, input_size = inputs[0].shape
+
+            # Define model graph
+            kwargs = {'num_units': 256,
+                      'num_layers': 5,
+                      'num_classes': 27,
+                      'parameter_init': 0.1,
+                      'downsample_list': [True, False, True, False, False],
+                      'downsample_type': downsample_type}
+            if encoder_type in ['vgg_blstm', 'vgg_lstm']:
+                kwargs['input_size'] = input_size // 11
+                kwargs['splice'] = 11
+            encoder = load(encoder_type)(**kwargs)
+
+            inputs_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, input_size],
+                                       name='inputs')
+            inputs_seq_len_pl = tf.placeholder(tf.int32,
+                                               shape=[None],
+                                               name='inputs_seq_len')
+            logits_op, _ = encoder(
+                inputs=inputs_pl,
+                inputs_seq_len=inputs_seq_len_pl,
+                keep_prob_input=1.0,
+                keep_prob_hidden=1.0,
+                keep_prob_output=1.0)
+            outputs_seq_len_op = encoder.output_seq_len(inputs_seq_len_pl)
+
+            feed_dict = {
+                inputs_pl: inputs,
+                inputs_seq_len_pl: inputs_seq_len
+            }
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                logits, outputs_seq_len = sess.run(
+                    [logits_op, outputs_seq_len_op], feed_dict=feed_dict)
+
+                # The time resolution is reduced to 1/4
+                self.assertEqual(
+                    ((frame_num + 3) // 4, batch_size, 27), logits.shape)
+                self.assertEqual(
+                    list((inputs_seq_len + 3) // 4), list(outputs_seq_len))
+
+    def check_encode(self, encoder_type, lstm_impl=None,
+                     downsample_type='concat'):
 
         print('==================================================')
         print('  encoder_type: %s' % encoder_type)
         print('  lstm_impl: %s' % lstm_impl)
+        if encoder_type == 'pblstm':
+            print('  downsample_type: %s' % downsample_type)
         print('==================================================')
 
         tf.reset_default_graph()
@@ -100,6 +173,15 @@ class TestEncoder(unittest.TestCase):
                     num_classes=0,  # return hidden states
                     lstm_impl=lstm_impl,
                     parameter_init=0.1)
+            elif encoder_type == 'pblstm':
+                encoder = load(encoder_type)(
+                    num_units=256,
+                    num_layers=5,
+                    num_classes=0,  # return hidden states
+                    lstm_impl=lstm_impl,
+                    parameter_init=0.1,
+                    downsample_list=[False, True, True, True, False],
+                    downsample_type=downsample_type)
             elif encoder_type in ['bgru', 'gru']:
                 encoder = load(encoder_type)(
                     num_units=256,
@@ -201,6 +283,20 @@ class TestEncoder(unittest.TestCase):
                     hidden_states, final_state = sess.run(
                         [hidden_states_op, final_state_op], feed_dict=feed_dict)
 
+                if encoder_type == 'pblstm':
+                    # The time resolution is reduced to 1/8
+                    self.assertEqual(8, encoder.downsample_factor)
+                    self.assertEqual(
+                        (batch_size, (frame_num + 7) // 8, encoder.num_units * 2),
+                        hidden_states.shape)
+                    outputs_seq_len = sess.run(
+                        encoder.output_seq_len(inputs_seq_len_pl),
+                        feed_dict=feed_dict)
+                    self.assertEqual(
+                        list((inputs_seq_len + 7) // 8), list(outputs_seq_len))
+                    self.assertEqual(
+                        (batch_size, encoder.num_units), final_state[0].c.shape)
+
                 if encoder_type in ['blstm', 'bgru', 'vgg_blstm', 'multitask_blstm']:
                     self.assertEqual(
                         (batch_size, frame_num, encoder.num_units * 2), hidden_states.shape)
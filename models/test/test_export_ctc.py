@@ -0,0 +1,128 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.ctc.export import export_inference_graph, FrozenCTC
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class TestExportCTC(tf.test.TestCase):
+
+    def test_export_ctc(self):
+        print("Frozen CTC graph Working check.")
+
+        self.check_export(encoder_type='blstm')
+        self.check_export(encoder_type='lstm')
+        self.check_export(encoder_type='vgg_blstm')
+        self.check_export(encoder_type='vgg_blstm', batch_norm=True)
+
+    @measure_time
+    def check_export(self, encoder_type, batch_norm=False):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('  batch_norm: %s' % str(batch_norm))
+        print('==================================================')
+
+        # Load batch data
+        splice = 11 if encoder_type in ['vgg_blstm', 'vgg_lstm'] else 1
+        inputs, _, inputs_seq_len = generate_data(
+            label_type='phone',
+            model='ctc',
+            batch_size=2,
+            splice=splice)
+
+        model = CTC(encoder_type=encoder_type,
+                    input_size=inputs[0].shape[-1] // splice,
+                    splice=splice,
+                    num_units=64,
+                    num_layers=2,
+                    num_classes=61,
+                    batch_norm=batch_norm)
+
+        save_dir = self.get_temp_dir()
+        checkpoint_path = os.path.join(save_dir, 'model.ckpt')
+        graph_path = os.path.join(save_dir, 'frozen_graph.pb')
+
+        # Save randomly initialized parameters
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            model.create_placeholders()
+            _, logits = model.compute_loss(
+                model.inputs_pl_list[0],
+                model.labels_pl_list[0],
+                model.inputs_seq_len_pl_list[0],
+                model.keep_prob_input_pl_list[0],
+                model.keep_prob_hidden_pl_list[0],
+                model.keep_prob_output_pl_list[0])
+            posteriors_op = tf.nn.softmax(tf.transpose(logits, (1, 0, 2)))
+            saver = tf.train.Saver()
+
+            update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                feed_dict = {
+                    model.inputs_pl_list[0]: inputs,
+                    model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                    model.keep_prob_input_pl_list[0]: 1.0,
+                    model.keep_prob_hidden_pl_list[0]: 1.0,
+                    model.keep_prob_output_pl_list[0]: 1.0
+                }
+                if batch_norm:
+                    # Update the moving averages in the training mode
+                    feed_dict[model.is_training_pl] = True
+                    for _ in range(5):
+                        sess.run(update_ops, feed_dict=feed_dict)
+                    posteriors_train = sess.run(posteriors_op,
+                                                feed_dict=feed_dict)
+                    del feed_dict[model.is_training_pl]
+                saver.save(sess, checkpoint_path)
+
+                # NOTE: the moving averages are used by default
+                posteriors = sess.run(posteriors_op, feed_dict=feed_dict)
+
+        if batch_norm:
+            self.assertFalse(np.allclose(posteriors, posteriors_train))
+
+            # Batch normalization is folded into the convolutional layers
+            model = CTC(encoder_type=encoder_type,
+                        input_size=inputs[0].shape[-1] // splice,
+                        splice=splice,
+                        num_units=64,
+                        num_layers=2,
+                        num_classes=61,
+                        batch_norm=False)
+        graph_def = export_inference_graph(model, checkpoint_path, graph_path,
+                                           fold_bn=batch_norm)
+        node_ops = set(node.op for node in graph_def.node)
+        print('Node num: %d' % len(graph_def.node))
+        self.assertNotIn('VariableV2', node_ops)
+        self.assertNotIn('RandomUniform', node_ops)
+
+        decoder = FrozenCTC(graph_path)
+        print('Startup time: %.3f sec' % decoder.startup_time)
+        posteriors_frozen = decoder.posteriors(inputs, inputs_seq_len)
+        labels_pred = decoder.decode(inputs, inputs_seq_len)
+        decoder.close()
+
+        # NOTE: the folded weights differ in rounding
+        self.assertAllClose(posteriors, posteriors_frozen,
+                            atol=1e-4 if batch_norm else 1e-5)
+        self.assertEqual(len(labels_pred), len(inputs))
+
+
+if __name__ == "__main__":
+    tf.test.main()
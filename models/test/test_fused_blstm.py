@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.encoders.load_encoder import load
+from models.test.util import measure_time
+
+
+def _flatten(structure):
+    if isinstance(structure, (list, tuple)):
+        return [x for s in structure for x in _flatten(s)]
+    return [structure]
+
+
+class TestFusedBLSTM(tf.test.TestCase):
+
+    def test_fused_blstm(self):
+        print("Fused BLSTM encoder Working check.")
+
+        for encoder_type in ['blstm', 'multitask_blstm', 'vgg_blstm']:
+            self.check_fused(encoder_type)
+
+        # Step time on CPU
+        self.check_step_time(max_time=200)
+        self.check_step_time(max_time=800)
+
+    def _build(self, encoder_type, lstm_impl, inputs, inputs_seq_len,
+               num_units=64, num_layers=3):
+        if encoder_type == 'multitask_blstm':
+            encoder = load(encoder_type)(
+                num_units=num_units,
+                num_layers_main=num_layers,
+                num_layers_sub=num_layers - 1,
+                num_classes_main=0,  # return hidden states
+                num_classes_sub=0,  # return hidden states
+                lstm_impl=lstm_impl,
+                use_peephole=False,
+                parameter_init=0.1)
+        elif encoder_type == 'vgg_blstm':
+            encoder = load(encoder_type)(
+                input_size=inputs.get_shape().as_list()[-1] // 11,
+                splice=11,
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=0,  # return hidden states
+                lstm_impl=lstm_impl,
+                use_peephole=False,
+                parameter_init=0.1)
+        else:
+            encoder = load(encoder_type)(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=0,  # return hidden states
+                lstm_impl=lstm_impl,
+                use_peephole=False,
+                parameter_init=0.1)
+        return encoder(inputs=inputs,
+                       inputs_seq_len=inputs_seq_len,
+                       keep_prob_input=1.0,
+                       keep_prob_hidden=1.0,
+                       keep_prob_output=1.0)
+
+    @measure_time
+    def check_fused(self, encoder_type, batch_size=4, max_time=30):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('==================================================')
+
+        input_size = 33 * 11 if encoder_type == 'vgg_blstm' else 40
+        inputs_np = np.random.randn(
+            batch_size, max_time, input_size).astype(np.float32)
+        inputs_seq_len_np = np.random.randint(
+            max_time // 2, max_time + 1, size=batch_size).astype(np.int32)
+        inputs_seq_len_np[0] = max_time
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            inputs = tf.constant(inputs_np)
+            inputs_seq_len = tf.constant(inputs_seq_len_np)
+
+            with tf.variable_scope('block'):
+                outputs_block = self._build(
+                    encoder_type, 'LSTMBlockCell', inputs, inputs_seq_len)
+            with tf.variable_scope('fused'):
+                outputs_fused = self._build(
+                    encoder_type, 'LSTMBlockFusedCell', inputs, inputs_seq_len)
+
+            # Share the weights: both cells have the same layout of the
+            # kernel `[input_size + num_units, num_units * 4]`
+            vars_block = tf.get_collection(
+                tf.GraphKeys.TRAINABLE_VARIABLES, scope='block')
+            vars_fused = tf.get_collection(
+                tf.GraphKeys.TRAINABLE_VARIABLES, scope='fused')
+            self.assertEqual(len(vars_block), len(vars_fused))
+            copy_op = tf.group(*[tf.assign(v_fused, v_block)
+                                 for v_block, v_fused in zip(vars_block, vars_fused)])
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run(copy_op)
+                outputs_block, outputs_fused = sess.run(
+                    [outputs_block, outputs_fused])
+
+        # The last hidden states and final states (and those of the sub task)
+        for block, fused in zip(_flatten(outputs_block), _flatten(outputs_fused)):
+            self.assertEqual(block.shape, fused.shape)
+            if block.ndim == 3:
+                for i_batch in range(batch_size):
+                    self.assertAllClose(
+                        block[i_batch, :inputs_seq_len_np[i_batch]],
+                        fused[i_batch, :inputs_seq_len_np[i_batch]],
+                        atol=1e-5)
+            else:
+                self.assertAllClose(block, fused, atol=1e-5)
+
+    @measure_time
+    def check_step_time(self, max_time, batch_size=32, input_size=123,
+                        num_trials=5):
+
+        print('==================================================')
+        print('  max_time: %d' % max_time)
+        print('==================================================')
+
+        for lstm_impl in ['LSTMBlockCell', 'LSTMBlockFusedCell']:
+            tf.reset_default_graph()
+            with tf.Graph().as_default(), tf.device('/cpu:0'):
+                inputs = tf.constant(np.random.randn(
+                    batch_size, max_time, input_size).astype(np.float32))
+                inputs_seq_len = tf.fill([batch_size], max_time)
+                outputs, _ = self._build(
+                    'blstm', lstm_impl, inputs, inputs_seq_len,
+                    num_units=256, num_layers=5)
+                train_op = tf.train.GradientDescentOptimizer(1e-6).minimize(
+                    tf.reduce_sum(outputs ** 2))
+
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    # Warm up
+                    sess.run(train_op)
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(train_op)
+                    elapsed = (time.time() - start_time) / num_trials
+                    print('%s: %.3f sec per training step' %
+                          (lstm_impl, elapsed))
+
+
+if __name__ == "__main__":
+    tf.test.main()
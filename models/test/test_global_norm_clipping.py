@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.test.util import measure_time
+from models.test.data import generate_data
+from utils.training.gradients import clip_gradients
+
+
+class TestGlobalNormClipping(tf.test.TestCase):
+
+    def test_global_norm_clipping(self):
+        print("Global norm clipping Working check.")
+
+        self.check_op_count()
+        self.check_clipping(accum_steps=1)
+        self.check_clipping(accum_steps=2)
+        # The norm is recorded also without clipping
+        self.check_clipping(accum_steps=1, clip_grad=None)
+
+    def _build(self, inputs, clip_grad):
+        model = CTC(encoder_type='blstm',
+                    input_size=inputs.shape[-1],
+                    num_units=32,
+                    num_layers=2,
+                    num_classes=26,
+                    lstm_impl='LSTMBlockCell',
+                    parameter_init=0.1,
+                    clip_grad=clip_grad)
+        model.create_placeholders()
+        loss_op, _ = model.compute_loss(
+            model.inputs_pl_list[0],
+            model.labels_pl_list[0],
+            model.inputs_seq_len_pl_list[0],
+            model.keep_prob_input_pl_list[0],
+            model.keep_prob_hidden_pl_list[0],
+            model.keep_prob_output_pl_list[0])
+        return model, loss_op
+
+    @measure_time
+    def check_op_count(self):
+
+        print('==================================================')
+        print('  The number of ops for clipping')
+        print('==================================================')
+
+        inputs, _, _ = generate_data(
+            label_type='character', model='ctc', batch_size=2)
+
+        for clip_norm, clip_global_norm in [(False, False), (True, False),
+                                            (False, True)]:
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                model, loss_op = self._build(inputs, clip_grad=1.0)
+                grads_and_vars = tf.train.GradientDescentOptimizer(
+                    0.1).compute_gradients(loss_op)
+
+                num_ops = len(tf.get_default_graph().get_operations())
+                clip_gradients(model, grads_and_vars, clip_norm,
+                               clip_global_norm)
+                num_ops = len(
+                    tf.get_default_graph().get_operations()) - num_ops
+
+            print('%s: %d ops for %d variables' %
+                  ('global norm' if clip_global_norm else
+                   'norm' if clip_norm else 'value',
+                   num_ops, len(grads_and_vars)))
+
+    @measure_time
+    def check_clipping(self, accum_steps, clip_grad=1e-3):
+
+        print('==================================================')
+        print('  accum_steps: %d' % accum_steps)
+        print('  clip_grad: %s' % str(clip_grad))
+        print('==================================================')
+
+        inputs, labels, inputs_seq_len = generate_data(
+            label_type='character', model='ctc', batch_size=2)
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            model, loss_op = self._build(inputs, clip_grad=clip_grad)
+            train_op = model.train(loss_op,
+                                   optimizer='sgd',
+                                   learning_rate=1.0,
+                                   clip_global_norm=True,
+                                   accum_steps=accum_steps)
+            grads = tf.gradients(loss_op, tf.trainable_variables())
+
+            feed_dict = {
+                model.inputs_pl_list[0]: inputs,
+                model.labels_pl_list[0]: labels,
+                model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                model.keep_prob_input_pl_list[0]: 1.0,
+                model.keep_prob_hidden_pl_list[0]: 1.0,
+                model.keep_prob_output_pl_list[0]: 1.0
+            }
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                vars_before = sess.run(tf.trainable_variables())
+                grads_np = sess.run(grads, feed_dict=feed_dict)
+                for _ in range(accum_steps):
+                    sess.run(train_op, feed_dict=feed_dict)
+                vars_after = sess.run(tf.trainable_variables())
+                grad_norm = sess.run(model.grad_norm)
+
+        # The norm is recorded before clipping
+        global_norm = np.sqrt(sum([np.sum(g ** 2) for g in grads_np]))
+        self.assertAllClose(grad_norm, global_norm, rtol=1e-4)
+
+        # The norm of the update is clip_grad (learning rate is 1)
+        update_norm = np.sqrt(sum([np.sum((after - before) ** 2)
+                                   for before, after in
+                                   zip(vars_before, vars_after)]))
+        if clip_grad is None:
+            self.assertAllClose(update_norm, global_norm, rtol=1e-3)
+        else:
+            self.assertAllClose(update_norm, clip_grad, rtol=1e-3)
+        print('global norm: %.3f, update norm: %f' %
+              (grad_norm, update_norm))
+
+
+if __name__ == "__main__":
+    tf.test.main()
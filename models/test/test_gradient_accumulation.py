@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.test.util import measure_time
+from models.test.data import generate_data
+from utils.training.gradient_accumulation import GradientAccumulator
+
+
+class TestGradientAccumulation(tf.test.TestCase):
+
+    def test_gradient_accumulation(self):
+        print("Gradient accumulation Working check.")
+
+        self.check_accumulator(num_steps=1)
+        self.check_accumulator(num_steps=4)
+
+        self.check_training(accum_steps=1)
+        self.check_training(accum_steps=3)
+        self.check_training(accum_steps=3, clip_grad=5.0)
+
+    @measure_time
+    def check_accumulator(self, num_steps, batch_size=8, input_size=5):
+
+        print('==================================================')
+        print('  num_steps: %d' % num_steps)
+        print('==================================================')
+
+        inputs_np = np.random.randn(batch_size, input_size).astype(np.float32)
+        micro_batch_size = batch_size // num_steps
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            inputs_pl = tf.placeholder(tf.float32, shape=[None, input_size])
+            W = tf.Variable(tf.ones([input_size, 1]), name='W')
+            loss = tf.reduce_mean(tf.matmul(inputs_pl, W) ** 2)
+            optimizer = tf.train.GradientDescentOptimizer(0.1)
+
+            # Update with the whole batch
+            grads = tf.gradients(loss, [W])[0]
+
+            # Update with micro-batches
+            accumulator = GradientAccumulator(num_steps)
+            train_op = accumulator.accumulate(
+                optimizer.compute_gradients(loss),
+                lambda grads_and_vars: optimizer.apply_gradients(
+                    grads_and_vars))
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                W_init = sess.run(W)
+                grads_np = sess.run(grads, feed_dict={inputs_pl: inputs_np})
+
+                for i_step in range(num_steps):
+                    # Not updated until the last micro-batch
+                    self.assertAllClose(sess.run(W), W_init)
+                    sess.run(train_op, feed_dict={
+                        inputs_pl: inputs_np[i_step * micro_batch_size:
+                                             (i_step + 1) * micro_batch_size]})
+
+                self.assertAllClose(sess.run(W), W_init - 0.1 * grads_np,
+                                    atol=1e-5)
+
+                # Accumulators are reset
+                for accum in accumulator.accum_list:
+                    self.assertAllClose(sess.run(accum),
+                                        np.zeros_like(W_init))
+
+    @measure_time
+    def check_training(self, accum_steps, clip_grad=None, num_updates=2):
+
+        print('==================================================')
+        print('  accum_steps: %d' % accum_steps)
+        print('  clip_grad: %s' % str(clip_grad))
+        print('==================================================')
+
+        inputs, labels, inputs_seq_len = generate_data(
+            label_type='character', model='ctc', batch_size=2)
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            model = CTC(encoder_type='blstm',
+                        input_size=inputs.shape[-1],
+                        num_units=32,
+                        num_layers=2,
+                        num_classes=26,
+                        lstm_impl='LSTMBlockCell',
+                        parameter_init=0.1,
+                        clip_grad=clip_grad)
+
+            model.create_placeholders()
+            loss_op, _ = model.compute_loss(
+                model.inputs_pl_list[0],
+                model.labels_pl_list[0],
+                model.inputs_seq_len_pl_list[0],
+                model.keep_prob_input_pl_list[0],
+                model.keep_prob_hidden_pl_list[0],
+                model.keep_prob_output_pl_list[0])
+            train_op = model.train(loss_op,
+                                   optimizer='adam',
+                                   learning_rate=1e-3,
+                                   accum_steps=accum_steps)
+            global_step = [var for var in tf.global_variables()
+                           if var.op.name == 'global_step'][0]
+
+            feed_dict = {
+                model.inputs_pl_list[0]: inputs,
+                model.labels_pl_list[0]: labels,
+                model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                model.keep_prob_input_pl_list[0]: 1.0,
+                model.keep_prob_hidden_pl_list[0]: 1.0,
+                model.keep_prob_output_pl_list[0]: 1.0
+            }
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for _ in range(num_updates * accum_steps):
+                    _, loss_train = sess.run([train_op, loss_op],
+                                             feed_dict=feed_dict)
+
+                # The global step counts updates, not mini-batches
+                self.assertEqual(sess.run(global_step), num_updates)
+
+        self.assertTrue(np.isfinite(loss_train))
+        print('loss: %.3f' % loss_train)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -8,6 +8,8 @@ from __future__ import print_function
 import os
 import sys
 import time
+import shutil
+import tempfile
 import tensorflow as tf
 # from tensorflow.python import debug as tf_debug
 
@@ -26,6 +28,70 @@ class TestAttention(tf.test.TestCase):
         print("Joint CTC-Attention Working check.")
         self.check_training(label_type='phone')
         self.check_training(label_type='character')
+        self.check_restore_old_checkpoint()
+
+    @measure_time
+    def check_restore_old_checkpoint(self):
+        print('----- restore old checkpoint -----')
+        inputs, _, _, _, _ = generate_data(label_type='character',
+                                           model='joint_ctc_attention',
+                                           batch_size=1)
+        save_path = tempfile.mkdtemp()
+        try:
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                network = JointCTCAttention(input_size=inputs[0].shape[1],
+                                            encoder_num_unit=32,
+                                            encoder_num_layer=1,
+                                            attention_dim=16,
+                                            attention_type='content',
+                                            decoder_num_unit=32,
+                                            decoder_num_layer=1,
+                                            embedding_dim=8,
+                                            att_num_classes=28,
+                                            ctc_num_classes=26,
+                                            att_task_weight=0.5,
+                                            sos_index=26,
+                                            eos_index=27,
+                                            max_decode_length=10)
+                network.create_placeholders()
+                network.compute_loss(
+                    network.inputs_pl_list[0],
+                    network.att_labels_pl_list[0],
+                    network.inputs_seq_len_pl_list[0],
+                    network.att_labels_seq_len_pl_list[0],
+                    network.ctc_labels_pl_list[0],
+                    network.keep_prob_input_pl_list[0],
+                    network.keep_prob_hidden_pl_list[0],
+                    network.keep_prob_output_pl_list[0])
+
+                # Save with the names before the output layer of CTC was
+                # created by tf.get_variable
+                old_var_list = {}
+                for var in tf.global_variables():
+                    var_name = var.op.name.replace(
+                        'ctc_output/W_ctc_output', 'ctc_output/Variable')
+                    var_name = var_name.replace(
+                        'ctc_output/b_ctc_output', 'ctc_output/Variable_1')
+                    old_var_list[var_name] = var
+                self.assertTrue('ctc_output/Variable' in old_var_list)
+
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    values = sess.run(tf.global_variables())
+                    model_path = tf.train.Saver(var_list=old_var_list).save(
+                        sess, os.path.join(save_path, 'model.ckpt'))
+
+                    sess.run(tf.global_variables_initializer())
+                    tf.train.Saver(
+                        var_list=network.checkpoint_var_list(model_path)
+                    ).restore(sess, model_path)
+                    values_restored = sess.run(tf.global_variables())
+
+            for value, value_restored in zip(values, values_restored):
+                self.assertAllEqual(value, value_restored)
+        finally:
+            shutil.rmtree(save_path)
 
     @measure_time
     def check_training(self, label_type):
@@ -0,0 +1,191 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.encoders.load_encoder import load
+from models.test.util import measure_time
+
+ENCODER_TYPES = ['blstm', 'lstm', 'vgg_blstm', 'vgg_lstm', 'pblstm',
+                 'multitask_blstm', 'multitask_lstm']
+CPU_LSTM_IMPLS = ['BasicLSTMCell', 'LSTMCell', 'LSTMBlockCell',
+                  'LSTMBlockFusedCell']
+FACTORY_ENCODER_TYPES = ['vgg_blstm', 'vgg_lstm', 'pblstm',
+                         'multitask_blstm', 'multitask_lstm']
+
+
+class TestLSTMFactory(tf.test.TestCase):
+
+    def test_lstm_factory(self):
+        print("LSTM factory Working check.")
+
+        # Every encoder on every backend
+        for encoder_type in ENCODER_TYPES:
+            for lstm_impl in CPU_LSTM_IMPLS:
+                self.check_encoder(encoder_type, lstm_impl)
+
+        # Step time on CPU
+        self.check_step_time()
+
+        # CudnnLSTM in the factory
+        if not tf.test.is_gpu_available(cuda_only=True):
+            print('Skipped: cuDNN is not available.')
+            return
+        for encoder_type in FACTORY_ENCODER_TYPES:
+            self.check_cudnn_encoder(encoder_type, num_proj=None)
+            self.check_cudnn_encoder(encoder_type, num_proj=8)
+
+    def _build(self, encoder_type, lstm_impl, inputs, inputs_seq_len,
+               num_units, num_layers, num_proj=None, is_training=True):
+        if encoder_type in ['multitask_blstm', 'multitask_lstm']:
+            encoder = load(encoder_type)(
+                num_units=num_units,
+                num_layers_main=num_layers,
+                num_layers_sub=num_layers - 1,
+                num_classes_main=0,  # return hidden states
+                num_classes_sub=0,  # return hidden states
+                lstm_impl=lstm_impl,
+                use_peephole=False,
+                parameter_init=0.1,
+                num_proj=num_proj)
+        elif encoder_type in ['vgg_blstm', 'vgg_lstm']:
+            encoder = load(encoder_type)(
+                input_size=inputs.get_shape().as_list()[-1] // 11,
+                splice=11,
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=0,  # return hidden states
+                lstm_impl=lstm_impl,
+                use_peephole=False,
+                parameter_init=0.1,
+                num_proj=num_proj)
+        else:
+            encoder = load(encoder_type)(
+                num_units=num_units,
+                num_layers=num_layers,
+                num_classes=0,  # return hidden states
+                lstm_impl=lstm_impl,
+                use_peephole=False,
+                parameter_init=0.1,
+                num_proj=num_proj)
+        return encoder(inputs=inputs,
+                       inputs_seq_len=inputs_seq_len,
+                       keep_prob_input=1.0,
+                       keep_prob_hidden=1.0,
+                       keep_prob_output=1.0,
+                       is_training=is_training)
+
+    def _inputs(self, encoder_type, batch_size, max_time):
+        input_size = 33 * 11 if 'vgg' in encoder_type else 40
+        inputs = tf.constant(np.random.randn(
+            batch_size, max_time, input_size).astype(np.float32))
+        inputs_seq_len = tf.fill([batch_size], max_time)
+        return inputs, inputs_seq_len
+
+    @measure_time
+    def check_encoder(self, encoder_type, lstm_impl, batch_size=4,
+                      max_time=30, num_units=16, num_layers=3):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('  lstm_impl: %s' % lstm_impl)
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default(), tf.device('/cpu:0'):
+            inputs, inputs_seq_len = self._inputs(
+                encoder_type, batch_size, max_time)
+            outputs = self._build(encoder_type, lstm_impl, inputs,
+                                  inputs_seq_len, num_units, num_layers)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                outputs = sess.run(outputs[0])
+
+        self.assertEqual(outputs.shape[0], batch_size)
+        self.assertEqual(outputs.shape[-1],
+                         num_units * 2 if 'blstm' in encoder_type else num_units)
+
+    @measure_time
+    def check_cudnn_encoder(self, encoder_type, num_proj, batch_size=4,
+                            max_time=30, num_units=16, num_layers=3):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('  lstm_impl: CudnnLSTM')
+        print('  num_proj: %s' % str(num_proj))
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            inputs, inputs_seq_len = self._inputs(
+                encoder_type, batch_size, max_time)
+            is_training = tf.placeholder_with_default(
+                False, shape=[], name='is_training')
+            outputs = self._build(encoder_type, 'CudnnLSTM', inputs,
+                                  inputs_seq_len, num_units, num_layers,
+                                  num_proj=num_proj, is_training=is_training)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                outputs_train = sess.run(outputs[0],
+                                         feed_dict={is_training: True})
+                outputs_eval = sess.run(outputs[0])
+
+        # Each direction is projected separately
+        output_size = num_units if num_proj is None else num_proj
+        if 'blstm' in encoder_type:
+            output_size *= 2
+        self.assertEqual(outputs_eval.shape[0], batch_size)
+        self.assertEqual(outputs_eval.shape[-1], output_size)
+        # The reserve space does not change the outputs
+        self.assertAllClose(outputs_train, outputs_eval, atol=1e-5)
+
+    @measure_time
+    def check_step_time(self, batch_size=32, max_time=200, num_units=256,
+                        num_layers=4, num_trials=5):
+
+        print('==================================================')
+        print('  Step time on CPU (ms)')
+        print('==================================================')
+
+        print('%-16s' % 'encoder' +
+              ''.join(['%20s' % lstm_impl for lstm_impl in CPU_LSTM_IMPLS]))
+        for encoder_type in ENCODER_TYPES:
+            elapsed_list = []
+            for lstm_impl in CPU_LSTM_IMPLS:
+                tf.reset_default_graph()
+                with tf.Graph().as_default(), tf.device('/cpu:0'):
+                    inputs, inputs_seq_len = self._inputs(
+                        encoder_type, batch_size, max_time)
+                    outputs = self._build(encoder_type, lstm_impl, inputs,
+                                          inputs_seq_len, num_units,
+                                          num_layers)
+                    train_op = tf.train.GradientDescentOptimizer(
+                        1e-6).minimize(tf.reduce_sum(outputs[0] ** 2))
+
+                    with tf.Session() as sess:
+                        sess.run(tf.global_variables_initializer())
+                        # Warm up
+                        sess.run(train_op)
+                        start_time = time.time()
+                        for _ in range(num_trials):
+                            sess.run(train_op)
+                        elapsed_list.append(
+                            (time.time() - start_time) / num_trials)
+            print('%-16s' % encoder_type +
+                  ''.join(['%20.1f' % (elapsed * 1000)
+                           for elapsed in elapsed_list]))
+
+
+if __name__ == "__main__":
+    tf.test.main()
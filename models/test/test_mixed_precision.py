@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.test.util import measure_time
+from models.test.data import generate_data
+from utils.training.mixed_precision import DynamicLossScaler
+
+
+def _allocated_bytes(run_metadata):
+    """Sum up the bytes allocated for the outputs of all ops in a step."""
+    total_bytes = 0
+    for dev_stats in run_metadata.step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            for output in node_stats.output:
+                total_bytes += output.tensor_description.allocation_description.requested_bytes
+    return total_bytes
+
+
+class TestMixedPrecision(tf.test.TestCase):
+
+    def test_mixed_precision(self):
+        print("Mixed precision training Working check.")
+
+        self.check_loss_scaler()
+
+        # NOTE: LSTMBlockCell has no float16 kernel on CPU
+        self.check_training(encoder_type='blstm', lstm_impl='LSTMCell')
+        self.check_training(encoder_type='lstm', lstm_impl='BasicLSTMCell')
+        self.check_training(encoder_type='cnn_zhang', lstm_impl=None)
+        # LSTMBlockCell and LSTMBlockFusedCell are rejected
+        for lstm_impl in ['LSTMBlockCell', 'LSTMBlockFusedCell']:
+            with self.assertRaises(ValueError):
+                self._build('blstm', lstm_impl, input_size=39, splice=1,
+                            mixed_precision=True)
+
+        # Step time and memory on CPU
+        self.check_step_time()
+
+    @measure_time
+    def check_loss_scaler(self):
+
+        print('==================================================')
+        print('  Dynamic loss scaling')
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            var = tf.Variable(1.0, name='var')
+            loss_pl = tf.placeholder(tf.float32, shape=[])
+            global_step = tf.Variable(0, name='global_step', trainable=False)
+            optimizer = tf.train.GradientDescentOptimizer(1.0)
+
+            loss_scaler = DynamicLossScaler(init_scale=2 ** 4,
+                                            increment_period=2)
+            grads_and_vars = optimizer.compute_gradients(
+                loss_scaler.scale_loss(var * loss_pl))
+            grads_and_vars = loss_scaler.unscale_gradients(grads_and_vars)
+            all_finite = loss_scaler.all_finite(grads_and_vars)
+            train_op = loss_scaler.apply_gradients(
+                optimizer, grads_and_vars, all_finite,
+                global_step=global_step)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                # Overflow: the update is skipped and the scale is halved
+                sess.run(train_op, feed_dict={loss_pl: np.inf})
+                self.assertEqual(sess.run(var), 1.0)
+                self.assertEqual(sess.run(loss_scaler.loss_scale), 2 ** 3)
+                self.assertEqual(sess.run(global_step), 1)
+
+                # The gradient is unscaled
+                sess.run(train_op, feed_dict={loss_pl: 0.5})
+                self.assertAllClose(sess.run(var), 0.5)
+                self.assertEqual(sess.run(loss_scaler.loss_scale), 2 ** 3)
+
+                # The scale is doubled after `increment_period` steps
+                sess.run(train_op, feed_dict={loss_pl: 0.5})
+                self.assertAllClose(sess.run(var), 0.0)
+                self.assertEqual(sess.run(loss_scaler.loss_scale), 2 ** 4)
+                self.assertEqual(sess.run(loss_scaler.num_good_steps), 0)
+
+    def _build(self, encoder_type, lstm_impl, input_size, splice,
+               mixed_precision, num_units=64):
+        model = CTC(encoder_type=encoder_type,
+                    input_size=input_size,
+                    splice=splice,
+                    num_units=num_units,
+                    num_layers=2,
+                    num_classes=26,
+                    lstm_impl=lstm_impl,
+                    parameter_init=0.1,
+                    clip_grad=5.0,
+                    weight_decay=1e-6,
+                    mixed_precision=mixed_precision)
+
+        model.create_placeholders()
+        loss_op, logits = model.compute_loss(
+            model.inputs_pl_list[0],
+            model.labels_pl_list[0],
+            model.inputs_seq_len_pl_list[0],
+            model.keep_prob_input_pl_list[0],
+            model.keep_prob_hidden_pl_list[0],
+            model.keep_prob_output_pl_list[0])
+        train_op = model.train(loss_op,
+                               optimizer='adam',
+                               learning_rate=1e-3,
+                               clip_norm=True)
+        return model, loss_op, logits, train_op
+
+    def _feed_dict(self, model, inputs, labels, inputs_seq_len):
+        return {
+            model.inputs_pl_list[0]: inputs,
+            model.labels_pl_list[0]: labels,
+            model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+            model.keep_prob_input_pl_list[0]: 0.9,
+            model.keep_prob_hidden_pl_list[0]: 0.9,
+            model.keep_prob_output_pl_list[0]: 0.9
+        }
+
+    @measure_time
+    def check_training(self, encoder_type, lstm_impl, num_steps=3):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('  lstm_impl: %s' % lstm_impl)
+        print('==================================================')
+
+        splice = 11 if encoder_type == 'cnn_zhang' else 1
+        inputs, labels, inputs_seq_len = generate_data(
+            label_type='character', model='ctc', batch_size=2, splice=splice)
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default(), tf.device('/cpu:0'):
+            model, loss_op, logits, train_op = self._build(
+                encoder_type, lstm_impl, inputs.shape[-1] // splice, splice,
+                mixed_precision=True)
+
+            # Master weights are float32, and logits are cast to float32
+            for var in tf.trainable_variables():
+                self.assertEqual(var.dtype.base_dtype, tf.float32)
+            self.assertEqual(logits.dtype, tf.float32)
+
+            feed_dict = self._feed_dict(model, inputs, labels, inputs_seq_len)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for _ in range(num_steps):
+                    _, loss_train = sess.run([train_op, loss_op],
+                                             feed_dict=feed_dict)
+                loss_scale = sess.run(model.loss_scaler.loss_scale)
+
+        self.assertTrue(np.isfinite(loss_train))
+        print('loss: %.3f, loss scale: %.1f' % (loss_train, loss_scale))
+
+    @measure_time
+    def check_step_time(self, encoder_type='blstm', lstm_impl='LSTMCell',
+                        batch_size=16, num_units=256, num_trials=3):
+
+        print('==================================================')
+        print('  Step time and memory on CPU')
+        print('==================================================')
+
+        inputs, labels, inputs_seq_len = generate_data(
+            label_type='character', model='ctc', batch_size=batch_size)
+
+        for mixed_precision in [False, True]:
+            tf.reset_default_graph()
+            with tf.Graph().as_default(), tf.device('/cpu:0'):
+                model, _, _, train_op = self._build(
+                    encoder_type, lstm_impl, inputs.shape[-1], 1,
+                    mixed_precision=mixed_precision, num_units=num_units)
+                feed_dict = self._feed_dict(
+                    model, inputs, labels, inputs_seq_len)
+
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+
+                    # Warm up and measure the memory
+                    run_metadata = tf.RunMetadata()
+                    sess.run(train_op, feed_dict=feed_dict,
+                             options=tf.RunOptions(
+                                 trace_level=tf.RunOptions.FULL_TRACE),
+                             run_metadata=run_metadata)
+
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(train_op, feed_dict=feed_dict)
+                    elapsed = (time.time() - start_time) / num_trials
+
+            print('%s: %.3f sec per training step (%.1f utterances/sec), '
+                  '%.1f MB allocated' %
+                  ('mixed precision' if mixed_precision else 'float32',
+                   elapsed, batch_size / elapsed,
+                   _allocated_bytes(run_metadata) / 1024 ** 2))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,241 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.attention.blstm_attention_seq2seq import BLSTMAttetion
+from models.test.util import measure_time
+from models.test.data import generate_data
+from utils.training.multi_gpu import build_towers, get_devices
+
+
+class TestMultiTower(tf.test.TestCase):
+
+    def test_multi_tower(self):
+        print("Multi-tower training Working check.")
+
+        self.check_ctc(num_towers=2)
+        self.check_ctc(num_towers=2, accum_steps=2)
+        self.check_attention(num_towers=2)
+
+        # Data-parallel scaling with CPU device replicas
+        for batch_size in [8, 32]:
+            self.check_scaling(batch_size)
+
+    def _build_ctc(self, inputs, num_towers, accum_steps=1, clip_grad=None):
+        model = CTC(encoder_type='blstm',
+                    input_size=inputs.shape[-1],
+                    num_units=32,
+                    num_layers=2,
+                    num_classes=26,
+                    lstm_impl='LSTMBlockCell',
+                    parameter_init=0.1,
+                    clip_grad=clip_grad)
+
+        def tower_fn(i_tower, scope):
+            model.create_placeholders()
+            tower_loss, _ = model.compute_loss(
+                model.inputs_pl_list[i_tower],
+                model.labels_pl_list[i_tower],
+                model.inputs_seq_len_pl_list[i_tower],
+                model.keep_prob_input_pl_list[i_tower],
+                model.keep_prob_hidden_pl_list[i_tower],
+                model.keep_prob_output_pl_list[i_tower],
+                scope)
+            return tower_loss, tower_loss
+
+        global_step = tf.Variable(0, name='global_step', trainable=False)
+        train_op, loss_op, tower_losses = build_towers(
+            model, tf.train.GradientDescentOptimizer(1.0), tower_fn,
+            devices=get_devices(num_towers, device_type='cpu'),
+            global_step=global_step,
+            accum_steps=accum_steps)
+        return model, train_op, loss_op, tower_losses
+
+    def _feed_ctc(self, model, num_towers, inputs, labels, inputs_seq_len):
+        feed_dict = {}
+        for i_tower in range(num_towers):
+            feed_dict[model.inputs_pl_list[i_tower]] = inputs
+            feed_dict[model.labels_pl_list[i_tower]] = labels
+            feed_dict[model.inputs_seq_len_pl_list[i_tower]] = inputs_seq_len
+            feed_dict[model.keep_prob_input_pl_list[i_tower]] = 1.0
+            feed_dict[model.keep_prob_hidden_pl_list[i_tower]] = 1.0
+            feed_dict[model.keep_prob_output_pl_list[i_tower]] = 1.0
+        return feed_dict
+
+    @measure_time
+    def check_ctc(self, num_towers, accum_steps=1, batch_size=4):
+
+        print('==================================================')
+        print('  num_towers: %d' % num_towers)
+        print('  accum_steps: %d' % accum_steps)
+        print('==================================================')
+
+        # The mini-batch is split over the towers
+        inputs, labels, inputs_seq_len = generate_data(
+            label_type='character', model='ctc', batch_size=batch_size)
+        inputs_split, labels_split, inputs_seq_len_split = generate_data(
+            label_type='character', model='ctc',
+            batch_size=batch_size // num_towers)
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            model, train_op, loss_op, tower_losses = self._build_ctc(
+                inputs, num_towers, accum_steps=accum_steps)
+
+            # Variables are shared across the towers
+            self.assertEqual(len(model.inputs_pl_list), num_towers)
+            num_vars = len(tf.trainable_variables())
+
+            # Gradients of the first tower on the whole mini-batch
+            grads = tf.gradients(tower_losses[0], tf.trainable_variables())
+            self.assertEqual(len(tf.trainable_variables()), num_vars)
+
+            config = tf.ConfigProto(device_count={'CPU': num_towers})
+            with tf.Session(config=config) as sess:
+                sess.run(tf.global_variables_initializer())
+                vars_before = sess.run(tf.trainable_variables())
+                feed_dict = {
+                    model.inputs_pl_list[0]: inputs,
+                    model.labels_pl_list[0]: labels,
+                    model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                    model.keep_prob_input_pl_list[0]: 1.0,
+                    model.keep_prob_hidden_pl_list[0]: 1.0,
+                    model.keep_prob_output_pl_list[0]: 1.0
+                }
+                grads_np = sess.run(grads, feed_dict=feed_dict)
+
+                feed_dict = self._feed_ctc(
+                    model, num_towers,
+                    inputs_split, labels_split, inputs_seq_len_split)
+                for _ in range(accum_steps):
+                    sess.run(train_op, feed_dict=feed_dict)
+                loss_np = sess.run(loss_op, feed_dict=feed_dict)
+                vars_after = sess.run(tf.trainable_variables())
+
+        # The update equals that of the whole mini-batch
+        for before, after, grad in zip(vars_before, vars_after, grads_np):
+            self.assertAllClose(after, before - grad, atol=1e-4)
+        self.assertTrue(np.isfinite(loss_np))
+        print('loss: %.3f' % loss_np)
+
+    @measure_time
+    def check_attention(self, num_towers, batch_size=2):
+
+        print('==================================================')
+        print('  Attention, num_towers: %d' % num_towers)
+        print('==================================================')
+
+        inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+            label_type='character', model='attention',
+            batch_size=batch_size // num_towers)
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            model = BLSTMAttetion(input_size=inputs[0].shape[1],
+                                  encoder_num_unit=32,
+                                  encoder_num_layer=1,
+                                  attention_dim=16,
+                                  attention_type='content',
+                                  decoder_num_unit=32,
+                                  decoder_num_layer=1,
+                                  embedding_dim=8,
+                                  num_classes=28,
+                                  sos_index=26,
+                                  eos_index=27,
+                                  max_decode_length=50,
+                                  clip_grad=5.0)
+
+            def tower_fn(i_tower, scope):
+                model.create_placeholders()
+                tower_loss, _, _, _ = model.compute_loss(
+                    model.inputs_pl_list[i_tower],
+                    model.labels_pl_list[i_tower],
+                    model.inputs_seq_len_pl_list[i_tower],
+                    model.labels_seq_len_pl_list[i_tower],
+                    model.keep_prob_input_pl_list[i_tower],
+                    model.keep_prob_hidden_pl_list[i_tower],
+                    model.keep_prob_output_pl_list[i_tower],
+                    scope)
+                return tower_loss, None
+
+            global_step = tf.Variable(0, name='global_step', trainable=False)
+            train_op, loss_op, _ = build_towers(
+                model, model.set_optimizer('adam', 1e-3), tower_fn,
+                devices=get_devices(num_towers, device_type='cpu'),
+                global_step=global_step,
+                clip_global_norm=True)
+
+            feed_dict = {}
+            for i_tower in range(num_towers):
+                feed_dict[model.inputs_pl_list[i_tower]] = inputs
+                feed_dict[model.labels_pl_list[i_tower]] = labels
+                feed_dict[model.inputs_seq_len_pl_list[i_tower]
+                          ] = inputs_seq_len
+                feed_dict[model.labels_seq_len_pl_list[i_tower]
+                          ] = labels_seq_len
+                feed_dict[model.keep_prob_input_pl_list[i_tower]] = 1.0
+                feed_dict[model.keep_prob_hidden_pl_list[i_tower]] = 1.0
+                feed_dict[model.keep_prob_output_pl_list[i_tower]] = 1.0
+
+            config = tf.ConfigProto(device_count={'CPU': num_towers})
+            with tf.Session(config=config) as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run(train_op, feed_dict=feed_dict)
+                loss_np, grad_norm = sess.run([loss_op, model.grad_norm],
+                                              feed_dict=feed_dict)
+                self.assertEqual(sess.run(global_step), 1)
+
+        self.assertTrue(np.isfinite(loss_np))
+        print('loss: %.3f, grad norm: %.3f' % (loss_np, grad_norm))
+
+    @measure_time
+    def check_scaling(self, batch_size, num_trials=5):
+
+        print('==================================================')
+        print('  batch_size: %d' % batch_size)
+        print('==================================================')
+
+        # NOTE: the global mini-batch is fixed, and split over the towers
+        base_time = None
+        for num_towers in [1, 2, 4]:
+            inputs, labels, inputs_seq_len = generate_data(
+                label_type='character', model='ctc',
+                batch_size=batch_size // num_towers)
+
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                model, train_op, _, _ = self._build_ctc(
+                    inputs, num_towers, clip_grad=5.0)
+                feed_dict = self._feed_ctc(
+                    model, num_towers, inputs, labels, inputs_seq_len)
+
+                config = tf.ConfigProto(device_count={'CPU': num_towers})
+                with tf.Session(config=config) as sess:
+                    sess.run(tf.global_variables_initializer())
+                    # Warm up
+                    sess.run(train_op, feed_dict=feed_dict)
+                    start_time = time.time()
+                    for _ in range(num_trials):
+                        sess.run(train_op, feed_dict=feed_dict)
+                    elapsed = (time.time() - start_time) / num_trials
+
+            if base_time is None:
+                base_time = elapsed
+            print('%d towers: %.2f ms per step, %.1f utterances/sec (x%.2f)' %
+                  (num_towers, elapsed * 1000, batch_size / elapsed,
+                   base_time / elapsed))
+
+
+if __name__ == "__main__":
+    tf.test.main()
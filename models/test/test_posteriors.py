@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.test.util import measure_time
+from utils.io.outputs.posteriors import PosteriorWriter, PosteriorReader
+
+
+def _softmax(logits):
+    exp = np.exp(logits - np.max(logits, axis=1, keepdims=True))
+    return exp / np.sum(exp, axis=1, keepdims=True)
+
+
+class TestPosteriors(tf.test.TestCase):
+
+    def test_posteriors(self):
+        print("Posterior archive Working check.")
+
+        self.check_round_trip(top_k=None)
+        self.check_round_trip(top_k=3)
+        self.check_round_trip(top_k=None, chunk_frames=1)
+
+    @measure_time
+    def check_round_trip(self, top_k, chunk_frames=100000, num_classes=6):
+
+        print('==================================================')
+        print('  top_k: %s' % str(top_k))
+        print('  chunk_frames: %d' % chunk_frames)
+        print('==================================================')
+
+        np.random.seed(0)
+        posteriors = {
+            'utt%d' % i: _softmax(np.random.randn(num_frames, num_classes))
+            for i, num_frames in enumerate([5, 1, 8])}
+        # The best path is [1, 1, 0, 0, 2] => [1, 2]
+        best = np.array([1, 1, num_classes - 1, num_classes - 1, 2])
+        posteriors['utt0'][np.arange(5), best] = 10
+
+        archive_path = tempfile.mkdtemp()
+        try:
+            with PosteriorWriter(archive_path, num_classes, top_k=top_k,
+                                 chunk_frames=chunk_frames) as writer:
+                for utt_name in sorted(posteriors.keys()):
+                    writer.write(utt_name, posteriors[utt_name])
+
+                # Names must be unique
+                with self.assertRaises(ValueError):
+                    writer.write('utt0', posteriors['utt0'])
+
+            reader = PosteriorReader(archive_path)
+            self.assertEqual(len(reader), 3)
+            self.assertEqual(reader.keys(), ['utt0', 'utt1', 'utt2'])
+            self.assertTrue('utt1' in reader)
+
+            for utt_name, posteriors_utt in posteriors.items():
+                posteriors_saved = reader[utt_name]
+                self.assertEqual(posteriors_saved.shape, posteriors_utt.shape)
+
+                if top_k is None:
+                    # Saved in float16
+                    self.assertAllClose(posteriors_saved, posteriors_utt,
+                                        rtol=1e-3, atol=1e-3)
+                else:
+                    indices, values = reader.top_k_posteriors(utt_name)
+                    self.assertEqual(indices.shape, (len(posteriors_utt), top_k))
+                    # Sorted in descending order
+                    self.assertTrue(np.all(np.diff(values, axis=1) <= 0))
+                    self.assertAllEqual(
+                        indices[:, 0], np.argmax(posteriors_utt, axis=1))
+                    rows = np.arange(len(posteriors_utt))[:, np.newaxis]
+                    self.assertAllClose(posteriors_saved[rows, indices],
+                                        posteriors_utt[rows, indices],
+                                        rtol=1e-3, atol=1e-3)
+                    # Posteriors out of top-k are 0
+                    self.assertAllEqual(
+                        np.sum(posteriors_saved > 0, axis=1),
+                        [top_k] * len(posteriors_utt))
+
+            self.assertAllEqual(reader.best_path('utt0'), [1, 2])
+        finally:
+            shutil.rmtree(archive_path)
+
+
+if __name__ == "__main__":
+    tf.test.main()
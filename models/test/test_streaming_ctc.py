@@ -0,0 +1,203 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.ctc.vanilla_ctc import CTC
+from models.ctc.streaming_ctc import StreamingCTC, LatencyControlledCTC
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class TestStreamingCTC(tf.test.TestCase):
+
+    def test_streaming_ctc(self):
+        print("Streaming CTC Working check.")
+
+        self.check_streaming(encoder_type='lstm', lstm_impl='LSTMCell')
+        self.check_streaming(encoder_type='lstm', lstm_impl='LSTMBlockCell')
+        self.check_streaming(encoder_type='gru')
+
+        self.check_latency_controlled(encoder_type='blstm',
+                                      lstm_impl='LSTMCell')
+        self.check_latency_controlled(encoder_type='blstm',
+                                      lstm_impl='LSTMBlockCell')
+        self.check_latency_controlled(encoder_type='vgg_blstm')
+
+    @measure_time
+    def check_streaming(self, encoder_type, lstm_impl='LSTMBlockCell',
+                        chunk_size=7):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('  lstm_impl: %s' % lstm_impl)
+        print('  chunk_size: %d' % chunk_size)
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            inputs, _, inputs_seq_len = generate_data(
+                label_type='phone',
+                model='ctc',
+                batch_size=1)
+
+            # Define model graph
+            model = CTC(encoder_type=encoder_type,
+                        input_size=inputs[0].shape[-1],
+                        num_units=64,
+                        num_layers=2,
+                        num_classes=61,
+                        lstm_impl=lstm_impl,
+                        parameter_init=0.1,
+                        clip_activation=50,
+                        num_proj=32)
+
+            # Define placeholders
+            model.create_placeholders()
+
+            # Whole utterance
+            _, logits = model.compute_loss(
+                model.inputs_pl_list[0],
+                model.labels_pl_list[0],
+                model.inputs_seq_len_pl_list[0],
+                model.keep_prob_input_pl_list[0],
+                model.keep_prob_hidden_pl_list[0],
+                model.keep_prob_output_pl_list[0])
+            posteriors_op = model.posteriors(logits)
+
+            # Chunk by chunk (share parameters)
+            with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+                streamer = StreamingCTC(model, chunk_size=chunk_size)
+
+            init_op = tf.global_variables_initializer()
+
+            with tf.Session() as sess:
+                sess.run(init_op)
+
+                feed_dict = {
+                    model.inputs_pl_list[0]: inputs,
+                    model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                    model.keep_prob_input_pl_list[0]: 1.0,
+                    model.keep_prob_hidden_pl_list[0]: 1.0,
+                    model.keep_prob_output_pl_list[0]: 1.0
+                }
+                posteriors = sess.run(posteriors_op, feed_dict=feed_dict)
+
+                posteriors_chunk_list = []
+                for posteriors_chunk, new_labels, latency in streamer(
+                        sess, inputs[0][:inputs_seq_len[0]]):
+                    posteriors_chunk_list.append(posteriors_chunk)
+                posteriors_streaming = np.concatenate(
+                    posteriors_chunk_list, axis=0)
+
+                print('Chunk num: %d' % len(streamer.latencies))
+                print('Latency per chunk: %.3f ms' %
+                      (np.mean(streamer.latencies) * 1000))
+
+                self.assertAllClose(posteriors[:inputs_seq_len[0]],
+                                    posteriors_streaming, atol=1e-5)
+
+                # Greedy decoding over the whole utterance
+                best = np.argmax(posteriors[:inputs_seq_len[0]], axis=1)
+                labels = [best[t] for t in range(len(best))
+                          if (t == 0 or best[t] != best[t - 1]) and
+                          best[t] != model.num_classes - 1]
+                self.assertEqual(labels, streamer.hypothesis)
+
+    @measure_time
+    def check_latency_controlled(self, encoder_type, lstm_impl='LSTMBlockCell',
+                                 chunk_size=7):
+
+        print('==================================================')
+        print('  encoder_type: %s' % encoder_type)
+        print('  lstm_impl: %s' % lstm_impl)
+        print('  chunk_size: %d' % chunk_size)
+        print('==================================================')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            batch_size = 2
+            splice = 11 if encoder_type == 'vgg_blstm' else 1
+            inputs, _, inputs_seq_len = generate_data(
+                label_type='phone',
+                model='ctc',
+                batch_size=batch_size,
+                splice=splice)
+
+            # Define model graph
+            model = CTC(encoder_type=encoder_type,
+                        input_size=inputs[0].shape[-1] // splice,
+                        splice=splice,
+                        num_units=64,
+                        num_layers=2,
+                        num_classes=61,
+                        lstm_impl=lstm_impl,
+                        parameter_init=0.1,
+                        clip_activation=50,
+                        num_proj=32)
+
+            # Define placeholders
+            model.create_placeholders()
+
+            # Whole utterance
+            _, logits = model.compute_loss(
+                model.inputs_pl_list[0],
+                model.labels_pl_list[0],
+                model.inputs_seq_len_pl_list[0],
+                model.keep_prob_input_pl_list[0],
+                model.keep_prob_hidden_pl_list[0],
+                model.keep_prob_output_pl_list[0])
+            posteriors_op = tf.nn.softmax(tf.transpose(logits, (1, 0, 2)))
+
+            # Chunk by chunk (share parameters)
+            # NOTE: if the right context covers the whole utterance, outputs
+            # are the same as those of the whole utterance
+            max_time = inputs.shape[1]
+            with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+                decoder_full = LatencyControlledCTC(
+                    model, chunk_size=chunk_size, right_context=max_time)
+            with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+                decoder = LatencyControlledCTC(
+                    model, chunk_size=chunk_size, right_context=2)
+
+            init_op = tf.global_variables_initializer()
+
+            with tf.Session() as sess:
+                sess.run(init_op)
+
+                feed_dict = {
+                    model.inputs_pl_list[0]: inputs,
+                    model.inputs_seq_len_pl_list[0]: inputs_seq_len,
+                    model.keep_prob_input_pl_list[0]: 1.0,
+                    model.keep_prob_hidden_pl_list[0]: 1.0,
+                    model.keep_prob_output_pl_list[0]: 1.0
+                }
+                posteriors = sess.run(posteriors_op, feed_dict=feed_dict)
+
+                posteriors_full = decoder_full(sess, inputs, inputs_seq_len)
+                for i_batch in range(batch_size):
+                    self.assertAllClose(
+                        posteriors[i_batch, :inputs_seq_len[i_batch]],
+                        posteriors_full[i_batch, :inputs_seq_len[i_batch]],
+                        atol=1e-5)
+
+                posteriors_lc = decoder(sess, inputs, inputs_seq_len)
+                self.assertEqual(posteriors.shape, posteriors_lc.shape)
+
+                print('Chunk num: %d' % len(decoder.latencies))
+                print('Latency per chunk: %.3f ms' %
+                      (np.mean(decoder.latencies) * 1000))
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,123 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath('../../'))
+from models.test.util import measure_time
+from utils.training.throughput import ThroughputMonitor, STAT_KEYS
+
+
+class _FakeTimer(object):
+    """A clock which advances only by `sleep`."""
+
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestThroughput(tf.test.TestCase):
+
+    def test_throughput(self):
+        print("Throughput instrumentation Working check.")
+
+        self.check_stats(num_towers=1)
+        self.check_stats(num_towers=2)
+        self.check_save()
+
+    def _run_steps(self, monitor, timer, num_towers, num_steps=3,
+                   batch_size=4, max_time=10):
+        for _ in range(num_steps):
+            timer.sleep(0.01)
+            monitor.lap('data')
+            inputs = [np.zeros((batch_size, max_time, 3))
+                      for _ in range(num_towers)]
+            # Half of the frames are padded
+            inputs_seq_len = [np.array([max_time // 2] * batch_size)
+                              for _ in range(num_towers)]
+            monitor.add_batch(inputs, inputs_seq_len)
+            timer.sleep(0.005)
+            monitor.lap('feed')
+            timer.sleep(0.02)
+            monitor.lap('run')
+
+    @measure_time
+    def check_stats(self, num_towers):
+
+        print('==================================================')
+        print('  num_towers: %d' % num_towers)
+        print('==================================================')
+
+        timer = _FakeTimer()
+        monitor = ThroughputMonitor(timer=timer)
+        self._run_steps(monitor, timer, num_towers)
+        timer.sleep(1.0)
+        monitor.lap('eval')
+        stats = monitor.report(step=3)
+
+        # Seconds per step
+        self.assertAllClose(stats['data'], 0.01)
+        self.assertAllClose(stats['feed'], 0.005)
+        self.assertAllClose(stats['run'], 0.02)
+        self.assertAllClose(stats['eval'], 1.0 / 3)
+
+        # The throughput excludes the evaluation
+        self.assertAllClose(stats['utterances_per_sec'],
+                            4 * num_towers / 0.035)
+        self.assertAllClose(stats['frames_per_sec'],
+                            stats['utterances_per_sec'] * 5)
+        self.assertAllClose(stats['padding_ratio'], 0.5)
+
+        # The counters are reset after the report
+        self.assertEqual(monitor.num_steps, 0)
+        self.assertEqual(monitor.num_frames, 0)
+
+        with self.assertRaises(ValueError):
+            monitor.lap('train')
+
+    @measure_time
+    def check_save(self):
+
+        print('==================================================')
+        print('  Save history')
+        print('==================================================')
+
+        save_path = tempfile.mkdtemp()
+        try:
+            timer = _FakeTimer()
+            monitor = ThroughputMonitor(timer=timer)
+            summary_writer = tf.summary.FileWriter(save_path)
+            for step in [3, 6]:
+                self._run_steps(monitor, timer, num_towers=1)
+                monitor.lap('eval')
+                monitor.report(step, summary_writer)
+            summary_writer.close()
+            monitor.save(save_path)
+
+            history = np.loadtxt(os.path.join(save_path, 'throughput.csv'),
+                                 delimiter=',', skiprows=1)
+        finally:
+            shutil.rmtree(save_path)
+
+        self.assertEqual(history.shape, (2, len(STAT_KEYS) + 1))
+        self.assertAllEqual(history[:, 0], [3, 6])
+        # The same values in each interval
+        self.assertAllClose(history[0, 1:], history[1, 1:])
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -3,7 +3,7 @@
 
 """Base class for loading dataset for the multi-task CTC model.
    In this class, all data will be loaded at once.
-   You can use only the single GPU version.
+   When num_gpu > 1, each mini-batch is split for the model towers.
 """
 
 from __future__ import absolute_import
@@ -11,7 +11,6 @@ from __future__ import division
 from __future__ import print_function
 
 from os.path import basename
-import random
 import numpy as np
 
 from utils.dataset.base import Base
@@ -39,6 +38,7 @@ class DatasetBase(Base):
                     `[B]`
                 input_names: list of file name of input data of size
                     `[B]`
+                When num_gpu > 1, each of them is a list of num_gpu splits.
             is_new_epoch (bool): If true, one epoch is finished
         """
         if self.max_epoch is not None and self.epoch >= self.max_epoch:
@@ -68,12 +68,12 @@ class DatasetBase(Base):
                     self.sort_utt = False
 
             # Shuffle data in the mini-batch
-            random.shuffle(data_indices)
+            self.rng.shuffle(data_indices)
 
         elif self.shuffle:
             # Randomly sample uttrances
             if len(self.rest) > batch_size:
-                data_indices = random.sample(list(self.rest), batch_size)
+                data_indices = self.rng.sample(list(self.rest), batch_size)
                 self.rest -= set(data_indices)
             else:
                 # Last mini-batch
@@ -83,7 +83,7 @@ class DatasetBase(Base):
                 self.epoch += 1
 
                 # Shuffle selected mini-batch
-                random.shuffle(data_indices)
+                self.rng.shuffle(data_indices)
 
         else:
             if len(self.rest) > batch_size:
@@ -138,6 +138,18 @@ class DatasetBase(Base):
                        ] = self.label_sub_list[x]
             inputs_seq_len[i_batch] = frame_num
 
+        ###############
+        # Multi-GPUs
+        ###############
+        if self.num_gpu > 1:
+            # Now we split the mini-batch data by num_gpu
+            inputs = np.array_split(inputs, self.num_gpu, axis=0)
+            labels_main = np.array_split(labels_main, self.num_gpu, axis=0)
+            labels_sub = np.array_split(labels_sub, self.num_gpu, axis=0)
+            inputs_seq_len = np.array_split(
+                inputs_seq_len, self.num_gpu, axis=0)
+            input_names = np.array_split(input_names, self.num_gpu, axis=0)
+
         self.iteration += len(data_indices)
 
         return (inputs, labels_main, labels_sub, inputs_seq_len,
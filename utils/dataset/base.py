@@ -7,6 +7,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import random
+
 
 class Base(object):
 
@@ -15,6 +17,10 @@ class Base(object):
         self.iteration = 0
         self.is_new_epoch = False
 
+        # NOTE: each dataset has its own random generator so that the order
+        # of mini-batches can be reproduced by seeding it
+        self.rng = random.Random()
+
     def __len__(self):
         return len(self.input_paths)
 
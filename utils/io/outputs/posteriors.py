@@ -0,0 +1,241 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compressed archive of CTC posteriors with random access by utterance.
+   An archive is a directory of the following files:
+       meta.pickle: num_classes, top_k, chunk_frames
+       index.pickle: utterance name => (chunk index, start frame, end frame)
+       chunkXXXXX.npy: posteriors of size `[frames, num_classes]` (float16)
+       chunkXXXXX.indices.npy & chunkXXXXX.values.npy: top-k class indices
+           and posteriors of size `[frames, top_k]` (when top_k is set)
+   Chunks are read with memory mapping, so loading an utterance touches only
+   its own frames.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join, isdir
+import os
+import pickle
+import numpy as np
+
+
+class PosteriorWriter(object):
+    """Write posteriors per utterance in streaming fashion.
+    Args:
+        archive_path (string): path to the archive directory
+        num_classes (int): the number of classes (including a blank label)
+        top_k (int, optional): if set, only top-k posteriors of each frame are
+            saved. None means saving all posteriors in float16.
+        chunk_frames (int, optional): the number of frames to buffer before
+            flushing them to a chunk file
+    """
+
+    def __init__(self, archive_path, num_classes, top_k=None,
+                 chunk_frames=100000):
+        if top_k is not None:
+            assert 0 < top_k <= num_classes, 'top_k must be in [1, num_classes].'
+        assert chunk_frames > 0, 'chunk_frames must be larger than 0.'
+
+        self.archive_path = archive_path
+        self.num_classes = int(num_classes)
+        self.top_k = int(top_k) if top_k is not None else None
+        self.chunk_frames = int(chunk_frames)
+
+        if not isdir(archive_path):
+            os.makedirs(archive_path)
+
+        self.index = {}
+        self._chunk_index = 0
+        self._buffer = []
+        self._buffer_names = []
+        self._buffer_frame_num = 0
+
+        with open(join(archive_path, 'meta.pickle'), 'wb') as f:
+            pickle.dump({'num_classes': self.num_classes,
+                         'top_k': self.top_k,
+                         'chunk_frames': self.chunk_frames}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, utt_name, posteriors):
+        """Append posteriors of an utterance.
+        Args:
+            utt_name (string): the name of the utterance
+            posteriors (np.ndarray): A tensor of size `[T, num_classes]`
+        """
+        assert posteriors.ndim == 2 and posteriors.shape[1] == self.num_classes, \
+            'posteriors must be a tensor of size [T, num_classes].'
+        if utt_name in self.index or utt_name in self._buffer_names:
+            raise ValueError('%s is already in the archive.' % utt_name)
+
+        self._buffer.append(posteriors)
+        self._buffer_names.append(utt_name)
+        self._buffer_frame_num += len(posteriors)
+
+        if self._buffer_frame_num >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Write buffered utterances to a new chunk file."""
+        if len(self._buffer) == 0:
+            return
+
+        posteriors = np.concatenate(self._buffer, axis=0)
+        chunk_path = join(self.archive_path, 'chunk%05d' % self._chunk_index)
+
+        if self.top_k is None:
+            np.save(chunk_path + '.npy', posteriors.astype(np.float16))
+        else:
+            indices, values = _top_k(posteriors, self.top_k)
+            index_dtype = np.int16 if self.num_classes <= 32767 else np.int32
+            np.save(chunk_path + '.indices.npy', indices.astype(index_dtype))
+            np.save(chunk_path + '.values.npy', values.astype(np.float16))
+
+        start = 0
+        for utt_name, posteriors_utt in zip(self._buffer_names, self._buffer):
+            end = start + len(posteriors_utt)
+            self.index[utt_name] = (self._chunk_index, start, end)
+            start = end
+
+        # Rewrite the index so that flushed chunks can be read even if the
+        # writer is not closed correctly
+        with open(join(self.archive_path, 'index.pickle'), 'wb') as f:
+            pickle.dump(self.index, f)
+
+        self._chunk_index += 1
+        self._buffer = []
+        self._buffer_names = []
+        self._buffer_frame_num = 0
+
+    def close(self):
+        self.flush()
+
+
+class PosteriorReader(object):
+    """Read posteriors of each utterance from the archive by random access.
+    Args:
+        archive_path (string): path to the archive directory
+    """
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+
+        with open(join(archive_path, 'meta.pickle'), 'rb') as f:
+            meta = pickle.load(f)
+        self.num_classes = meta['num_classes']
+        self.top_k = meta['top_k']
+
+        with open(join(archive_path, 'index.pickle'), 'rb') as f:
+            self.index = pickle.load(f)
+
+        # Memory-mapped chunks
+        self._chunks = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, utt_name):
+        return utt_name in self.index
+
+    def keys(self):
+        return sorted(self.index.keys())
+
+    def _load_chunk(self, chunk_index):
+        if chunk_index not in self._chunks:
+            chunk_path = join(self.archive_path, 'chunk%05d' % chunk_index)
+            if self.top_k is None:
+                self._chunks[chunk_index] = np.load(
+                    chunk_path + '.npy', mmap_mode='r')
+            else:
+                self._chunks[chunk_index] = (
+                    np.load(chunk_path + '.indices.npy', mmap_mode='r'),
+                    np.load(chunk_path + '.values.npy', mmap_mode='r'))
+        return self._chunks[chunk_index]
+
+    def top_k_posteriors(self, utt_name):
+        """
+        Args:
+            utt_name (string): the name of the utterance
+        Returns:
+            indices (np.ndarray): class indices of size `[T, top_k]` sorted
+                by posteriors in descending order
+            values (np.ndarray): posteriors of size `[T, top_k]`
+        """
+        if self.top_k is None:
+            raise ValueError('This archive saves all posteriors.')
+        chunk_index, start, end = self.index[utt_name]
+        indices, values = self._load_chunk(chunk_index)
+        return (np.array(indices[start:end], dtype=np.int32),
+                np.array(values[start:end], dtype=np.float32))
+
+    def __getitem__(self, utt_name):
+        """
+        Args:
+            utt_name (string): the name of the utterance
+        Returns:
+            posteriors (np.ndarray): A tensor of size `[T, num_classes]`.
+                Posteriors out of top-k are filled with 0.
+        """
+        if self.top_k is None:
+            chunk_index, start, end = self.index[utt_name]
+            return np.array(self._load_chunk(chunk_index)[start:end],
+                            dtype=np.float32)
+
+        indices, values = self.top_k_posteriors(utt_name)
+        posteriors = np.zeros((len(indices), self.num_classes),
+                              dtype=np.float32)
+        posteriors[np.arange(len(indices))[:, np.newaxis], indices] = values
+        return posteriors
+
+    def best_path(self, utt_name, blank_index=None):
+        """Greedy (best path) decoding from saved posteriors.
+        Args:
+            utt_name (string): the name of the utterance
+            blank_index (int, optional): the index of the blank class.
+                Default is the last class.
+        Returns:
+            labels (np.ndarray): A tensor of size `[L]`
+        """
+        if blank_index is None:
+            blank_index = self.num_classes - 1
+
+        if self.top_k is None:
+            best = np.argmax(self[utt_name], axis=1)
+        else:
+            indices, _ = self.top_k_posteriors(utt_name)
+            best = indices[:, 0]
+
+        # Merge repeated labels, then remove blanks
+        if len(best) == 0:
+            return best.astype(np.int32)
+        keep = np.insert(best[1:] != best[:-1], 0, True)
+        labels = best[keep]
+        return labels[labels != blank_index].astype(np.int32)
+
+
+def _top_k(posteriors, k):
+    """
+    Args:
+        posteriors (np.ndarray): A tensor of size `[T, num_classes]`
+        k (int): the number of classes to keep per frame
+    Returns:
+        indices (np.ndarray): A tensor of size `[T, k]`
+        values (np.ndarray): A tensor of size `[T, k]`
+    """
+    rows = np.arange(len(posteriors))[:, np.newaxis]
+    if k == posteriors.shape[1]:
+        indices = np.tile(np.arange(k), (len(posteriors), 1))
+    else:
+        indices = np.argpartition(-posteriors, k - 1, axis=1)[:, :k]
+    values = posteriors[rows, indices]
+
+    # Sort in descending order
+    order = np.argsort(-values, axis=1)
+    return indices[rows, order], values[rows, order]
@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Utilities for the between-graph data-parallel training. Each worker
+   process builds its own graph, and the variables are shared through the
+   parameter servers."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+class Cluster(object):
+    """A cluster of the parameter servers and workers.
+    Args:
+        ps_hosts (list): `host:port` of the parameter servers
+        worker_hosts (list): `host:port` of the workers
+        job_name (string): ps or worker
+        task_index (int): the index of the task in the job
+        sync (bool, optional): if True, average the gradients of all workers
+            before each update. Otherwise, each worker updates the variables
+            asynchronously.
+    """
+
+    def __init__(self, ps_hosts, worker_hosts, job_name, task_index,
+                 sync=True):
+        if job_name not in ['ps', 'worker']:
+            raise ValueError('job_name must be "ps" or "worker".')
+        if job_name == 'worker' and not 0 <= task_index < len(worker_hosts):
+            raise ValueError('task_index must be less than the number of '
+                             'workers.')
+
+        self.cluster = tf.train.ClusterSpec(
+            {'ps': ps_hosts, 'worker': worker_hosts})
+        self.server = tf.train.Server(self.cluster,
+                                      job_name=job_name,
+                                      task_index=task_index)
+        self.job_name = job_name
+        self.task_index = int(task_index)
+        self.num_workers = len(worker_hosts)
+        self.sync = bool(sync)
+
+        # The first worker initializes the variables
+        self.is_chief = job_name == 'worker' and task_index == 0
+
+        self.sync_optimizer = None
+
+    def join(self):
+        """Serve the variables until the process is killed."""
+        self.server.join()
+
+    def device_setter(self):
+        """Return a device function which places the variables on the
+           parameter servers and the other operations on this worker."""
+        return tf.train.replica_device_setter(
+            worker_device='/job:worker/task:%d' % self.task_index,
+            cluster=self.cluster)
+
+    def wrap_optimizer(self, optimizer, model, accum_steps=1):
+        """Wrap the optimizer to aggregate gradients over the workers.
+        Args:
+            optimizer: An instance of `tf.train.Optimizer`
+            model: the model to train
+            accum_steps (int, optional): the number of mini-batches to
+                accumulate gradients over
+        Returns:
+            optimizer: An instance of `tf.train.Optimizer`
+        """
+        if not self.sync:
+            return optimizer
+
+        # NOTE: the aggregated update can not be built in a branch of tf.cond
+        if model.mixed_precision:
+            raise NotImplementedError(
+                'Mixed precision training is not supported with the '
+                'synchronous distributed training.')
+        if accum_steps > 1:
+            raise NotImplementedError(
+                'Gradient accumulation is not supported with the '
+                'synchronous distributed training.')
+
+        self.sync_optimizer = tf.train.SyncReplicasOptimizer(
+            optimizer,
+            replicas_to_aggregate=self.num_workers,
+            total_num_replicas=self.num_workers)
+        return self.sync_optimizer
+
+    def create_session(self, init_op, global_step):
+        """Initialize the variables on the parameter servers by the chief,
+           or wait for the initialization by the others. Note that the graph
+           is finalized.
+        Args:
+            init_op: An operation to initialize the variables
+            global_step: A variable to track the global step
+        Returns:
+            sess: A session for this worker
+        """
+        kwargs = {}
+        if self.sync_optimizer is not None:
+            if self.is_chief:
+                kwargs['local_init_op'] = self.sync_optimizer.chief_init_op
+            else:
+                kwargs['local_init_op'] = \
+                    self.sync_optimizer.local_step_init_op
+            kwargs['ready_for_local_init_op'] = \
+                self.sync_optimizer.ready_for_local_init_op
+
+            # NOTE: these must be created before the graph is finalized
+            chief_queue_runner = self.sync_optimizer.get_chief_queue_runner()
+            init_tokens_op = self.sync_optimizer.get_init_tokens_op()
+
+        self.supervisor = tf.train.Supervisor(is_chief=self.is_chief,
+                                              init_op=init_op,
+                                              global_step=global_step,
+                                              summary_op=None,
+                                              saver=None,
+                                              recovery_wait_secs=1,
+                                              **kwargs)
+
+        # NOTE: allow_soft_placement is needed for the ops without GPU
+        # kernels
+        config = tf.ConfigProto(
+            allow_soft_placement=True,
+            device_filters=['/job:ps',
+                            '/job:worker/task:%d' % self.task_index])
+        sess = self.supervisor.prepare_or_wait_for_session(
+            self.server.target, config=config)
+
+        if self.is_chief and self.sync_optimizer is not None:
+            # Start the queue runner to apply the aggregated gradients
+            sess.run(init_tokens_op)
+            self.supervisor.start_queue_runners(sess, [chief_queue_runner])
+
+        return sess
+
+
+def split_for_worker(data, num_gpu, num_workers=1, task_index=0):
+    """Select the splits of a mini-batch for the towers of a worker.
+    Args:
+        data (list): arrays of the mini-batch, which are split into
+            `num_gpu * num_workers` pieces by the dataset when it is more
+            than 1
+        num_gpu (int): the number of towers in each worker
+        num_workers (int, optional): the number of workers
+        task_index (int, optional): the index of the worker
+    Returns:
+        list of lists of num_gpu splits
+    """
+    if num_gpu * num_workers == 1:
+        return [[x] for x in data]
+    start = task_index * num_gpu
+    return [x[start:start + num_gpu] for x in data]
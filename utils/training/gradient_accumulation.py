@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Accumulate gradients over micro-batches to train with a larger effective
+   batch size than fits in the memory of a device."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+class GradientAccumulator(object):
+    """Accumulate gradients over `num_steps` micro-batches, and apply the
+       average of them once. The training operation is run every
+       micro-batch as usual.
+    Args:
+        num_steps (int): the number of micro-batches to accumulate
+    """
+
+    def __init__(self, num_steps):
+        assert int(num_steps) >= 1, 'num_steps must be larger than 0.'
+        self.num_steps = int(num_steps)
+
+        # NOTE: initializers must not depend on the update operations
+        with tf.control_dependencies(None):
+            self.step = tf.Variable(0, trainable=False, name='accum_step')
+        self.accum_list = []
+
+    def _create_accumulator(self, var):
+        """Create a zero-initialized variable on the device of var.
+        Args:
+            var: A trainable variable
+        Returns:
+            accum: A non-trainable variable of the same shape as var
+        """
+        with tf.control_dependencies(None), tf.colocate_with(var):
+            if var.get_shape().is_fully_defined():
+                return tf.Variable(
+                    tf.zeros(var.get_shape(), dtype=var.dtype.base_dtype),
+                    trainable=False, name='grad_accum')
+            # NOTE: the shape of the cuDNN parameters is unknown
+            return tf.Variable(tf.zeros_like(var.initialized_value()),
+                               trainable=False, validate_shape=False,
+                               name='grad_accum')
+
+    def accumulate(self, grads_and_vars, apply_fn):
+        """Operation for accumulating gradients of a micro-batch. Every
+           `num_steps` micro-batches, the averaged gradients are applied by
+           `apply_fn` and the accumulators are reset.
+        Args:
+            grads_and_vars: list of (grads, vars) tuples of a micro-batch
+            apply_fn: A function which takes a list of (averaged grads, vars)
+                tuples and returns an operation to apply them
+        Returns:
+            train_op: operation for training
+        """
+        accum_ops, accum_and_vars = [], []
+        with tf.name_scope('gradient_accumulation'):
+            for grad, var in grads_and_vars:
+                if grad is None:
+                    continue
+                accum = self._create_accumulator(var)
+                self.accum_list.append(accum)
+                if isinstance(grad, tf.IndexedSlices):
+                    # NOTE: gradients of the embedding lookup are sparse
+                    accum_ops.append(
+                        tf.scatter_add(accum, grad.indices, grad.values))
+                else:
+                    accum_ops.append(tf.assign_add(accum, grad))
+                accum_and_vars.append((accum, var))
+
+            with tf.control_dependencies(accum_ops):
+                step = tf.assign_add(self.step, 1)
+
+            def _apply():
+                average_grads_and_vars = [
+                    (accum.read_value() / self.num_steps, var)
+                    for accum, var in accum_and_vars]
+                apply_op = apply_fn(average_grads_and_vars)
+
+                # Reset the accumulators for the next micro-batches
+                with tf.control_dependencies([apply_op]):
+                    return tf.group(*[tf.assign(accum, tf.zeros_like(accum))
+                                      for accum, _ in accum_and_vars])
+
+            train_op = tf.cond(tf.equal(step % self.num_steps, 0),
+                               _apply, tf.no_op)
+
+        return train_op
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compute, clip and apply gradients. These are shared by the CTC, multi-task
+   CTC, Attention and joint CTC-Attention models. The model must have
+   `mixed_precision`, `loss_scaler`, `clip_grad`, `grad_norm` and
+   `summaries_train`."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def compute_gradients(model, optimizer, loss):
+    """Compute gradients. In mixed precision training, gradients are
+       computed from the scaled loss and scaled down.
+    Args:
+        model: the model to train
+        optimizer: An instance of `tf.train.Optimizer`
+        loss: An operation for computing loss
+    Returns:
+        grads_and_vars: list of (grads, vars) tuples
+    """
+    if model.mixed_precision:
+        grads_and_vars = optimizer.compute_gradients(
+            model.loss_scaler.scale_loss(loss))
+        return model.loss_scaler.unscale_gradients(grads_and_vars)
+    return optimizer.compute_gradients(loss)
+
+
+def apply_gradients(model, optimizer, grads_and_vars, clip_norm,
+                    global_step, clip_global_norm=False):
+    """Clip gradients and apply them. In mixed precision training, the
+       update is skipped when gradients overflow.
+    Args:
+        model: the model to train
+        optimizer: An instance of `tf.train.Optimizer`
+        grads_and_vars: list of (grads, vars) tuples
+        clip_norm (bool): if True, clip gradients norm by model.clip_grad
+        global_step: A variable to increment
+        clip_global_norm (bool, optional): if True, clip the global norm
+            of all gradients by model.clip_grad
+    Returns:
+        train_op: operation for applying gradients
+    """
+    if model.mixed_precision:
+        # NOTE: check overflow before clipping
+        all_finite = model.loss_scaler.all_finite(grads_and_vars)
+        clipped_grads_and_vars = clip_gradients(
+            model, grads_and_vars, clip_norm, clip_global_norm)
+        return model.loss_scaler.apply_gradients(
+            optimizer, clipped_grads_and_vars, all_finite,
+            global_step=global_step)
+
+    # Clip gradients
+    clipped_grads_and_vars = clip_gradients(
+        model, grads_and_vars, clip_norm, clip_global_norm)
+
+    # Create gradient updates
+    return optimizer.apply_gradients(clipped_grads_and_vars,
+                                     global_step=global_step)
+
+
+def add_grad_norm_summary(model):
+    """Create a variable to record the global norm of gradients, and add
+       a scalar summary of it.
+    Args:
+        model: the model to train
+    """
+    if model.grad_norm is None:
+        model.grad_norm = tf.Variable(0.0, trainable=False, name='grad_norm')
+        model.summaries_train.append(
+            tf.summary.scalar('grad_norm', model.grad_norm))
+
+
+def _identity(grad):
+    if isinstance(grad, tf.IndexedSlices):
+        return tf.IndexedSlices(tf.identity(grad.values), grad.indices,
+                                grad.dense_shape)
+    return tf.identity(grad)
+
+
+def clip_gradients(model, grads_and_vars, clip_norm, clip_global_norm=False):
+    """Clip gradients. The global norm before clipping is recorded in
+       model.grad_norm if it exists.
+    Args:
+        model: the model to train
+        grads_and_vars: list of (grads, vars) tuples
+        clip_norm (bool): if True, clip gradients norm by model.clip_grad
+        clip_global_norm (bool, optional): if True, clip the global norm of
+            all gradients by model.clip_grad in a single op
+    Returns:
+        clipped_grads_and_vars: list of (clipped grads, vars)
+    """
+    # TODO: Optionally add gradient noise
+
+    grads_and_vars = [(grad, var) for grad, var in grads_and_vars
+                      if grad is not None]
+    grads = [grad for grad, _ in grads_and_vars]
+
+    global_norm = None
+    if model.grad_norm is not None:
+        global_norm = tf.global_norm(grads)
+        # NOTE: the norm is recorded in a variable because this may be built
+        # in a branch of tf.cond (gradient accumulation)
+        with tf.control_dependencies(
+                [tf.assign(model.grad_norm, global_norm)]):
+            global_norm = tf.identity(global_norm)
+
+    if model.clip_grad is None:
+        # NOTE: gradients are only passed through
+        clipped_grads = grads
+    elif clip_global_norm:
+        # Clip the global norm
+        clipped_grads, _ = tf.clip_by_global_norm(
+            grads, clip_norm=model.clip_grad, use_norm=global_norm)
+    elif clip_norm:
+        # Clip gradient norm
+        clipped_grads = [tf.clip_by_norm(grad, clip_norm=model.clip_grad)
+                         for grad in grads]
+    else:
+        # Clip gradient
+        clipped_grads = [tf.clip_by_value(grad,
+                                          clip_value_min=-model.clip_grad,
+                                          clip_value_max=model.clip_grad)
+                         for grad in grads]
+
+    if global_norm is not None and (model.clip_grad is None or
+                                    not clip_global_norm):
+        # NOTE: record the norm also when it is not used for clipping
+        with tf.control_dependencies([global_norm]):
+            clipped_grads = [_identity(grad) for grad in clipped_grads]
+
+    return [(clipped_grad, var) for clipped_grad, (_, var)
+            in zip(clipped_grads, grads_and_vars)]
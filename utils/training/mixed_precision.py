@@ -0,0 +1,199 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Utilities for mixed precision training. Variables are stored in float32
+   (master weights), the encoders compute in float16, and the loss is scaled
+   dynamically so that small gradients do not underflow in float16."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def float32_variable_storage_getter(getter, name, shape=None, dtype=None,
+                                    initializer=None, regularizer=None,
+                                    trainable=True, *args, **kwargs):
+    """A custom getter which creates trainable variables in float32 and
+       casts them to the requested dtype (float16).
+    Args:
+        getter: the original getter of `tf.get_variable`
+        name (string): the name of the variable
+        shape (optional): the shape of the variable
+        dtype (optional): the dtype requested by the layer
+        initializer (optional): the initializer of the variable
+        regularizer (optional): the regularizer of the variable
+        trainable (bool, optional): if True, the variable is stored in
+            float32
+    Returns:
+        variable: A float32 variable, or a float16 tensor cast from it
+    """
+    storage_dtype = tf.float32 if trainable else dtype
+    variable = getter(name, shape, dtype=storage_dtype,
+                      initializer=initializer, regularizer=regularizer,
+                      trainable=trainable, *args, **kwargs)
+    if trainable and dtype != tf.float32:
+        variable = tf.cast(variable, dtype)
+    return variable
+
+
+def float16_scope():
+    """Reopen the current variable scope to compute in float16 with float32
+       master weights.
+    Returns:
+        A context manager of `tf.variable_scope`
+    """
+    return tf.variable_scope(tf.get_variable_scope(),
+                             custom_getter=float32_variable_storage_getter,
+                             dtype=tf.float16)
+
+
+def cast_structure(structure, dtype):
+    """Cast all tensors in a (nested) tuple such as `LSTMStateTuple`.
+    Args:
+        structure: A tensor, or a (nested) tuple or list of tensors
+        dtype: the dtype to cast to
+    Returns:
+        A structure of the same type
+    """
+    if structure is None:
+        return None
+    if isinstance(structure, tuple) and hasattr(structure, '_fields'):
+        # namedtuple
+        return type(structure)(*[cast_structure(s, dtype) for s in structure])
+    if isinstance(structure, (list, tuple)):
+        return type(structure)([cast_structure(s, dtype) for s in structure])
+    return tf.cast(structure, dtype)
+
+
+class DynamicLossScaler(object):
+    """Scale the loss dynamically in mixed precision training. The gradients
+       are computed from the scaled loss and scaled down before the update.
+       When gradients overflow, the update is skipped and the scale is
+       decreased. The scale is increased after `increment_period` steps
+       without overflow.
+    Args:
+        init_scale (float, optional): the initial loss scale
+        increment_period (int, optional): the number of steps without
+            overflow to increase the scale
+        factor (float, optional): the factor to increase or decrease the scale
+        min_scale (float, optional): the lower bound of the scale
+        max_scale (float, optional): the upper bound of the scale
+    """
+
+    def __init__(self, init_scale=2 ** 15, increment_period=2000, factor=2.0,
+                 min_scale=1.0, max_scale=2 ** 24):
+        assert float(factor) > 1, 'factor must be larger than 1.'
+        assert float(min_scale) <= float(init_scale) <= float(max_scale)
+
+        self.increment_period = int(increment_period)
+        self.factor = float(factor)
+        self.min_scale = float(min_scale)
+        self.max_scale = float(max_scale)
+
+        self.loss_scale = tf.Variable(float(init_scale), trainable=False,
+                                      name='loss_scale')
+        self.num_good_steps = tf.Variable(0, trainable=False,
+                                          name='num_good_steps')
+
+    def scale_loss(self, loss):
+        """
+        Args:
+            loss: A float32 scalar tensor
+        Returns:
+            A scaled loss
+        """
+        return loss * self.loss_scale
+
+    def unscale_gradients(self, grads_and_vars):
+        """
+        Args:
+            grads_and_vars: list of (grads, vars) tuples of the scaled loss
+        Returns:
+            unscaled_grads_and_vars: list of (unscaled grads, vars)
+        """
+        inv_scale = 1 / self.loss_scale
+        unscaled_grads_and_vars = []
+        for grad, var in grads_and_vars:
+            if grad is None:
+                pass
+            elif isinstance(grad, tf.IndexedSlices):
+                grad = tf.IndexedSlices(grad.values * inv_scale,
+                                        grad.indices, grad.dense_shape)
+            else:
+                grad *= inv_scale
+            unscaled_grads_and_vars.append((grad, var))
+        return unscaled_grads_and_vars
+
+    @staticmethod
+    def all_finite(grads_and_vars):
+        """Check overflow of gradients. Check the gradients before clipping,
+           because clipping by value hides infinite values.
+        Args:
+            grads_and_vars: list of (grads, vars) tuples
+        Returns:
+            A boolean scalar tensor, True if all gradients are finite
+        """
+        is_finite_list = []
+        for grad, _ in grads_and_vars:
+            if grad is None:
+                continue
+            if isinstance(grad, tf.IndexedSlices):
+                grad = grad.values
+            is_finite_list.append(tf.reduce_all(tf.is_finite(grad)))
+        return tf.reduce_all(tf.stack(is_finite_list))
+
+    def update(self, all_finite):
+        """Operation for updating the loss scale.
+        Args:
+            all_finite: A boolean scalar tensor
+        Returns:
+            update_op: operation for updating the loss scale
+        """
+        def _overflow():
+            return tf.group(
+                tf.assign(self.loss_scale,
+                          tf.maximum(self.loss_scale / self.factor,
+                                     self.min_scale)),
+                tf.assign(self.num_good_steps, 0))
+
+        def _no_overflow():
+            increment = self.num_good_steps + 1 >= self.increment_period
+            return tf.group(
+                tf.assign(self.loss_scale,
+                          tf.where(increment,
+                                   tf.minimum(self.loss_scale * self.factor,
+                                              self.max_scale),
+                                   self.loss_scale)),
+                tf.assign(self.num_good_steps,
+                          tf.where(increment, 0, self.num_good_steps + 1)))
+
+        return tf.cond(all_finite, _no_overflow, _overflow)
+
+    def apply_gradients(self, optimizer, grads_and_vars, all_finite,
+                        global_step=None):
+        """Apply gradients only if they are all finite, and update the loss
+           scale. The global step is incremented even when the update is
+           skipped.
+        Args:
+            optimizer: An instance of `tf.train.Optimizer`
+            grads_and_vars: list of (unscaled grads, vars) tuples
+            all_finite: A boolean scalar tensor computed by `all_finite`
+            global_step (optional): A variable to increment
+        Returns:
+            train_op: operation for training
+        """
+        def _apply():
+            return optimizer.apply_gradients(grads_and_vars,
+                                             global_step=global_step)
+
+        def _skip():
+            if global_step is None:
+                return tf.no_op()
+            return tf.group(tf.assign_add(global_step, 1))
+
+        with tf.control_dependencies([self.update(all_finite)]):
+            train_op = tf.cond(all_finite, _apply, _skip)
+
+        return train_op
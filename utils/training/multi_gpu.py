@@ -9,14 +9,21 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from utils.training.mixed_precision import DynamicLossScaler
+from utils.training.gradient_accumulation import GradientAccumulator
+from utils.training.gradients import compute_gradients, apply_gradients, \
+    add_grad_norm_summary
 
-def average_gradients(total_grads_and_vars):
+
+def average_gradients(total_grads_and_vars, device=None):
     """Calculate the average gradient for each shared variable across all towers.
     Note that this function provides a synchronization point across all towers.
     Args:
         total_grads_and_vars: List of lists of (gradient, variable) tuples.
             The outer list is over individual gradients. The inner list is over
             the gradient calculation for each tower.
+        device (string, optional): the device to aggregate gradients on, e.g.
+            '/gpu:0'. Default is the device of the current scope.
     Returns:
         average_grads_and_vars: List of pairs of (gradient, variable) where
             the gradient has been averaged across all towers.
@@ -25,24 +32,160 @@ def average_gradients(total_grads_and_vars):
     for tower_grads_and_vars in zip(*total_grads_and_vars):
         # Note that each tower_grads_and_vars looks like the following:
         #   ((grad0_gpu0, var0_gpu0), ... , (grad0_gpuN, var0_gpuN))
-        tower_grads = []
-        for grad, _ in tower_grads_and_vars:  # var is ignored
-            if grad is not None:
-                # Add 0 dimension to the gradients to represent the tower
-                expanded_grad = tf.expand_dims(grad, axis=0)
-
-                # Append on a 'tower' dimension which we will average over
-                # below
-                tower_grads.append(expanded_grad)
-
-        # Average over the 'tower' dimension.
-        tower_grads = tf.concat(axis=0, values=tower_grads)
-        mean_tower_grad = tf.reduce_mean(tower_grads, axis=0)
+        tower_grads = [grad for grad, _ in tower_grads_and_vars
+                       if grad is not None]
 
         # Keep in mind that the Variables are redundant because they are shared
         # across towers. So .. we will just return the first tower's pointer to
         # the Variable.
         var = tower_grads_and_vars[0][1]  # var0_gpu0
-        grad_and_var = (mean_tower_grad, var)
-        average_grads_and_vars.append(grad_and_var)
+
+        if len(tower_grads) == 0:
+            average_grads_and_vars.append((None, var))
+            continue
+
+        if device is None:
+            mean_tower_grad = _average(tower_grads)
+        else:
+            with tf.device(device):
+                mean_tower_grad = _average(tower_grads)
+        average_grads_and_vars.append((mean_tower_grad, var))
     return average_grads_and_vars
+
+
+def _average(tower_grads):
+    """Average gradients of a variable without stacking copies of them.
+    Args:
+        tower_grads: A list of gradients of each tower
+    Returns:
+        A tensor or `tf.IndexedSlices` of the averaged gradient
+    """
+    num_towers = len(tower_grads)
+    if num_towers == 1:
+        return tower_grads[0]
+
+    if all(isinstance(grad, tf.IndexedSlices) for grad in tower_grads):
+        # NOTE: sparse gradients (e.g. of the embedding lookup) are averaged
+        # by concatenating the slices, which are summed in the update
+        return tf.IndexedSlices(
+            values=tf.concat(
+                axis=0, values=[grad.values for grad in tower_grads]) / num_towers,
+            indices=tf.concat(
+                axis=0, values=[grad.indices for grad in tower_grads]),
+            dense_shape=tower_grads[0].dense_shape)
+
+    tower_grads = [tf.convert_to_tensor(grad) for grad in tower_grads]
+    return tf.add_n(tower_grads) / num_towers
+
+
+def get_devices(num_towers, device_type='gpu'):
+    """Return the list of devices to place the model towers on.
+    Args:
+        num_towers (int): the number of towers
+        device_type (string, optional): gpu or cpu. The CPU device replicas
+            are prepared by `tf.ConfigProto(device_count={'CPU': num_towers})`
+    Returns:
+        devices (list): e.g. ['/gpu:0', '/gpu:1']
+    """
+    if device_type not in ['gpu', 'cpu']:
+        raise ValueError('device_type must be "gpu" or "cpu".')
+    return ['/%s:%d' % (device_type, i_tower) for i_tower in range(num_towers)]
+
+
+def build_towers(model, optimizer, tower_fn, devices, global_step,
+                 clip_norm=False, clip_global_norm=False, accum_steps=1,
+                 aggregation_device=None):
+    """Build a copy of the model on each device (tower) with shared variables,
+       and the operation to apply the gradients averaged over all towers.
+       The mini-batch is split over the towers (data parallelism).
+    Args:
+        model: the model to train. This must have the attributes used in
+            utils/training/gradients.py (the CTC, multi-task CTC, Attention
+            and joint CTC-Attention models).
+        optimizer: An instance of `tf.train.Optimizer`
+        tower_fn: A function which takes the index of the tower and the name
+            scope of it, and builds the tower. This must create the
+            placeholders of the tower and return `(loss, outputs)`, where
+            outputs is any structure of the other operations to keep. Only
+            the summaries added by the first tower are kept in the model.
+        devices (list): the devices to place the towers on, e.g. the output
+            of `get_devices`
+        global_step: A variable to increment
+        clip_norm (bool, optional): if True, clip gradients norm by
+            model.clip_grad
+        clip_global_norm (bool, optional): if True, clip the global norm of
+            the averaged gradients by model.clip_grad
+        accum_steps (int, optional): the number of mini-batches to accumulate
+            the averaged gradients over
+        aggregation_device (string, optional): the device to average
+            gradients on. Default is the device of the current scope.
+    Returns:
+        train_op: operation for training
+        loss_op: operation for computing the loss averaged over all towers
+        tower_outputs (list): outputs of tower_fn in each tower
+    """
+    # NOTE: variables must be created before the towers
+    if model.mixed_precision and model.loss_scaler is None:
+        model.loss_scaler = DynamicLossScaler()
+        model.summaries_train.append(
+            tf.summary.scalar('loss_scale', model.loss_scaler.loss_scale))
+    if clip_global_norm:
+        add_grad_norm_summary(model)
+
+    # Calculate the gradients for each model tower
+    total_grads_and_vars, total_losses, tower_outputs = [], [], []
+    with tf.variable_scope(tf.get_variable_scope()):
+        for i_tower, device in enumerate(devices):
+            with tf.device(device):
+                with tf.name_scope('tower%d' % i_tower) as scope:
+
+                    # Construct the entire model, which shares the variables
+                    # across all towers
+                    num_summaries_train = len(model.summaries_train)
+                    num_summaries_dev = len(model.summaries_dev)
+                    tower_loss, outputs = tower_fn(i_tower, scope)
+
+                    # Retain the summaries from the first tower
+                    if i_tower > 0:
+                        del model.summaries_train[num_summaries_train:]
+                        del model.summaries_dev[num_summaries_dev:]
+
+                    # Reuse variables for the next tower
+                    tf.get_variable_scope().reuse_variables()
+
+                    # Calculate the gradients for the split of mini-batch on
+                    # this tower
+                    tower_grads_and_vars = compute_gradients(
+                        model, optimizer, tower_loss)
+                    total_grads_and_vars.append(
+                        [(grad, var) for grad, var in tower_grads_and_vars
+                         if grad is not None])
+                    total_losses.append(tower_loss)
+                    tower_outputs.append(outputs)
+
+    # Average losses over all towers
+    loss_op = tf.add_n(total_losses) / len(devices)
+
+    # We must calculate the mean of each gradient. Note that this is the
+    # synchronization point across all towers
+    average_grads_and_vars = average_gradients(total_grads_and_vars,
+                                               device=aggregation_device)
+
+    def apply_fn(grads_and_vars):
+        return apply_gradients(model, optimizer, grads_and_vars,
+                               clip_norm=clip_norm,
+                               global_step=global_step,
+                               clip_global_norm=clip_global_norm)
+
+    # NOTE: the moving averages of batch normalization are updated in each
+    # tower
+    update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
+    with tf.control_dependencies(update_ops):
+        if accum_steps > 1:
+            accumulator = GradientAccumulator(accum_steps)
+            train_op = accumulator.accumulate(average_grads_and_vars,
+                                              apply_fn)
+        else:
+            train_op = apply_fn(average_grads_and_vars)
+
+    return train_op, loss_op, tower_outputs
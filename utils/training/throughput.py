@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure where the time of each training step goes, and the throughput
+   of the training loop."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import time
+import numpy as np
+import tensorflow as tf
+
+TIME_KEYS = ['data', 'feed', 'run', 'eval']
+STAT_KEYS = TIME_KEYS + ['frames_per_sec', 'utterances_per_sec',
+                         'padding_ratio']
+
+
+class ThroughputMonitor(object):
+    """Accumulate the time spent in each phase of the training loop and the
+       number of frames over a print interval. The phases are:
+           data: loading a mini-batch by the dataset
+           feed: creating the feed dictionary (e.g. `list2sparsetensor`)
+           run: running the training operation
+           eval: logging and evaluation
+       The time of each phase is reported per step, and the throughput is
+       computed over data, feed and run, so that these do not depend on how
+       often the report is made.
+    Args:
+        timer (optional): A function which returns the current time in
+            seconds. Default is `time.time`.
+    """
+
+    def __init__(self, timer=time.time):
+        self.history = []
+        self._timer = timer
+        self._last_time = timer()
+        self._reset()
+
+    def _reset(self):
+        self.times = dict((key, 0.) for key in TIME_KEYS)
+        self.num_steps = 0
+        self.num_utterances = 0
+        self.num_frames = 0
+        self.num_padded_frames = 0
+
+    def lap(self, key):
+        """Add the time from the previous lap to the phase.
+        Args:
+            key (string): data or feed or run or eval
+        """
+        if key not in TIME_KEYS:
+            raise ValueError('key must be "data" or "feed" or "run" or '
+                             '"eval".')
+        now = self._timer()
+        self.times[key] += now - self._last_time
+        self._last_time = now
+
+    def add_batch(self, inputs, inputs_seq_len):
+        """Count the frames of a mini-batch.
+        Args:
+            inputs (list): arrays of size `[B, T, input_size]` of each tower
+            inputs_seq_len (list): arrays of size `[B]` of each tower
+        """
+        self.num_steps += 1
+        for inputs_i, inputs_seq_len_i in zip(inputs, inputs_seq_len):
+            self.num_utterances += len(inputs_seq_len_i)
+            self.num_frames += int(np.sum(inputs_seq_len_i))
+            self.num_padded_frames += inputs_i.shape[0] * inputs_i.shape[1]
+
+    def report(self, step, summary_writer=None):
+        """Print the throughput of the interval, add it to the event files and
+           reset the counters.
+        Args:
+            step (int): the current step
+            summary_writer (optional): An instance of `tf.summary.FileWriter`
+        Returns:
+            stats (dict): seconds per step of each phase, frames/sec and
+                utterances/sec in training, and the ratio of padded frames
+        """
+        num_steps = max(self.num_steps, 1)
+        stats = dict((key, self.times[key] / num_steps) for key in TIME_KEYS)
+
+        # NOTE: logging and evaluation are excluded because they are run
+        # once per report
+        duration = max(self.times['data'] + self.times['feed'] +
+                       self.times['run'], 1e-8)
+        stats['frames_per_sec'] = self.num_frames / duration
+        stats['utterances_per_sec'] = self.num_utterances / duration
+        stats['padding_ratio'] = 1 - \
+            self.num_frames / max(self.num_padded_frames, 1)
+        self.history.append([step] + [stats[key] for key in STAT_KEYS])
+
+        print('  %.1f frames/sec, %.1f utt/sec, padding %.1f %% / '
+              'data %.3f, feed %.3f, run %.3f, eval %.3f sec/step' %
+              (stats['frames_per_sec'], stats['utterances_per_sec'],
+               stats['padding_ratio'] * 100, stats['data'], stats['feed'],
+               stats['run'], stats['eval']))
+
+        if summary_writer is not None:
+            summary = tf.Summary(value=[
+                tf.Summary.Value(tag='throughput/' + key,
+                                 simple_value=stats[key])
+                for key in STAT_KEYS])
+            summary_writer.add_summary(summary, step)
+            summary_writer.flush()
+
+        self._reset()
+        return stats
+
+    def save(self, save_path):
+        """Save history of the throughput as a csv file.
+        Args:
+            save_path (string): path to the directory to save
+        """
+        if len(self.history) == 0:
+            return
+        np.savetxt(os.path.join(save_path, "throughput.csv"),
+                   np.array(self.history), delimiter=",",
+                   header=','.join(['step'] + STAT_KEYS), comments='')